@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Blob store output size benchmark
+
+Writes the same synthetic pages as JSON items with the HTML inline (the
+current JsonWriterPipeline output) and as JSON items carrying only a
+content hash plus the blob store, with and without a trained dictionary,
+and reports bytes written and write time.
+
+Usage:
+    python benchmarks/blobstore_benchmark.py --pages 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.blobstore import BlobStore
+
+
+def make_pages(count, duplicate_ratio, seed=0):
+    """Pages from a few site templates, a share of them identical error pages"""
+    rng = random.Random(seed)
+    words = [f'word{i}' for i in range(3000)]
+    templates = []
+    for site in range(5):
+        nav = ''.join(f'<li><a href="/section{j}">Section {j} of site {site}</a></li>' for j in range(40))
+        templates.append(
+            f'<!DOCTYPE html><html><head><title>{{title}}</title><link rel="stylesheet" href="/site{site}.css">'
+            f'<script src="/site{site}.js"></script></head><body><header><ul>{nav}</ul></header>'
+            f'<main><h1>{{title}}</h1><article>{{text}}</article></main>'
+            f'<footer><p>Copyright site {site}. All rights reserved.</p></footer></body></html>'
+        )
+    error_page = '<html><head><title>404</title></head><body><h1>Not Found</h1></body></html>'
+    for i in range(count):
+        if rng.random() < duplicate_ratio:
+            content = error_page
+        else:
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(100, 600)))
+            content = rng.choice(templates).format(title=f'Page {i}', text=f'<p>{text}</p>')
+        yield {'url': f'http://bench.example/{i}', 'title': f'Page {i}', 'content': content}
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def write_inline(pages, directory):
+    os.makedirs(directory)
+    for i, page in enumerate(pages):
+        with open(os.path.join(directory, f'{i:08d}-page.json'), 'w', encoding='utf-8') as f:
+            json.dump(page, f, ensure_ascii=False, indent=2)
+
+
+def write_blobs(pages, directory, dictionary_samples):
+    items = os.path.join(directory, 'pages')
+    os.makedirs(items)
+    store = BlobStore(os.path.join(directory, 'blobs'), dictionary_samples=dictionary_samples)
+    for i, page in enumerate(pages):
+        page = dict(page)
+        page['content_hash'] = store.put(page.pop('content').encode('utf-8'), use_dictionary=True)
+        with open(os.path.join(items, f'{i:08d}-page.json'), 'w', encoding='utf-8') as f:
+            json.dump(page, f, ensure_ascii=False, indent=2)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inline HTML output with the blob store')
+    parser.add_argument('--pages', type=int, default=5000, help='Number of pages')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='Share of identical error pages')
+    parser.add_argument('--dictionary-samples', type=int, default=1000, help='Pages used to train the dictionary')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {'pages': args.pages}
+    variants = [
+        ('inline_json', lambda pages, d: write_inline(pages, d)),
+        ('blob_store', lambda pages, d: write_blobs(pages, d, 0)),
+        ('blob_store_dictionary', lambda pages, d: write_blobs(pages, d, args.dictionary_samples)),
+    ]
+    for name, write in variants:
+        workdir = tempfile.mkdtemp(prefix=f'blob-bench-{name}-')
+        try:
+            start = time.perf_counter()
+            write(make_pages(args.pages, args.duplicate_ratio), os.path.join(workdir, 'out'))
+            elapsed = time.perf_counter() - start
+            results[name] = {'seconds': round(elapsed, 3), 'bytes': dir_size(workdir)}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{name:>22}: {results[name]}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
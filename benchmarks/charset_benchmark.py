@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Charset detection benchmark
+
+Decodes a mixed-encoding corpus of HTML pages and text documents three
+ways and reports accuracy (exact match with the original text) and time:
+
+- ``retry``: the old DocumentProcessor loop trying utf-8, utf-16,
+  latin-1 and cp1252 in turn (utf-8 with errors ignored for HTML)
+- ``scrapy``: ``TextResponse.text`` with the Content-Type header
+- ``charset``: ``utils.charset.decode``
+
+Results are given for the documents whose Content-Type header names
+their charset and for the rest, which carry no charset or a wrong UTF-8
+one and are left to detection.
+
+Usage:
+    python benchmarks/charset_benchmark.py --documents 2000 --size 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, TextResponse
+
+from utils import charset
+
+TEXTS = {
+    'utf-8': 'Mixed ünïcödé текст 日本語 and plain English words. ',
+    'cp1252': 'Café crème brûlée, naïve façade — “quoted” text über Größe. ',
+    'iso-8859-2': 'Zażółć gęślą jaźń, příliš žluťoučký kůň úpěl ďábelské ódy. ',
+    'cp1251': 'Привет мир, это тестовый текст на русском языке для проверки. ',
+    'iso-8859-7': 'Καλημέρα κόσμε, αυτό είναι ελληνικό κείμενο για δοκιμή. ',
+    'cp932': 'これは日本語のテキストです。文字コードの検出をテストします。',
+    'gb18030': '这是一个中文文本，用于测试字符编码检测功能。',
+    'utf-16': 'Plain English text stored as UTF-16 with a byte order mark. ',
+}
+ENGLISH = 'The quick brown fox jumps over the lazy dog. '
+
+
+def make_corpus(count, size, seed=1):
+    """(body, content type, is html, expected text, declared) tuples"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        encoding = rng.choice(list(TEXTS))
+        html = rng.random() < 0.7
+        paragraphs = []
+        while sum(map(len, paragraphs)) < size:
+            paragraphs.append(TEXTS[encoding] * rng.randint(1, 4) + ENGLISH * rng.randint(0, 3))
+        text = '\n'.join(paragraphs)
+        declared = 'utf-16' if encoding == 'utf-16' else encoding
+        if html:
+            meta = f'<meta charset="{declared}">' if rng.random() < 0.4 and encoding != 'utf-16' else ''
+            text = f'<html><head>{meta}<title>Page {i}</title></head><body><p>{text}</p></body></html>'
+        roll = rng.random()
+        declared_header = roll < 0.4
+        if declared_header:
+            content_type = f"{'text/html' if html else 'text/plain'}; charset={declared}"
+        elif roll < 0.5 and encoding != 'utf-8':
+            # Servers often claim UTF-8 for legacy pages
+            content_type = f"{'text/html' if html else 'text/plain'}; charset=utf-8"
+        else:
+            content_type = 'text/html' if html else 'text/plain'
+        corpus.append((text.encode(encoding), content_type, html, text, declared_header))
+    return corpus
+
+
+def retry_decode(body, content_type, html):
+    if html:
+        return body.decode('utf-8', errors='ignore')
+    for encoding in ['utf-8', 'utf-16', 'latin-1', 'cp1252']:
+        try:
+            return body.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return body.decode('utf-8', errors='ignore')
+
+
+def scrapy_decode(body, content_type, html):
+    cls = HtmlResponse if html else TextResponse
+    return cls('http://example.com/', body=body, headers={'Content-Type': content_type}).text
+
+
+def charset_decode(body, content_type, html):
+    return charset.decode(body, content_type, html=html)[0]
+
+
+def bench(name, decoder, corpus):
+    correct = 0
+    start = time.perf_counter()
+    for body, content_type, html, text, _ in corpus:
+        correct += decoder(body, content_type, html) == text
+    elapsed = time.perf_counter() - start
+    return {
+        'decoder': name,
+        'accuracy_percent': round(correct / len(corpus) * 100, 1),
+        'seconds': round(elapsed, 4),
+        'mb_per_second': round(sum(len(body) for body, *_ in corpus) / elapsed / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark charset detection and decoding')
+    parser.add_argument('--documents', type=int, default=2000, help='Documents in the corpus')
+    parser.add_argument('--size', type=int, default=20000, help='Approximate characters per document')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.documents, args.size)
+    groups = {
+        'all': corpus,
+        'declared': [document for document in corpus if document[4]],
+        'undeclared': [document for document in corpus if not document[4]],
+    }
+    results = {group: [bench(name, decoder, documents) for name, decoder in
+                       (('retry', retry_decode), ('scrapy', scrapy_decode), ('charset', charset_decode))]
+               for group, documents in groups.items()}
+
+    print(f"{'documents':>10} {'decoder':>8} {'accuracy %':>11} {'seconds':>9} {'MB/s':>7}")
+    for group, group_results in results.items():
+        for result in group_results:
+            print(f"{group:>10} {result['decoder']:>8} {result['accuracy_percent']:>11} "
+                  f"{result['seconds']:>9} {result['mb_per_second']:>7}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'documents': args.documents, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
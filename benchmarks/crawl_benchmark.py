@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+End-to-end crawl benchmark
+
+Serves a synthetic site (see ``synthetic_site.py``) from a child process and
+crawls it with ``MainSpider`` and the project settings, with download
+delays and the HTTP cache turned off. Reports pages/sec, download latency
+p50/p99, CPU time per page, peak RSS, the size of the pages' text_content and
+the number of trap pages fetched.
+Output files are written to a temporary directory.
+
+Results can be saved as JSON and compared with an earlier run, e.g. from
+another commit:
+
+    python benchmarks/crawl_benchmark.py --pages 2000 --output before.json
+    git checkout my-branch
+    python benchmarks/crawl_benchmark.py --pages 2000 --compare before.json
+
+Usage:
+    python benchmarks/crawl_benchmark.py --pages 1000 --latency-ms 5 --traps -s CONCURRENT_REQUESTS_PER_DOMAIN=16
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from synthetic_site import TRAP_PREFIXES, add_site_arguments, config_from_args, start_server
+from webcrawler.spiders.main_spider import MainSpider
+
+# Settings that would measure politeness or the cache instead of the crawler
+BENCHMARK_SETTINGS = {
+    'DOWNLOAD_DELAY': 0,
+    'ADAPTIVE_THROTTLE_START_DELAY': 0,
+    'HTTPCACHE_ENABLED': False,
+    'METRICS_PORT': [],
+    'LOG_LEVEL': 'WARNING',
+}
+
+COMPARED = ('pages_per_sec', 'latency_p50_ms', 'latency_p99_ms', 'cpu_ms_per_page', 'peak_rss_mb', 'wire_mb',
+            'text_mb')
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class CrawlRecorder:
+    """Collects responses, latencies and timings from the crawler's signals"""
+
+    def __init__(self, crawler):
+        self.statuses = Counter()
+        self.kinds = Counter()
+        self.items = Counter()
+        self.latencies = []
+        self.text_chars = 0
+        self.started = self.finished = None
+        self.cpu_started = self.cpu_finished = None
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(self.item_scraped, signal=signals.item_scraped)
+
+    def spider_opened(self, spider):
+        self.started = time.perf_counter()
+        self.cpu_started = cpu_seconds()
+
+    def spider_closed(self, spider, reason):
+        self.finished = time.perf_counter()
+        self.cpu_finished = cpu_seconds()
+
+    def response_downloaded(self, response, request, spider):
+        self.statuses[response.status] += 1
+        path = urlsplit(response.url).path
+        if path == '/robots.txt':
+            self.kinds['robots'] += 1
+            return
+        self.kinds['trap' if path.startswith(TRAP_PREFIXES) else 'document' if path.startswith('/files/') else 'page'] += 1
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def item_scraped(self, item, response, spider):
+        self.items[type(item).__name__] += 1
+        if type(item).__name__ == 'WebPageItem':
+            self.text_chars += len(item.get('text_content') or '')
+
+
+def run_crawl(base_url, max_depth, overrides):
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'webcrawler.settings')
+    settings = get_project_settings()
+    for name, value in {**BENCHMARK_SETTINGS, **overrides}.items():
+        settings.set(name, value, priority='cmdline')
+    process = CrawlerProcess(settings, install_root_handler=False)
+    crawler = process.create_crawler(MainSpider)
+    recorder = CrawlRecorder(crawler)
+    process.crawl(crawler, start_urls=base_url + '/', max_depth=max_depth)
+    process.start()
+    return recorder, crawler.stats.get_stats()
+
+
+def summarize(recorder, stats):
+    elapsed = recorder.finished - recorder.started
+    fetched = sum(recorder.kinds[kind] for kind in ('page', 'document', 'trap'))
+    return {
+        'responses': dict(recorder.kinds),
+        'statuses': {str(status): count for status, count in sorted(recorder.statuses.items())},
+        'items': dict(recorder.items),
+        'trap_pages': recorder.kinds['trap'],
+        'elapsed_seconds': round(elapsed, 3),
+        'pages_per_sec': round(fetched / elapsed, 1) if elapsed else None,
+        'latency_p50_ms': round(percentile(recorder.latencies, 0.5) * 1000, 2),
+        'latency_p99_ms': round(percentile(recorder.latencies, 0.99) * 1000, 2),
+        'cpu_ms_per_page': round((recorder.cpu_finished - recorder.cpu_started) * 1000 / fetched, 3) if fetched else None,
+        # Response bytes as received, before decompression
+        'wire_mb': round(stats.get('downloader/response_bytes', 0) / 1024 / 1024, 3),
+        # text_content of the pages, as stored and indexed
+        'text_mb': round(recorder.text_chars / 1024 / 1024, 3),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'finish_reason': stats.get('finish_reason'),
+    }
+
+
+def compare(results, baseline):
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for key in COMPARED:
+        old, new = baseline.get(key), results.get(key)
+        if not old or new is None:
+            continue
+        print(f"  {key:>16}: {old:>10} -> {new:>10} ({(new - old) / old * 100:+.1f}%)")
+    if baseline.get('site') != results['site']:
+        print("  (the site configuration differs)")
+
+
+def parse_setting(value):
+    name, _, raw = value.partition('=')
+    if not name or not _:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {value}")
+    try:
+        return name, json.loads(raw)
+    except ValueError:
+        return name, raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl a local synthetic site and measure throughput')
+    add_site_arguments(parser)
+    parser.add_argument('--max-depth', type=int, default=20, help='Spider max_depth, bounds the traps')
+    parser.add_argument('-s', '--set', type=parse_setting, action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a Scrapy setting (JSON values are decoded); can be repeated')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    parser.add_argument('--compare', type=str, help='Earlier results JSON to compare with')
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    server, base_url = start_server(config)
+    workdir = tempfile.mkdtemp(prefix='crawl-bench-')
+    cwd = os.getcwd()
+    try:
+        # Pipelines and logs write relative to the working directory
+        os.chdir(workdir)
+        recorder, stats = run_crawl(base_url, args.max_depth, dict(args.set))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'site': config.as_dict(),
+        'max_depth': args.max_depth,
+        'settings': dict(args.set),
+        **summarize(recorder, stats),
+    }
+    print(json.dumps(results, indent=2))
+    if baseline is not None:
+        compare(results, baseline)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Item storage benchmark
+
+Pushes the same synthetic page items through JsonWriterPipeline and
+DatabasePipeline and reports the sustained insert rate of each, measured
+from the first item until everything is on disk.
+
+Usage:
+    python benchmarks/database_benchmark.py --pages 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.spiders import Spider
+
+from webcrawler.items import WebPageItem
+from webcrawler.pipelines import DatabasePipeline, JsonWriterPipeline
+
+
+def make_pages(count, seed=0):
+    rng = random.Random(seed)
+    words = [f'word{i}' for i in range(2000)]
+    pages = []
+    for i in range(count):
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(200, 800)))
+        pages.append(WebPageItem(
+            url=f'http://bench.example/{i}',
+            title=f'Page {i}',
+            content=f'<html><body><p>{text}</p></body></html>',
+            text_content=text,
+            headers={'h1': [f'Heading {i}'], 'h2': ['Section'], 'h3': [], 'h4': [], 'h5': [], 'h6': []},
+            links=[{'url': f'http://bench.example/{rng.randrange(count)}', 'text': 'link', 'type': 'internal'}
+                   for _ in range(rng.randint(5, 40))],
+            images=[{'url': f'http://bench.example/img{i % 50}.png', 'alt': ''}],
+            response_status=200,
+            content_type='text/html',
+            file_size=len(text),
+        ))
+    return pages
+
+
+def run_pipeline(pipeline, pages, spider):
+    if hasattr(pipeline, 'open_spider'):
+        pipeline.open_spider(spider)
+    start = time.perf_counter()
+    for page in pages:
+        pipeline.process_item(page.copy(), spider)
+    if hasattr(pipeline, 'close_spider'):
+        pipeline.close_spider(spider)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JsonWriterPipeline and DatabasePipeline insert rates')
+    parser.add_argument('--pages', type=int, default=5000, help='Number of page items')
+    parser.add_argument('--batch-size', type=int, default=500, help='DatabasePipeline batch size')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages)
+    spider = Spider('bench')
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='db-bench-')
+    cwd = os.getcwd()
+    results = {'pages': args.pages}
+    try:
+        # JsonWriterPipeline writes relative to the working directory
+        os.chdir(workdir)
+        elapsed = run_pipeline(JsonWriterPipeline(), pages, spider)
+        results['json'] = {'seconds': round(elapsed, 3), 'items_per_sec': round(args.pages / elapsed, 1)}
+
+        pipeline = DatabasePipeline(os.path.join(workdir, 'crawl.sqlite3'), batch_size=args.batch_size)
+        elapsed = run_pipeline(pipeline, pages, spider)
+        results['database'] = {'seconds': round(elapsed, 3), 'items_per_sec': round(args.pages / elapsed, 1)}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name in ('json', 'database'):
+        print(f"{name:>9}: {results[name]}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
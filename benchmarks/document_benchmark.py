@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+DocumentProcessor benchmark
+
+Generates PDF, DOCX, XLSX, PPTX, RTF, TXT and HTML fixtures at several sizes
+(1 to 1000 pages, 100 to 1M spreadsheet cells) and times
+``DocumentProcessor.process_document`` and ``extract_metadata`` on each.
+Reports throughput in MB/s of input and the peak RSS growth of each case.
+Every case runs in a forked child process so the peaks do not mix.
+
+``--backends`` also times alternative extractors for the same fixtures
+(pdfminer, pypdfium2 and PyPDF2 for PDF, read-only openpyxl, direct XML
+parsing for DOCX/PPTX, lxml for HTML) next to the current implementation,
+which is reported as ``default``.
+
+Usage:
+    python benchmarks/document_benchmark.py --max-pages 100 --max-cells 100000
+    python benchmarks/document_benchmark.py --formats pdf,html --backends
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_site import WORDS, filler_text, path_random, pdf_pages
+from utils.document_processor import DocumentProcessor
+from webcrawler.memory import current_rss
+
+
+PAGE_SIZES = (1, 10, 100, 1000)
+CELL_SIZES = (100, 10000, 100000, 1000000)
+# Roughly one printed page of text
+PAGE_CHARS = 3000
+
+
+def page_texts(pages, seed='text'):
+    return [f'Page {page}. ' + filler_text(path_random(seed, page), PAGE_CHARS) for page in range(pages)]
+
+
+def make_pdf(pages):
+    return pdf_pages(page_texts(pages))
+
+
+def make_docx(pages):
+    from docx import Document
+    document = Document()
+    document.core_properties.title = f'Benchmark document, {pages} pages'
+    for page, text in enumerate(page_texts(pages)):
+        for start in range(0, len(text), 500):
+            document.add_paragraph(text[start:start + 500])
+        if page % 10 == 0:
+            table = document.add_table(rows=3, cols=4)
+            for row in table.rows:
+                for cell, word in zip(row.cells, text.split()):
+                    cell.text = word
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_xlsx(cells):
+    from openpyxl import Workbook
+    columns = 10 if cells <= 10000 else 20
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Data')
+    rng = path_random('cells', cells)
+    for row in range(cells // columns):
+        sheet.append([row if column == 0 else rng.choice(WORDS) if column % 2 else rng.random()
+                      for column in range(columns)])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+def make_pptx(pages):
+    from pptx import Presentation
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for page, text in enumerate(page_texts(pages)):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f'Slide {page}'
+        slide.placeholders[1].text = text[:1000]
+    out = io.BytesIO()
+    presentation.save(out)
+    return out.getvalue()
+
+
+def make_rtf(pages):
+    body = '\n'.join(r'{\pard\f0\fs24 ' + text + r'\par}' for text in page_texts(pages))
+    return (r'{\rtf1\ansi\deff0{\fonttbl{\f0 Times New Roman;}}' + '\n' + body + '}').encode('latin-1')
+
+
+def make_txt(pages):
+    return '\n\f\n'.join(page_texts(pages)).encode('utf-8')
+
+
+def make_html(pages):
+    sections = ''.join(f'<section><h2>Section {page}</h2><p>{text}</p>'
+                       f'<table><tr><td>{page}</td><td>value</td></tr></table></section>'
+                       for page, text in enumerate(page_texts(pages)))
+    return (f'<!DOCTYPE html><html><head><title>Benchmark</title><style>p {{ margin: 0 }}</style>'
+            f'<script>var tracking = 1;</script></head><body><nav><a href="/">Home</a></nav>'
+            f'{sections}</body></html>').encode('utf-8')
+
+
+# Format -> (fixture builder, sizes, size unit)
+FORMATS = {
+    'pdf': (make_pdf, PAGE_SIZES, 'pages'),
+    'docx': (make_docx, PAGE_SIZES, 'pages'),
+    'xlsx': (make_xlsx, CELL_SIZES, 'cells'),
+    'pptx': (make_pptx, PAGE_SIZES, 'slides'),
+    'rtf': (make_rtf, PAGE_SIZES, 'pages'),
+    'txt': (make_txt, PAGE_SIZES, 'pages'),
+    'html': (make_html, PAGE_SIZES, 'pages'),
+}
+
+
+def pdfminer_text(content):
+    from pdfminer.high_level import extract_text
+    return extract_text(io.BytesIO(content))
+
+
+def pypdfium2_text(content):
+    import pypdfium2
+    document = pypdfium2.PdfDocument(content)
+    try:
+        return '\n'.join(page.get_textpage().get_text_range() for page in document)
+    finally:
+        document.close()
+
+
+def pypdf2_text(content):
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(content))
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def xlsx_read_only_text(content):
+    import openpyxl
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        lines = []
+        for sheet in workbook.worksheets:
+            lines.append(f'Sheet: {sheet.title}')
+            for row in sheet.iter_rows(values_only=True):
+                cells = [str(cell) for cell in row if cell is not None]
+                if cells:
+                    lines.append('\t'.join(cells))
+        return '\n'.join(lines)
+    finally:
+        workbook.close()
+
+
+def ooxml_text(content, prefix, tag):
+    """Text of every ``tag`` element in the archive members starting with ``prefix``"""
+    from lxml import etree
+    parts = []
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for name in sorted(archive.namelist()):
+            if name.startswith(prefix) and name.endswith('.xml'):
+                with archive.open(name) as member:
+                    for _, element in etree.iterparse(member, tag=tag):
+                        if element.text:
+                            parts.append(element.text)
+                        element.clear()
+    return '\n'.join(parts)
+
+
+def html_lxml_text(content):
+    import lxml.html
+    document = lxml.html.document_fromstring(content)
+    for element in document.iter('script', 'style'):
+        element.drop_tree()
+    return ' '.join(document.text_content().split())
+
+
+def html_bs4_lxml_text(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'lxml')
+    for element in soup(['script', 'style']):
+        element.decompose()
+    return ' '.join(soup.get_text().split())
+
+
+WORDML = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'
+DRAWINGML = '{http://schemas.openxmlformats.org/drawingml/2006/main}t'
+
+# Alternative extractors per format, compared with DocumentProcessor under --backends
+BACKENDS = {
+    'pdf': {'pdfminer': pdfminer_text, 'pypdfium2': pypdfium2_text, 'pypdf2': pypdf2_text},
+    'docx': {'xml': lambda content: ooxml_text(content, 'word/document', WORDML)},
+    'xlsx': {'openpyxl_read_only': xlsx_read_only_text},
+    'pptx': {'xml': lambda content: ooxml_text(content, 'ppt/slides/slide', DRAWINGML)},
+    'html': {'lxml': html_lxml_text, 'bs4_lxml': html_bs4_lxml_text},
+}
+
+
+def timed(function, min_time, max_calls):
+    """Seconds per call, repeating fast calls until ``min_time`` has passed"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or calls >= max_calls:
+            return elapsed / calls, calls
+
+
+def measure(path, file_type, backend, min_time, max_calls):
+    with open(path, 'rb') as f:
+        content = f.read()
+    processor = DocumentProcessor()
+    if backend == 'default':
+        extract = lambda: processor.process_document(content, file_type)
+    else:
+        extract = lambda: BACKENDS[file_type][backend](content)
+    rss = current_rss()
+    # The first call measures the memory peak and warms up imports and caches
+    text = extract()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - rss
+    seconds, calls = timed(extract, min_time, max_calls)
+    result = {
+        'bytes': len(content),
+        'text_chars': len(text),
+        'seconds': round(seconds, 6),
+        'calls': calls,
+        'mb_per_sec': round(len(content) / seconds / 2**20, 2) if seconds else None,
+        'peak_rss_mb': round(max(peak, 0) / 2**20, 1),
+    }
+    if backend == 'default':
+        metadata_seconds, _ = timed(lambda: processor.extract_metadata(content, file_type), min_time, max_calls)
+        result['metadata_seconds'] = round(metadata_seconds, 6)
+    return result
+
+
+def run_case(queue, *args):
+    try:
+        queue.put(measure(*args))
+    except Exception as e:
+        queue.put({'error': f'{type(e).__name__}: {e}'})
+
+
+def measure_in_child(*args):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=run_case, args=(queue, *args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DocumentProcessor per format and size')
+    parser.add_argument('--formats', type=str, default=','.join(FORMATS),
+                        help='Comma-separated formats (default: all)')
+    parser.add_argument('--max-pages', type=int, default=1000, help='Largest page/slide count to generate')
+    parser.add_argument('--max-cells', type=int, default=1000000, help='Largest spreadsheet to generate')
+    parser.add_argument('--backends', action='store_true', help='Also time the alternative extractors')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Minimum seconds of calls per case')
+    parser.add_argument('--max-calls', type=int, default=50, help='Maximum calls per case')
+    parser.add_argument('--fixture-dir', type=str, help='Keep generated fixtures here and reuse them')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+    fixture_dir = args.fixture_dir or tempfile.mkdtemp(prefix='document-bench-')
+    os.makedirs(fixture_dir, exist_ok=True)
+
+    results = []
+    print(f"{'format':>6} {'size':>14} {'backend':>18} {'KB':>9} {'ms/call':>10} {'MB/s':>8} "
+          f"{'meta ms':>8} {'peak MB':>8}")
+    for file_type in formats:
+        build, sizes, unit = FORMATS[file_type]
+        limit = args.max_cells if unit == 'cells' else args.max_pages
+        for size in (size for size in sizes if size <= limit):
+            path = os.path.join(fixture_dir, f'{file_type}-{size}.{file_type}')
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(build(size))
+            backends = ['default'] + (list(BACKENDS.get(file_type, ())) if args.backends else [])
+            for backend in backends:
+                result = measure_in_child(path, file_type, backend, args.min_time, args.max_calls)
+                result.update({'format': file_type, 'size': size, 'unit': unit, 'backend': backend})
+                results.append(result)
+                if 'error' in result:
+                    print(f"{file_type:>6} {f'{size} {unit}':>14} {backend:>18} {result['error']}")
+                    continue
+                metadata = f"{result['metadata_seconds'] * 1000:8.2f}" if 'metadata_seconds' in result else f"{'':>8}"
+                print(f"{file_type:>6} {f'{size} {unit}':>14} {backend:>18} {result['bytes'] / 1024:9.1f} "
+                      f"{result['seconds'] * 1000:10.2f} {result['mb_per_sec'] or 0:8.2f} {metadata} "
+                      f"{result['peak_rss_mb']:8.1f}")
+
+    if not args.fixture_dir:
+        for name in os.listdir(fixture_dir):
+            os.remove(os.path.join(fixture_dir, name))
+        os.rmdir(fixture_dir)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
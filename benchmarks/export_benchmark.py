@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Export format scan benchmark
+
+Writes the same synthetic page items as per-item JSON files (the
+JsonWriterPipeline layout) and as Parquet, then times a typical analytic
+scan over each: pages per content type, average size and outgoing link
+counts.
+
+Usage:
+    python benchmarks/export_benchmark.py --pages 20000
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyarrow.compute as pc
+
+from utils.columnar import PAGES, ParquetExporter, pq
+
+
+def make_pages(count, seed=0):
+    rng = random.Random(seed)
+    words = [f'word{i}' for i in range(2000)]
+    for i in range(count):
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(200, 800)))
+        yield {
+            'url': f'http://bench.example/{i}',
+            'title': f'Page {i}',
+            'content': f'<html><body><p>{text}</p></body></html>',
+            'text_content': text,
+            'meta_description': '',
+            'meta_keywords': '',
+            'headers': {f'h{level}': [f'Heading {i}'] if level == 1 else [] for level in range(1, 7)},
+            'links': [{'url': f'http://bench.example/{rng.randrange(count)}', 'text': 'link', 'type': 'internal'}
+                      for _ in range(rng.randint(5, 40))],
+            'images': [{'url': f'http://bench.example/img{i}.png', 'alt': ''}],
+            'response_status': 200,
+            'content_type': rng.choice(['text/html', 'text/html; charset=utf-8', 'application/xhtml+xml']),
+            'file_size': len(text) + 26,
+            'timestamp': f'2024-01-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}',
+        }
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def scan_json(directory):
+    types = Counter()
+    total_size = 0
+    total_links = 0
+    for path in glob.glob(os.path.join(directory, '*-page.json')):
+        with open(path, encoding='utf-8') as f:
+            page = json.load(f)
+        types[page['content_type']] += 1
+        total_size += page['file_size']
+        total_links += len(page['links'])
+    return dict(types), total_size, total_links
+
+
+def scan_parquet(path):
+    table = pq.read_table(path, columns=['content_type', 'file_size', 'links'])
+    types = table.group_by('content_type').aggregate([('content_type', 'count')])
+    counts = dict(zip(types.column('content_type').to_pylist(), types.column('content_type_count').to_pylist()))
+    total_size = pc.sum(table.column('file_size')).as_py()
+    total_links = pc.sum(pc.list_value_length(table.column('links'))).as_py()
+    return counts, total_size, total_links
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare analytic scans over JSON and Parquet exports')
+    parser.add_argument('--pages', type=int, default=5000, help='Number of page items')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Parquet row group size')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='export-bench-')
+    json_dir = os.path.join(workdir, 'pages')
+    parquet_dir = os.path.join(workdir, 'parquet')
+    os.makedirs(json_dir)
+    try:
+        exporter = ParquetExporter(parquet_dir, batch_size=args.batch_size)
+        start = time.perf_counter()
+        for i, page in enumerate(make_pages(args.pages)):
+            with open(os.path.join(json_dir, f'{i:08d}-page.json'), 'w', encoding='utf-8') as f:
+                json.dump(page, f, ensure_ascii=False, indent=2)
+        json_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for page in make_pages(args.pages):
+            exporter.add(page)
+        exporter.close()
+        parquet_write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        json_result = scan_json(json_dir)
+        json_scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parquet_result = scan_parquet(exporter.path(PAGES))
+        parquet_scan = time.perf_counter() - start
+        assert json_result[1:] == parquet_result[1:] and json_result[0] == parquet_result[0]
+
+        results = {
+            'pages': args.pages,
+            'json': {'write_seconds': round(json_write, 3), 'scan_seconds': round(json_scan, 3),
+                     'size_bytes': dir_size(json_dir), 'files': args.pages},
+            'parquet': {'write_seconds': round(parquet_write, 3), 'scan_seconds': round(parquet_scan, 3),
+                        'size_bytes': dir_size(parquet_dir), 'files': 1},
+            'scan_speedup': round(json_scan / parquet_scan, 1) if parquet_scan else None,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name in ('json', 'parquet'):
+        print(f"{name:>8}: {results[name]}")
+    print(f"Scan speedup: {results['scan_speedup']}x")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
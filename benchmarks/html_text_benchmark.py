@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+HTML to text benchmark
+
+Generates a corpus of varied HTML pages (navigation, inline scripts and
+styles, comments, entities, tables, forms, lists, unclosed tags) and
+compares for each page size:
+
+- ``bs4``: the previous ``DocumentProcessor.process_html_document``
+  (BeautifulSoup with html.parser, decompose scripts and styles, clean up)
+- ``html_to_text``: ``utils.html_text.html_to_text`` (lxml parser target)
+- ``spider_css``: the previous ``MainSpider.extract_text_content`` CSS
+  query, on a response whose tree is already built
+- ``spider_iter_text``: ``iter_text(..., within='body')`` as used by the
+  spider now, parsing the page itself
+
+and checks that ``html_to_text`` returns exactly the bs4 output on every
+page.
+
+Usage:
+    python benchmarks/html_text_benchmark.py --pages 200 --sizes 10000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from scrapy.http import HtmlResponse
+
+from utils.html_text import html_to_text, iter_text
+
+WORDS = ('crawler page index document report archive section data result market policy research '
+         'café naïve “quoted” über straße данные 数据 &amp; &lt;tag&gt; &nbsp; &copy; &#8212;').split()
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def block(rng):
+    kind = rng.randrange(8)
+    if kind == 0:
+        return f'<h2>{sentence(rng, 4)}</h2>\n<p>{sentence(rng)} <b>{sentence(rng, 3)}</b> {sentence(rng)}</p>'
+    if kind == 1:
+        items = ''.join(f'\n  <li>{sentence(rng, 5)}' + ('</li>' if rng.random() < 0.5 else '') for _ in range(5))
+        return f'<ul>{items}\n</ul>'
+    if kind == 2:
+        rows = ''.join(f'<tr><td>{rng.randrange(1000)}</td> <td>{sentence(rng, 3)}</td></tr>\n' for _ in range(5))
+        return f'<table>\n{rows}</table>'
+    if kind == 3:
+        return f'<script>var data = {{"a": "<p>{rng.random()}</p>"}};\nif (a < b && c) {{ run(); }}</script>'
+    if kind == 4:
+        return f'<!-- {sentence(rng, 4)} --><div class="ad"><style>.ad {{ color: red }}</style>{sentence(rng)}</div>'
+    if kind == 5:
+        return (f'<form action="/s"><label>{sentence(rng, 2)}</label><input name="q">'
+                f'<select><option>{rng.choice(WORDS)}</option> <option>{rng.choice(WORDS)}</option></select></form>')
+    if kind == 6:
+        return f'<p>{sentence(rng)}<br>{sentence(rng)}<p>{sentence(rng)}'
+    return f'<div><div><span>{sentence(rng, 6)}</span>  <a href="/x">{sentence(rng, 2)}</a>\t{sentence(rng)}</div></div>'
+
+
+def make_page(rng, size):
+    blocks = []
+    while sum(map(len, blocks)) < size:
+        blocks.append(block(rng))
+    return ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>' + sentence(rng, 5) + '</title>\n'
+            '<style>body { margin: 0 }</style>\n<script src="/app.js"></script>\n</head>\n<body>\n'
+            '<nav><a href="/">Home</a> | <a href="/about">About</a></nav>\n'
+            + '\n'.join(blocks) + '\n<footer>&copy; 2024</footer>\n</body>\n</html>\n')
+
+
+def bs4_text(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def spider_css(response):
+    text = response.css('body *:not(script):not(style)::text').getall()
+    return ' '.join([t.strip() for t in text if t.strip()])
+
+
+def spider_iter_text(response):
+    return ' '.join([t.strip() for t in iter_text(response.text, within='body') if t.strip()])
+
+
+def timed(function, inputs):
+    start = time.perf_counter()
+    for value in inputs:
+        function(value)
+    return time.perf_counter() - start
+
+
+def bench_size(pages, size, seed=1):
+    rng = random.Random(seed)
+    corpus = [make_page(rng, size) for _ in range(pages)]
+    megabytes = sum(len(html.encode('utf-8')) for html in corpus) / 1e6
+    responses = [HtmlResponse('http://example.com/', body=html.encode('utf-8'), encoding='utf-8')
+                 for html in corpus]
+    for response in responses:
+        response.selector
+    seconds = {
+        'bs4': timed(bs4_text, corpus),
+        'html_to_text': timed(html_to_text, corpus),
+        'spider_css': timed(spider_css, responses),
+        'spider_iter_text': timed(spider_iter_text, responses),
+    }
+    return {
+        'size': size,
+        'pages': pages,
+        'identical': sum(bs4_text(html) == html_to_text(html) for html in corpus),
+        'mb_per_second': {name: round(megabytes / value, 1) for name, value in seconds.items()},
+        'speedup': round(seconds['bs4'] / seconds['html_to_text'], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML to text extraction')
+    parser.add_argument('--pages', type=int, default=100, help='Pages per size')
+    parser.add_argument('--sizes', type=str, default='10000,100000,1000000', help='Comma-separated page sizes')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes.split(','):
+        size = int(size)
+        # Fewer pages for large sizes so each size takes similar time
+        results.append(bench_size(max(1, args.pages * 10000 // max(size, 10000)), size))
+
+    print(f"{'size':>8} {'pages':>6} {'identical':>10} {'bs4 MB/s':>9} {'lxml MB/s':>10} {'speedup':>8} "
+          f"{'css MB/s':>9} {'iter MB/s':>10}")
+    for result in results:
+        rates = result['mb_per_second']
+        print(f"{result['size']:>8} {result['pages']:>6} {result['identical']:>10} {rates['bs4']:>9} "
+              f"{rates['html_to_text']:>10} {result['speedup']:>8} {rates['spider_css']:>9} "
+              f"{rates['spider_iter_text']:>10}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+HTTP cache storage benchmark
+
+Stores the same synthetic responses in Scrapy's FilesystemCacheStorage and
+in SqliteCacheStorage, then reports store throughput, lookup latency and
+size on disk for both.
+
+Usage:
+    python benchmarks/httpcache_benchmark.py --responses 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.extensions.httpcache import FilesystemCacheStorage
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+from webcrawler.httpcache import SqliteCacheStorage
+
+
+def make_responses(count, duplicate_ratio, seed=0):
+    """Build templated HTML pages, a share of them with identical bodies"""
+    rng = random.Random(seed)
+    words = [f'word{i}' for i in range(2000)]
+    shared_body = b'<html><body><h1>Not Found</h1><p>The page does not exist.</p></body></html>'
+    responses = []
+    for i in range(count):
+        url = f'http://bench.example/{i}'
+        if rng.random() < duplicate_ratio:
+            body = shared_body
+        else:
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(300, 1500)))
+            body = (
+                f'<html><head><title>Page {i}</title></head><body>'
+                f'<nav><a href="/">Home</a><a href="/about">About</a></nav>'
+                f'<article><p>{text}</p></article><footer>Footer</footer></body></html>'
+            ).encode()
+        request = Request(url)
+        responses.append((request, HtmlResponse(url, body=body, headers={'Content-Type': 'text/html'})))
+    return responses
+
+
+def dir_size(path):
+    total = 0
+    files = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(root, filename))
+            files += 1
+    return total, files
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def bench_storage(storage_cls, responses, lookups, workdir):
+    crawler = get_crawler(Spider, settings_dict={
+        'HTTPCACHE_DIR': workdir,
+        'HTTPCACHE_EXPIRATION_SECS': 0,
+        'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
+    })
+    spider = crawler._create_spider('bench')
+    storage = storage_cls(crawler.settings)
+    storage.open_spider(spider)
+
+    start = time.perf_counter()
+    for request, response in responses:
+        storage.store_response(spider, request, response)
+    store_time = time.perf_counter() - start
+    storage.close_spider(spider)
+
+    # Reopen so lookups are not served from write buffers
+    storage = storage_cls(crawler.settings)
+    storage.open_spider(spider)
+    latencies = []
+    for request, _ in lookups:
+        start = time.perf_counter()
+        cached = storage.retrieve_response(spider, request)
+        latencies.append(time.perf_counter() - start)
+        assert cached is not None
+    storage.close_spider(spider)
+
+    size, files = dir_size(workdir)
+    return {
+        'store_per_sec': round(len(responses) / store_time, 1),
+        'lookup_p50_us': round(percentile(latencies, 0.5) * 1e6, 1),
+        'lookup_p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+        'size_bytes': size,
+        'files': files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTTP cache storage backends')
+    parser.add_argument('--responses', type=int, default=5000, help='Number of responses to store')
+    parser.add_argument('--lookups', type=int, default=2000, help='Number of random lookups')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1, help='Share of identical bodies')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    responses = make_responses(args.responses, args.duplicate_ratio)
+    lookups = random.Random(1).choices(responses, k=args.lookups)
+    raw_bytes = sum(len(response.body) for _, response in responses)
+
+    results = {'responses': args.responses, 'raw_body_bytes': raw_bytes}
+    for name, storage_cls in [('filesystem', FilesystemCacheStorage), ('sqlite', SqliteCacheStorage)]:
+        workdir = tempfile.mkdtemp(prefix=f'httpcache-{name}-')
+        try:
+            results[name] = bench_storage(storage_cls, responses, lookups, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{name:>10}: {results[name]}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
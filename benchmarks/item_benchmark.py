@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Page item size benchmark
+
+Parses a synthetic link-heavy page with ``MainSpider.parse_webpage`` under
+several item schemas and reports extraction time, memory retained per item
+and JSON serialization time (formatted like JsonWriterPipeline). ``dict_links`` reproduces the old layout with
+one dict per link and image.
+
+Usage:
+    python benchmarks/item_benchmark.py --items 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+
+from webcrawler.items import Record, WebPageItem, json_default
+from webcrawler.spiders.main_spider import MainSpider
+
+
+def make_page(links, images, paragraphs):
+    body = [f'<p>Paragraph {i} with some text about crawling and indexing pages.</p>' for i in range(paragraphs)]
+    body += [f'<a href="/section/{i}">Section {i} link text</a>' for i in range(links)]
+    body += [f'<img src="/images/{i}.png" alt="Image {i}">' for i in range(images)]
+    html = f'<html><head><title>Benchmark page</title></head><body>{"".join(body)}</body></html>'
+    return html.encode('utf-8')
+
+
+def deep_size(value):
+    """Bytes held by an item value and everything it references"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key) + deep_size(entry) for key, entry in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(entry) for entry in value)
+    elif isinstance(value, Record):
+        size += sum(deep_size(getattr(value, key)) for key in value.__slots__)
+    return size
+
+
+SCHEMAS = {
+    'dict_links': ([], {}),
+    'full': ([], {}),
+    'title_text': (['title', 'text_content'], {}),
+    'title_text_truncated': (['title', 'text_content'], {'text_content': 2000}),
+}
+
+
+def measure(name, body, count):
+    fields, limits = SCHEMAS[name]
+    spider = MainSpider()
+    spider.configure_item_fields(fields, limits)
+    url = 'http://bench.example/'
+
+    items = []
+    extract_seconds = 0.0
+    for _ in range(count):
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        start = time.perf_counter()
+        item = next(entry for entry in spider.parse_webpage(response, 0) if isinstance(entry, WebPageItem))
+        extract_seconds += time.perf_counter() - start
+        if name == 'dict_links':
+            for field in ('links', 'images'):
+                item[field] = [dict(entry) for entry in item[field]]
+        items.append(item)
+    retained = sum(deep_size(dict(item)) for item in items)
+
+    start = time.perf_counter()
+    serialized = 0
+    for item in items:
+        serialized += len(json.dumps(dict(item), ensure_ascii=False, indent=2, default=json_default))
+    serialize_seconds = time.perf_counter() - start
+    return {
+        'extract_ms_per_item': round(extract_seconds * 1000 / count, 3),
+        'retained_kb_per_item': round(retained / count / 1024, 1),
+        'serialize_ms_per_item': round(serialize_seconds * 1000 / count, 3),
+        'json_kb_per_item': round(serialized / count / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page item extraction and size')
+    parser.add_argument('--items', type=int, default=50, help='Items per schema')
+    parser.add_argument('--links', type=int, default=400, help='Links per page')
+    parser.add_argument('--images', type=int, default=50, help='Images per page')
+    parser.add_argument('--paragraphs', type=int, default=200, help='Paragraphs per page')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    body = make_page(args.links, args.images, args.paragraphs)
+    results = {'page_bytes': len(body)}
+    for name in SCHEMAS:
+        results[name] = measure(name, body, args.items)
+        print(f"{name:>21}: {results[name]}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
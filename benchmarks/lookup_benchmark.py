@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+URL lookup index benchmark
+
+Builds lookup indexes of growing size over one synthetic record file and
+reports build rate, index size and the time to locate a URL. Lookup latency
+should stay flat as the index grows.
+
+Usage:
+    python benchmarks/lookup_benchmark.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.recordindex import INDEX_FILE, RecordIndex, RecordIndexWriter
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(size, lookups, workdir):
+    directory = os.path.join(workdir, f'lookup-{size}')
+    data = os.path.join(workdir, 'records.bin')
+    start = time.perf_counter()
+    writer = RecordIndexWriter(directory)
+    for i in range(size):
+        writer.add(f'http://bench.example/{i}', data, i * 100, 100)
+    writer.close()
+    build_seconds = time.perf_counter() - start
+
+    index = RecordIndex(directory)
+    rng = random.Random(size)
+    timings = []
+    for _ in range(lookups):
+        url = f'http://bench.example/{rng.randrange(size)}'
+        start = time.perf_counter()
+        found = index.locate(url)
+        timings.append((time.perf_counter() - start) * 1e6)
+        assert found
+    index.close()
+    result = {
+        'records': size,
+        'build_records_per_sec': round(size / build_seconds),
+        'index_bytes': os.path.getsize(os.path.join(directory, INDEX_FILE)),
+        'lookup_p50_us': round(percentile(timings, 0.5), 1),
+        'lookup_p99_us': round(percentile(timings, 0.99), 1),
+    }
+    shutil.rmtree(directory, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the URL lookup index')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Index sizes')
+    parser.add_argument('--lookups', type=int, default=2000, help='Lookups per index')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='lookup-bench-')
+    try:
+        results = [measure(size, args.lookups, workdir) for size in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in results:
+        print(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
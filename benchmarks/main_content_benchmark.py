@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Main-content extraction benchmark
+
+Renders the pages of the synthetic site (see ``synthetic_site.py``) with
+its site template (``--boilerplate``) in crawl order and extracts
+``text_content`` from each the way MainSpider does, with all body text
+(``MAIN_CONTENT_ENABLED = False``) and with ``MainContentExtractor``, with
+and without per-host template learning. Reports for each page size:
+
+- text size and reduction against all body text
+- recall: share of each page's own heading and paragraph text kept
+- boilerplate: share of the kept text that is not the page's own text
+- extraction time per page and per MB of HTML, which should stay flat
+  as pages grow since extraction is linear
+
+Usage:
+    python benchmarks/main_content_benchmark.py --pages 500 --sizes 5000,20000,100000
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_site import SiteConfig, SyntheticSite
+from utils.html_text import iter_text
+from utils.main_content import MainContentExtractor
+
+OWN_TEXT = re.compile(r'<div class="content"><h1>(.*?)</h1>.*?</ul>(.*)</div><div class="col">', re.S)
+
+
+def all_text(html):
+    return ' '.join([t.strip() for t in iter_text(html, within='body') if t.strip()])
+
+
+def own_text(html):
+    """Heading and paragraphs of the page itself, without its link list"""
+    heading, paragraphs = OWN_TEXT.search(html).groups()
+    return [heading] + re.findall(r'<p>(.*?)</p>', paragraphs)
+
+
+def bench_size(pages, size, seed=1):
+    site = SyntheticSite(SiteConfig(pages=pages, page_size=size, boilerplate=True, seed=seed))
+    corpus = [site.page(number).decode('utf-8') for number in range(pages)]
+    megabytes = sum(map(len, corpus)) / 1e6
+    own = [own_text(html) for html in corpus]
+    own_chars = sum(len(part) for parts in own for part in parts)
+
+    extractors = {
+        'all_text': lambda html: all_text(html),
+        'main_content': MainContentExtractor(template_min_pages=0).extract,
+        'main_content_template': MainContentExtractor().extract,
+    }
+    results = {}
+    for name, extract in extractors.items():
+        start = time.perf_counter()
+        texts = [extract(html, '127.0.0.1') if name != 'all_text' else extract(html) for html in corpus]
+        elapsed = time.perf_counter() - start
+        chars = sum(map(len, texts))
+        kept = sum(len(part) for parts, text in zip(own, texts) for part in parts if part in text)
+        results[name] = {
+            'text_mb': round(chars / 1e6, 3),
+            'recall_percent': round(kept / own_chars * 100, 1),
+            'boilerplate_percent': round(max(chars - kept - len(texts), 0) / chars * 100, 1) if chars else 0.0,
+            'us_per_page': round(elapsed / pages * 1e6, 1),
+            'ms_per_mb': round(elapsed / megabytes * 1000, 1),
+        }
+    for name in ('main_content', 'main_content_template'):
+        results[name]['reduction_percent'] = round(
+            (1 - results[name]['text_mb'] / results['all_text']['text_mb']) * 100, 1)
+    return {'size': size, 'pages': pages, 'html_mb': round(megabytes, 3), 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark main-content extraction on the synthetic site')
+    parser.add_argument('--pages', type=int, default=500, help='Pages per size')
+    parser.add_argument('--sizes', type=str, default='5000,20000,100000', help='Comma-separated page sizes')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    runs = [bench_size(args.pages, int(size)) for size in args.sizes.split(',')]
+
+    print(f"{'size':>7} {'extractor':>22} {'text MB':>8} {'reduction':>10} {'recall %':>9} "
+          f"{'boiler %':>9} {'us/page':>8} {'ms/MB':>7}")
+    for run in runs:
+        for name, result in run['results'].items():
+            print(f"{run['size']:>7} {name:>22} {result['text_mb']:>8} {result.get('reduction_percent', ''):>10} "
+                  f"{result['recall_percent']:>9} {result['boilerplate_percent']:>9} "
+                  f"{result['us_per_page']:>8} {result['ms_per_mb']:>7}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
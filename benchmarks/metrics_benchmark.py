@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark
+
+Runs the page callback and the Validation, Deduplication,
+DocumentProcessing and JsonWriter stages over synthetic pages twice, once
+plain and once with the CrawlMetrics instrumentation (timed callback output,
+timed pipeline stages, a download latency observation per response), and
+reports the relative overhead. Because the end-to-end difference is small
+next to run-to-run noise, the instrumentation is also timed on its own
+around no-op callbacks and stages, which gives the added cost per page.
+
+Usage:
+    python benchmarks/metrics_benchmark.py --pages 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+
+from webcrawler.metrics import MetricsRegistry, stage_name, timed_stage
+from webcrawler.middlewares import WebcrawlerSpiderMiddleware
+from webcrawler.pipelines import (DeduplicationPipeline, DocumentProcessingPipeline, JsonWriterPipeline,
+                                  ValidationPipeline)
+from webcrawler.spiders.main_spider import MainSpider
+
+
+def make_responses(count):
+    responses = []
+    for i in range(count):
+        links = ''.join(f'<a href="/page/{i}/{j}">Link {j}</a>' for j in range(30))
+        body = (f'<html><head><title>Page {i}</title></head><body><h1>Page {i}</h1>'
+                f'<p>{"Some text about the page. " * 40}</p>{links}</body></html>')
+        url = f'http://bench.example/page/{i}'
+        request = Request(url, meta={'depth': 0, 'download_latency': 0.05})
+        responses.append(HtmlResponse(url, body=body.encode('utf-8'), encoding='utf-8', request=request))
+    return responses
+
+
+def run(count, instrumented):
+    # Fresh responses every run, parsel caches the parsed document on them
+    responses = make_responses(count)
+    spider = MainSpider()
+    pipelines = [ValidationPipeline(), DeduplicationPipeline(), DocumentProcessingPipeline(),
+                 JsonWriterPipeline(index_dir='')]
+    stages = [pipeline.process_item for pipeline in pipelines]
+    middleware = WebcrawlerSpiderMiddleware()
+    if instrumented:
+        registry = MetricsRegistry()
+        spider.metrics = registry
+        download_latency = registry.histogram('download_latency_seconds')
+        stages = [timed_stage(pipeline.process_item, registry.histogram('pipeline_seconds', stage=stage_name(pipeline)))
+                  for pipeline in pipelines]
+    logger = spider.logger.logger
+    logger.disabled = True
+    start = time.perf_counter()
+    for response in responses:
+        if instrumented:
+            download_latency.observe(response.meta['download_latency'])
+        output = spider.parse_webpage(response, 0)
+        for entry in middleware.process_spider_output(response, output, spider):
+            if isinstance(entry, Request) or 'target_url' in entry:
+                continue
+            for stage in stages:
+                entry = stage(entry, spider)
+    elapsed = time.perf_counter() - start
+    logger.disabled = False
+    return elapsed
+
+
+def noop_stage(item, spider):
+    return item
+
+
+def noop_callback(outputs):
+    yield from outputs
+
+
+def instrumentation_cost(count, outputs, stages):
+    """Seconds the instrumentation adds per page, measured around no-op work"""
+    spider = Spider('bench')
+    middleware = WebcrawlerSpiderMiddleware()
+    response = HtmlResponse('http://bench.example/', body=b'', request=Request('http://bench.example/'))
+    entries = list(range(outputs))
+    registry = MetricsRegistry()
+    download_latency = registry.histogram('download_latency_seconds')
+    timed = [timed_stage(noop_stage, registry.histogram('pipeline_seconds', stage=str(i))) for i in range(stages)]
+    timings = []
+    for instrumented in (False, True):
+        spider.metrics = registry if instrumented else None
+        pipeline = timed if instrumented else [noop_stage] * stages
+        start = time.perf_counter()
+        for _ in range(count):
+            if instrumented:
+                download_latency.observe(0.05)
+            for entry in middleware.process_spider_output(response, noop_callback(entries), spider):
+                if entry:
+                    # Only items reach the pipelines, requests go to the scheduler
+                    continue
+                for stage in pipeline:
+                    entry = stage(entry, spider)
+        timings.append(time.perf_counter() - start)
+    return max(timings[1] - timings[0], 0.0) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cost of crawl metrics instrumentation')
+    parser.add_argument('--pages', type=int, default=1000, help='Number of pages')
+    parser.add_argument('--rounds', type=int, default=3, help='Rounds per variant, the fastest is kept')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='metrics-bench-')
+    cwd = os.getcwd()
+    try:
+        # JsonWriterPipeline writes relative to the working directory
+        os.chdir(workdir)
+        timings = {False: [], True: []}
+        for _ in range(args.rounds):
+            for instrumented in (False, True):
+                timings[instrumented].append(run(args.pages, instrumented))
+        plain, instrumented = min(timings[False]), min(timings[True])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # parse_webpage yields one item and 30 link requests per synthetic page
+    added = min(instrumentation_cost(args.pages * 10, 31, 4) for _ in range(args.rounds))
+    per_page = plain / args.pages
+    results = {
+        'pages': args.pages,
+        'plain_ms_per_page': round(per_page * 1000, 3),
+        'instrumented_ms_per_page': round(instrumented * 1000 / args.pages, 3),
+        'overhead_percent': round((instrumented - plain) / plain * 100, 2),
+        'instrumentation_us_per_page': round(added * 1e6, 2),
+        'instrumentation_overhead_percent': round(added / per_page * 100, 3),
+    }
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
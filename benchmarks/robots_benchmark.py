@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+robots.txt benchmark
+
+Compares ``webcrawler.robots.RobotsMiddleware`` with Scrapy's
+RobotsTxtMiddleware (Protego parser):
+
+- per-request cost of an allowed/forbidden decision once robots.txt is
+  known, for robots.txt files of 10 to 1000 rules, for the matcher alone
+  and for the whole ``process_request`` call
+- the robots.txt downloads needed to start a crawl over many hosts, on a
+  cold start and on a warm start from the persistent cache
+
+Downloads are answered in-process, so only the middlewares are measured.
+
+Usage:
+    python benchmarks/robots_benchmark.py --rules 10,100,1000 --hosts 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.downloadermiddlewares.robotstxt import RobotsTxtMiddleware
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.robotstxt import ProtegoRobotParser
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import Deferred, succeed
+
+from webcrawler.robots import RobotsMiddleware, RobotsRules, parse_robots
+
+USER_AGENT = 'WebCrawler/1.0'
+WORDS = ['wiki', 'index.php', 'api', 'Special:', 'search', 'images', 'static', 'cgi-bin', 'admin',
+         'private', 'tmp', 'en', 'de', 'page', 'item', 'product', 'cart', 'checkout', 'login', 'account']
+
+
+def make_robots(rules, seed=1):
+    """A robots.txt with ``rules`` rules, about 10% of them with wildcards"""
+    rng = random.Random(seed)
+    lines = ['User-agent: *', 'Crawl-delay: 1']
+    for _ in range(rules):
+        pattern = '/' + '/'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            pattern += '*' + rng.choice(['.php', '?action=', '&oldid='])
+        lines.append(f"{'Allow' if rng.random() < 0.2 else 'Disallow'}: {pattern}")
+    return '\n'.join(lines).encode()
+
+
+def make_paths(count, seed=2):
+    rng = random.Random(seed)
+    return ['/' + '/'.join(rng.choice(WORDS + ['article', 'x', 'y']) for _ in range(rng.randint(1, 5)))
+            + ('?q=1' if rng.random() < 0.2 else '') for _ in range(count)]
+
+
+def per_call_us(function, items, min_time):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            function(item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return round(elapsed / calls * 1e6, 3)
+
+
+def crawler(settings, download):
+    crawler = get_crawler(Spider, {'ROBOTSTXT_OBEY': True, 'ROBOTSTXT_USER_AGENT': USER_AGENT, **settings})
+    crawler.stats.open_spider(None)
+    crawler.engine = SimpleNamespace(download=download, downloader=SimpleNamespace(slots={}))
+    spider = crawler._create_spider('bench')
+    return crawler, spider
+
+
+def decide(middleware, spider):
+    def process(request):
+        try:
+            result = middleware.process_request(request, spider)
+        except IgnoreRequest:
+            return
+        if isinstance(result, Deferred):
+            result.addErrback(lambda failure: failure.trap(IgnoreRequest))
+    return process
+
+
+def bench_matching(rules, paths, min_time, directory):
+    body = make_robots(rules)
+    urls = ['http://example.com' + path for path in paths]
+    requests = [Request(url) for url in urls]
+    protego = ProtegoRobotParser(body, None)
+    compiled = RobotsRules(*parse_robots(body, 'webcrawler'))
+
+    def robots_response(request):
+        return succeed(Response(request.url, body=body))
+
+    scrapy_crawler, spider = crawler({}, robots_response)
+    scrapy_mw = RobotsTxtMiddleware.from_crawler(scrapy_crawler)
+    scrapy_mw.process_request(requests[0], spider)
+    ours_crawler, spider = crawler({'ROBOTSTXT_CACHE_PATH': os.path.join(directory, f'match-{rules}.sqlite3')},
+                                   robots_response)
+    ours_mw = RobotsMiddleware.from_crawler(ours_crawler)
+    ours_mw.spider_opened(spider)
+    try:
+        ours_mw.process_request(requests[0], spider)
+        disagreements = sum(protego.allowed(url, USER_AGENT) != compiled.allowed(path)
+                            for url, path in zip(urls, paths))
+        return {
+            'rules': rules,
+            'forbidden_percent': round(sum(not compiled.allowed(path) for path in paths) / len(paths) * 100, 1),
+            'disagreements': disagreements,
+            'protego_match_us': per_call_us(lambda url: protego.allowed(url, USER_AGENT), urls, min_time),
+            'compiled_match_us': per_call_us(compiled.allowed, paths, min_time),
+            'scrapy_middleware_us': per_call_us(decide(scrapy_mw, spider), requests, min_time),
+            'robots_middleware_us': per_call_us(decide(ours_mw, spider), requests, min_time),
+        }
+    finally:
+        ours_mw.spider_closed(spider)
+
+
+def bench_startup(hosts, directory):
+    """robots.txt downloads and time to first decision for every host, cold and warm"""
+    body = make_robots(100)
+    path = os.path.join(directory, 'startup.sqlite3')
+    requests = [Request(f'http://host{i}.example/page') for i in range(hosts)]
+    results = {}
+    for run in ('cold', 'warm'):
+        downloads = []
+
+        def robots_response(request):
+            downloads.append(request.url)
+            return succeed(Response(request.url, body=body))
+
+        robots_crawler, spider = crawler({'ROBOTSTXT_CACHE_PATH': path}, robots_response)
+        middleware = RobotsMiddleware.from_crawler(robots_crawler)
+        start = time.perf_counter()
+        middleware.spider_opened(spider)
+        for request in requests:
+            middleware.process_request(request, spider)
+        elapsed = time.perf_counter() - start
+        middleware.spider_closed(spider)
+        results[run] = {'robots_downloads': len(downloads), 'seconds': round(elapsed, 4)}
+    return {'hosts': hosts, **results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark robots.txt matching and caching')
+    parser.add_argument('--rules', type=str, default='10,100,1000', help='Comma-separated rule counts')
+    parser.add_argument('--paths', type=int, default=2000, help='URL paths checked per rule count')
+    parser.add_argument('--hosts', type=int, default=1000, help='Hosts for the startup benchmark')
+    parser.add_argument('--min-time', type=float, default=0.5, help='Minimum seconds per measurement')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    paths = make_paths(args.paths)
+    with tempfile.TemporaryDirectory(prefix='robots-bench-') as directory:
+        matching = [bench_matching(int(rules), paths, args.min_time, directory) for rules in args.rules.split(',')]
+        startup = bench_startup(args.hosts, directory)
+
+    print(f"{'rules':>6} {'forbid%':>8} {'protego us':>11} {'compiled us':>12} {'scrapy mw us':>13} "
+          f"{'robots mw us':>13} {'diff':>5}")
+    for result in matching:
+        print(f"{result['rules']:>6} {result['forbidden_percent']:>8} {result['protego_match_us']:>11} "
+              f"{result['compiled_match_us']:>12} {result['scrapy_middleware_us']:>13} "
+              f"{result['robots_middleware_us']:>13} {result['disagreements']:>5}")
+    print(f"\nStartup over {startup['hosts']} hosts: "
+          f"cold {startup['cold']['robots_downloads']} robots.txt downloads ({startup['cold']['seconds']}s), "
+          f"warm {startup['warm']['robots_downloads']} downloads ({startup['warm']['seconds']}s)")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'matching': matching, 'startup': startup}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
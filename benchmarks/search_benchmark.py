@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Full-text index benchmark
+
+Indexes synthetic documents with a Zipf-like vocabulary, then reports
+indexing throughput, index size and query latency for rare, medium and
+common terms. Common pairs are also run with ``exact=True`` to show what
+champion lists save, and ``common_pair_overlap`` is the share of the exact
+top 10 that the champion search returns.
+
+Usage:
+    python benchmarks/search_benchmark.py --docs 200000
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fulltext import IndexReader, IndexWriter
+
+
+def make_docs(count, words_per_doc, vocabulary, seed=0):
+    rng = random.Random(seed)
+    words = [f'term{i}' for i in range(vocabulary)]
+    # Zipf-like weights so a few terms are very common and most are rare
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(vocabulary)))
+    for i in range(count):
+        yield f'http://bench.example/{i}', ' '.join(rng.choices(words, cum_weights=cumulative, k=words_per_doc))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the full-text index')
+    parser.add_argument('--docs', type=int, default=50000, help='Number of documents')
+    parser.add_argument('--words', type=int, default=150, help='Words per document')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='Distinct terms')
+    parser.add_argument('--flush-docs', type=int, default=5000, help='Documents per level 0 segment')
+    parser.add_argument('--queries', type=int, default=50, help='Queries per term class')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='search-bench-')
+    try:
+        writer = IndexWriter(workdir, flush_docs=args.flush_docs)
+        start = time.perf_counter()
+        for url, text in make_docs(args.docs, args.words, args.vocabulary):
+            writer.add(url, text)
+        writer.close()
+        index_seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir))
+
+        start = time.perf_counter()
+        reader = IndexReader(workdir)
+        open_ms = (time.perf_counter() - start) * 1000
+        rng = random.Random(1)
+        term_classes = {
+            'rare': (lambda: f'term{rng.randrange(args.vocabulary // 2, args.vocabulary)}', False),
+            'medium': (lambda: f'term{rng.randrange(100, 1000)}', False),
+            'common_pair': (lambda: f'term{rng.randrange(10, 100)} term{rng.randrange(10, 100)}', False),
+            'common_pair_exact': (lambda: f'term{rng.randrange(10, 100)} term{rng.randrange(10, 100)}', True),
+        }
+        latencies = {}
+        for name, (make_query, exact) in term_classes.items():
+            timings = []
+            for _ in range(args.queries):
+                query = make_query()
+                start = time.perf_counter()
+                reader.search(query, top=10, exact=exact)
+                timings.append((time.perf_counter() - start) * 1000)
+            latencies[name] = {'p50_ms': round(percentile(timings, 0.5), 2), 'p99_ms': round(percentile(timings, 0.99), 2)}
+
+        overlap = []
+        for _ in range(args.queries):
+            query = f'term{rng.randrange(10, 100)} term{rng.randrange(10, 100)}'
+            exact = {url for _, url in reader.search(query, top=10, exact=True)}
+            approximate = {url for _, url in reader.search(query, top=10)}
+            overlap.append(len(exact & approximate) / max(1, len(exact)))
+        reader.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'docs': args.docs,
+        'index_docs_per_sec': round(args.docs / index_seconds, 1),
+        'index_bytes': size,
+        'segments_merged': writer.merges,
+        'open_ms': round(open_ms, 2),
+        'query_latency': latencies,
+        'common_pair_overlap': round(sum(overlap) / len(overlap), 3),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
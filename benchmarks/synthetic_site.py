@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic website for crawl benchmarks
+
+Serves ``pages`` HTML pages from ``/page/<n>`` (``/`` is page 0). Each page
+links to its children in a tree of the given fan-out, so every page is
+reachable, plus random cross links. Pages are padded with text to
+``page_size`` bytes. A ``doc_ratio`` share of pages also links to a
+document (PDF, DOCX, XLSX or TXT) served from ``/files/<n>``.
+
+Responses can be delayed (``latency_ms`` plus up to ``jitter_ms``) and an
+``error_rate`` share of pages answers 404, 500 or 503. With ``traps`` every
+page also links into three crawler traps that never end: a calendar with a
+link to the next month, a session id that changes on every link, and an
+ever deeper path. Everything is derived from ``seed`` and the URL path,
+so two runs with the same options serve the same site.
+
+Text responses are compressed with the first of ``encodings`` (br, zstd,
+gzip) the request's ``Accept-Encoding`` lists, as a web server would.
+
+With ``boilerplate`` every page is wrapped in the same site template, as
+on most real sites: a cookie notice, a header with a navigation menu, a
+breadcrumb trail, a sidebar with an about blurb, popular links and a
+newsletter form, and a footer. The page's own heading, links and text
+are in ``<div class="content">``.
+
+Usage:
+    python benchmarks/synthetic_site.py --port 8080 --pages 1000 --traps
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+WORDS = ('crawler page index document report archive section data result market policy research '
+         'network system annual review content summary analysis product service customer quality '
+         'energy health finance project update release version history support contact').split()
+
+DOCUMENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'txt': 'text/plain; charset=utf-8',
+}
+
+TRAP_PREFIXES = ('/calendar/', '/session/', '/deep/')
+ERROR_STATUSES = (404, 500, 503)
+ENCODINGS = ('br', 'zstd', 'gzip')
+
+
+class SiteConfig:
+    """Shape of the synthetic site"""
+
+    def __init__(self, pages=1000, fanout=8, cross_links=4, page_size=20000, doc_ratio=0.05,
+                 doc_types=('pdf', 'docx', 'xlsx', 'txt'), latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, traps=False, seed=1, encodings=(), boilerplate=False):
+        self.pages = pages
+        self.fanout = fanout
+        self.cross_links = cross_links
+        self.page_size = page_size
+        self.doc_ratio = doc_ratio
+        self.doc_types = tuple(doc_types)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.traps = traps
+        self.seed = seed
+        self.encodings = tuple(encodings)
+        self.boilerplate = boilerplate
+
+    def as_dict(self):
+        return dict(vars(self), doc_types=list(self.doc_types), encodings=list(self.encodings))
+
+
+def path_random(seed, path):
+    """Random generator that depends only on the seed and the path"""
+    digest = hashlib.blake2b(f'{seed}:{path}'.encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'little'))
+
+
+def filler_text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def encode_body(body, encoding):
+    """Compress ``body`` at the levels web servers use for dynamic responses"""
+    if encoding == 'gzip':
+        return gzip.compress(body, 6)
+    if encoding == 'br':
+        import brotli
+        return brotli.compress(body, quality=5)
+    from utils.compression import compress
+    return compress(body, 'zstd', 3)
+
+
+def pdf_document(text):
+    """Single page PDF showing ``text``"""
+    return pdf_pages([text])
+
+
+def pdf_pages(texts):
+    """PDF with one page per text, each showing up to 40 lines of 80 characters"""
+    font = 3 + 2 * len(texts)
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            b' '.join(b'%d 0 R' % (3 + 2 * i) for i in range(len(texts))), len(texts)),
+    ]
+    for i, text in enumerate(texts):
+        lines = [text[j:j + 80] for j in range(0, min(len(text), 3200), 80)]
+        stream = 'BT /F1 10 Tf 40 800 Td 12 TL ' + ' '.join(
+            '(' + line.replace('\\', '').replace('(', '').replace(')', '') + ") '" for line in lines) + ' ET'
+        stream = zlib.compress(stream.encode('latin-1'))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R '
+                       b'/Resources << /Font << /F1 %d 0 R >> >> >>' % (4 + 2 * i, font))
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def docx_document(text):
+    from docx import Document
+    document = Document()
+    for i in range(0, len(text), 400):
+        document.add_paragraph(text[i:i + 400])
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def xlsx_document(text):
+    from openpyxl import Workbook
+    workbook = Workbook()
+    sheet = workbook.active
+    words = text.split()
+    for row in range(0, len(words), 8):
+        sheet.append(words[row:row + 8])
+    out = io.BytesIO()
+    workbook.save(out)
+    return out.getvalue()
+
+
+DOCUMENT_BUILDERS = {
+    'pdf': pdf_document,
+    'docx': docx_document,
+    'xlsx': xlsx_document,
+    'txt': lambda text: text.encode('utf-8'),
+}
+
+
+class SyntheticSite:
+    """Renders the pages, documents and traps of one site configuration"""
+
+    def __init__(self, config):
+        self.config = config
+        self.documents = {}
+        self.wrapper = None
+
+    def page_links(self, number):
+        config = self.config
+        rng = path_random(config.seed, f'/page/{number}')
+        first = number * config.fanout + 1
+        links = [f'/page/{child}' for child in range(first, min(first + config.fanout, config.pages))]
+        links += [f'/page/{rng.randrange(config.pages)}' for _ in range(config.cross_links)]
+        if config.doc_types and rng.random() < config.doc_ratio:
+            links.append(f'/files/{number}')
+        if config.traps:
+            links += ['/calendar/2000/1', f'/session/{number}?sid={rng.randrange(1 << 30)}', '/deep/x']
+        return links
+
+    def template(self):
+        """Markup before and after the content of every page, the same on all pages"""
+        rng = path_random(self.config.seed, '/template')
+        sections = ''.join(f'<li><a href="/page/{rng.randrange(self.config.pages)}">{word.title()}</a></li>'
+                           for word in rng.sample(WORDS, 10))
+        popular = ''.join(f'<li><a href="/page/{rng.randrange(self.config.pages)}">{filler_text(rng, 30)}</a></li>'
+                          for _ in range(6))
+        legal = ' | '.join(f'<a href="/{word}">{word.title()}</a>'
+                           for word in ('privacy', 'terms', 'cookies', 'contact'))
+        before = ('<div class="notice"><p>This site uses cookies to remember your preferences and to measure '
+                  'traffic. By continuing to browse you agree to their use as described in our '
+                  '<a href="/cookies">cookie policy</a>.</p></div>'
+                  f'<header><a href="/">Synthetic Site</a><nav><ul>{sections}</ul></nav></header>')
+        after = (f'<div class="col"><h3>About us</h3><p>{filler_text(rng, 400)}</p>'
+                 f'<h3>Popular</h3><ul>{popular}</ul>'
+                 f'<h3>Newsletter</h3><p>{filler_text(rng, 150)}</p>'
+                 '<form action="/subscribe"><input name="email"><input type="submit" value="Sign up"></form></div>'
+                 f'<footer><p>{filler_text(rng, 200)}</p><p>{legal}</p>'
+                 '<p>Copyright 2024 Synthetic Site. All rights reserved.</p></footer>')
+        return before, after
+
+    def page(self, number):
+        rng = path_random(self.config.seed, f'/text/{number}')
+        links = ''.join(f'<li><a href="{link}">{link.strip("/").replace("/", " ")}</a></li>'
+                        for link in self.page_links(number))
+        head = (f'<!DOCTYPE html><html><head><title>Page {number}</title>'
+                f'<meta name="description" content="Synthetic page {number}"></head><body>')
+        tail = '</body></html>'
+        if self.config.boilerplate:
+            if self.wrapper is None:
+                self.wrapper = self.template()
+            before, after = self.wrapper
+            parent = max(number - 1, 0) // self.config.fanout
+            head += (f'{before}<div class="trail"><a href="/">Home</a> &gt; '
+                     f'<a href="/page/{parent}">Page {parent}</a> &gt; Page {number}</div><div class="content">')
+            tail = f'</div>{after}{tail}'
+        head += f'<h1>Page {number}</h1><ul>{links}</ul>'
+        paragraphs = []
+        remaining = self.config.page_size - len(head) - len(tail)
+        while remaining > 0:
+            paragraph = f'<p>{filler_text(rng, min(remaining, 600))}</p>'
+            paragraphs.append(paragraph)
+            remaining -= len(paragraph)
+        return (head + ''.join(paragraphs) + tail).encode('utf-8')
+
+    def document(self, number):
+        """Content type and bytes of document ``number``, built once"""
+        if number not in self.documents:
+            rng = path_random(self.config.seed, f'/files/{number}')
+            doc_type = rng.choice(self.config.doc_types)
+            text = f'Document {number}. ' + filler_text(rng, 2000)
+            self.documents[number] = (DOCUMENT_TYPES[doc_type], DOCUMENT_BUILDERS[doc_type](text))
+        return self.documents[number]
+
+    def trap(self, path, query):
+        parts = path.strip('/').split('/')
+        if parts[0] == 'calendar' and len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+            year, month = int(parts[1]), int(parts[2])
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            link = f'/calendar/{year}/{month}'
+        elif parts[0] == 'session':
+            sid = parse_qs(query).get('sid', ['0'])[0]
+            link = f'/session/{parts[-1]}?sid={int(sid) + 1 if sid.isdigit() else 1}'
+        elif parts[0] == 'deep':
+            link = path.rstrip('/') + '/x'
+        else:
+            return None
+        return (f'<html><head><title>{path}</title></head><body>'
+                f'<p>{path}</p><a href="{link}">next</a></body></html>').encode('utf-8')
+
+    def respond(self, target):
+        """(status, content type, body) for a request target"""
+        parts = urlsplit(target)
+        path = parts.path
+        if path == '/robots.txt':
+            return 200, 'text/plain', b'User-agent: *\nAllow: /\n'
+        if path == '/':
+            path = '/page/0'
+        rng = path_random(self.config.seed, 'error:' + path)
+        if rng.random() < self.config.error_rate and not path.startswith(TRAP_PREFIXES):
+            return rng.choice(ERROR_STATUSES), 'text/html', b'<html><body>Error</body></html>'
+        kind, _, number = path.strip('/').partition('/')
+        if kind == 'page' and number.isdigit() and int(number) < self.config.pages:
+            return 200, 'text/html; charset=utf-8', self.page(int(number))
+        if kind == 'files' and number.isdigit() and self.config.doc_types:
+            content_type, body = self.document(int(number))
+            return 200, content_type, body
+        if self.config.traps and path.startswith(TRAP_PREFIXES):
+            body = self.trap(path, parts.query)
+            if body is not None:
+                return 200, 'text/html; charset=utf-8', body
+        return 404, 'text/html', b'<html><body>Not found</body></html>'
+
+    def content_encoding(self, content_type, accept_encoding):
+        """Encoding to compress a response with, None to send it as it is"""
+        if not self.config.encodings or not content_type.startswith('text/'):
+            return None
+        accepted = {value.split(';')[0].strip().lower() for value in (accept_encoding or '').split(',')}
+        return next((encoding for encoding in self.config.encodings if encoding in accepted), None)
+
+    def delay(self, target):
+        if not self.config.latency_ms and not self.config.jitter_ms:
+            return 0.0
+        jitter = path_random(self.config.seed, 'latency:' + target).random() * self.config.jitter_ms
+        return (self.config.latency_ms + jitter) / 1000
+
+
+def make_handler(site):
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            delay = site.delay(self.path)
+            if delay:
+                time.sleep(delay)
+            status, content_type, body = site.respond(self.path)
+            encoding = site.content_encoding(content_type, self.headers.get('Accept-Encoding'))
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            if encoding:
+                body = encode_body(body, encoding)
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SiteHandler
+
+
+def serve(config, port=0, host='127.0.0.1', ready=None):
+    """Serve the site until the process is stopped, putting the bound port on ``ready``"""
+    server = ThreadingHTTPServer((host, port), make_handler(SyntheticSite(config)))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(config, host='127.0.0.1'):
+    """Serve the site from a child process so it does not share the crawler's CPU
+
+    Returns the process and the base URL.
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(config, 0, host, ready), daemon=True)
+    process.start()
+    port = ready.get(timeout=30)
+    return process, f'http://{host}:{port}'
+
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=1000, help='Number of HTML pages')
+    parser.add_argument('--fanout', type=int, default=8, help='Child pages linked from each page')
+    parser.add_argument('--cross-links', type=int, default=4, help='Extra random links per page')
+    parser.add_argument('--page-size', type=int, default=20000, help='Approximate page size in bytes')
+    parser.add_argument('--doc-ratio', type=float, default=0.05, help='Share of pages linking a document')
+    parser.add_argument('--doc-types', type=str, default='pdf,docx,xlsx,txt',
+                        help='Comma-separated document types to serve (pdf, docx, xlsx, txt)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random delay up to this value')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of pages answering 404/500/503')
+    parser.add_argument('--traps', action='store_true', help='Link every page to endless crawler traps')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for links, text and errors')
+    parser.add_argument('--encodings', type=str, default='',
+                        help='Comma-separated encodings to compress text with, by preference (br, zstd, gzip)')
+    parser.add_argument('--boilerplate', action='store_true',
+                        help='Wrap pages in a site template (menus, sidebar, footer, cookie notice)')
+
+
+def config_from_args(args):
+    doc_types = [doc_type.strip() for doc_type in args.doc_types.split(',') if doc_type.strip()]
+    unknown = set(doc_types) - set(DOCUMENT_TYPES)
+    if unknown:
+        raise SystemExit(f"Unknown document types: {', '.join(sorted(unknown))}")
+    encodings = [encoding.strip() for encoding in args.encodings.split(',') if encoding.strip()]
+    unknown = set(encodings) - set(ENCODINGS)
+    if unknown:
+        raise SystemExit(f"Unknown encodings: {', '.join(sorted(unknown))}")
+    return SiteConfig(
+        pages=args.pages, fanout=args.fanout, cross_links=args.cross_links, page_size=args.page_size,
+        doc_ratio=args.doc_ratio, doc_types=doc_types, latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms, error_rate=args.error_rate, traps=args.traps, seed=args.seed,
+        encodings=encodings, boilerplate=args.boilerplate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a deterministic synthetic website')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"Serving {args.pages} pages on http://{args.host}:{args.port}/")
+    try:
+        serve(config_from_args(args), args.port, args.host)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
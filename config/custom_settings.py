@@ -9,10 +9,12 @@ RESPECTFUL_CRAWLING = {
     'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
     'CONCURRENT_REQUESTS_PER_IP': 2,
     'ROBOTSTXT_OBEY': True,
-    'AUTOTHROTTLE_ENABLED': True,
-    'AUTOTHROTTLE_START_DELAY': 2,
-    'AUTOTHROTTLE_MAX_DELAY': 15,
-    'AUTOTHROTTLE_TARGET_CONCURRENCY': 1.0,
+    'ADAPTIVE_THROTTLE_ENABLED': True,
+    'ADAPTIVE_THROTTLE_START_DELAY': 2,
+    'ADAPTIVE_THROTTLE_MIN_DELAY': 1,
+    'ADAPTIVE_THROTTLE_MAX_DELAY': 15,
+    'ADAPTIVE_THROTTLE_START_CONCURRENCY': 1.0,
+    'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 2.0,
 }
 
 # Settings for aggressive crawling (use with caution)
@@ -22,7 +24,10 @@ AGGRESSIVE_CRAWLING = {
     'CONCURRENT_REQUESTS_PER_DOMAIN': 16,
     'CONCURRENT_REQUESTS_PER_IP': 16,
     'ROBOTSTXT_OBEY': False,
-    'AUTOTHROTTLE_ENABLED': False,
+    'ADAPTIVE_THROTTLE_ENABLED': True,
+    'ADAPTIVE_THROTTLE_START_DELAY': 0.5,
+    'ADAPTIVE_THROTTLE_START_CONCURRENCY': 4.0,
+    'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 16.0,
 }
 
 # Settings for document-focused crawling
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Record Lookup Script
+
+Prints the JSON record stored for a URL using the lookup index written by
+JsonWriterPipeline, without scanning the output directories.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from scrapy.utils.project import get_project_settings
+from utils.recordindex import RecordIndex, read_record
+
+
+def find_records(index, url):
+    """Stored items for ``url``, oldest first, skipping fingerprint collisions"""
+    records = []
+    for path, offset, length in index.locate(url):
+        try:
+            item = json.loads(read_record(path, offset, length))
+        except (OSError, ValueError):
+            # The file was removed or rewritten since it was indexed
+            continue
+        if item.get('url') == url:
+            records.append((path, item))
+    return records
+
+
+def main():
+    """Main function to look up stored records"""
+    settings = get_project_settings()
+    parser = argparse.ArgumentParser(description='Show the stored record for a URL')
+    parser.add_argument('url', help='URL of a crawled page or document')
+    parser.add_argument(
+        '--index',
+        type=str,
+        default=settings.get('RECORD_INDEX_DIR') or 'data/lookup',
+        help='Lookup index directory (default: RECORD_INDEX_DIR)'
+    )
+    parser.add_argument('--all', action='store_true', help='Show every stored copy, not only the newest')
+    parser.add_argument('--path', action='store_true', help='Print file paths instead of the records')
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.index):
+        print(f"Error: no lookup index at {args.index}")
+        sys.exit(1)
+
+    index = RecordIndex(args.index)
+    try:
+        start = time.perf_counter()
+        records = find_records(index, args.url)
+        elapsed = (time.perf_counter() - start) * 1000
+    finally:
+        index.close()
+
+    if not records:
+        print(f"No record stored for {args.url}", file=sys.stderr)
+        sys.exit(1)
+    for path, item in (records if args.all else records[-1:]):
+        print(path if args.path else json.dumps(item, ensure_ascii=False, indent=2))
+    print(f"{len(records)} records ({elapsed:.2f} ms)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Blob Store Maintenance Script
+
+Shows blob store statistics, prints single blobs and compacts the store,
+optionally dropping blobs no longer referenced by the JSON output files or
+the SQLite database. Do not compact while a crawl is writing to the store.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+from scrapy.utils.project import get_project_settings
+from utils.blobstore import BlobStore
+
+
+def live_hashes(json_dirs, databases):
+    """Collect content hashes referenced by item JSON files and databases"""
+    hashes = set()
+    for directory in json_dirs:
+        for path in glob.iglob(os.path.join(directory, '*.json')):
+            with open(path, encoding='utf-8') as f:
+                content_hash = json.load(f).get('content_hash')
+            if content_hash:
+                hashes.add(content_hash)
+    for path in databases:
+        db = sqlite3.connect(path)
+        for table in ('pages', 'documents'):
+            hashes.update(row[0] for row in db.execute(f'SELECT content_hash FROM {table} WHERE content_hash IS NOT NULL'))
+        db.close()
+    return hashes
+
+
+def main():
+    """Main function to maintain the blob store"""
+    settings = get_project_settings()
+    parser = argparse.ArgumentParser(description='Maintain the content-addressed blob store')
+    parser.add_argument(
+        '--store',
+        type=str,
+        default=settings.get('BLOB_STORE_DIR', 'data/blobs'),
+        help='Blob store directory (default: BLOB_STORE_DIR)'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='Show blob count, sizes and pack files')
+
+    get_parser = subparsers.add_parser('get', help='Write one blob to stdout')
+    get_parser.add_argument('hash', help='sha256 of the blob')
+
+    compact_parser = subparsers.add_parser('compact', help='Rewrite packs, dropping unreferenced blobs')
+    compact_parser.add_argument(
+        '--json-dir',
+        action='append',
+        default=[],
+        help='Directory of item JSON files whose content_hash values are live (can be repeated)'
+    )
+    compact_parser.add_argument(
+        '--database',
+        action='append',
+        default=[],
+        help='SQLite database written by DatabasePipeline whose hashes are live (can be repeated)'
+    )
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.store):
+        print(f"Error: no blob store at {args.store}")
+        sys.exit(1)
+    store = BlobStore(args.store)
+
+    if args.command == 'stats':
+        for name, value in store.stats().items():
+            print(f"{name:>14}: {value}")
+    elif args.command == 'get':
+        try:
+            sys.stdout.buffer.write(store.get(args.hash))
+        except KeyError:
+            print(f"Error: blob {args.hash} not found", file=sys.stderr)
+            sys.exit(1)
+    elif args.command == 'compact':
+        live = None
+        if args.json_dir or args.database:
+            live = live_hashes(args.json_dir, args.database)
+        before = store.stats()['pack_bytes']
+        kept, removed = store.compact(live)
+        after = store.stats()['pack_bytes']
+        print(f"Kept {kept} blobs, removed {removed}; packs {before} -> {after} bytes")
+
+
+if __name__ == '__main__':
+    main()
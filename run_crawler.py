@@ -10,6 +10,7 @@ import sys
 import os
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
+from webcrawler.profiler import profile_url
 from webcrawler.spiders.main_spider import MainSpider
 
 
@@ -21,7 +22,6 @@ def main():
     parser.add_argument(
         '--start-urls', 
         type=str, 
-        required=True,
         help='Comma-separated list of URLs to start crawling from'
     )
     
@@ -74,10 +74,44 @@ def main():
         help='Output directory for crawled data (default: data)'
     )
     
+    parser.add_argument(
+        '--fields',
+        type=str,
+        help='Comma-separated WebPageItem fields to extract, e.g. title,text_content (default: all)'
+    )
+    
+    parser.add_argument(
+        '--field-limit',
+        action='append',
+        default=[],
+        metavar='FIELD=LENGTH',
+        help='Truncate a field to LENGTH characters (or entries for links/images); can be repeated'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Sample the crawl and write collapsed stacks and hot functions to <output-dir>/logs/profile'
+    )
+    
+    parser.add_argument(
+        '--profile-url',
+        type=str,
+        metavar='URL',
+        help='Fetch one URL and profile the spider and pipelines on it with cProfile, then exit'
+    )
+    
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=30,
+        help='Functions listed in the profile reports (default: 30)'
+    )
+    
     args = parser.parse_args()
     
     # Validate start URLs
-    if not args.start_urls:
+    if not args.start_urls and not args.profile_url:
         print("Error: --start-urls is required")
         sys.exit(1)
     
@@ -94,6 +128,26 @@ def main():
     settings.set('ROBOTSTXT_OBEY', args.obey_robots)
     settings.set('LOG_LEVEL', args.log_level)
     settings.set('LOG_FILE', f'{args.output_dir}/logs/webcrawler.log')
+    if args.fields:
+        settings.set('ITEM_FIELDS', [field.strip() for field in args.fields.split(',') if field.strip()])
+    if args.field_limit:
+        limits = dict(settings.getdict('ITEM_FIELD_LIMITS'))
+        for entry in args.field_limit:
+            field, _, length = entry.partition('=')
+            if not length.isdigit():
+                print(f"Error: --field-limit expects FIELD=LENGTH, got {entry}")
+                sys.exit(1)
+            limits[field.strip()] = int(length)
+        settings.set('ITEM_FIELD_LIMITS', limits)
+    settings.set('PROFILE_ENABLED', args.profile)
+    settings.set('PROFILE_DIR', f'{args.output_dir}/logs/profile')
+    settings.set('PROFILE_TOP', args.profile_top)
+    
+    if args.profile_url:
+        stats_path, report = profile_url(settings, args.profile_url, settings.get('PROFILE_DIR'), args.profile_top)
+        print(report)
+        print(f"Profile saved to {stats_path}")
+        return
     
     # Create and configure crawler process
     process = CrawlerProcess(settings)
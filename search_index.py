@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search Script
+
+Runs BM25 queries against the index written by SearchIndexPipeline. The
+index can be searched while a crawl is still adding to it; each query sees
+the segments that were published when the index was opened.
+"""
+
+import argparse
+import os
+import sys
+import time
+from scrapy.utils.project import get_project_settings
+from utils.fulltext import MANIFEST, IndexReader
+
+
+def main():
+    """Main function to search the crawl index"""
+    settings = get_project_settings()
+    parser = argparse.ArgumentParser(description='Search crawled pages and documents')
+    parser.add_argument('query', nargs='+', help='Query terms')
+    parser.add_argument(
+        '--index',
+        type=str,
+        default=settings.get('SEARCH_INDEX_DIR', 'data/index'),
+        help='Index directory (default: SEARCH_INDEX_DIR)'
+    )
+    parser.add_argument('--top', type=int, default=10, help='Number of results (default: 10)')
+    parser.add_argument(
+        '--exact',
+        action='store_true',
+        help='Score full posting lists instead of champion lists for common terms'
+    )
+
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(args.index, MANIFEST)):
+        print(f"Error: no search index at {args.index}")
+        sys.exit(1)
+
+    reader = IndexReader(args.index)
+    try:
+        start = time.perf_counter()
+        results = reader.search(' '.join(args.query), top=args.top, exact=args.exact)
+        elapsed = (time.perf_counter() - start) * 1000
+        for score, url in results:
+            print(f"{score:8.4f}  {url}")
+        print(f"{len(results)} results from {reader.doc_count} documents "
+              f"in {len(reader.segments)} segments ({elapsed:.1f} ms)")
+    finally:
+        reader.close()
+
+
+if __name__ == '__main__':
+    main()
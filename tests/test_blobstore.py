@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed blob store
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.spiders import Spider
+
+from utils.blobstore import BlobStore, blob_hash
+from webcrawler.items import DocumentItem, WebPageItem
+from webcrawler.pipelines import BlobStorePipeline
+
+
+def html(i):
+    return (f'<html><head><title>Page {i}</title></head><body><nav><a href="/">Home</a></nav>'
+            f'<p>Article number {i} with some text {i * 7}</p><footer>Footer</footer></body></html>').encode()
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_identical_blobs_are_stored_once(self):
+        store = BlobStore(self.tmpdir)
+        first = store.put(b'same bytes')
+        second = store.put(b'same bytes')
+        self.assertEqual(first, second)
+        self.assertEqual(first, blob_hash(b'same bytes'))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(first), b'same bytes')
+        store.close()
+
+    def test_blobs_survive_reopen_and_pack_rotation(self):
+        store = BlobStore(self.tmpdir, pack_size=100)
+        hashes = [store.put(html(i)) for i in range(10)]
+        store.close()
+
+        store = BlobStore(self.tmpdir)
+        self.assertEqual([store.get(digest) for digest in hashes], [html(i) for i in range(10)])
+        self.assertEqual(store.stats()['pack_files'], 10)
+
+    def test_dictionary_is_trained_from_html_samples(self):
+        store = BlobStore(self.tmpdir, dictionary_samples=50, dictionary_size=2048)
+        hashes = [store.put(html(i), use_dictionary=True) for i in range(100)]
+        self.assertTrue(store.dictionary_id)
+        self.assertEqual(store.index[bytes.fromhex(hashes[-1])].dictionary_id, store.dictionary_id)
+        store.close()
+
+        store = BlobStore(self.tmpdir)
+        self.assertEqual(store.get(hashes[-1]), html(99))
+
+    def test_compact_drops_unreferenced_blobs(self):
+        store = BlobStore(self.tmpdir, pack_size=300)
+        hashes = [store.put(html(i)) for i in range(10)]
+        kept, removed = store.compact(hashes[:3])
+        self.assertEqual((kept, removed), (3, 7))
+        store.put(b'written after compaction')
+        store.close()
+
+        store = BlobStore(self.tmpdir)
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.get(hashes[2]), html(2))
+        self.assertNotIn(hashes[5], store)
+
+
+class TestBlobStorePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_items_keep_only_the_content_hash(self):
+        pipeline = BlobStorePipeline(self.tmpdir, dictionary_samples=0)
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        page = pipeline.process_item(WebPageItem(url='http://example.com/', content='<html>é</html>'), spider)
+        document = pipeline.process_item(
+            DocumentItem(url='http://example.com/a.pdf', file_type='pdf', content=b'%PDF'), spider)
+        pipeline.close_spider(spider)
+
+        self.assertNotIn('content', page)
+        self.assertEqual(pipeline.store.get(page['content_hash']).decode('utf-8'), '<html>é</html>')
+        self.assertEqual(pipeline.store.get(document['content_hash']), b'%PDF')
+
+
+if __name__ == '__main__':
+    unittest.main()
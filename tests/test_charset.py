@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for charset detection
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request, TextResponse
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+from utils import charset
+from utils.document_processor import DocumentProcessor
+from webcrawler.middlewares import CharsetMiddleware
+
+TEXTS = {
+    'cp1252': 'Café crème brûlée, naïve façade — “quoted” text über Größe. ',
+    'cp1251': 'Привет мир, это тестовый текст на русском языке для проверки. ',
+    'cp932': 'これは日本語のテキストです。文字コードの検出をテストします。',
+    'gb18030': '这是一个中文文本，用于测试字符编码检测功能。',
+    'utf-8': 'Mixed ünïcödé текст 日本語 ',
+}
+
+
+class TestDetection(unittest.TestCase):
+
+    def test_declarations_in_browser_order(self):
+        html = '<html><head><meta charset="windows-1251"></head><body>Привет</body></html>'
+        self.assertEqual(charset.detect_encoding(b'\xef\xbb\xbf<p>x</p>', 'text/html; charset=cp1251'),
+                         ('utf-8', 'bom'))
+        self.assertEqual(charset.detect_encoding(html.encode('cp1251'), 'text/html; charset=koi8-r'),
+                         ('koi8-r', 'header'))
+        self.assertEqual(charset.detect_encoding(html.encode('cp1251'), 'text/html'), ('cp1251', 'meta'))
+        # Meta declarations only count in HTML, and latin-1 means windows-1252
+        self.assertEqual(charset.detect_encoding(b'<meta charset="iso-8859-1">', b'text/html'), ('cp1252', 'meta'))
+        self.assertEqual(charset.detect_encoding(html.encode('utf-8'), html=False), ('utf-8', 'detected'))
+
+    def test_wrong_utf8_declaration_is_detected(self):
+        body = ('<html><head><meta charset="utf-8"></head><body>' + TEXTS['cp1252'] * 20).encode('cp1252')
+        encoding, source = charset.detect_encoding(body, 'text/html; charset=UTF-8')
+        self.assertEqual(source, 'detected')
+        self.assertEqual(charset.decode(body, 'text/html; charset=UTF-8')[0], body.decode('cp1252'))
+
+    def test_undeclared_text(self):
+        for encoding, text in TEXTS.items():
+            if encoding not in ('utf-8', 'cp1252') and charset.chardet is None:
+                continue
+            body = (text * 50).encode(encoding)
+            self.assertEqual(charset.decode(body, html=False)[0], text * 50, encoding)
+        # UTF-16 without a BOM, and legacy text is not mistaken for it
+        text = 'Plain English text without a byte order mark. ' * 10
+        self.assertEqual(charset.decode(text.encode('utf-16-le'), html=False), (text, 'utf-16-le'))
+        self.assertEqual(charset.decode(text.encode('utf-16-be'), html=False), (text, 'utf-16-be'))
+        self.assertEqual(charset.decode(b'caf\xe9 ' * 10, html=False)[0], 'café ' * 10)
+
+    def test_non_utf8_past_the_sample(self):
+        body = b'a' * 100 + 'café'.encode('cp1252')
+        self.assertEqual(charset.decode(body, html=False, sample_size=50), ('a' * 100 + 'café', 'cp1252'))
+
+
+class TestCharsetUsers(unittest.TestCase):
+
+    def test_middleware_sets_response_encoding(self):
+        crawler = get_crawler(Spider)
+        crawler.stats.open_spider(None)
+        mw = CharsetMiddleware.from_crawler(crawler)
+        body = ('<html><body><p>' + TEXTS['cp1252'] * 20 + '</p></body></html>').encode('cp1252')
+        response = mw.process_response(Request('http://a.com/'), HtmlResponse('http://a.com/', body=body), None)
+        self.assertEqual(response.encoding, 'cp1252')
+        self.assertIn(TEXTS['cp1252'], response.text)
+        declared = TextResponse('http://a.com/', body=b'x', encoding='cp1251')
+        self.assertIs(mw.process_response(Request('http://a.com/'), declared, None), declared)
+        self.assertEqual(crawler.stats.get_value('charset/detected'), 1)
+
+    def test_processor_uses_header_charset(self):
+        processor = DocumentProcessor()
+        body = (TEXTS['cp1251'] * 5).encode('koi8-r')
+        self.assertEqual(processor.process_document(body, 'txt', 'text/plain; charset=KOI8-R'), TEXTS['cp1251'] * 5)
+        html = '<html><body><p>Größe</p></body></html>'.encode('cp1252')
+        self.assertEqual(processor.process_document(html, 'html'), 'Größe')
+
+
+if __name__ == '__main__':
+    unittest.main()
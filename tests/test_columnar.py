@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the Parquet export
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.columnar import DOCUMENTS, LINKS, PAGES, ParquetExporter, pq
+
+
+def page(i):
+    return {
+        'url': f'http://example.com/{i}',
+        'title': f'Page {i}',
+        'content': '<html>...</html>',
+        'text_content': 'Some text',
+        'headers': {'h1': [f'Heading {i}'], 'h2': [], 'h3': [], 'h4': [], 'h5': [], 'h6': []},
+        'links': [{'url': 'http://example.com/', 'text': 'Home', 'type': 'internal'}],
+        'images': [{'url': 'http://example.com/logo.png', 'alt': 'Logo'}],
+        'response_status': 200,
+        'content_type': 'text/html',
+        'file_size': 100 + i,
+        'timestamp': '2024-01-01T12:00:00',
+    }
+
+
+@unittest.skipIf(pq is None, "pyarrow is not installed")
+class TestParquetExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_items_are_written_in_row_groups_per_kind(self):
+        exporter = ParquetExporter(self.tmpdir, batch_size=2)
+        for i in range(5):
+            exporter.add(page(i))
+        exporter.add({'source_url': 'http://example.com/', 'target_url': 'http://example.com/1',
+                      'link_text': 'One', 'link_type': 'internal'})
+        exporter.add({'url': 'http://example.com/a.pdf', 'filename': 'a.pdf', 'file_type': 'pdf',
+                      'content': b'%PDF', 'metadata': {'content-type': 'application/pdf'}, 'file_size': 4})
+        exporter.close()
+
+        self.assertEqual(exporter.rows, {PAGES: 5, LINKS: 1, DOCUMENTS: 1})
+        pages = pq.ParquetFile(exporter.path(PAGES))
+        self.assertEqual(pages.metadata.num_row_groups, 3)
+        table = pages.read(columns=['url', 'links', 'headers'])
+        self.assertEqual(table.column('links')[0].as_py()[0]['text'], 'Home')
+        self.assertEqual(table.column('headers')[4].as_py()['h1'], ['Heading 4'])
+
+        documents = pq.read_table(exporter.path(DOCUMENTS)).to_pylist()
+        self.assertEqual(documents[0]['content'], b'%PDF')
+        self.assertEqual(documents[0]['metadata'], [('content-type', 'application/pdf')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite item storage
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.spiders import Spider
+from twisted.internet.defer import Deferred
+
+from utils.database import CrawlDatabase
+from webcrawler.items import DocumentItem, LinkItem, WebPageItem
+from webcrawler.pipelines import DatabasePipeline
+
+
+def page(url, title, links):
+    item = WebPageItem()
+    item['url'] = url
+    item['title'] = title
+    item['headers'] = {'h1': [title], 'h2': ['Intro', 'Details']}
+    item['links'] = [{'url': link, 'text': link, 'type': 'internal'} for link in links]
+    item['images'] = [{'url': 'http://example.com/logo.png', 'alt': 'Logo'}]
+    item['response_status'] = 200
+    return item
+
+
+class TestCrawlDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = CrawlDatabase(os.path.join(self.tmpdir, 'crawl.sqlite3'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_urls_are_interned_once(self):
+        self.db.write_batch([dict(page('http://example.com/a', 'A', ['http://example.com/b'])),
+                             dict(page('http://example.com/b', 'B', ['http://example.com/a']))])
+        self.assertEqual(self.db.count('urls'), 3)
+        self.assertEqual(self.db.count('links'), 2)
+        self.assertEqual(self.db.count('images'), 2)
+
+    def test_recrawl_replaces_page_and_children(self):
+        self.db.write_batch([dict(page('http://example.com/a', 'Old', ['http://example.com/b', 'http://example.com/c']))])
+        self.db.write_batch([dict(page('http://example.com/a', 'New', ['http://example.com/b']))])
+        title = self.db.db.execute('SELECT title FROM pages').fetchall()
+        self.assertEqual(title, [('New',)])
+        self.assertEqual(self.db.count('links'), 1)
+        self.assertEqual(self.db.count('headings'), 3)
+
+    def test_documents_and_link_items(self):
+        document = DocumentItem(url='http://example.com/a.pdf', filename='a.pdf', file_type='pdf',
+                                metadata={'content-type': 'application/pdf'}, file_size=4)
+        link = LinkItem(source_url='http://example.com/', target_url='http://example.com/a.pdf',
+                        link_text='A', link_type='document')
+        self.db.write_batch([dict(document), dict(link)])
+        self.assertEqual(self.db.count('documents'), 1)
+        self.assertEqual(self.db.db.execute('SELECT type FROM links').fetchone(), ('document',))
+
+
+class TestDatabasePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_items_are_written_by_the_writer_thread(self):
+        path = os.path.join(self.tmpdir, 'crawl.sqlite3')
+        pipeline = DatabasePipeline(path, batch_size=3, commit_interval=0.05, queue_size=2)
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        items = [page(f'http://example.com/{i}', f'Page {i}', []) for i in range(10)]
+        passed = []
+        for item in items:
+            result = pipeline.process_item(item, spider)
+            if isinstance(result, Deferred):
+                result.addCallback(passed.append)
+            else:
+                passed.append(result)
+        pipeline.close_spider(spider)
+
+        self.assertEqual(passed, items)
+        self.assertEqual(pipeline.written, 10)
+        db = CrawlDatabase(path)
+        self.assertEqual(db.count('pages'), 10)
+        db.close()
+
+    def test_full_queue_defers_items(self):
+        pipeline = DatabasePipeline(os.path.join(self.tmpdir, 'crawl.sqlite3'), queue_size=1)
+        spider = Spider('test')
+        first = page('http://example.com/1', 'One', [])
+        second = page('http://example.com/2', 'Two', [])
+        self.assertIs(pipeline.process_item(first, spider), first)
+        # No writer thread yet, the second item waits instead of blocking
+        passed = []
+        pipeline.process_item(second, spider).addCallback(passed.append)
+        self.assertEqual(passed, [])
+        pipeline.queue.queue.get()
+        pipeline.queue.refill()
+        self.assertEqual(passed, [second])
+
+
+if __name__ == '__main__':
+    unittest.main()
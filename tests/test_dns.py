@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent DNS cache, run against a local stub DNS server
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from twisted.internet import defer, reactor
+from twisted.internet.error import DNSLookupError
+from twisted.internet.task import deferLater
+from twisted.names import dns, error, server
+from twisted.names.common import ResolverBase
+from twisted.trial import unittest
+
+from webcrawler.dns import CachingResolver, DnsPrefetch, DnsStore, build_resolver
+
+
+class StubAuthority(ResolverBase):
+    """Answers A queries from a dict, NXDOMAIN for anything else"""
+
+    def __init__(self, records, delay=0):
+        super().__init__()
+        self.records = records
+        self.delay = delay
+        self.queries = []
+        self.active = 0
+        self.max_active = 0
+
+    def _lookup(self, name, cls, type, timeout):
+        name = name.decode()
+        self.queries.append(name)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        d = deferLater(reactor, self.delay, self.answer, name)
+        d.addBoth(self.done)
+        return d
+
+    def answer(self, name):
+        if name not in self.records:
+            raise error.DomainError(name)
+        value, ttl = self.records[name]
+        if value.endswith('.'):
+            payload = dns.Record_CNAME(value[:-1], ttl=ttl)
+            return [dns.RRHeader(name, dns.CNAME, ttl=ttl, payload=payload)], [], []
+        return [dns.RRHeader(name, dns.A, ttl=ttl, payload=dns.Record_A(value, ttl=ttl))], [], []
+
+    def done(self, result):
+        self.active -= 1
+        return result
+
+
+class DnsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'dns.sqlite3')
+        self.authority = StubAuthority({
+            'a.test': ('10.0.0.1', 600),
+            'short.test': ('10.0.0.2', 1),
+            'www.test': ('a.test.', 300),
+        }, delay=0.01)
+        factory = server.DNSServerFactory(authorities=[self.authority])
+        self.port = reactor.listenUDP(0, dns.DNSDatagramProtocol(factory), interface='127.0.0.1')
+        self.resolvers = []
+
+    def tearDown(self):
+        for resolver in self.resolvers:
+            resolver.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        return self.port.stopListening()
+
+    def resolver(self, **kwargs):
+        resolver = CachingResolver(reactor, build_resolver([f'127.0.0.1:{self.port.getHost().port}']),
+                                   store=DnsStore(self.path), timeout=5, **kwargs)
+        self.resolvers.append(resolver)
+        return resolver
+
+    @defer.inlineCallbacks
+    def test_ttl_respecting_cache(self):
+        resolver = self.resolver(min_ttl=10)
+        self.assertEqual((yield resolver.getHostByName('A.test')), '10.0.0.1')
+        self.assertEqual((yield resolver.getHostByName('a.test')), '10.0.0.1')
+        self.assertEqual((yield resolver.getHostByName('www.test')), '10.0.0.1')
+        self.assertEqual((yield resolver.getHostByName('10.1.2.3')), '10.1.2.3')
+        self.assertEqual(self.authority.queries, ['a.test', 'www.test', 'a.test'])
+        self.assertEqual(resolver.counts['cache_hits'], 1)
+
+        # TTLs below DNS_CACHE_MIN_TTL are raised to it, expired entries are looked up again
+        yield resolver.getHostByName('short.test')
+        now = resolver.clock()
+        resolver.clock = lambda: now + 5
+        yield resolver.getHostByName('short.test')
+        self.assertEqual(self.authority.queries.count('short.test'), 1)
+        resolver.clock = lambda: now + 700
+        yield resolver.getHostByName('a.test')
+        self.assertEqual(self.authority.queries.count('a.test'), 3)
+
+    @defer.inlineCallbacks
+    def test_negative_entries_and_persistence(self):
+        resolver = self.resolver()
+        yield resolver.getHostByName('a.test')
+        yield self.assertFailure(resolver.getHostByName('missing.test'), DNSLookupError)
+        yield self.assertFailure(resolver.getHostByName('missing.test'), DNSLookupError)
+        self.assertEqual(self.authority.queries, ['a.test', 'missing.test'])
+        self.assertEqual(resolver.counts['negative_hits'], 1)
+        resolver.close()
+
+        # A new process starts with both entries
+        resolver = self.resolver()
+        self.assertEqual((yield resolver.getHostByName('a.test')), '10.0.0.1')
+        yield self.assertFailure(resolver.getHostByName('missing.test'), DNSLookupError)
+        self.assertEqual(len(self.authority.queries), 2)
+
+    @defer.inlineCallbacks
+    def test_bounded_concurrency_and_priority(self):
+        self.authority.records.update({f'h{i}.test': (f'10.1.0.{i}', 600) for i in range(10)})
+        resolver = self.resolver(concurrency=2)
+        for i in range(8):
+            resolver.prefetch(f'h{i}.test')
+        self.assertFalse(resolver.prefetch('h0.test'))
+        # Lookups for requests go before queued prefetches, and share them
+        results = yield defer.gatherResults([resolver.getHostByName(name)
+                                             for name in ('h9.test', 'h7.test', 'h7.test')])
+        self.assertEqual(results, ['10.1.0.9', '10.1.0.7', '10.1.0.7'])
+        self.assertEqual(self.authority.queries[2:4], ['h9.test', 'h7.test'])
+        self.assertEqual(self.authority.max_active, 2)
+        self.assertEqual(self.authority.queries.count('h7.test'), 1)
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertEqual(len(self.authority.queries), 9)
+
+    @defer.inlineCallbacks
+    def test_prefetch_extension(self):
+        from scrapy.http import Request
+        from scrapy.spiders import Spider
+        from scrapy.utils.test import get_crawler
+
+        resolver = self.resolver()
+        crawler = get_crawler(Spider)
+        crawler.stats.open_spider(None)
+        spider = crawler._create_spider('test')
+        extension = DnsPrefetch(crawler)
+        extension.resolver = resolver
+        extension.request_scheduled(Request('http://a.test/page'), spider)
+        extension.prefetch_urls(['http://www.test/', 'http://10.0.0.5/'])
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertEqual(sorted(set(self.authority.queries)), ['a.test', 'www.test'])
+
+        self.assertEqual((yield resolver.getHostByName('a.test')), '10.0.0.1')
+        extension.spider_closed(spider)
+        self.assertEqual(crawler.stats.get_value('dns/prefetched'), 2)
+        self.assertEqual(crawler.stats.get_value('dns/prefetch_hits'), 1)
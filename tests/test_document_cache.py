@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Tests for document content-hash deduplication
+"""
+
+import unittest
+import json
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.exceptions import StopDownload
+from scrapy.http import Headers, Request, Response
+from twisted.internet import defer
+from scrapy.utils.test import get_crawler
+
+from utils.blobstore import blob_hash
+from utils.document_cache import DocumentCache
+from webcrawler.items import DocumentItem
+from webcrawler.pipelines import DocumentProcessingPipeline
+from webcrawler.spiders.main_spider import MainSpider
+
+KB = 1024
+
+
+class CountingProcessor:
+
+    def __init__(self):
+        self.calls = 0
+
+    def process_document(self, content, file_type, content_type=None):
+        self.calls += 1
+        return f'text of {len(content)} bytes'
+
+
+class DownloadingEngine:
+
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    def download(self, request):
+        self.requests.append(request)
+        return defer.succeed(Response(request.url, body=self.body, request=request))
+
+
+class TestDocumentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'documents.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_persistent_lookup_and_prefix(self):
+        content = b'%PDF' + b'x' * 10 * KB
+        cache = DocumentCache(self.path, prefix_bytes=KB)
+        cache.add(blob_hash(content), 'http://a.com/doc.pdf', content, 'pdf', 'text', {'title': 'Doc'}, 3)
+        cache.close()
+
+        cache = DocumentCache(self.path, prefix_bytes=KB)
+        document = cache.get(blob_hash(content))
+        self.assertEqual(document['url'], 'http://a.com/doc.pdf')
+        self.assertEqual(document['metadata'], {'title': 'Doc'})
+        self.assertEqual(document['page_count'], 3)
+        self.assertEqual(cache.find_prefix(len(content), content[:KB]), blob_hash(content))
+        self.assertIsNone(cache.find_prefix(len(content) + 1, content[:KB]))
+        self.assertIsNone(cache.find_prefix(len(content), b'%PDG' + content[4:KB]))
+        cache.close()
+
+
+class TestDocumentDedupPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.crawler = get_crawler(MainSpider, {
+            'DOCUMENT_DEDUP_PATH': os.path.join(self.tmpdir, 'documents.sqlite3'),
+            'DOCUMENT_DEDUP_PREFIX_KB': 1,
+            'DOCUMENT_ALIASES_FILE': os.path.join(self.tmpdir, 'aliases.jsonl'),
+        })
+        self.crawler.stats.open_spider(None)
+        self.spider = self.crawler._create_spider()
+        self.pipeline = DocumentProcessingPipeline.from_crawler(self.crawler)
+        self.pipeline.processor = CountingProcessor()
+        self.pipeline.open_spider(self.spider)
+        self.content = b'%PDF-1.4 ' + b'y' * 10 * KB
+
+    def tearDown(self):
+        if self.pipeline.cache is not None:
+            self.pipeline.close_spider(self.spider)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def document(self, url, content=None, **fields):
+        return DocumentItem(url=url, file_type='pdf', content=self.content if content is None else content,
+                            metadata={'server': 'test'}, **fields)
+
+    def test_copies_are_processed_once_and_exported_as_aliases(self):
+        first = self.pipeline.process_item(self.document('http://a.com/doc.pdf'), self.spider)
+        second = self.pipeline.process_item(self.document('http://b.com/copy.pdf'), self.spider)
+        self.assertEqual(self.pipeline.processor.calls, 1)
+        self.assertEqual(second['text_content'], first['text_content'])
+        self.assertEqual(second['alias_of'], 'http://a.com/doc.pdf')
+        self.assertEqual(second['content_hash'], blob_hash(self.content))
+        self.assertNotIn('content', second)
+        # Other content is processed
+        self.pipeline.process_item(self.document('http://a.com/other.pdf', b'other'), self.spider)
+        self.assertEqual(self.pipeline.processor.calls, 2)
+
+        self.pipeline.close_spider(self.spider)
+        with open(os.path.join(self.tmpdir, 'aliases.jsonl'), encoding='utf-8') as f:
+            aliases = [json.loads(line) for line in f]
+        self.assertEqual(aliases, [{'url': 'http://b.com/copy.pdf', 'alias_of': 'http://a.com/doc.pdf',
+                                    'content_hash': blob_hash(self.content)}])
+        self.assertEqual(self.crawler.stats.get_value('documents/aliases'), 1)
+
+    def test_prefix_match_stops_download(self):
+        self.pipeline.process_item(self.document('http://a.com/doc.pdf'), self.spider)
+        request = Request('http://b.com/copy.pdf')
+        headers = Headers({'Content-Type': 'application/pdf'})
+        self.pipeline.headers_received(headers, len(self.content), request, self.spider)
+        self.pipeline.bytes_received(self.content[:512], request, self.spider)
+        with self.assertRaises(StopDownload):
+            self.pipeline.bytes_received(self.content[512:2 * KB], request, self.spider)
+        self.assertEqual(request.meta['document_content_hash'], blob_hash(self.content))
+
+        # The spider passes the hash on with the partial body
+        item = self.document('http://b.com/copy.pdf', self.content[:2 * KB],
+                             content_hash=request.meta['document_content_hash'])
+        item = self.pipeline.process_item(item, self.spider)
+        self.assertEqual(self.pipeline.processor.calls, 1)
+        self.assertEqual(item['file_size'], len(self.content))
+        self.assertEqual(item['alias_of'], 'http://a.com/doc.pdf')
+
+    def test_prefix_of_a_document_no_longer_cached_is_not_processed(self):
+        self.pipeline.process_item(self.document('http://a.com/doc.pdf'), self.spider)
+        request = Request('http://b.com/copy.pdf')
+        self.pipeline.headers_received(Headers({'Content-Type': 'application/pdf'}), len(self.content),
+                                       request, self.spider)
+        with self.assertRaises(StopDownload):
+            self.pipeline.bytes_received(self.content[:2 * KB], request, self.spider)
+        # The document is gone by the time the stopped download's item arrives
+        self.pipeline.cache.db.execute('DELETE FROM documents')
+
+        self.crawler.engine = DownloadingEngine(self.content)
+        item = self.document('http://b.com/copy.pdf', self.content[:2 * KB],
+                             content_hash=request.meta['document_content_hash'])
+        results = []
+        self.pipeline.process_item(item, self.spider).addCallback(results.append)
+        full_request, = self.crawler.engine.requests
+        self.assertTrue(full_request.meta['document_full_download'])
+        self.assertTrue(full_request.meta['dont_dedup'])
+        item, = results
+        self.assertEqual(item['text_content'], f'text of {len(self.content)} bytes')
+        self.assertEqual(item['file_size'], len(self.content))
+        self.assertEqual(item['content_hash'], blob_hash(self.content))
+        self.assertNotIn('alias_of', item)
+        self.assertEqual(self.crawler.stats.get_value('documents/full_downloads'), 1)
+        # The full download is not stopped again
+        self.pipeline.headers_received(Headers({'Content-Type': 'application/pdf'}), len(self.content),
+                                       full_request, self.spider)
+        self.pipeline.bytes_received(self.content, full_request, self.spider)
+        self.assertNotIn('document_content_hash', full_request.meta)
+
+    def test_other_downloads_are_not_watched(self):
+        self.pipeline.process_item(self.document('http://a.com/doc.pdf'), self.spider)
+        for url, size, headers in [
+            ('http://b.com/page.html', len(self.content), {'Content-Type': 'text/html'}),
+            ('http://b.com/copy.pdf', len(self.content) + 1, {'Content-Type': 'application/pdf'}),
+            ('http://b.com/copy.pdf', len(self.content), {'Content-Encoding': 'gzip'}),
+        ]:
+            request = Request(url)
+            self.pipeline.headers_received(Headers(headers), size, request, self.spider)
+            self.pipeline.bytes_received(self.content, request, self.spider)
+            self.assertNotIn('document_content_hash', request.meta)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared crawl frontier
+"""
+
+import unittest
+import os
+import sys
+import socketserver
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webcrawler.frontier import MemoryFrontierBackend, RedisConnection, RedisFrontierBackend
+from webcrawler.spiders.main_spider import MainSpider
+
+
+class StandInRedis:
+    """In-memory implementation of the Redis commands used by the frontier"""
+
+    WRITES = frozenset(['sadd', 'srem', 'rpush', 'lpush', 'ltrim', 'hset', 'hdel', 'set', 'pexpire', 'del'])
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        # Bumped on every write, for WATCH
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get_key(self, key, default=None):
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return self.data.get(key, default)
+
+    def run(self, name, args):
+        with self.lock:
+            return self.call(name, args)
+
+    def call(self, name, args):
+        name = name.lower()
+        if name in self.WRITES:
+            for key in (args if name == 'del' else args[:1]):
+                self.versions[key] = self.versions.get(key, 0) + 1
+        return getattr(self, 'cmd_' + name)(*args)
+
+    def watch(self, keys):
+        with self.lock:
+            return {key: self.versions.get(key, 0) for key in keys}
+
+    def transaction(self, watched, commands):
+        """EXEC: run the queued commands, or nothing if a watched key changed"""
+        with self.lock:
+            if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                return None
+            return [self.call(args[0], args[1:]) for args in commands]
+
+    def cmd_sadd(self, key, *members):
+        members_set = self.data.setdefault(key, set())
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        return added
+
+    def cmd_srem(self, key, *members):
+        members_set = self.get_key(key, set())
+        removed = len(members_set & set(members))
+        members_set.difference_update(members)
+        return removed
+
+    def cmd_scard(self, key):
+        return len(self.get_key(key, set()))
+
+    def cmd_sismember(self, key, member):
+        return int(member in self.get_key(key, set()))
+
+    def cmd_srandmember(self, key, count):
+        return list(self.get_key(key, set()))[:int(count)]
+
+    def cmd_rpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        items.extend(values)
+        return len(items)
+
+    def cmd_lpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def cmd_lrange(self, key, start, stop):
+        items = self.get_key(key, [])
+        stop = int(stop)
+        return items[int(start):None if stop == -1 else stop + 1]
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self.get_key(key, [])
+        items[:] = self.cmd_lrange(key, start, stop)
+        return 'OK'
+
+    def cmd_llen(self, key):
+        return len(self.get_key(key, []))
+
+    def cmd_hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+        return 1
+
+    def cmd_hdel(self, key, *fields):
+        table = self.get_key(key, {})
+        return sum(1 for field in fields if table.pop(field, None) is not None)
+
+    def cmd_hlen(self, key):
+        return len(self.get_key(key, {}))
+
+    def cmd_hgetall(self, key):
+        flat = []
+        for field, value in self.get_key(key, {}).items():
+            flat.extend([field, value])
+        return flat
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        if 'NX' in options and self.get_key(key) is not None:
+            return None
+        self.data[key] = value
+        self.expiry.pop(key, None)
+        if 'PX' in options:
+            self.expiry[key] = time.monotonic() + int(options[options.index('PX') + 1]) / 1000
+        return 'OK'
+
+    def cmd_get(self, key):
+        return self.get_key(key)
+
+    def cmd_pexpire(self, key, ms):
+        if self.get_key(key) is None:
+            return 0
+        self.expiry[key] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def cmd_del(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+
+def encode_reply(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if value in ('OK', 'QUEUED'):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    return b'*%d\r\n' % len(value) + b''.join(encode_reply(v) for v in value)
+
+
+class StandInHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        # Transaction state of this connection
+        watched = {}
+        queued = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            self.server.commands += 1
+            name = args[0].upper()
+            try:
+                if name == 'WATCH':
+                    watched.update(self.server.store.watch(args[1:]))
+                    result = 'OK'
+                elif name == 'UNWATCH':
+                    watched = {}
+                    result = 'OK'
+                elif name == 'MULTI':
+                    queued = []
+                    result = 'OK'
+                elif name == 'EXEC':
+                    result = self.server.store.transaction(watched, queued)
+                    watched, queued = {}, None
+                elif queued is not None:
+                    queued.append(args)
+                    result = 'QUEUED'
+                else:
+                    result = self.server.store.run(args[0], args[1:])
+                reply = encode_reply(result)
+            except Exception as e:
+                reply = b'-ERR %s\r\n' % str(e).encode()
+            self.wfile.write(reply)
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.store = StandInRedis()
+        self.commands = 0
+
+
+class TestMemoryFrontier(unittest.TestCase):
+
+    def test_push_deduplicates(self):
+        frontier = MemoryFrontierBackend()
+        self.assertEqual(frontier.push([('http://a.com/1', 0), ('http://a.com/1', 1)]), 1)
+        self.assertEqual(frontier.pop(10), [('http://a.com/1', 0)])
+        self.assertTrue(frontier.has_pending())
+        frontier.mark_done(['http://a.com/1'])
+        self.assertFalse(frontier.has_pending())
+
+
+class TestRedisFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_backend(self, node_id, lease_timeout=60):
+        connection = RedisConnection('127.0.0.1', self.server.server_address[1])
+        backend = RedisFrontierBackend(connection, prefix='test', lease_timeout=lease_timeout, node_id=node_id)
+        self.backends.append(backend)
+        return backend
+
+    def test_push_and_pop_batch(self):
+        node = self.make_backend('node-a')
+        urls = [(f'http://a.com/{i}', 1) for i in range(20)]
+        self.assertEqual(node.push(urls), 20)
+        self.assertEqual(node.push(urls[:5]), 0)
+
+        before = self.server.commands
+        popped = node.pop(10)
+        self.assertEqual(len(popped), 10)
+        self.assertEqual(popped[0], ('http://a.com/0', 1))
+        # A batch costs a handful of round trips, not one per URL
+        self.assertLess(self.server.commands - before, 20)
+
+    def test_host_lease_is_exclusive(self):
+        node_a = self.make_backend('node-a')
+        node_b = self.make_backend('node-b')
+        node_a.push([('http://a.com/1', 0), ('http://a.com/2', 0)])
+
+        self.assertEqual(len(node_a.pop(1)), 1)
+        self.assertEqual(node_b.pop(10), [])
+
+    def test_expired_lease_is_taken_over_without_refetching(self):
+        node_a = self.make_backend('node-a', lease_timeout=0.2)
+        node_b = self.make_backend('node-b')
+        node_a.push([('http://a.com/1', 0), ('http://a.com/2', 0), ('http://a.com/3', 0)])
+
+        popped = node_a.pop(2)
+        node_a.mark_done([popped[0][0]])
+        # node-a dies here without finishing popped[1]
+        time.sleep(0.3)
+
+        urls = [url for url, _ in node_b.pop(10)]
+        self.assertNotIn(popped[0][0], urls)
+        self.assertCountEqual(urls, [popped[1][0], 'http://a.com/3'])
+        self.assertEqual(node_b.pop_recovered(), {popped[1][0]})
+        self.assertEqual(node_b.pop_recovered(), set())
+
+    def test_heartbeat_keeps_leases_between_pops(self):
+        node_a = self.make_backend('node-a', lease_timeout=0.3)
+        node_b = self.make_backend('node-b')
+        node_a.push([('http://a.com/1', 0), ('http://a.com/2', 0)])
+        node_a.pop(1)
+
+        spider = MainSpider()
+        spider.frontier = node_a
+        spider.frontier_lease_timeout = 0.3
+        spider.open_frontier(spider)
+        self.assertAlmostEqual(spider.frontier_heartbeat.interval, 0.1)
+        spider.frontier_heartbeat.stop()
+        # A slow batch: no pop for longer than the lease, only heartbeats
+        for _ in range(4):
+            time.sleep(0.1)
+            spider.renew_frontier_leases()
+        self.assertEqual(node_b.pop(10), [])
+        self.assertIn('a.com', node_a.leases)
+
+    def test_host_released_when_drained(self):
+        node = self.make_backend('node-a')
+        node.push([('http://a.com/1', 0)])
+        node.mark_done([url for url, _ in node.pop(5)])
+        self.assertFalse(node.has_pending())
+        self.assertEqual(node.leases, {})
+
+    def test_host_kept_when_work_arrives_while_retiring(self):
+        node_a = self.make_backend('node-a')
+        node_b = self.make_backend('node-b')
+        node_a.push([('http://a.com/1', 0)])
+        popped = node_a.pop(5)
+
+        # node-b pushes for the host between node-a's emptiness check and its removal
+        pipeline = node_a.conn.pipeline
+
+        def interleaved(commands):
+            if commands and commands[0] == ('MULTI',):
+                node_b.push([('http://a.com/2', 0)])
+            return pipeline(commands)
+
+        node_a.conn.pipeline = interleaved
+        node_a.mark_done([url for url, _ in popped])
+        node_a.conn.pipeline = pipeline
+        self.assertIn('a.com', node_a.leases)
+        self.assertTrue(node_a.has_pending())
+        self.assertEqual(node_a.pop(5), [('http://a.com/2', 0)])
+
+    def test_popped_entries_are_moved_in_flight_atomically(self):
+        node_a = self.make_backend('node-a')
+        node_b = self.make_backend('node-b')
+        node_a.push([('http://a.com/1', 0), ('http://a.com/2', 0)])
+        node_a.pop(1)
+
+        # node-b pushes for the host between node-a's read and its move
+        pipeline = node_a.conn.pipeline
+        interleaved_pushes = []
+
+        def interleaved(commands):
+            if commands and commands[0] == ('MULTI',) and not interleaved_pushes:
+                interleaved_pushes.append(node_b.push([('http://a.com/3', 0)]))
+            return pipeline(commands)
+
+        node_a.conn.pipeline = interleaved
+        self.assertEqual(node_a.pop(5), [('http://a.com/2', 0), ('http://a.com/3', 0)])
+        node_a.conn.pipeline = pipeline
+        self.assertEqual(interleaved_pushes, [1])
+        store = self.server.store
+        self.assertEqual(store.data['test:q:a.com'], [])
+        self.assertEqual(len(store.data['test:inflight:a.com']), 3)
+
+    def test_shared_seen_set(self):
+        node_a = self.make_backend('node-a')
+        node_b = self.make_backend('node-b')
+        self.assertEqual(node_a.add_seen(['x', 'y']), [True, True])
+        self.assertEqual(node_b.add_seen(['y', 'z']), [False, True])
+        node_b.remove_seen(['y'])
+        self.assertEqual(node_a.add_seen(['y']), [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the full-text index
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.spiders import Spider
+from twisted.internet.defer import Deferred
+
+from utils import fulltext
+from utils.fulltext import IndexReader, IndexWriter, decode_postings, encode_postings, read_manifest, tokenize
+from webcrawler.items import DocumentItem, WebPageItem
+from webcrawler.pipelines import SearchIndexPipeline
+
+
+class TestPostings(unittest.TestCase):
+
+    def test_postings_round_trip(self):
+        postings = [(0, 1), (5, 3), (127, 1), (128, 200), (100000, 2)]
+        self.assertEqual(list(decode_postings(encode_postings(postings))), postings)
+
+    def test_tokenize_drops_stopwords(self):
+        self.assertEqual(tokenize('The Crawler and the Index'), ['crawler', 'index'])
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def search(self, query, **kwargs):
+        reader = IndexReader(self.tmpdir)
+        try:
+            return [url for _, url in reader.search(query, **kwargs)]
+        finally:
+            reader.close()
+
+    def test_segments_are_merged(self):
+        writer = IndexWriter(self.tmpdir, flush_docs=2, merge_factor=2, background_merge=False)
+        for i in range(8):
+            writer.add(f'http://example.com/{i}', f'page number{i} shared words')
+        writer.add('http://example.com/python', 'python python crawler')
+        writer.close()
+
+        self.assertGreater(writer.merges, 0)
+        self.assertLess(len(read_manifest(self.tmpdir)['segments']), 5)
+        self.assertEqual(self.search('number3'), ['http://example.com/3'])
+        self.assertEqual(self.search('python'), ['http://example.com/python'])
+        self.assertEqual(len(self.search('shared', top=20)), 8)
+
+    def test_bm25_prefers_frequent_term_in_short_document(self):
+        writer = IndexWriter(self.tmpdir, background_merge=False)
+        writer.add('http://example.com/short', 'scrapy scrapy spider')
+        writer.add('http://example.com/long', 'scrapy ' + ' '.join(f'filler{i}' for i in range(50)))
+        writer.add('http://example.com/other', 'nothing relevant here')
+        writer.close()
+        self.assertEqual(self.search('scrapy'), ['http://example.com/short', 'http://example.com/long'])
+
+    def test_recrawl_replaces_older_copy(self):
+        writer = IndexWriter(self.tmpdir, flush_docs=2, merge_factor=10, background_merge=False)
+        writer.add('http://example.com/a', 'old topic')
+        writer.add('http://example.com/b', 'unrelated')
+        writer.add('http://example.com/a', 'new topic')
+        writer.add('http://example.com/a', 'newest topic')
+        writer.close()
+        self.assertEqual(self.search('old'), [])
+        self.assertEqual(self.search('new'), [])
+        self.assertEqual(self.search('topic'), ['http://example.com/a'])
+
+    def test_champion_lists_match_exact_top_results(self):
+        self.addCleanup(setattr, fulltext, 'CHAMPION_THRESHOLD', fulltext.CHAMPION_THRESHOLD)
+        self.addCleanup(setattr, fulltext, 'CHAMPION_SIZE', fulltext.CHAMPION_SIZE)
+        fulltext.CHAMPION_THRESHOLD = 10
+        fulltext.CHAMPION_SIZE = 5
+        writer = IndexWriter(self.tmpdir, flush_docs=20, merge_factor=2, background_merge=False)
+        for i in range(40):
+            writer.add(f'http://example.com/{i}', 'common ' * (1 + i % 7) + 'filler ' * (i % 5))
+        writer.close()
+        exact = self.search('common', top=3, exact=True)
+        self.assertEqual(self.search('common', top=3), exact)
+        self.assertEqual(len(self.search('common', top=40)), 5)
+        self.assertEqual(len(self.search('common', top=40, exact=True)), 40)
+
+
+class TestSearchIndexPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_pages_and_documents_are_indexed(self):
+        pipeline = SearchIndexPipeline(self.tmpdir, flush_docs=2, merge_factor=2, queue_size=1)
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        items = [WebPageItem(url=f'http://example.com/{i}', text_content=f'web page {i}') for i in range(5)]
+        passed = []
+        for item in items:
+            result = pipeline.process_item(item, spider)
+            if isinstance(result, Deferred):
+                result.addCallback(passed.append)
+            else:
+                passed.append(result)
+        document = DocumentItem(url='http://example.com/report.pdf', file_type='pdf',
+                                text_content='quarterly report')
+        pipeline.process_item(document, spider)
+        pipeline.process_item(WebPageItem(url='http://example.com/empty'), spider)
+        pipeline.close_spider(spider)
+        self.assertEqual(passed, items)
+
+        reader = IndexReader(self.tmpdir)
+        self.assertEqual(reader.doc_count, 6)
+        self.assertEqual([url for _, url in reader.search('quarterly')], ['http://example.com/report.pdf'])
+        self.assertEqual(len(reader.search('web page', top=10)), 5)
+        reader.close()
+
+    def test_full_queue_defers_items(self):
+        pipeline = SearchIndexPipeline(self.tmpdir, queue_size=1)
+        spider = Spider('test')
+        first = WebPageItem(url='http://example.com/1', text_content='one')
+        second = WebPageItem(url='http://example.com/2', text_content='two')
+        self.assertIs(pipeline.process_item(first, spider), first)
+        # No indexer thread yet, the second item waits instead of blocking
+        waiter = pipeline.process_item(second, spider)
+        passed = []
+        waiter.addCallback(passed.append)
+        self.assertEqual(passed, [])
+        pipeline.queue.queue.get()
+        pipeline.queue.refill()
+        self.assertEqual(passed, [second])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for HTML to text conversion
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from scrapy.http import HtmlResponse
+
+from utils.html_text import html_to_text, iter_text
+from webcrawler.spiders.main_spider import MainSpider
+
+FIXTURES = [
+    '<html><body><h1>Title</h1><p>Content</p></body></html>',
+    '''<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8">
+  <title>News &amp; Updates</title>
+  <style>body { font: 12px sans-serif }</style>
+  <script>var tags = "<p>not text</p>"; if (a < b && c) { run(); }</script>
+</head>
+<body>
+  <nav><a href="/">Home</a> | <a href="/about">About</a></nav>
+  <!-- main content -->
+  <article>
+    <h2>Caf&eacute; prices   rise</h2>
+    <p>Prices rose&nbsp;5% in&#160;March.<br>Analysts <b>expect</b> <i>more</i>.
+    <p>Second paragraph	with a tab,  two spaces and &lt;brackets&gt;.
+  </article>
+  <ul>
+    <li>One
+    <li>Two</li>
+  </ul>
+  <table>
+    <tr><td>1</td> <td>First</td></tr>
+    <tr><td>2</td><td>Second</td></tr>
+  </table>
+  <form><label>Search</label><input name="q"> <select><option>All</option> <option>News</option></select></form>
+  <pre>  keep
+    this  </pre>
+  <footer>&copy; 2024 Example</footer>
+</body>
+</html>''',
+    '<div><span>a &nbsp;</span>  <a href="/x">b &nbsp; page.</a></div>\r\n<div>windows\rline</div>',
+    'Plain text without tags  and   runs of spaces',
+]
+
+
+def bs4_text(html):
+    """The previous DocumentProcessor.process_html_document"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+class TestHtmlText(unittest.TestCase):
+
+    def test_same_text_as_beautifulsoup(self):
+        for html in FIXTURES:
+            self.assertEqual(html_to_text(html), bs4_text(html))
+        self.assertNotIn('not text', html_to_text(FIXTURES[1]))
+
+    def test_text_nodes_stream_in_chunks(self):
+        html = '<body><p>a&amp;b</p>x<!-- c -->y<script>z</script>' + '<p>long</p>' * 1000 + '</body>'
+        for chunk_size in (1, 7, 65536):
+            nodes = list(iter_text(html, chunk_size=chunk_size))
+            self.assertEqual(nodes[:3], ['a&b', 'x', 'y'])
+            self.assertEqual(len(nodes), 1003)
+        self.assertEqual(list(iter_text('')), [])
+
+    def test_spider_text_content(self):
+        html = ('<html><head><title>T</title><script>s()</script></head>'
+                '<body>direct <p>one <b>two</b></p>\n<style>p {}</style><p>three</p></body></html>')
+        response = HtmlResponse('http://example.com/', body=html.encode('utf-8'), encoding='utf-8')
+        self.assertEqual(MainSpider().extract_text_content(response), 'direct one two three')
+        self.assertEqual(list(iter_text(html, within='body')), ['direct ', 'one ', 'two', '\n', 'three'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite HTTP cache storage
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+from webcrawler.httpcache import SqliteCacheStorage
+
+
+class TestSqliteCacheStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.crawler = get_crawler(Spider, {
+            'HTTPCACHE_DIR': self.tmpdir,
+            'HTTPCACHE_EXPIRATION_SECS': 0,
+            'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
+        })
+        self.spider = self.crawler._create_spider('cache_test')
+        self.storage = SqliteCacheStorage(self.crawler.settings)
+        self.storage.open_spider(self.spider)
+
+    def tearDown(self):
+        self.storage.close_spider(self.spider)
+        shutil.rmtree(self.tmpdir)
+
+    def store(self, url, body, status=200):
+        request = Request(url)
+        response = HtmlResponse(url, status=status, body=body, headers={'Content-Type': 'text/html'})
+        self.storage.store_response(self.spider, request, response)
+        return request
+
+    def test_roundtrip(self):
+        request = self.store('http://example.com/a', b'<html><body>Hello</body></html>', status=203)
+        cached = self.storage.retrieve_response(self.spider, request)
+        self.assertIsInstance(cached, HtmlResponse)
+        self.assertEqual(cached.status, 203)
+        self.assertEqual(cached.body, b'<html><body>Hello</body></html>')
+        self.assertEqual(cached.headers['Content-Type'], b'text/html')
+        self.assertIsNone(self.storage.retrieve_response(self.spider, Request('http://example.com/missing')))
+
+    def test_identical_bodies_stored_once(self):
+        for i in range(5):
+            self.store(f'http://example.com/{i}', b'<html>same error page</html>')
+        cache = self.storage.cache
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(cache.db.execute('SELECT COUNT(*) FROM bodies').fetchone()[0], 1)
+
+    def test_bulk_expiry_removes_orphan_bodies(self):
+        self.store('http://example.com/old', b'old body')
+        cache = self.storage.cache
+        cache.db.execute('UPDATE responses SET stored_at = ?', (time.time() - 7200,))
+        self.store('http://example.com/new', b'new body')
+        self.assertEqual(cache.expire(time.time() - 3600), 1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.db.execute('SELECT COUNT(*) FROM bodies').fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
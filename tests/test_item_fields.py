@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for page field projection, truncation and link/image records
+"""
+
+import unittest
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+
+from webcrawler.items import ImageRecord, LinkRecord, WebPageItem, json_default
+from webcrawler.spiders.main_spider import MainSpider
+
+
+PAGE = b"""<html><head><title>Example page</title>
+<meta name="description" content="A description"></head>
+<body><h1>Heading</h1><p>Some body text for the page.</p>
+<a href="/a">First</a><a href="/b">Second</a><a href="https://other.example/">Other</a>
+<img src="/logo.png" alt="Logo"><img src="/photo.jpg" alt="Photo">
+</body></html>"""
+
+
+def response():
+    url = 'http://example.com/'
+    return HtmlResponse(url, body=PAGE, encoding='utf-8', request=Request(url, meta={'depth': 0}))
+
+
+def page_item(spider):
+    return next(item for item in spider.parse_webpage(response(), 0) if isinstance(item, WebPageItem))
+
+
+class TestItemFields(unittest.TestCase):
+
+    def test_all_fields_by_default(self):
+        item = page_item(MainSpider())
+        self.assertEqual(item['title'], 'Example page')
+        self.assertEqual(len(item['links']), 5)
+        self.assertEqual(item['links'][0], {'url': 'http://example.com/a', 'text': 'First', 'type': 'internal'})
+        self.assertEqual(item['images'][1]['alt'], 'Photo')
+
+    def test_unselected_fields_are_not_extracted(self):
+        spider = MainSpider()
+        spider.configure_item_fields(['title', 'text_content'], {})
+        calls = []
+        spider.extract_images = lambda response: calls.append('images')
+        item = page_item(spider)
+        self.assertEqual(set(item.keys()), {'url', 'title', 'text_content'})
+        self.assertEqual(calls, [])
+        # Links are still followed when they are not stored
+        requests = [r for r in spider.parse_webpage(response(), 0) if isinstance(r, Request)]
+        self.assertEqual(len(requests), 2)
+
+    def test_field_limits(self):
+        spider = MainSpider()
+        spider.configure_item_fields([], {'text_content': 10, 'links': 2})
+        item = page_item(spider)
+        self.assertEqual(item['text_content'], 'Heading So')
+        self.assertEqual(len(item['links']), 2)
+        self.assertEqual(len(item['images']), 2)
+
+    def test_unknown_fields_are_rejected(self):
+        spider = MainSpider()
+        self.assertRaises(ValueError, spider.configure_item_fields, ['title', 'body'], {})
+        self.assertRaises(ValueError, spider.configure_item_fields, [], {'headers': 3})
+
+    def test_records_serialize_as_dicts(self):
+        item = {'links': [LinkRecord('http://example.com/a', 'A')], 'images': [ImageRecord('http://example.com/i.png')]}
+        self.assertEqual(json.loads(json.dumps(item, default=json_default)), {
+            'links': [{'url': 'http://example.com/a', 'text': 'A', 'type': 'internal'}],
+            'images': [{'url': 'http://example.com/i.png', 'alt': ''}],
+        })
+        self.assertFalse(hasattr(LinkRecord('http://example.com/'), '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
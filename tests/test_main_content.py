@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for main-content extraction
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from utils.main_content import MainContentExtractor
+from webcrawler.spiders.main_spider import MainSpider
+
+ARTICLE = ('This is the {} paragraph of the article, with more than enough words to be content. '
+           'It goes on for a second sentence as well.')
+
+
+def page(number, blurb='We are a small team writing about crawling and this blurb is on every page of the site.'):
+    return f'''<html><head><title>Story {number}</title><script>track()</script></head><body>
+<div id="cookie-banner"><p>We use cookies to make this site work, by continuing you accept them all.</p></div>
+<header><a href="/">Site</a><nav><ul><li><a href="/news">News</a></li><li><a href="/sport">Sport</a></li></ul></nav></header>
+<div class="content">
+  <h1>Story number {number}</h1>
+  <p class="byline">By <a href="/jane">Jane Doe</a></p>
+  <p>{ARTICLE.format(f'first {number}')}</p>
+  <p>A short line.</p>
+  <p>{ARTICLE.format(f'second {number}')}</p>
+  <ul><li><a href="/1">Read this other story</a></li><li><a href="/2">And this one too</a></li></ul>
+</div>
+<div class="col"><h3>About</h3><p>{blurb}</p></div>
+<footer><p>Copyright 2024 Example Company and its many partners around the whole world.</p></footer>
+</body></html>'''
+
+
+class TestMainContent(unittest.TestCase):
+
+    def test_keeps_article_text(self):
+        text = MainContentExtractor(template_min_pages=0).extract(page(1))
+        self.assertTrue(text.startswith('Story number 1 This is the first 1 paragraph'))
+        self.assertIn('A short line. This is the second 1 paragraph', text)
+        for boilerplate in ('cookies', 'News', 'Jane', 'other story', 'Copyright', 'track'):
+            self.assertNotIn(boilerplate, text)
+        # Without a text-dense block, everything but boilerplate is kept
+        self.assertEqual(MainContentExtractor().extract('<body><nav>Menu</nav><p>Contact</p><p>Hours</p></body>'),
+                         'Contact Hours')
+        self.assertEqual(MainContentExtractor().extract(''), '')
+
+    def test_template_learning(self):
+        extractor = MainContentExtractor(template_min_pages=3)
+        texts = [extractor.extract(page(number), 'a.com') for number in range(4)]
+        self.assertIn('small team', texts[1])
+        self.assertNotIn('small team', texts[2])
+        self.assertIn('This is the first 3 paragraph', texts[3])
+        # Other hosts learn their own template
+        self.assertIn('small team', extractor.extract(page(5), 'b.com'))
+        self.assertEqual(extractor.counts['pages'], 5)
+        self.assertGreater(extractor.counts['template_blocks'], 0)
+
+    def test_template_memory_is_bounded(self):
+        extractor = MainContentExtractor(max_hosts=2, max_blocks=20)
+        for host in ('a.com', 'b.com', 'c.com'):
+            extractor.extract(page(0), host)
+        self.assertEqual(list(extractor.hosts), ['b.com', 'c.com'])
+        for number in range(10):
+            extractor.extract(page(number, blurb=ARTICLE.format(number)), 'c.com')
+        self.assertLessEqual(len(extractor.hosts['c.com']), 20)
+        self.assertNotIn('Copyright', extractor.extract(page(10), 'c.com'))
+
+    def test_spider_text_content(self):
+        crawler = get_crawler(MainSpider, {'MAIN_CONTENT_ENABLED': True, 'MAIN_CONTENT_TEMPLATE_MIN_PAGES': 2})
+        crawler.stats.open_spider(None)
+        spider = MainSpider.from_crawler(crawler)
+        response = HtmlResponse('http://a.com/1', body=page(1).encode('utf-8'), encoding='utf-8')
+        self.assertNotIn('cookies', spider.extract_text_content(response))
+        spider.main_content_stats(spider)
+        self.assertEqual(crawler.stats.get_value('main_content/pages'), 1)
+        self.assertLess(crawler.stats.get_value('main_content/kept_chars'),
+                        crawler.stats.get_value('main_content/chars'))
+
+    def test_spider_keeps_all_text_by_default(self):
+        settings = Settings()
+        settings.setmodule('webcrawler.settings')
+        crawler = get_crawler(MainSpider, settings.copy_to_dict())
+        spider = MainSpider.from_crawler(crawler)
+        self.assertIsNone(spider.main_content)
+        response = HtmlResponse('http://a.com/1', body=page(1).encode('utf-8'), encoding='utf-8')
+        self.assertIn('cookies', spider.extract_text_content(response))
+
+    def test_spider_text_depends_on_crawl_order(self):
+        def crawl(numbers):
+            crawler = get_crawler(MainSpider, {'MAIN_CONTENT_ENABLED': True, 'MAIN_CONTENT_TEMPLATE_MIN_PAGES': 2})
+            spider = MainSpider.from_crawler(crawler)
+            return [spider.extract_text_content(HtmlResponse(f'http://a.com/{number}', encoding='utf-8',
+                                                             body=page(number).encode('utf-8')))
+                    for number in numbers]
+
+        texts = crawl([1, 2, 3])
+        # The site blurb is kept until it has been seen on two pages of the host
+        self.assertIn('small team', texts[0])
+        self.assertNotIn('small team', texts[1])
+        self.assertIn('This is the first 3 paragraph', texts[2])
+        # The same page crawled first keeps it
+        first, = crawl([3])
+        self.assertIn('small team', first)
+        self.assertNotEqual(first, texts[2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for document handling in MainSpider
+"""
+
+import unittest
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import Request, Response
+
+from webcrawler.items import DocumentItem
+from webcrawler.spiders.main_spider import MainSpider
+
+
+class TestDocumentParsing(unittest.TestCase):
+
+    def parse(self, url, content_type):
+        response = Response(url, body=b'%PDF-1.4', headers={'Content-Type': content_type, 'Content-Length': '8'},
+                            request=Request(url, meta={'depth': 1}))
+        return [item for item in MainSpider().parse(response) if isinstance(item, DocumentItem)]
+
+    def test_document_item(self):
+        items = self.parse('http://example.com/report.pdf', 'application/pdf')
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['file_type'], 'pdf')
+        self.assertEqual(items[0]['filename'], 'report.pdf')
+        self.assertEqual(items[0]['metadata'], {'content-type': 'application/pdf', 'content-length': '8'})
+
+    def test_document_metadata_from_repeated_headers(self):
+        url = 'http://example.com/report.pdf'
+        response = Response(url, body=b'%PDF-1.4', request=Request(url), headers={
+            'Content-Type': ['application/octet-stream', 'application/pdf'],
+            'Last-Modified': 'Mon, 19 Oct 2026 04:00:00 GMT',
+            'X-Extra': 'ignored',
+        })
+        self.assertEqual(MainSpider().extract_document_metadata(response), {
+            'content-type': 'application/pdf',
+            'last-modified': 'Mon, 19 Oct 2026 04:00:00 GMT',
+        })
+
+    def test_file_type_from_content_type(self):
+        items = self.parse('http://example.com/download/12', 'application/pdf; qs=0.001')
+        self.assertEqual(items[0]['file_type'], 'pdf')
+        items = self.parse('http://example.com/download/13',
+                           'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        self.assertEqual(items[0]['file_type'], 'docx')
+
+
+if __name__ == '__main__':
+    unittest.main()
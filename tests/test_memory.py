@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for the memory monitor extension
+"""
+
+import unittest
+import json
+import os
+import sys
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+from webcrawler.items import WebPageItem
+from webcrawler.memory import MemoryMonitor, container_sizes, module_name
+from webcrawler.pipelines import DeduplicationPipeline, WarcWriterPipeline
+from webcrawler.spiders.main_spider import MainSpider
+
+MB = 1024 * 1024
+
+
+class FakeEngine:
+
+    def __init__(self, spider, pipelines):
+        self.spider = spider
+        self.paused = False
+        self.slot = SimpleNamespace(inprogress=set(), scheduler=SimpleNamespace(df=SimpleNamespace(fingerprints={'a'})))
+        self.scraper = SimpleNamespace(slot=None, itemproc=SimpleNamespace(middlewares=pipelines))
+
+    def pause(self):
+        self.paused = True
+
+    def unpause(self):
+        self.paused = False
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_module_name(self):
+        paths = [os.path.join(os.sep, 'venv', 'site-packages'), os.path.join(os.sep, 'src')]
+        self.assertEqual(module_name(os.path.join(os.sep, 'venv', 'site-packages', 'pdfplumber', 'page.py'), paths),
+                         'pdfplumber.page')
+        self.assertEqual(module_name(os.path.join(os.sep, 'src', 'webcrawler', '__init__.py'), paths), 'webcrawler')
+        self.assertEqual(module_name('<frozen abc>', paths), '<frozen abc>')
+
+    def test_container_sizes(self):
+        pipeline = DeduplicationPipeline()
+        pipeline.urls_seen.update({'http://a/', 'http://b/'})
+        pipeline.helper = SimpleNamespace(cache={})
+        sizes = container_sizes(pipeline, 'Dedup')
+        self.assertEqual(sizes['Dedup.urls_seen'], 2)
+        # Only project objects are searched below the first level
+        self.assertNotIn('Dedup.helper.cache', sizes)
+
+
+class TestMemoryMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.report_file = os.path.join(self.tmpdir, 'memory.json')
+        self.crawler = get_crawler(MainSpider, {
+            'MEMORY_RSS_LIMIT_MB': 100,
+            'MEMORY_CHECK_INTERVAL': 0,
+            'MEMORY_REPORT_INTERVAL': 0,
+            'MEMORY_REPORT_FILE': self.report_file,
+        })
+        self.spider = self.crawler._create_spider()
+        self.pipeline = DeduplicationPipeline()
+        self.crawler.engine = FakeEngine(self.spider, (self.pipeline,))
+        self.monitor = MemoryMonitor.from_crawler(self.crawler)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def check(self, rss_mb):
+        self.monitor.rss = lambda: rss_mb * MB
+        self.monitor.check()
+        return self.crawler.engine.paused
+
+    def test_backpressure(self):
+        self.crawler.engine.slot.inprogress.add('request')
+        self.assertFalse(self.check(50))
+        self.assertTrue(self.check(95))
+        # Stays paused while requests are in flight and RSS is above the resume ratio
+        self.assertTrue(self.check(85))
+        self.assertFalse(self.check(70))
+        self.assertEqual(self.crawler.stats.get_value('memory/pauses'), 1)
+
+    def test_resume_when_drained_above_threshold(self):
+        self.assertTrue(self.check(95))
+        self.assertFalse(self.check(95))
+        # The next pause waits for another step of growth
+        self.assertFalse(self.check(99))
+        self.assertTrue(self.check(101))
+        self.assertEqual(self.crawler.stats.get_value('memory/limit_reached'), 1)
+
+    def test_pause_is_shared_with_the_warc_writer(self):
+        self.crawler.engine.slot.inprogress.add('request')
+        warc = WarcWriterPipeline(directory=self.tmpdir, queue_size=1)
+        warc.crawler = self.crawler
+        spider = Spider('test')
+        for i in range(2):
+            request = Request(f'http://example.com/{i}')
+            warc.response_received(HtmlResponse(request.url, body=b'', request=request), request, spider)
+        self.assertTrue(warc.paused)
+
+        self.assertTrue(self.check(95))
+        # Memory recovered first, the WARC queue is still full
+        self.assertTrue(self.check(70))
+        warc.queue.queue.get()
+        warc.queue.refill()
+        self.assertFalse(self.crawler.engine.paused)
+
+        # And the other way round
+        self.assertTrue(self.check(95))
+        warc.response_received(HtmlResponse(request.url, body=b'', request=request), request, spider)
+        self.assertTrue(warc.paused)
+        warc.queue.queue.get()
+        warc.queue.refill()
+        self.assertFalse(warc.paused)
+        self.assertTrue(self.crawler.engine.paused)
+        self.assertFalse(self.check(70))
+
+    def test_report(self):
+        self.spider.crawled_urls.update({'http://a/', 'http://b/', 'http://c/'})
+        self.pipeline.urls_seen.add('http://a/')
+        item = WebPageItem(url='http://a/')
+        self.monitor.spider_opened(self.spider)
+        self.monitor.spider_closed(self.spider, 'finished')
+        with open(self.report_file, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['containers']['spider.crawled_urls'], 3)
+        self.assertEqual(report['containers']['DeduplicationPipeline.urls_seen'], 1)
+        self.assertEqual(report['containers']['dupefilter.fingerprints'], 1)
+        self.assertGreaterEqual(report['live_instances']['WebPageItem'], 1)
+        self.assertGreater(report['rss_mb'], 0)
+        self.assertNotIn('allocations', report)
+        del item
+
+    def test_tracemalloc_report(self):
+        crawler = get_crawler(MainSpider, {'MEMORY_TRACEMALLOC': True, 'MEMORY_CHECK_INTERVAL': 0,
+                                           'MEMORY_REPORT_INTERVAL': 0, 'MEMORY_REPORT_FILE': ''})
+        crawler.engine = self.crawler.engine
+        monitor = MemoryMonitor.from_crawler(crawler)
+        monitor.spider_opened(self.spider)
+        try:
+            retained = [bytearray(1024) for _ in range(1000)]
+            allocations = monitor.report()['allocations']
+        finally:
+            monitor.spider_closed(self.spider, 'finished')
+        growth = {module: size for module, size in allocations['growth_since_start'].items()
+                  if module.endswith('test_memory')}
+        self.assertGreaterEqual(sum(growth.values()), 1000 * 1024)
+        del retained
+
+
+if __name__ == '__main__':
+    unittest.main()
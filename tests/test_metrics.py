@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the crawl metrics extension
+"""
+
+import unittest
+import json
+import os
+import sys
+import shutil
+import tempfile
+from collections import deque
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.exceptions import DropItem
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.defer import deferred_f_from_coro_f
+from scrapy.utils.test import get_crawler
+
+from webcrawler.metrics import CrawlMetrics, Histogram, MetricsRegistry
+from webcrawler.middlewares import WebcrawlerSpiderMiddleware
+from webcrawler.pipelines import ValidationPipeline
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram((0.1, 1.0, 10.0))
+        for value in (0.05, 0.1, 0.5, 0.7, 5.0, 50.0):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.counts), [2, 2, 1, 1])
+        self.assertEqual(histogram.count, 6)
+        self.assertEqual(histogram.quantile(0.5), 1.0)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry((0.1, 1.0))
+        registry.histogram('pipeline_seconds', stage='Validation').observe(0.5)
+        text = registry.render_prometheus({'scheduler_pending': 3}, {'bytes_in_total': 10})
+        self.assertIn('# TYPE webcrawler_pipeline_seconds histogram', text)
+        self.assertIn('webcrawler_pipeline_seconds_bucket{stage="Validation",le="0.1"} 0', text)
+        self.assertIn('webcrawler_pipeline_seconds_bucket{stage="Validation",le="+Inf"} 1', text)
+        self.assertIn('webcrawler_pipeline_seconds_count{stage="Validation"} 1', text)
+        self.assertIn('webcrawler_scheduler_pending 3', text)
+        self.assertIn('webcrawler_bytes_in_total 10', text)
+
+
+class TestCrawlMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.stats_file = os.path.join(self.tmpdir, 'metrics.json')
+        self.crawler = get_crawler(Spider, {
+            'METRICS_ENABLED': True,
+            'METRICS_PORT': [],
+            'METRICS_STATS_FILE': self.stats_file,
+            'METRICS_INTERVAL': 0,
+        })
+        self.crawler.stats.open_spider(None)
+        self.pipeline = ValidationPipeline()
+        itemproc = SimpleNamespace(
+            methods={'process_item': deque([deferred_f_from_coro_f(self.pipeline.process_item)])},
+            middlewares=(self.pipeline,),
+        )
+        self.crawler.engine = SimpleNamespace(scraper=SimpleNamespace(itemproc=itemproc), slot=None)
+        self.spider = self.crawler._create_spider('test')
+        self.metrics = CrawlMetrics.from_crawler(self.crawler)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_pipeline_stages_are_timed(self):
+        self.metrics.spider_opened(self.spider)
+        process_item = self.crawler.engine.scraper.itemproc.methods['process_item'][0]
+        item = {'url': 'http://example.com/'}
+        self.assertIs(process_item(item, self.spider), item)
+        self.assertRaises(DropItem, process_item, {}, self.spider)
+        histogram = self.metrics.registry.histogram('pipeline_seconds', stage='Validation')
+        self.assertEqual(histogram.count, 2)
+
+    def test_callbacks_and_downloads_are_timed(self):
+        self.metrics.spider_opened(self.spider)
+        request = Request('http://example.com/', callback=self.spider.parse, meta={'download_latency': 0.3})
+        response = Response('http://example.com/', request=request)
+        self.metrics.response_downloaded(response, request, self.spider)
+
+        middleware = WebcrawlerSpiderMiddleware()
+        output = list(middleware.process_spider_output(response, iter([1, 2, 3]), self.spider))
+        self.assertEqual(output, [1, 2, 3])
+        self.assertEqual(self.metrics.registry.histogram('parse_seconds', callback='parse').count, 1)
+        self.assertEqual(self.metrics.download_latency.count, 1)
+
+    def test_stats_file_written_on_close(self):
+        self.metrics.spider_opened(self.spider)
+        self.crawler.stats.set_value('downloader/response_bytes', 1234)
+        self.metrics.response_downloaded(None, Request('http://example.com/', meta={'download_latency': 0.3}), self.spider)
+        self.metrics.spider_closed(self.spider, 'finished')
+        with open(self.stats_file, encoding='utf-8') as f:
+            stats = json.load(f)
+        self.assertEqual(stats['counters']['bytes_in_total'], 1234)
+        self.assertEqual(stats['histograms']['download_latency_seconds']['count'], 1)
+        self.assertEqual(stats['histograms']['download_latency_seconds']['p50'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
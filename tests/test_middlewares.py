@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Tests for downloader middlewares
+"""
+
+import unittest
+import gzip
+import os
+import sys
+import zlib
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, reactor
+from twisted.internet.error import ConnectionRefusedError
+from twisted.trial import unittest as trial_unittest
+from twisted.web import resource, server
+
+from utils.compression import CONTENT_ENCODINGS, compress
+from webcrawler.frontier import MemoryFrontierBackend
+from webcrawler.metrics import MetricsRegistry
+from webcrawler.middlewares import (
+    CircuitBreaker, DecompressionMiddleware, PrefetchDedupMiddleware, WebcrawlerDownloaderMiddleware
+)
+
+
+class TestCircuitBreakerMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, {
+            'CIRCUIT_BREAKER_FAILURE_THRESHOLD': 3,
+            'CIRCUIT_BREAKER_RECOVERY_TIMEOUT': 10,
+            'CIRCUIT_BREAKER_MAX_TRIPS': 2,
+            'RETRY_TIMES': 3,
+            'RETRY_HTTP_CODES': [500, 503],
+            'RETRY_BUDGET_MIN_TOKENS': 1,
+            'RETRY_BUDGET_RATIO': 0.5,
+        })
+        self.crawler.stats.open_spider(None)
+        self.crawled = []
+        self.crawler.engine = SimpleNamespace(crawl=self.crawled.append)
+        self.spider = self.crawler._create_spider('test')
+        self.mw = WebcrawlerDownloaderMiddleware.from_crawler(self.crawler)
+        self.now = 1000.0
+        self.timers = []
+        self.mw.clock = lambda: self.now
+        self.mw.call_later = lambda delay, func, *args: self.timers.append((delay, func, args))
+
+    def fail(self, url='http://dead.com/', exception=None):
+        request = Request(url)
+        self.assertIsNone(self.mw.process_request(request, self.spider))
+        try:
+            self.mw.process_exception(request, exception or ConnectionRefusedError(), self.spider)
+        except IgnoreRequest:
+            pass
+        return request
+
+    def breaker(self, host='dead.com'):
+        return self.mw.breakers[host]
+
+    def test_opens_after_threshold_and_parks_requests(self):
+        for _ in range(3):
+            self.fail()
+        self.assertEqual(self.breaker().state, CircuitBreaker.OPEN)
+
+        request = Request('http://dead.com/page')
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(request, self.spider)
+        self.assertTrue(request.meta['circuit_breaker_deferred'])
+        self.assertEqual(len(self.mw.parked['dead.com']), 1)
+        with self.assertRaises(DontCloseSpider):
+            self.mw.spider_idle(self.spider)
+
+    def test_half_open_probe_closes_and_releases(self):
+        for _ in range(3):
+            self.fail()
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/a'), self.spider)
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/b'), self.spider)
+
+        # Recovery timer fires and hands one parked request back as a probe
+        self.now += 10
+        delay, func, args = [t for t in self.timers if t[1] == self.mw.release_probe][0]
+        self.assertEqual(delay, 10)
+        func(*args)
+        probe = self.crawled.pop()
+        self.assertIsNone(self.mw.process_request(probe, self.spider))
+        self.assertEqual(self.breaker().state, CircuitBreaker.HALF_OPEN)
+        # Only one probe at a time
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/c'), self.spider)
+
+        self.mw.process_response(probe, Response(probe.url, status=200), self.spider)
+        self.assertEqual(self.breaker().state, CircuitBreaker.CLOSED)
+        self.assertEqual([r.url for r in self.crawled], ['http://dead.com/b', 'http://dead.com/c'])
+
+    def open_with_probe(self):
+        for _ in range(3):
+            self.fail()
+        for path in ('a', 'b'):
+            with self.assertRaises(IgnoreRequest):
+                self.mw.process_request(Request(f'http://dead.com/{path}'), self.spider)
+        self.now += 10
+        probe = Request('http://dead.com/probe')
+        self.assertIsNone(self.mw.process_request(probe, self.spider))
+        self.assertTrue(self.breaker().probe_in_flight)
+        return probe
+
+    def test_redirected_probe_closes(self):
+        probe = self.open_with_probe()
+        # RedirectMiddleware answers the 301 before process_response runs here
+        self.mw.response_downloaded(Response(probe.url, status=301), probe, self.spider)
+        self.assertEqual(self.breaker().state, CircuitBreaker.CLOSED)
+        self.assertEqual(len(self.crawled), 2)
+        self.assertNotIn('circuit_breaker_probe', probe.meta)
+
+    def test_ignored_probe_hands_over_to_next_parked_request(self):
+        probe = self.open_with_probe()
+        self.mw.process_exception(probe, IgnoreRequest(), self.spider)
+        self.assertEqual(self.breaker().state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker().probe_in_flight)
+        self.assertEqual([r.url for r in self.crawled], ['http://dead.com/a'])
+        self.assertIsNone(self.mw.process_request(self.crawled.pop(), self.spider))
+        self.assertTrue(self.breaker().probe_in_flight)
+
+    def test_lost_probe_expires(self):
+        self.open_with_probe()
+        expiries = [t for t in self.timers if t[1] == self.mw.expire_probe]
+        delay, func, args = expiries[0]
+        self.assertEqual(delay, 10)
+        func(*args)
+        self.assertFalse(self.breaker().probe_in_flight)
+        self.assertEqual(self.crawler.stats.get_value('circuit_breaker/probes_expired'), 1)
+        # The released request probes next; the old timer no longer ends it
+        self.assertIsNone(self.mw.process_request(self.crawled.pop(), self.spider))
+        func(*args)
+        self.assertTrue(self.breaker().probe_in_flight)
+
+    def test_failed_probe_reopens_then_gives_up(self):
+        for _ in range(3):
+            self.fail()
+        self.now += 10
+        self.fail()
+        self.assertEqual(self.breaker().state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker().trips, 2)
+        self.now += 20
+        self.fail()
+        self.assertTrue(self.breaker().dead)
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/x'), self.spider)
+        self.assertFalse(self.mw.parked.get('dead.com'))
+
+    def test_retried_server_errors_do_not_count_again(self):
+        request = Request('http://mixed.com/broken')
+        for _ in range(4):
+            self.mw.process_request(request, self.spider)
+            try:
+                self.mw.process_response(request, Response(request.url, status=500), self.spider)
+            except IgnoreRequest:
+                request = self.timers.pop()[2][0]
+        self.assertEqual(self.breaker('mixed.com').failures, 1)
+        self.assertEqual(self.breaker('mixed.com').state, CircuitBreaker.CLOSED)
+
+    def test_probe_prefers_requests_that_have_not_failed(self):
+        for _ in range(3):
+            self.fail()
+        retried = Request('http://dead.com/retried', meta={'retry_times': 1})
+        for request in (retried, Request('http://dead.com/fresh')):
+            with self.assertRaises(IgnoreRequest):
+                self.mw.process_request(request, self.spider)
+        self.now += 10
+        # A retry reaching the half-open breaker first is parked again
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/retried-2', meta={'retry_times': 2}), self.spider)
+        self.mw.release_probe('dead.com')
+        probe = self.crawled.pop()
+        self.assertEqual(probe.url, 'http://dead.com/fresh')
+        self.assertIsNone(self.mw.process_request(probe, self.spider))
+        self.assertTrue(self.breaker().probe_in_flight)
+
+    def test_idle_spider_releases_a_lost_probe(self):
+        for _ in range(3):
+            self.fail()
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://dead.com/a'), self.spider)
+        with self.assertRaises(DontCloseSpider):
+            self.mw.spider_idle(self.spider)
+        self.assertEqual(self.crawled, [])
+        # The probe released by the timer never came back
+        self.now += 10
+        with self.assertRaises(DontCloseSpider):
+            self.mw.spider_idle(self.spider)
+        self.assertEqual([r.url for r in self.crawled], ['http://dead.com/a'])
+
+    def test_retries_drawn_from_budget_with_backoff(self):
+        request = Request('http://flaky.com/')
+        self.mw.process_request(request, self.spider)
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_response(request, Response(request.url, status=503), self.spider)
+        delay, func, args = self.timers[-1]
+        self.assertLessEqual(delay, 1.0)
+        self.assertEqual(args[0].meta['retry_times'], 1)
+
+        # Budget: 1 initial token + 0.5 per first attempt, one spent already
+        request = Request('http://flaky.com/2')
+        self.mw.process_request(request, self.spider)
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_response(request, Response(request.url, status=503), self.spider)
+        request = Request('http://flaky.com/3')
+        self.mw.process_request(request, self.spider)
+        response = self.mw.process_response(request, Response(request.url, status=503), self.spider)
+        self.assertEqual(response.status, 503)
+        self.assertEqual(self.crawler.stats.get_value('retry_budget/exhausted'), 1)
+
+    def test_client_errors_keep_breaker_closed(self):
+        for _ in range(5):
+            request = Request('http://ok.com/missing')
+            self.mw.process_request(request, self.spider)
+            self.mw.process_response(request, Response(request.url, status=404), self.spider)
+        self.assertNotIn('ok.com', self.mw.breakers)
+
+
+class MixedResource(resource.Resource):
+    """Pages under /broken/ always fail, every other page is fine"""
+
+    isLeaf = True
+
+    def render_GET(self, request):
+        if request.path.startswith(b'/broken/'):
+            request.setResponseCode(500)
+        return b'<html><body>page</body></html>'
+
+
+class MixedSpider(Spider):
+    name = 'mixed'
+
+    def start_requests(self):
+        # The broken pages first, so their failures come in a row
+        for i in range(3):
+            yield Request(f'{self.base_url}/broken/{i}', priority=1)
+        for i in range(20):
+            yield Request(f'{self.base_url}/page/{i}')
+
+    def parse(self, response):
+        pass
+
+
+class TestCircuitBreakerCrawl(trial_unittest.TestCase):
+    """A host answering mostly 200s with a few persistently broken URLs"""
+
+    def setUp(self):
+        self.port = reactor.listenTCP(0, server.Site(MixedResource()), interface='127.0.0.1')
+
+    def tearDown(self):
+        return self.port.stopListening()
+
+    @defer.inlineCallbacks
+    def test_broken_urls_do_not_stop_a_healthy_host(self):
+        crawler = get_crawler(MixedSpider, {
+            'DOWNLOADER_MIDDLEWARES': {
+                'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+                'webcrawler.middlewares.WebcrawlerDownloaderMiddleware': 543,
+            },
+            'CIRCUIT_BREAKER_FAILURE_THRESHOLD': 3,
+            'CIRCUIT_BREAKER_RECOVERY_TIMEOUT': 0.2,
+            'CIRCUIT_BREAKER_MAX_TRIPS': 3,
+            'RETRY_TIMES': 2,
+            'RETRY_HTTP_CODES': [500],
+            'RETRY_BACKOFF_BASE': 0.05,
+            'CONCURRENT_REQUESTS_PER_DOMAIN': 1,
+            'LOG_LEVEL': 'WARNING',
+        })
+        fetched = []
+        crawler.signals.connect(lambda response, **kwargs: fetched.append(response.url),
+                                signal=signals.response_received, weak=False)
+        yield crawler.crawl(base_url=f'http://127.0.0.1:{self.port.getHost().port}')
+
+        stats = crawler.stats.get_stats()
+        self.assertEqual(len({url for url in fetched if '/page/' in url}), 20)
+        self.assertIsNone(stats.get('circuit_breaker/dead_hosts'))
+        self.assertLessEqual(stats.get('circuit_breaker/opened', 0), 1)
+
+
+class TestPrefetchDedupMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider)
+        self.crawler.stats.open_spider(None)
+        self.spider = self.crawler._create_spider('test')
+        self.mw = PrefetchDedupMiddleware.from_crawler(self.crawler)
+        self.mw.spider_opened(self.spider)
+
+    def fetch(self, request, body=b''):
+        self.assertIsNone(self.mw.process_request(request, self.spider))
+        return self.mw.process_response(request, Response(request.url, body=body), self.spider)
+
+    def test_drops_canonical_duplicates(self):
+        self.fetch(Request('http://a.com/page?b=2&a=1#top'))
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://a.com/page?a=1&b=2'), self.spider)
+        self.assertIsNone(self.mw.process_request(Request('http://a.com/other'), self.spider))
+        self.assertEqual(self.crawler.stats.get_value('dedup/prefetch_dropped'), 1)
+
+    def test_retries_robots_and_opt_out_pass(self):
+        request = Request('http://a.com/')
+        self.fetch(request)
+        # Retries are copies of the request that claimed the URL
+        self.assertIsNone(self.mw.process_request(request.replace(dont_filter=True), self.spider))
+        self.fetch(Request('http://a.com/robots.txt'))
+        self.fetch(Request('http://a.com/robots.txt'))
+        self.fetch(Request('http://a.com/', meta={'dont_dedup': True}))
+
+    def test_claim_released_when_not_fetched(self):
+        frontier = MemoryFrontierBackend()
+        self.spider.frontier = frontier
+        self.mw.spider_opened(self.spider)
+        for exception in (IgnoreRequest('Forbidden by robots.txt'), ConnectionRefusedError()):
+            request = Request('http://a.com/private')
+            self.assertIsNone(self.mw.process_request(request, self.spider))
+            self.mw.process_exception(request, exception, self.spider)
+            self.assertEqual(frontier.seen['fetched'], set())
+        self.assertEqual(self.crawler.stats.get_value('dedup/prefetch_released'), 2)
+
+        # Parked requests keep their claim, fetched ones hold it
+        parked = Request('http://a.com/parked')
+        self.mw.process_request(parked, self.spider)
+        parked.meta['circuit_breaker_deferred'] = True
+        self.mw.process_exception(parked, IgnoreRequest(), self.spider)
+        self.fetch(Request('http://a.com/page'))
+        self.assertEqual(len(frontier.seen['fetched']), 2)
+        # A duplicate dropped here does not release the original's claim
+        duplicate = Request('http://a.com/page')
+        with self.assertRaises(IgnoreRequest) as dropped:
+            self.mw.process_request(duplicate, self.spider)
+        self.mw.process_exception(duplicate, dropped.exception, self.spider)
+        self.assertEqual(len(frontier.seen['fetched']), 2)
+
+    def test_recovered_frontier_entries_pass(self):
+        self.fetch(Request('http://a.com/'))
+        # Claimed by a node that died before marking the URL done
+        request = Request('http://a.com/', meta={'frontier_url': 'http://a.com/', 'frontier_recovered': True})
+        self.assertIsNone(self.mw.process_request(request, self.spider))
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(Request('http://a.com/'), self.spider)
+
+    def test_redirect_target_checked(self):
+        self.fetch(Request('http://a.com/target'))
+        source = Request('http://a.com/old')
+        self.fetch(source)
+        redirect = source.replace(url='http://a.com/target')
+        redirect.meta['redirect_urls'] = [source.url]
+        with self.assertRaises(IgnoreRequest):
+            self.mw.process_request(redirect, self.spider)
+        self.assertEqual(self.crawler.stats.get_value('dedup/prefetch_redirect_dropped'), 1)
+
+    def test_shared_seen_store(self):
+        frontier = MemoryFrontierBackend()
+        self.spider.frontier = frontier
+        self.mw.spider_opened(self.spider)
+        other = PrefetchDedupMiddleware.from_crawler(self.crawler)
+        other.spider_opened(self.spider)
+        self.fetch(Request('http://a.com/'))
+        with self.assertRaises(IgnoreRequest):
+            other.process_request(Request('http://a.com/'), self.spider)
+
+    def test_savings_stats(self):
+        self.spider.metrics = MetricsRegistry()
+        self.spider.metrics.histogram('parse_seconds', callback='parse').observe(0.02)
+        self.spider.metrics.histogram('parse_seconds', callback='parse_document').observe(0.04)
+        self.fetch(Request('http://a.com/1'), body=b'x' * 1000)
+        self.fetch(Request('http://a.com/2'), body=b'x' * 3000)
+        for _ in range(2):
+            with self.assertRaises(IgnoreRequest):
+                self.mw.process_request(Request('http://a.com/1'), self.spider)
+        self.mw.spider_closed(self.spider, 'finished')
+        self.assertEqual(self.crawler.stats.get_value('dedup/prefetch_bytes_saved'), 4000)
+        self.assertEqual(self.crawler.stats.get_value('dedup/prefetch_parse_ms_saved'), 60)
+        self.assertIs(self.spider.prefetch_dedup, self.mw)
+
+
+class TestDecompressionMiddleware(unittest.TestCase):
+
+    HTML = b'<html><head><title>Compressed</title></head><body>' + b'<p>Some text.</p>' * 2000 + b'</body></html>'
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, {'MAX_FILE_SIZE': 10 * 1024 * 1024})
+        self.crawler.stats.open_spider(None)
+        self.spider = self.crawler._create_spider('test')
+        self.mw = DecompressionMiddleware.from_crawler(self.crawler)
+
+    def fetch(self, url, body, encoding=None):
+        request = Request(url)
+        self.mw.process_request(request, self.spider)
+        headers = {'Content-Type': 'text/html'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return self.mw.process_response(request, Response(url, body=body, headers=headers), self.spider)
+
+    def encoded(self, encoding, data):
+        if encoding == 'gzip':
+            return gzip.compress(data)
+        if encoding == 'deflate':
+            return zlib.compress(data)
+        if encoding == 'br':
+            import brotli
+            return brotli.compress(data)
+        return compress(data, 'zstd')
+
+    def test_advertises_and_decodes_encodings(self):
+        request = Request('http://a.com/')
+        self.mw.process_request(request, self.spider)
+        self.assertEqual(request.headers['Accept-Encoding'].decode().split(', '), CONTENT_ENCODINGS)
+        for encoding in CONTENT_ENCODINGS:
+            response = self.fetch('http://a.com/', self.encoded(encoding, self.HTML), encoding)
+            self.assertIsInstance(response, HtmlResponse)
+            self.assertEqual(response.body, self.HTML, encoding)
+            self.assertNotIn(b'Content-Encoding', response.headers)
+        # Raw deflate, several gzip members and unknown encodings
+        raw = zlib.compressobj(wbits=-15)
+        self.assertEqual(self.fetch('http://a.com/', raw.compress(self.HTML) + raw.flush(), 'deflate').body, self.HTML)
+        self.assertEqual(self.fetch('http://a.com/', gzip.compress(b'a') + gzip.compress(b'b'), 'x-gzip').body, b'ab')
+        self.assertEqual(self.fetch('http://a.com/', b'data', 'unknown').body, b'data')
+
+    def test_decompression_bombs_are_dropped(self):
+        zeros = gzip.compress(b'\0' * 50 * 1024 * 1024)
+        with self.assertRaises(IgnoreRequest):
+            self.fetch('http://a.com/bomb', zeros, 'gzip')
+        self.assertEqual(self.crawler.stats.get_value('httpcompression/ratio_exceeded'), 1)
+        # Compressible bodies pass the ratio check up to its minimum size, not past MAX_FILE_SIZE
+        self.mw.max_ratio = 0
+        with self.assertRaises(IgnoreRequest):
+            self.fetch('http://a.com/bomb', zeros, 'gzip')
+        self.assertEqual(self.crawler.stats.get_value('httpcompression/size_exceeded'), 1)
+        self.mw.max_ratio = 100
+        small = b'\0' * 512 * 1024
+        self.assertEqual(self.fetch('http://a.com/zeros', gzip.compress(small), 'gzip').body, small)
+
+    def test_ratio_per_host(self):
+        self.fetch('http://a.com/1', gzip.compress(self.HTML), 'gzip')
+        self.fetch('http://b.com/1', self.HTML)
+        self.mw.spider_closed(self.spider, 'finished')
+        stats = self.crawler.stats
+        self.assertGreater(stats.get_value('httpcompression/ratio/a.com'), 10)
+        self.assertEqual(stats.get_value('httpcompression/ratio/b.com'), 1.0)
+        self.assertEqual(stats.get_value('httpcompression/decoded_bytes'), 2 * len(self.HTML))
+        self.assertEqual(stats.get_value('httpcompression/encoding/gzip'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the sampling profiler
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from webcrawler.pipelines import ValidationPipeline
+from webcrawler.profiler import CrawlProfiler, SamplingProfiler, frame_name, is_idle
+from webcrawler.spiders.main_spider import MainSpider
+
+
+def busy_stage(entered, release):
+    entered.set()
+    while not release.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def sample_thread(self, target):
+        """Sample five times while ``target(entered, release)`` runs in a thread"""
+        profiler = SamplingProfiler()
+        profiler.label(busy_stage, 'pipeline:Busy')
+        entered, release = threading.Event(), threading.Event()
+        thread = threading.Thread(target=target, args=(entered, release), name='worker')
+        thread.start()
+        try:
+            entered.wait()
+            # Let the thread get past Event.set()
+            time.sleep(0.05)
+            for _ in range(5):
+                profiler.sample()
+        finally:
+            release.set()
+            thread.join()
+        return profiler
+
+    def test_samples_are_attributed_to_labelled_stage(self):
+        profiler = self.sample_thread(busy_stage)
+        worker = [line for line in profiler.collapsed() if line.startswith('worker;')]
+        self.assertTrue(worker)
+        self.assertTrue(all(line.startswith('worker;pipeline:Busy;') for line in worker))
+        self.assertTrue(all('busy_stage (test_profiler.py:' in line for line in worker))
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in worker), 5)
+        report = profiler.report()
+        self.assertIn('pipeline:Busy', report)
+        self.assertIn('Hot functions (self)', report)
+
+    def test_waiting_threads_are_idle(self):
+        def wait(entered, release):
+            entered.set()
+            release.wait()
+
+        profiler = self.sample_thread(wait)
+        worker = [line for line in profiler.collapsed() if line.startswith('worker;')]
+        self.assertTrue(all(line.startswith('worker;idle;') for line in worker))
+
+    def test_code_without_qualname(self):
+        # Python < 3.11 code objects have no co_qualname
+        code = SimpleNamespace(co_name='wait', co_filename='/usr/lib/threading.py', co_firstlineno=300)
+        self.assertEqual(frame_name(code), 'wait (threading.py:300)')
+        self.assertTrue(is_idle(code))
+        self.assertFalse(is_idle(SimpleNamespace(co_name='parse')))
+
+
+class TestCrawlProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.crawler = get_crawler(MainSpider, {'PROFILE_ENABLED': True, 'PROFILE_DIR': self.tmpdir,
+                                                'PROFILE_INTERVAL': 0.001})
+        itemproc = SimpleNamespace(middlewares=(ValidationPipeline(),))
+        self.crawler.engine = SimpleNamespace(scraper=SimpleNamespace(itemproc=itemproc))
+        self.spider = self.crawler._create_spider()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_disabled_by_default(self):
+        self.assertRaises(NotConfigured, CrawlProfiler.from_crawler, get_crawler(MainSpider))
+
+    def test_profile_written_on_close(self):
+        extension = CrawlProfiler.from_crawler(self.crawler)
+        extension.spider_opened(self.spider)
+        labels = set(extension.profiler.labels.values())
+        self.assertIn('callback:parse_webpage', labels)
+        self.assertIn('pipeline:Validation', labels)
+        extension.spider_closed(self.spider, 'finished')
+        self.assertIsNone(extension.profiler.thread)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'main_spider.collapsed')))
+        with open(os.path.join(self.tmpdir, 'main_spider-top.txt'), encoding='utf-8') as f:
+            self.assertIn('Samples by stage', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
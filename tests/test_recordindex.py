@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the URL lookup index
+"""
+
+import unittest
+import json
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.spiders import Spider
+
+from utils.recordindex import INDEX_FILE, RecordIndex, RecordIndexWriter, run_names
+from webcrawler.items import LinkItem, WebPageItem
+from webcrawler.pipelines import JsonWriterPipeline
+
+
+class TestRecordIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index_dir = os.path.join(self.tmpdir, 'lookup')
+        self.data = os.path.join(self.tmpdir, 'records.bin')
+        with open(self.data, 'wb') as f:
+            for i in range(1000):
+                f.write(b'record-%04d' % i)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def write(self, count, run_size, merge=True, start=0):
+        writer = RecordIndexWriter(self.index_dir, run_size=run_size)
+        for i in range(start, start + count):
+            writer.add(f'http://example.com/{i % 700}', self.data, i * 11, 11)
+        writer.close(merge=merge)
+
+    def test_runs_are_merged_into_one_index(self):
+        self.write(1000, run_size=128)
+        self.assertEqual(run_names(self.index_dir), [])
+        index = RecordIndex(self.index_dir)
+        self.assertEqual(len(index), 1000)
+        self.assertEqual(index.lookup('http://example.com/350'), b'record-0350')
+        # URLs 0-299 were stored twice, the newest copy wins
+        self.assertEqual(index.lookup('http://example.com/42'), b'record-0742')
+        self.assertEqual(len(index.locate('http://example.com/42')), 2)
+        self.assertIsNone(index.lookup('http://example.com/missing'))
+        index.close()
+
+    def test_unmerged_runs_are_searched(self):
+        self.write(500, run_size=1000)
+        self.write(500, run_size=100, merge=False, start=500)
+        self.assertTrue(os.path.exists(os.path.join(self.index_dir, INDEX_FILE)))
+        self.assertEqual(len(run_names(self.index_dir)), 5)
+        index = RecordIndex(self.index_dir)
+        self.assertEqual(index.lookup('http://example.com/100'), b'record-0800')
+        self.assertEqual(index.lookup('http://example.com/600'), b'record-0600')
+        index.close()
+
+
+class TestJsonWriterIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        # JsonWriterPipeline writes relative to the working directory
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_pages_are_indexed(self):
+        pipeline = JsonWriterPipeline()
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        for i in range(3):
+            pipeline.process_item(WebPageItem(url=f'http://example.com/{i}', title=f'Page {i}'), spider)
+        pipeline.process_item(LinkItem(source_url='http://example.com/0', target_url='http://example.com/1'), spider)
+        pipeline.close_spider(spider)
+
+        index = RecordIndex('data/lookup')
+        self.assertEqual(len(index), 3)
+        item = json.loads(index.lookup('http://example.com/2'))
+        self.assertEqual(item['title'], 'Page 2')
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for offline replay
+"""
+
+import unittest
+import os
+import sys
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.settings import Settings
+
+from utils.warc import iter_records
+from webcrawler.httpcache import ResponseCache
+from webcrawler.pipelines import SearchIndexPipeline
+from webcrawler.replay import iter_cache_entries, iter_warc_entries, replay
+
+PAGE = (b'<html><head><title>Replay</title></head><body>'
+        b'<p>Stored text</p><a href="/next">next</a></body></html>')
+
+
+def warc_response(url, body):
+    http = b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n' + body
+    header = (
+        'WARC/1.1\r\nWARC-Type: response\r\n'
+        f'WARC-Target-URI: {url}\r\nContent-Length: {len(http)}\r\n\r\n'
+    ).encode()
+    return gzip.compress(header + http + b'\r\n\r\n')
+
+
+class SlowSearchIndexPipeline(SearchIndexPipeline):
+    """Indexes slower than replay parses, so its queue fills up"""
+
+    def index_loop(self):
+        for url, text in iter(self.queue.get, None):
+            time.sleep(0.01)
+            self.writer.add(url, text)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings = Settings({'ITEM_PIPELINES': {}, 'LOG_ENABLED': False,
+                                  'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_replay_from_cache(self):
+        path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        cache = ResponseCache(path)
+        for i in range(3):
+            cache.put(f'fp{i}', 'GET', f'http://example.com/{i}', f'http://example.com/{i}',
+                      200, b'Content-Type: text/html', PAGE)
+        cache.close()
+
+        report = replay(self.settings, [('cache', path)], processes=1)
+        self.assertEqual(report['counts']['responses'], 3)
+        # One page item and one link item per page, links are not fetched
+        self.assertEqual(report['counts']['items'], 6)
+        self.assertEqual(report['counts']['requests'], 3)
+        self.assertIn('parse', report['stages'])
+
+    def test_writer_pipelines_with_full_queues(self):
+        path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        cache = ResponseCache(path)
+        for i in range(20):
+            cache.put(f'fp{i}', 'GET', f'http://example.com/{i}', f'http://example.com/{i}',
+                      200, b'Content-Type: text/html', PAGE)
+        cache.close()
+        settings = self.settings.copy()
+        settings.set('ITEM_PIPELINES', {
+            f'{__name__}.SlowSearchIndexPipeline': 500,
+            'webcrawler.pipelines.DatabasePipeline': 700,
+        })
+        settings.set('SEARCH_INDEX_DIR', os.path.join(self.tmpdir, 'index'))
+        settings.set('SEARCH_INDEX_QUEUE_SIZE', 1)
+        settings.set('DATABASE_PATH', os.path.join(self.tmpdir, 'crawl.sqlite3'))
+        settings.set('DATABASE_QUEUE_SIZE', 1)
+
+        report = replay(settings, [('cache', path)], processes=1)
+        self.assertEqual(report['counts']['items'], 40)
+        self.assertNotIn('dropped', report['counts'])
+        self.assertEqual(report['stages']['DatabasePipeline']['calls'], 40)
+        with sqlite3.connect(os.path.join(self.tmpdir, 'crawl.sqlite3')) as connection:
+            self.assertEqual(connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0], 20)
+
+    def test_compressed_cache_entries_are_decoded(self):
+        # The cache stores responses before DecompressionMiddleware decodes them
+        path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        cache = ResponseCache(path)
+        cache.put('fp', 'GET', 'http://example.com/', 'http://example.com/', 200,
+                  b'Content-Type: text/html\r\nContent-Encoding: gzip', gzip.compress(PAGE))
+        cache.put('bad', 'GET', 'http://example.com/bad', 'http://example.com/bad', 200,
+                  b'Content-Type: text/html\r\nContent-Encoding: gzip', b'not gzip')
+        cache.close()
+
+        (url, status, headers, body), = iter_cache_entries(path)
+        self.assertEqual((url, body), ('http://example.com/', PAGE))
+        self.assertNotIn(b'Content-Encoding', headers)
+        report = replay(self.settings, [('cache', path)], processes=1)
+        self.assertEqual(report['counts']['responses'], 1)
+        self.assertEqual(report['counts']['requests'], 1)
+
+    def test_shards_split_entries(self):
+        path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        cache = ResponseCache(path)
+        for i in range(5):
+            cache.put(f'fp{i}', 'GET', f'http://example.com/{i}', f'http://example.com/{i}',
+                      200, b'Content-Type: text/html', PAGE + str(i).encode())
+        cache.close()
+        warc_path = os.path.join(self.tmpdir, 'test.warc.gz')
+        with open(warc_path, 'wb') as f:
+            for i in range(5):
+                f.write(warc_response(f'http://example.com/{i}', PAGE))
+
+        for entries in (iter_cache_entries, iter_warc_entries):
+            source = path if entries is iter_cache_entries else warc_path
+            shards = [[url for url, _, _, _ in entries(source, shard, 2)] for shard in range(2)]
+            self.assertEqual(sorted(shards[0] + shards[1]), [f'http://example.com/{i}' for i in range(5)])
+            self.assertTrue(shards[0] and shards[1])
+
+    def test_warc_records(self):
+        path = os.path.join(self.tmpdir, 'test.warc.gz')
+        with open(path, 'wb') as f:
+            f.write(warc_response('http://example.com/a', PAGE))
+            f.write(warc_response('http://example.com/b', b'<html><body>b</body></html>'))
+
+        records = list(iter_records(path))
+        self.assertEqual([r.target_uri for r in records], ['http://example.com/a', 'http://example.com/b'])
+        url, status, headers, body = next(iter_warc_entries(path))
+        self.assertEqual((url, status, body), ('http://example.com/a', 200, PAGE))
+        self.assertEqual(headers[b'Content-Type'], [b'text/html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
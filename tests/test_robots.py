@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests for the robots.txt cache and compiled rule matchers
+"""
+
+import unittest
+import os
+import random
+import sys
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protego import Protego
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet.defer import Deferred
+
+from webcrawler.robots import RobotsMiddleware, RobotsRules, parse_robots, product_token
+
+ROBOTS = b"""
+User-agent: *
+Disallow: /private
+Crawl-delay: 5
+
+# Our own group wins over '*'
+User-agent: otherbot
+User-agent: webcrawler
+Disallow: /search
+Allow: /search/about
+Disallow: /*.php$
+Allow: /page.php$
+Crawl-delay: 2
+"""
+
+
+def rules(body, token='webcrawler'):
+    return RobotsRules(*parse_robots(body, token))
+
+
+class TestRobotsRules(unittest.TestCase):
+
+    def test_group_selection(self):
+        self.assertEqual(product_token('WebCrawler/1.0 (+https://example.com)'), 'webcrawler')
+        selected, delay = parse_robots(ROBOTS, 'webcrawler')
+        self.assertIn((False, '/search'), selected)
+        self.assertNotIn((False, '/private'), selected)
+        self.assertEqual(delay, 2)
+        selected, delay = parse_robots(ROBOTS, 'scrapy')
+        self.assertEqual(selected, [(False, '/private')])
+        self.assertEqual(delay, 5)
+        self.assertEqual(parse_robots(b'', 'scrapy'), ([], None))
+
+    def test_longest_match(self):
+        matcher = rules(ROBOTS)
+        self.assertFalse(matcher.allowed('/search?q=1'))
+        self.assertTrue(matcher.allowed('/search/about'))
+        self.assertTrue(matcher.allowed('/private'))
+        self.assertFalse(matcher.allowed('/a/b.php'))
+        self.assertTrue(matcher.allowed('/a/b.php?x=1'))
+        self.assertTrue(matcher.allowed('/page.php'))
+        self.assertTrue(matcher.allowed('/robots.txt'))
+
+    def test_ties_and_normalization(self):
+        matcher = rules(b'User-agent: *\nDisallow: /a\nAllow: /a\nDisallow: /caf%c3%a9\nDisallow: /%7euser')
+        self.assertTrue(matcher.allowed('/a/b'))
+        self.assertFalse(matcher.allowed('/café/menu'))
+        self.assertFalse(matcher.allowed('/~user/home'))
+
+    def test_agrees_with_protego(self):
+        rng = random.Random(7)
+        words = ['a', 'b', 'ab', 'x.php', 'search', 'img', 'q=1']
+        for _ in range(20):
+            lines = ['User-agent: *']
+            for _ in range(rng.randint(1, 15)):
+                pattern = '/' + '/'.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+                if rng.random() < 0.2:
+                    pattern = pattern[:rng.randint(1, len(pattern))] + '*' + rng.choice(words)
+                if rng.random() < 0.1:
+                    pattern += '$'
+                lines.append(f"{rng.choice(['Allow', 'Disallow'])}: {pattern}")
+            body = '\n'.join(lines)
+            matcher = rules(body.encode())
+            reference = Protego.parse(body)
+            for _ in range(50):
+                path = '/' + '/'.join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+                self.assertEqual(matcher.allowed(path), reference.can_fetch('http://h.com' + path, 'webcrawler'),
+                                 f'{path}\n{body}')
+
+
+class FakeThrottle:
+
+    def __init__(self):
+        self.delays = {}
+
+    def set_crawl_delay(self, key, delay):
+        self.delays[key] = delay
+
+
+class TestRobotsMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings = {
+            'ROBOTSTXT_OBEY': True,
+            'ROBOTSTXT_USER_AGENT': 'WebCrawler/1.0',
+            'ROBOTSTXT_CACHE_PATH': os.path.join(self.tmpdir, 'robots.sqlite3'),
+        }
+        self.downloads = []
+        self.mw, self.crawler, self.spider = self.open_middleware()
+
+    def tearDown(self):
+        self.mw.spider_closed(self.spider)
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def open_middleware(self):
+        crawler = get_crawler(Spider, self.settings)
+        crawler.stats.open_spider(None)
+        crawler.engine = SimpleNamespace(download=self.download)
+        spider = crawler._create_spider('test')
+        spider.throttle = FakeThrottle()
+        mw = RobotsMiddleware.from_crawler(crawler)
+        mw.spider_opened(spider)
+        return mw, crawler, spider
+
+    def download(self, request):
+        d = Deferred()
+        self.downloads.append((request, d))
+        return d
+
+    def outcome(self, request):
+        """'allowed' or 'forbidden', or a list filled in once robots.txt has arrived"""
+        try:
+            result = self.mw.process_request(request, self.spider)
+        except IgnoreRequest:
+            return 'forbidden'
+        if not isinstance(result, Deferred):
+            return 'allowed'
+        outcomes = []
+        result.addCallbacks(lambda _: outcomes.append('allowed'), lambda f: outcomes.append('forbidden'))
+        return outcomes
+
+    def test_requests_wait_for_one_fetch(self):
+        first = self.outcome(Request('http://a.com/search'))
+        second = self.outcome(Request('http://a.com/index.html'))
+        self.assertEqual((first, second), ([], []))
+        self.assertEqual(len(self.downloads), 1)
+        robots_request, d = self.downloads[0]
+        self.assertEqual(robots_request.url, 'http://a.com/robots.txt')
+        d.callback(Response(robots_request.url, body=ROBOTS))
+        self.assertEqual((first, second), (['forbidden'], ['allowed']))
+        self.assertEqual(self.outcome(Request('http://a.com/search/about')), 'allowed')
+        self.assertEqual(self.crawler.stats.get_value('robotstxt/forbidden'), 1)
+
+    def test_rules_persist_between_runs(self):
+        self.outcome(Request('http://a.com/'))
+        robots_request, d = self.downloads[0]
+        d.callback(Response(robots_request.url, body=ROBOTS))
+        self.mw.spider_closed(self.spider)
+
+        self.mw, self.crawler, self.spider = self.open_middleware()
+        self.assertEqual(self.outcome(Request('http://a.com/search')), 'forbidden')
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual(self.crawler.stats.get_value('robotstxt/cache_hit'), 1)
+
+        # Expired entries are fetched again
+        self.mw.clock = lambda: 10 ** 12
+        self.mw.hosts.clear()
+        self.outcome(Request('http://a.com/search'))
+        self.assertEqual(len(self.downloads), 2)
+
+    def test_crawl_delay_and_errors(self):
+        self.outcome(Request('http://a.com/'))
+        self.outcome(Request('http://b.com/'))
+        (a_request, a), (b_request, b) = self.downloads
+        a.callback(Response(a_request.url, body=ROBOTS))
+        b.callback(Response(b_request.url, status=503, body=b'User-agent: *\nDisallow: /'))
+        self.assertEqual(self.outcome(Request('http://b.com/anything')), 'allowed')
+
+        request = Request('http://a.com/page', meta={'download_slot': '10.0.0.1'})
+        self.mw.request_reached_downloader(request, self.spider)
+        self.assertEqual(self.spider.throttle.delays, {'10.0.0.1': 2})
+
+        # Server errors are not kept for long
+        self.mw.clock = lambda: 10 ** 12
+        self.outcome(Request('http://b.com/'))
+        self.assertEqual(len(self.downloads), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
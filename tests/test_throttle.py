@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-host adaptive throttle
+"""
+
+import unittest
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy import signals
+from scrapy.core.downloader import Slot
+from scrapy.http import Request, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, reactor
+from twisted.trial import unittest as trial_unittest
+from twisted.web import resource, server
+
+from webcrawler.throttle import AdaptiveThrottle, parse_retry_after
+
+
+class TestAdaptiveThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.crawler = get_crawler(Spider, {
+            'ADAPTIVE_THROTTLE_ENABLED': True,
+            'ADAPTIVE_THROTTLE_START_CONCURRENCY': 2.0,
+            'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 8.0,
+            'ADAPTIVE_THROTTLE_START_DELAY': 1.0,
+        })
+        self.crawler.stats.open_spider(None)
+        self.slots = {}
+        self.crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots=self.slots))
+        self.throttle = AdaptiveThrottle.from_crawler(self.crawler)
+        self.spider = Spider('test')
+
+    def make_request(self, host, latency=0.1, meta=None):
+        self.slots.setdefault(host, Slot(concurrency=8, delay=0, randomize_delay=False))
+        request = Request(f'http://{host}/', meta=meta)
+        request.meta['download_slot'] = host
+        request.meta['download_latency'] = latency
+        self.throttle.request_reached_downloader(request, self.spider)
+        return request
+
+    def respond(self, host, status=200, latency=0.1, headers=None, meta=None):
+        request = self.make_request(host, latency, meta)
+        response = Response(request.url, status=status, headers=headers or {}, request=request)
+        self.throttle.response_downloaded(response, request, self.spider)
+        self.throttle.request_left_downloader(request, self.spider)
+        return self.slots[host]
+
+    def test_new_slot_gets_start_values(self):
+        self.make_request('a.com')
+        self.assertEqual(self.slots['a.com'].concurrency, 2)
+        self.assertEqual(self.slots['a.com'].delay, 1.0)
+
+    def test_fast_host_ramps_up(self):
+        for _ in range(60):
+            slot = self.respond('cdn.com', latency=0.05)
+        self.assertEqual(slot.concurrency, 8)
+        self.assertEqual(slot.delay, 0)
+        self.assertGreater(self.crawler.stats.get_value('adaptive_throttle/increase'), 0)
+
+    def test_delay_floor_is_opt_in(self):
+        for settings, floor in (({'DOWNLOAD_DELAY': 0.5}, 0), ({'ADAPTIVE_THROTTLE_MIN_DELAY': 0.5}, 0.5)):
+            crawler = get_crawler(Spider, dict(settings, ADAPTIVE_THROTTLE_ENABLED=True))
+            crawler.stats.open_spider(None)
+            crawler.engine = self.crawler.engine
+            self.throttle = AdaptiveThrottle.from_crawler(crawler)
+            for _ in range(60):
+                slot = self.respond(f'cdn{floor}.com', latency=0.05)
+            self.assertEqual(slot.delay, floor)
+
+    def test_recreated_slot_keeps_adapted_state(self):
+        slot = self.respond('a.com', status=503, headers={'Retry-After': '30'})
+        # The downloader drops idle slots and creates them again with its defaults
+        del self.slots['a.com']
+        self.make_request('a.com')
+        self.assertIsNot(self.slots['a.com'], slot)
+        self.assertEqual(self.slots['a.com'].concurrency, 1)
+        self.assertEqual(self.slots['a.com'].delay, 30)
+
+    def test_throttled_host_backs_off(self):
+        for _ in range(20):
+            self.respond('a.com')
+        slot = self.respond('a.com', status=429)
+        self.assertLess(slot.concurrency, self.throttle.max_concurrency)
+        self.assertGreater(slot.delay, 0)
+        self.assertEqual(self.crawler.stats.get_value('adaptive_throttle/decrease/throttled'), 1)
+
+    def test_retry_after_is_honoured(self):
+        slot = self.respond('a.com', status=503, headers={'Retry-After': '120'})
+        self.assertEqual(slot.concurrency, 1)
+        self.assertEqual(slot.delay, 120)
+        # Successes do not speed the host up while it is blocked
+        slot = self.respond('a.com')
+        self.assertEqual(slot.delay, 120)
+
+    def test_crawl_delay_is_a_floor(self):
+        self.make_request('slow.com')
+        self.throttle.set_crawl_delay('slow.com', 3.0)
+        self.assertEqual(self.slots['slow.com'].delay, 3.0)
+        for _ in range(60):
+            slot = self.respond('slow.com', latency=0.05)
+        self.assertEqual(slot.delay, 3.0)
+        self.assertEqual(slot.concurrency, 8)
+
+    def test_retried_server_errors_do_not_back_off_again(self):
+        for _ in range(20):
+            self.respond('a.com')
+        slot = self.respond('a.com', status=500)
+        concurrency, delay = slot.concurrency, slot.delay
+        for retry_times in (1, 2, 3):
+            slot = self.respond('a.com', status=500, meta={'retry_times': retry_times})
+        self.assertEqual((slot.concurrency, slot.delay), (concurrency, delay))
+        self.assertEqual(self.throttle.host_stats('a.com')['errors'], 4)
+        self.assertEqual(self.crawler.stats.get_value('adaptive_throttle/decrease/server_error'), 1)
+
+    def test_download_error_counts_as_failure(self):
+        request = self.make_request('down.com')
+        self.throttle.request_left_downloader(request, self.spider)
+        self.assertEqual(self.throttle.host_stats('down.com')['errors'], 1)
+        self.assertEqual(self.crawler.stats.get_value('adaptive_throttle/decrease/download_error'), 1)
+
+    def test_hosts_are_independent(self):
+        for _ in range(30):
+            self.respond('fast.com', latency=0.05)
+            self.respond('slow.com', status=503)
+        self.assertGreater(self.slots['fast.com'].concurrency, self.slots['slow.com'].concurrency)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after(b'30'), 30.0)
+        self.assertIsNone(parse_retry_after(b'soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470), 10.0)
+
+
+class PageResource(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        return b'<html><body>page</body></html>'
+
+
+class PagesSpider(Spider):
+    name = 'pages'
+
+    def start_requests(self):
+        for i in range(int(self.pages)):
+            yield Request(f'{self.base_url}/{i}', dont_filter=True)
+
+    def parse(self, response):
+        pass
+
+
+class TestAchievedRate(trial_unittest.TestCase):
+    """Request rate of a real crawl of one fast local host"""
+
+    def setUp(self):
+        self.port = reactor.listenTCP(0, server.Site(PageResource()), interface='127.0.0.1')
+        self.base_url = f'http://127.0.0.1:{self.port.getHost().port}'
+
+    def tearDown(self):
+        return self.port.stopListening()
+
+    @defer.inlineCallbacks
+    def crawl(self, pages, **settings):
+        crawler = get_crawler(PagesSpider, dict({
+            'EXTENSIONS': {'webcrawler.throttle.AdaptiveThrottle': 500},
+            'ADAPTIVE_THROTTLE_ENABLED': True,
+            'ADAPTIVE_THROTTLE_START_DELAY': 0.25,
+            'DOWNLOAD_DELAY': 1,
+            'RANDOMIZE_DOWNLOAD_DELAY': False,
+            'LOG_LEVEL': 'WARNING',
+        }, **settings))
+        times = []
+        crawler.signals.connect(lambda **kwargs: times.append(time.monotonic()),
+                                signal=signals.response_received, weak=False)
+        yield crawler.crawl(base_url=self.base_url, pages=pages)
+        self.assertEqual(len(times), pages)
+        return (pages - 1) / (times[-1] - times[0])
+
+    @defer.inlineCallbacks
+    def test_healthy_host_outruns_download_delay(self):
+        rate = yield self.crawl(60)
+        # DOWNLOAD_DELAY = 1 would hold it at one request per second
+        self.assertGreater(rate, 10)
+
+    @defer.inlineCallbacks
+    def test_min_delay_caps_the_rate(self):
+        rate = yield self.crawl(12, ADAPTIVE_THROTTLE_MIN_DELAY=0.2)
+        self.assertLess(rate, 1 / 0.2 * 1.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
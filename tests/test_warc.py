@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Tests for the WARC writer and the WARC archiving pipeline
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.spiders import Spider
+
+from utils.warc import WarcWriter, iter_cdx, iter_records, lookup, read_record_at
+from webcrawler.pipelines import WarcWriterPipeline, WriterQueue
+
+PAGE = b'<html><head><title>Archived</title></head><body><p>Raw body</p></body></html>'
+
+
+class TestWarcWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_records_are_readable_sequentially_and_by_offset(self):
+        writer = WarcWriter(self.tmpdir, prefix='test')
+        path, offset = writer.write_exchange(
+            'http://example.com/page?a=1', 'GET', [(b'User-Agent', b'test')],
+            200, [(b'Content-Type', b'text/html'), (b'Content-Encoding', b'gzip')], PAGE, 'text/html'
+        )
+        writer.close()
+
+        types = [record.type for record in iter_records(path)]
+        self.assertEqual(types, ['warcinfo', 'response', 'request'])
+
+        record = read_record_at(path, offset)
+        self.assertEqual(record.target_uri, 'http://example.com/page?a=1')
+        status, headers, body = record.http_response()
+        self.assertEqual(status, 200)
+        self.assertEqual(body, PAGE)
+        self.assertNotIn(b'Content-Encoding', dict(headers))
+
+        entries = list(iter_cdx(path + '.cdx'))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['urlkey'], 'com,example)/page?a=1')
+        self.assertEqual(int(entries[0]['offset']), offset)
+
+    def test_files_rotate_by_size(self):
+        writer = WarcWriter(self.tmpdir, prefix='test', max_size=200)
+        for i in range(3):
+            writer.write_exchange(f'http://example.com/{i}', 'GET', [], 200, [], PAGE)
+        writer.close()
+
+        names = sorted(name for name in os.listdir(self.tmpdir) if name.endswith('.warc.gz'))
+        self.assertEqual(len(names), 3)
+        self.assertEqual([len(lookup(self.tmpdir, f'http://example.com/{i}')) for i in range(3)], [1, 1, 1])
+
+
+class TestWarcWriterPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_received_responses_are_archived_off_thread(self):
+        pipeline = WarcWriterPipeline(directory=self.tmpdir, queue_size=2)
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        for i in range(5):
+            request = Request(f'http://example.com/{i}')
+            response = HtmlResponse(request.url, body=PAGE, request=request,
+                                    headers={'Content-Type': 'text/html'})
+            pipeline.response_received(response, request, spider)
+        cached = HtmlResponse('http://example.com/cached', body=PAGE, flags=['cached'])
+        pipeline.response_received(cached, cached.request, spider)
+        pipeline.close_spider(spider)
+
+        self.assertEqual(pipeline.records, 5)
+        records = lookup(self.tmpdir, 'http://example.com/3')
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].http_response()[2], PAGE)
+        self.assertEqual(lookup(self.tmpdir, 'http://example.com/cached'), [])
+
+    def test_stopped_downloads_are_not_archived(self):
+        pipeline = WarcWriterPipeline(directory=self.tmpdir)
+        spider = Spider('test')
+        pipeline.open_spider(spider)
+        request = Request('http://example.com/large.pdf')
+        prefix = HtmlResponse(request.url, body=PAGE[:20], request=request, flags=['download_stopped'])
+        pipeline.response_received(prefix, request, spider)
+        pipeline.close_spider(spider)
+
+        self.assertEqual(pipeline.records, 0)
+        self.assertEqual(lookup(self.tmpdir, 'http://example.com/large.pdf'), [])
+
+    def test_full_queue_pauses_the_engine(self):
+        pipeline = WarcWriterPipeline(directory=self.tmpdir, queue_size=1)
+        calls = []
+        pipeline.crawler = SimpleNamespace(engine=SimpleNamespace(pause=lambda: calls.append('pause'),
+                                                                  unpause=lambda: calls.append('unpause')))
+        spider = Spider('test')
+        # No writer thread yet, nothing leaves the queue
+        for i in range(3):
+            request = Request(f'http://example.com/{i}')
+            pipeline.response_received(HtmlResponse(request.url, body=PAGE, request=request), request, spider)
+        self.assertEqual(calls, ['pause'])
+        self.assertEqual(len(pipeline.queue.waiting), 2)
+
+        for _ in range(2):
+            pipeline.queue.queue.get()
+            pipeline.queue.refill()
+        self.assertEqual(calls, ['pause', 'unpause'])
+        self.assertEqual(pipeline.queue.queue.get()[0], 'http://example.com/2')
+        pipeline.open_spider(spider)
+        pipeline.close_spider(spider)
+
+    def test_engine_resumes_when_the_waiter_fired_at_once(self):
+        pipeline = WarcWriterPipeline(directory=self.tmpdir, queue_size=2)
+        calls = []
+        pipeline.crawler = SimpleNamespace(engine=SimpleNamespace(pause=lambda: calls.append('pause'),
+                                                                  unpause=lambda: calls.append('unpause')))
+        spider = Spider('test')
+
+        def receive(i):
+            request = Request(f'http://example.com/{i}')
+            pipeline.response_received(HtmlResponse(request.url, body=PAGE, request=request), request, spider)
+
+        for i in range(3):
+            receive(i)
+        self.assertEqual(calls, ['pause'])
+        # The writer made room but its refill has not run yet, the next
+        # response's waiter fires as soon as it is queued
+        pipeline.queue.queue.get()
+        pipeline.queue.queue.get()
+        receive(3)
+        self.assertEqual(calls, ['pause', 'unpause'])
+        self.assertFalse(pipeline.paused)
+        pipeline.open_spider(spider)
+        pipeline.close_spider(spider)
+
+
+class TestWriterQueue(unittest.TestCase):
+
+    def test_put_never_blocks(self):
+        writer_queue = WriterQueue(maxsize=1)
+        self.assertIsNone(writer_queue.put('a'))
+        waiting = [writer_queue.put('b'), writer_queue.put('c')]
+        fired = []
+        for waiter in waiting:
+            waiter.addCallback(fired.append)
+        self.assertEqual(fired, [])
+        # Entries keep their order, each waiter fires once its entry is queued
+        self.assertEqual(writer_queue.queue.get(), 'a')
+        writer_queue.refill()
+        self.assertEqual(fired, [None])
+        self.assertEqual(writer_queue.queue.get(), 'b')
+        # Closing hands over what still waits, then the end marker
+        received = []
+        thread = threading.Thread(target=lambda: received.extend(iter(writer_queue.get, None)))
+        thread.start()
+        writer_queue.close()
+        thread.join()
+        self.assertEqual(fired, [None, None])
+        self.assertEqual(received, ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+"""
+Content-addressed blob store
+
+Raw page HTML and document bytes are stored once per sha256 in large
+append-only pack files. Every blob is compressed on its own (zstd when
+available), optionally with a dictionary trained on the first HTML pages,
+so single blobs can be read with one seek. A fixed-size binary index is
+loaded into a dict on open for O(1) lookups.
+
+Each writer appends to its own packs and appends index entries with single
+``O_APPEND`` writes, so several processes can share a store. ``compact``
+rewrites the live blobs into fresh packs and must run while nothing else
+writes to the store.
+"""
+
+import hashlib
+import os
+import struct
+import uuid
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from utils.compression import DEFAULT_CODEC, IDENTITY, ZLIB, ZSTD, compress, decompress, train_dictionary
+
+
+INDEX_FILE = 'index.bin'
+# sha256, pack session, pack serial, offset, compressed length, size, codec, dictionary id
+INDEX_ENTRY = struct.Struct('<32sIHQIIBI')
+CODECS = {IDENTITY: 0, ZLIB: 1, ZSTD: 2}
+CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+
+class BlobEntry:
+    """Location of one blob in a pack file"""
+
+    __slots__ = ('session', 'serial', 'offset', 'length', 'size', 'codec', 'dictionary_id')
+
+    def __init__(self, session, serial, offset, length, size, codec, dictionary_id):
+        self.session = session
+        self.serial = serial
+        self.offset = offset
+        self.length = length
+        self.size = size
+        self.codec = codec
+        self.dictionary_id = dictionary_id
+
+    @property
+    def pack_name(self) -> str:
+        return pack_name(self.session, self.serial)
+
+
+def pack_name(session: int, serial: int) -> str:
+    return f'pack-{session:08x}-{serial:04d}.pack'
+
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """sha256-addressed blobs in compressed append-only pack files"""
+
+    def __init__(self, directory: str, codec: str = DEFAULT_CODEC, level: int = 3,
+                 pack_size: int = 256 * 1024 * 1024, dictionary_samples: int = 0,
+                 dictionary_size: int = 112640, flush_every: int = 100):
+        self.directory = directory
+        self.codec = codec
+        self.level = level
+        self.pack_size = pack_size
+        self.dictionary_samples = dictionary_samples
+        self.dictionary_size = dictionary_size
+        self.flush_every = flush_every
+        os.makedirs(directory, exist_ok=True)
+
+        self.index: Dict[bytes, BlobEntry] = {}
+        self.dictionaries: Dict[int, bytes] = {}
+        self.dictionary_id = 0
+        self.samples = []
+        self.load()
+
+        self.session = uuid.uuid4().int & 0xFFFFFFFF
+        self.serial = 0
+        self.pack = None
+        self.pack_offset = 0
+        self.pending = []
+        self.written_bytes = 0
+
+    def load(self):
+        for name in os.listdir(self.directory):
+            if name.startswith('dict-') and name.endswith('.zdict'):
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    self.dictionaries[int(name[5:-6], 16)] = f.read()
+        if self.dictionaries:
+            # The newest dictionary is used for new blobs
+            newest = max(self.dictionaries, key=lambda d: os.path.getmtime(self.dictionary_path(d)))
+            self.dictionary_id = newest
+        self.index = dict(read_index(os.path.join(self.directory, INDEX_FILE)))
+
+    def dictionary_path(self, dictionary_id: int) -> str:
+        return os.path.join(self.directory, f'dict-{dictionary_id:08x}.zdict')
+
+    def __contains__(self, digest: str) -> bool:
+        return bytes.fromhex(digest) in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def put(self, data: bytes, use_dictionary: bool = False) -> str:
+        """Store ``data`` unless it is already present, returns its sha256"""
+        digest = blob_hash(data)
+        key = bytes.fromhex(digest)
+        if key in self.index:
+            return digest
+
+        if use_dictionary and self.dictionary_samples and not self.dictionary_id:
+            self.samples.append(data)
+            if len(self.samples) >= self.dictionary_samples:
+                self.train(self.samples)
+                self.samples = []
+        dictionary_id = self.dictionary_id if use_dictionary else 0
+        payload = compress(data, self.codec, self.level, self.dictionaries.get(dictionary_id))
+
+        if self.pack is None or self.pack_offset >= self.pack_size:
+            self.open_pack()
+        entry = BlobEntry(self.session, self.serial, self.pack_offset, len(payload), len(data),
+                          CODECS[self.codec], dictionary_id)
+        self.pack.write(payload)
+        self.pack_offset += len(payload)
+        self.written_bytes += len(payload)
+        self.index[key] = entry
+        self.pending.append(pack_entry(key, entry))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Return the blob stored under ``digest``, raises KeyError if missing"""
+        entry = self.index[bytes.fromhex(digest)]
+        if self.pack is not None and entry.session == self.session and entry.serial == self.serial:
+            self.pack.flush()
+        with open(os.path.join(self.directory, entry.pack_name), 'rb') as f:
+            f.seek(entry.offset)
+            payload = f.read(entry.length)
+        return decompress(payload, CODEC_NAMES[entry.codec], self.dictionaries.get(entry.dictionary_id))
+
+    def train(self, samples: Iterable[bytes]) -> int:
+        """Train a new dictionary from samples and use it for new HTML blobs"""
+        dictionary = train_dictionary(list(samples), self.dictionary_size, self.codec)
+        dictionary_id = uuid.uuid4().int & 0xFFFFFFFF
+        with open(self.dictionary_path(dictionary_id), 'wb') as f:
+            f.write(dictionary)
+        self.dictionaries[dictionary_id] = dictionary
+        self.dictionary_id = dictionary_id
+        return dictionary_id
+
+    def open_pack(self):
+        if self.pack is not None:
+            self.flush()
+            self.pack.close()
+        self.serial += 1
+        self.pack = open(os.path.join(self.directory, pack_name(self.session, self.serial)), 'ab', buffering=1024 * 1024)
+        self.pack_offset = self.pack.tell()
+
+    def flush(self):
+        """Make written blobs durable in the pack before publishing their index entries"""
+        if self.pack is not None:
+            self.pack.flush()
+        if self.pending:
+            fd = os.open(os.path.join(self.directory, INDEX_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b''.join(self.pending))
+            finally:
+                os.close(fd)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+
+    def stats(self) -> Dict[str, int]:
+        packs = [name for name in os.listdir(self.directory) if name.endswith('.pack')]
+        return {
+            'blobs': len(self.index),
+            'raw_bytes': sum(entry.size for entry in self.index.values()),
+            'stored_bytes': sum(entry.length for entry in self.index.values()),
+            'pack_files': len(packs),
+            'pack_bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in packs),
+            'dictionaries': len(self.dictionaries),
+        }
+
+    def compact(self, live: Optional[Iterable[str]] = None) -> Tuple[int, int]:
+        """Copy live blobs into new packs and delete the old packs
+
+        ``live`` is an iterable of hashes to keep; all blobs are kept when it
+        is None. Returns (blobs kept, blobs removed).
+        """
+        self.close()
+        keep = self.index
+        if live is not None:
+            wanted = {bytes.fromhex(digest) for digest in live}
+            keep = {key: entry for key, entry in self.index.items() if key in wanted}
+        removed = len(self.index) - len(keep)
+
+        self.session = uuid.uuid4().int & 0xFFFFFFFF
+        self.serial = 0
+        new_index = {}
+        handles = {}
+        try:
+            for key, entry in sorted(keep.items(), key=lambda kv: (kv[1].pack_name, kv[1].offset)):
+                source = handles.get(entry.pack_name)
+                if source is None:
+                    source = handles[entry.pack_name] = open(os.path.join(self.directory, entry.pack_name), 'rb')
+                source.seek(entry.offset)
+                payload = source.read(entry.length)
+                if self.pack is None or self.pack_offset >= self.pack_size:
+                    if self.pack is not None:
+                        self.pack.close()
+                    self.serial += 1
+                    self.pack = open(os.path.join(self.directory, pack_name(self.session, self.serial)), 'wb')
+                    self.pack_offset = 0
+                new_index[key] = BlobEntry(self.session, self.serial, self.pack_offset, entry.length,
+                                           entry.size, entry.codec, entry.dictionary_id)
+                self.pack.write(payload)
+                self.pack_offset += len(payload)
+        finally:
+            for handle in handles.values():
+                handle.close()
+            if self.pack is not None:
+                self.pack.close()
+                self.pack = None
+
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(index_path + '.tmp', 'wb') as f:
+            f.write(b''.join(pack_entry(key, entry) for key, entry in new_index.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(index_path + '.tmp', index_path)
+
+        live_packs = {entry.pack_name for entry in new_index.values()}
+        for name in os.listdir(self.directory):
+            if name.endswith('.pack') and name not in live_packs:
+                os.remove(os.path.join(self.directory, name))
+        used = {entry.dictionary_id for entry in new_index.values()}
+        for dictionary_id in list(self.dictionaries):
+            if dictionary_id not in used and dictionary_id != self.dictionary_id:
+                os.remove(self.dictionary_path(dictionary_id))
+                del self.dictionaries[dictionary_id]
+
+        self.index = new_index
+        # New writes go to a fresh session rather than the compacted packs
+        self.session = uuid.uuid4().int & 0xFFFFFFFF
+        self.serial = 0
+        return len(new_index), removed
+
+
+def pack_entry(key: bytes, entry: BlobEntry) -> bytes:
+    return INDEX_ENTRY.pack(key, entry.session, entry.serial, entry.offset, entry.length,
+                            entry.size, entry.codec, entry.dictionary_id)
+
+
+def read_index(path: str) -> Iterator[Tuple[bytes, BlobEntry]]:
+    """Yield (sha256, entry) pairs, the first entry of a hash wins"""
+    if not os.path.exists(path):
+        return
+    seen = set()
+    with open(path, 'rb') as f:
+        data = f.read()
+    # A torn trailing entry from a crash is ignored
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    for key, *fields in INDEX_ENTRY.iter_unpack(data[:usable]):
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key, BlobEntry(*fields)
@@ -0,0 +1,153 @@
+"""
+Character encoding detection for HTML and text bodies
+
+``detect_encoding`` settles on one codec in the order browsers use: a byte
+order mark, the charset of the HTTP ``Content-Type`` header, then a
+``<meta charset>`` or XML declaration near the top of HTML. Undeclared
+bodies are only examined on a bounded prefix: UTF-16 without a BOM shows
+as zero bytes at every other position, a prefix that is valid UTF-8 is
+taken as UTF-8 (ASCII included), and anything else is left to chardet when
+it is installed and the prefix has enough non-ASCII bytes to go on,
+windows-1252 otherwise.
+
+``decode`` turns a body into text with a single decode once the encoding
+is known. The spider (through CharsetMiddleware) and DocumentProcessor
+both use it, so pages and text documents are decoded the same way.
+"""
+
+import codecs
+import re
+from typing import Optional, Tuple
+
+from w3lib.encoding import html_body_declared_encoding, http_content_type_encoding, read_bom, resolve_encoding
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+
+# Bytes of an undeclared body examined by the detector
+SAMPLE_SIZE = 16 * 1024
+# Legacy default of browsers for undeclared non-UTF-8 text
+FALLBACK_ENCODING = 'cp1252'
+# Bytes handed to chardet, from the first non-ASCII byte of the sample
+DETECT_SIZE = 2048
+# Non-ASCII bytes needed before chardet's guess is preferred to the fallback
+MIN_DETECT_BYTES = 32
+_ASCII = bytes(range(128))
+_NON_ASCII = re.compile(rb'[\x80-\xff]')
+
+BOM = 'bom'
+HEADER = 'header'
+META = 'meta'
+DETECTED = 'detected'
+
+
+def header_encoding(content_type) -> Optional[str]:
+    """Codec named by a Content-Type header value (str or bytes), if any"""
+    if not content_type:
+        return None
+    if isinstance(content_type, bytes):
+        content_type = content_type.decode('latin-1')
+    return http_content_type_encoding(content_type)
+
+
+def is_utf8(sample: bytes) -> bool:
+    """True if ``sample`` is valid UTF-8, allowing a sequence cut off at its end"""
+    if sample.isascii():
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def utf16_byte_order(sample: bytes) -> Optional[str]:
+    """'utf-16-le' or 'utf-16-be' for mostly-Latin UTF-16 without a BOM, None otherwise"""
+    if len(sample) < 64:
+        return None
+    sample = sample[:len(sample) // 2 * 2]
+    half = len(sample) // 2
+    even_zeros = sample[0::2].count(0)
+    odd_zeros = sample[1::2].count(0)
+    if odd_zeros > half * 0.4 and even_zeros < half * 0.05:
+        return 'utf-16-le'
+    if even_zeros > half * 0.4 and odd_zeros < half * 0.05:
+        return 'utf-16-be'
+    return None
+
+
+def guess_legacy(sample: bytes) -> str:
+    """Single-byte or CJK codec for a sample known not to be UTF-8
+
+    chardet sees at most ``DETECT_SIZE`` bytes, starting where the text
+    stops being ASCII, and only when they hold enough non-ASCII bytes to
+    tell scripts apart; a few accented letters are read as windows-1252.
+    """
+    match = _NON_ASCII.search(sample)
+    if match is None or chardet is None:
+        return FALLBACK_ENCODING
+    window = sample[match.start():match.start() + DETECT_SIZE]
+    if len(window.translate(None, _ASCII)) >= MIN_DETECT_BYTES:
+        guess = chardet.detect(window)['encoding']
+        encoding = resolve_encoding(guess) if guess else None
+        if encoding is not None and encoding != 'utf-8':
+            return encoding
+    return FALLBACK_ENCODING
+
+
+def guess_encoding(sample: bytes) -> str:
+    """Statistical guess for an undeclared sample"""
+    order = utf16_byte_order(sample)
+    if order is not None:
+        return order
+    if is_utf8(sample):
+        return 'utf-8'
+    return guess_legacy(sample)
+
+
+def detect_encoding(body: bytes, content_type=None, html: bool = True,
+                    sample_size: int = SAMPLE_SIZE) -> Tuple[str, str]:
+    """Return (codec name, source) for ``body``
+
+    ``source`` is 'bom', 'header', 'meta' or 'detected'. Only the first
+    ``sample_size`` bytes are examined.
+    """
+    encoding, _ = read_bom(body)
+    if encoding is not None:
+        return encoding, BOM
+    sample = body[:sample_size]
+    encoding = header_encoding(content_type)
+    # A UTF-8 declaration is checked, servers often send it for legacy pages
+    if encoding is not None and (encoding != 'utf-8' or is_utf8(sample)):
+        return encoding, HEADER
+    if html:
+        encoding = html_body_declared_encoding(sample)
+        # An ASCII-compatible document cannot be UTF-16/32 (WHATWG treats that as UTF-8)
+        if encoding is not None and encoding.startswith(('utf-16', 'utf-32')):
+            encoding = 'utf-8'
+        if encoding is not None and (encoding != 'utf-8' or is_utf8(sample)):
+            return encoding, META
+    return guess_encoding(sample), DETECTED
+
+
+def decode(body: bytes, content_type=None, html: bool = True,
+           sample_size: int = SAMPLE_SIZE) -> Tuple[str, str]:
+    """Return (text, codec name) for ``body``, decoding it once
+
+    Undeclared bodies whose prefix looked like UTF-8 but that turn out not
+    to be are detected again around the first invalid byte.
+    """
+    encoding, source = detect_encoding(body, content_type, html, sample_size)
+    if source == BOM:
+        _, bom = read_bom(body)
+        return body[len(bom):].decode(encoding, errors='replace'), encoding
+    if source == DETECTED and encoding == 'utf-8':
+        try:
+            return body.decode('utf-8'), encoding
+        except UnicodeDecodeError as e:
+            start = max(0, e.start - sample_size // 2)
+            encoding = guess_legacy(body[start:start + sample_size])
+    return body.decode(encoding, errors='replace'), encoding
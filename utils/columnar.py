@@ -0,0 +1,160 @@
+"""
+Columnar export of crawled items
+
+Buffers page, document and link items as columns and writes them as Parquet
+row groups, one file per item kind. Nested fields (links, images, h1-h6
+headers, document metadata) become list/struct/map columns so they can be
+queried without decoding JSON. Requires ``pyarrow``.
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+PAGES = 'pages'
+DOCUMENTS = 'documents'
+LINKS = 'links'
+
+
+def build_schemas() -> Dict[str, 'pa.Schema']:
+    link = pa.struct([('url', pa.string()), ('text', pa.string()), ('type', pa.string())])
+    image = pa.struct([('url', pa.string()), ('alt', pa.string())])
+    headings = pa.struct([(f'h{i}', pa.list_(pa.string())) for i in range(1, 7)])
+    timestamp = pa.timestamp('us')
+    return {
+        PAGES: pa.schema([
+            ('url', pa.string()),
+            ('title', pa.string()),
+            ('content', pa.large_string()),
+            ('content_hash', pa.string()),
+            ('text_content', pa.large_string()),
+            ('meta_description', pa.string()),
+            ('meta_keywords', pa.string()),
+            ('headers', headings),
+            ('links', pa.list_(link)),
+            ('images', pa.list_(image)),
+            ('response_status', pa.int16()),
+            ('content_type', pa.string()),
+            ('file_size', pa.int64()),
+            ('timestamp', timestamp),
+        ]),
+        DOCUMENTS: pa.schema([
+            ('url', pa.string()),
+            ('filename', pa.string()),
+            ('file_type', pa.string()),
+            ('content', pa.large_binary()),
+            ('content_hash', pa.string()),
+            ('text_content', pa.large_string()),
+            ('metadata', pa.map_(pa.string(), pa.string())),
+            ('file_size', pa.int64()),
+            ('page_count', pa.int32()),
+            ('alias_of', pa.string()),
+            ('timestamp', timestamp),
+        ]),
+        LINKS: pa.schema([
+            ('source_url', pa.string()),
+            ('target_url', pa.string()),
+            ('link_text', pa.string()),
+            ('link_type', pa.string()),
+            ('timestamp', timestamp),
+        ]),
+    }
+
+
+# Low-cardinality columns that benefit from dictionary encoding
+DICTIONARY_COLUMNS = ['content_type', 'file_type', 'link_type', 'source_url', 'response_status']
+
+
+def item_kind(item: Dict[str, Any]) -> str:
+    if 'file_type' in item:
+        return DOCUMENTS
+    if 'target_url' in item:
+        return LINKS
+    return PAGES
+
+
+def to_timestamp(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.now()
+
+
+class ParquetExporter:
+    """Accumulates items per kind and flushes them as Parquet row groups"""
+
+    def __init__(self, directory: str, batch_size: int = 1000, compression: str = 'zstd',
+                 compression_level: Optional[int] = None):
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet export")
+        self.directory = directory
+        self.batch_size = batch_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.schemas = build_schemas()
+        self.columns = {kind: self.empty_columns(kind) for kind in self.schemas}
+        self.writers = {}
+        self.rows = {kind: 0 for kind in self.schemas}
+        self.stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        os.makedirs(directory, exist_ok=True)
+
+    def empty_columns(self, kind: str) -> Dict[str, List[Any]]:
+        return {name: [] for name in self.schemas[kind].names}
+
+    def path(self, kind: str) -> str:
+        # The pid keeps files apart when several processes export at once (replay)
+        return os.path.join(self.directory, f'{kind}-{self.stamp}-{os.getpid()}.parquet')
+
+    def add(self, item: Dict[str, Any]) -> str:
+        """Buffer one item, flushing its kind once a full batch is collected"""
+        kind = item_kind(item)
+        columns = self.columns[kind]
+        for name, values in columns.items():
+            value = item.get(name)
+            if name == 'timestamp':
+                value = to_timestamp(value)
+            elif name == 'metadata' and value is not None:
+                value = {str(k): str(v) for k, v in value.items()}
+            elif name in ('links', 'images') and value is not None:
+                # Link and image records become plain dicts for the struct columns
+                value = [dict(entry) for entry in value]
+            values.append(value)
+        if len(columns['timestamp']) >= self.batch_size:
+            self.flush(kind)
+        return kind
+
+    def flush(self, kind: str):
+        columns = self.columns[kind]
+        if not columns['timestamp']:
+            return
+        schema = self.schemas[kind]
+        table = pa.Table.from_pydict(columns, schema=schema)
+        writer = self.writers.get(kind)
+        if writer is None:
+            writer = pq.ParquetWriter(
+                self.path(kind),
+                schema,
+                compression=self.compression,
+                compression_level=self.compression_level,
+                use_dictionary=[name for name in DICTIONARY_COLUMNS if name in schema.names],
+            )
+            self.writers[kind] = writer
+        writer.write_table(table, row_group_size=len(table))
+        self.rows[kind] += len(table)
+        self.columns[kind] = self.empty_columns(kind)
+
+    def close(self):
+        for kind in self.schemas:
+            self.flush(kind)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
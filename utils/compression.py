@@ -0,0 +1,250 @@
+"""
+Compression helpers shared by the storage backends
+
+zstd is used when a binding is installed (``zstandard`` or
+``backports.zstd``), otherwise data falls back to zlib. The codec name is
+stored next to each payload so data written with one codec stays readable
+when the other is in use. Both codecs accept a preset dictionary, which
+helps a lot on small, similar payloads such as HTML pages of one site.
+
+``decode_content`` decodes HTTP ``Content-Encoding`` bodies (gzip, deflate,
+and br and zstd when a binding is installed) a bounded chunk at a time, so
+size and expansion limits stop a decompression bomb before its output is
+held in memory.
+"""
+
+import threading
+import zlib
+from functools import lru_cache
+from typing import Iterator
+
+try:
+    import brotli as _brotli
+except ImportError:
+    _brotli = None
+
+try:
+    import zstandard as _zstandard
+except ImportError:
+    _zstandard = None
+
+_zstd = None
+if _zstandard is None:
+    try:
+        from compression import zstd as _zstd
+    except ImportError:
+        try:
+            from backports import zstd as _zstd
+        except ImportError:
+            _zstd = None
+
+
+ZSTD = 'zstd'
+ZLIB = 'zlib'
+IDENTITY = 'identity'
+
+HAS_ZSTD = _zstandard is not None or _zstd is not None
+DEFAULT_CODEC = ZSTD if HAS_ZSTD else ZLIB
+
+
+@lru_cache(maxsize=8)
+def _zstd_dictionary(dictionary: bytes):
+    if _zstandard is not None:
+        return _zstandard.ZstdCompressionDict(dictionary)
+    return _zstd.ZstdDict(dictionary)
+
+
+_local = threading.local()
+
+
+def _zstd_compressor(level: int, dictionary: bytes = None):
+    """Reuse compression contexts, loading a dictionary per call is slow"""
+    compressors = getattr(_local, 'compressors', None)
+    if compressors is None:
+        compressors = _local.compressors = {}
+    key = (level, dictionary)
+    compressor = compressors.get(key)
+    if compressor is None:
+        zstd_dict = _zstd_dictionary(dictionary) if dictionary else None
+        if _zstandard is not None:
+            compressor = _zstandard.ZstdCompressor(level=level, dict_data=zstd_dict)
+        else:
+            compressor = _zstd.ZstdCompressor(level=level, zstd_dict=zstd_dict)
+        if len(compressors) >= 8:
+            compressors.clear()
+        compressors[key] = compressor
+    return compressor
+
+
+def compress(data: bytes, codec: str = DEFAULT_CODEC, level: int = 3, dictionary: bytes = None) -> bytes:
+    """Compress data with the given codec"""
+    if codec == ZSTD:
+        if _zstandard is not None:
+            return _zstd_compressor(level, dictionary).compress(data)
+        if _zstd is not None:
+            return _zstd_compressor(level, dictionary).compress(data, _zstd.ZstdCompressor.FLUSH_FRAME)
+        raise ValueError("zstd requested but no zstd module is installed")
+    if codec == ZLIB:
+        if dictionary:
+            compressor = zlib.compressobj(min(level, 9), zdict=dictionary)
+            return compressor.compress(data) + compressor.flush()
+        return zlib.compress(data, min(level, 9))
+    if codec == IDENTITY:
+        return data
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data: bytes, codec: str, dictionary: bytes = None) -> bytes:
+    """Decompress data written by compress()"""
+    if codec == ZSTD:
+        if _zstandard is not None:
+            if dictionary:
+                return _zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(dictionary)).decompress(data)
+            return _zstandard.ZstdDecompressor().decompress(data)
+        if _zstd is not None:
+            if dictionary:
+                return _zstd.decompress(data, zstd_dict=_zstd_dictionary(dictionary))
+            return _zstd.decompress(data)
+        raise ValueError("zstd data found but no zstd module is installed")
+    if codec == ZLIB:
+        if dictionary:
+            decompressor = zlib.decompressobj(zdict=dictionary)
+            return decompressor.decompress(data) + decompressor.flush()
+        return zlib.decompress(data)
+    if codec == IDENTITY:
+        return data
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def train_dictionary(samples, size: int = 112640, codec: str = DEFAULT_CODEC) -> bytes:
+    """Build a preset dictionary from sample payloads
+
+    zstd trains a real dictionary; zlib only uses the last 32KB of a preset
+    dictionary, so its fallback is the concatenated tail of the samples.
+    """
+    samples = [sample for sample in samples if sample]
+    if codec == ZSTD and _zstandard is not None:
+        return _zstandard.train_dictionary(size, samples).as_bytes()
+    if codec == ZSTD and _zstd is not None:
+        return _zstd.train_dict(samples, size).dict_content
+    return b''.join(samples)[-32768:]
+
+
+# HTTP content codings decode_content() understands, most compact first
+CONTENT_ENCODINGS = (['br'] if _brotli is not None else []) + (['zstd'] if HAS_ZSTD else []) + ['gzip', 'deflate']
+
+DECODE_CHUNK_SIZE = 64 * 1024
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class DecompressionLimitExceeded(ValueError):
+    """Raised when decoded content passes a size or expansion ratio limit"""
+
+    def __init__(self, message, limit):
+        super().__init__(message)
+        self.limit = limit
+
+
+def _iter_zlib(data: bytes, wbits: int, chunk_size: int) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(wbits)
+    while True:
+        chunk = decompressor.decompress(data, chunk_size)
+        if chunk:
+            yield chunk
+        data = decompressor.unconsumed_tail
+        if decompressor.eof:
+            # gzip bodies may hold several members
+            data = decompressor.unused_data
+            if wbits != GZIP_WBITS or not data.startswith(b'\x1f\x8b'):
+                return
+            decompressor = zlib.decompressobj(wbits)
+        elif not data and not chunk:
+            # Truncated bodies keep what could be decoded
+            return
+
+
+def _iter_deflate(data: bytes, chunk_size: int) -> Iterator[bytes]:
+    # Some servers send raw deflate data without the zlib header
+    has_header = len(data) >= 2 and data[0] & 0x0f == 8 and (data[0] << 8 | data[1]) % 31 == 0
+    return _iter_zlib(data, zlib.MAX_WBITS if has_header else -zlib.MAX_WBITS, chunk_size)
+
+
+def _iter_brotli(data: bytes, chunk_size: int) -> Iterator[bytes]:
+    decompressor = _brotli.Decompressor()
+    try:
+        chunk = decompressor.process(data, output_buffer_limit=chunk_size)
+    except TypeError:
+        # brotli < 1.2 cannot bound its output, feed it small pieces instead
+        for start in range(0, len(data), 1024):
+            chunk = decompressor.process(data[start:start + 1024])
+            if chunk:
+                yield chunk
+        return
+    while chunk:
+        yield chunk
+        if decompressor.is_finished():
+            return
+        # Without new input, an empty chunk means the body was truncated
+        chunk = decompressor.process(b'', output_buffer_limit=chunk_size)
+
+
+def _iter_zstd(data: bytes, chunk_size: int) -> Iterator[bytes]:
+    if _zstandard is not None:
+        reader = _zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True)
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    decompressor = _zstd.ZstdDecompressor()
+    chunk = decompressor.decompress(data, chunk_size)
+    while True:
+        if chunk:
+            yield chunk
+        if decompressor.eof:
+            data = decompressor.unused_data
+            if not data:
+                return
+            decompressor = _zstd.ZstdDecompressor()
+            chunk = decompressor.decompress(data, chunk_size)
+        elif decompressor.needs_input:
+            return
+        else:
+            chunk = decompressor.decompress(b'', chunk_size)
+
+
+def iter_decoded(data: bytes, encoding: str, chunk_size: int = DECODE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Decode an HTTP content coding, yielding at most ``chunk_size`` bytes at a time"""
+    if encoding in ('gzip', 'x-gzip'):
+        return _iter_zlib(data, GZIP_WBITS, chunk_size)
+    if encoding == 'deflate':
+        return _iter_deflate(data, chunk_size)
+    if encoding == 'br' and _brotli is not None:
+        return _iter_brotli(data, chunk_size)
+    if encoding == 'zstd' and HAS_ZSTD:
+        return _iter_zstd(data, chunk_size)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decode_content(data: bytes, encoding: str, max_size: int = 0, max_ratio: float = 0,
+                   ratio_min_size: int = 0) -> bytes:
+    """Decode an HTTP body, raising DecompressionLimitExceeded past the limits
+
+    ``max_size`` caps the decoded size. ``max_ratio`` caps decoded / encoded
+    size once more than ``ratio_min_size`` bytes have been decoded, since
+    small bodies legitimately compress very well.
+    """
+    ratio_limit = max(len(data) * max_ratio, ratio_min_size) if max_ratio else 0
+    chunks = []
+    size = 0
+    for chunk in iter_decoded(data, encoding):
+        size += len(chunk)
+        if max_size and size > max_size:
+            raise DecompressionLimitExceeded(
+                f"decoded size passed {max_size} bytes", 'size')
+        if ratio_limit and size > ratio_limit:
+            raise DecompressionLimitExceeded(
+                f"{len(data)} encoded bytes expanded past {size} bytes (ratio above {max_ratio:g})", 'ratio')
+        chunks.append(chunk)
+    return b''.join(chunks)
@@ -0,0 +1,198 @@
+"""
+SQLite storage for crawled items
+
+Pages, documents and links go into a normalized schema where every URL is
+stored once in ``urls`` and referenced by id. Items are written in batches
+with ``executemany``; pages and documents are upserted on their URL so a
+recrawl replaces the previous row and its child rows.
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url_id INTEGER PRIMARY KEY REFERENCES urls (id),
+    title TEXT,
+    content_hash TEXT,
+    text_content TEXT,
+    meta_description TEXT,
+    meta_keywords TEXT,
+    status INTEGER,
+    content_type TEXT,
+    file_size INTEGER,
+    crawled_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS headings (
+    page_id INTEGER NOT NULL REFERENCES pages (url_id),
+    level INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS headings_page ON headings (page_id);
+CREATE TABLE IF NOT EXISTS images (
+    page_id INTEGER NOT NULL REFERENCES pages (url_id),
+    image_id INTEGER NOT NULL REFERENCES urls (id),
+    alt TEXT,
+    PRIMARY KEY (page_id, image_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS links (
+    source_id INTEGER NOT NULL REFERENCES urls (id),
+    target_id INTEGER NOT NULL REFERENCES urls (id),
+    text TEXT,
+    type TEXT,
+    PRIMARY KEY (source_id, target_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_target ON links (target_id);
+CREATE TABLE IF NOT EXISTS documents (
+    url_id INTEGER PRIMARY KEY REFERENCES urls (id),
+    filename TEXT,
+    file_type TEXT,
+    content_hash TEXT,
+    text_content TEXT,
+    metadata TEXT,
+    file_size INTEGER,
+    page_count INTEGER,
+    crawled_at TEXT NOT NULL
+);
+"""
+
+UPSERT_PAGE = """
+INSERT INTO pages (url_id, title, content_hash, text_content, meta_description, meta_keywords,
+                   status, content_type, file_size, crawled_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (url_id) DO UPDATE SET
+    title = excluded.title, content_hash = excluded.content_hash, text_content = excluded.text_content,
+    meta_description = excluded.meta_description, meta_keywords = excluded.meta_keywords,
+    status = excluded.status, content_type = excluded.content_type,
+    file_size = excluded.file_size, crawled_at = excluded.crawled_at
+"""
+
+UPSERT_DOCUMENT = """
+INSERT INTO documents (url_id, filename, file_type, content_hash, text_content, metadata,
+                       file_size, page_count, crawled_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (url_id) DO UPDATE SET
+    filename = excluded.filename, file_type = excluded.file_type, content_hash = excluded.content_hash,
+    text_content = excluded.text_content, metadata = excluded.metadata,
+    file_size = excluded.file_size, page_count = excluded.page_count,
+    crawled_at = excluded.crawled_at
+"""
+
+UPSERT_LINK = """
+INSERT INTO links (source_id, target_id, text, type) VALUES (?, ?, ?, ?)
+ON CONFLICT (source_id, target_id) DO UPDATE SET text = excluded.text, type = excluded.type
+"""
+
+
+class CrawlDatabase:
+    """Batched writer for the normalized crawl schema"""
+
+    # Keeps IN (...) lists below SQLite's host parameter limit
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.url_ids = {}
+
+    def intern_urls(self, urls: Iterable[str]):
+        """Make sure every URL has an id in ``urls`` and in the local cache"""
+        missing = list({url for url in urls if url not in self.url_ids})
+        if not missing:
+            return
+        self.db.executemany('INSERT OR IGNORE INTO urls (url) VALUES (?)', ((url,) for url in missing))
+        for i in range(0, len(missing), self.LOOKUP_CHUNK):
+            chunk = missing[i:i + self.LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            for url_id, url in self.db.execute(f'SELECT id, url FROM urls WHERE url IN ({placeholders})', chunk):
+                self.url_ids[url] = url_id
+
+    def write_batch(self, items: List[Dict[str, Any]]):
+        """Write pages, documents and link items in one transaction"""
+        # The last copy of a URL in the batch wins, like a later recrawl would
+        pages = list({item['url']: item for item in items
+                      if 'file_type' not in item and 'target_url' not in item}.values())
+        documents = list({item['url']: item for item in items if 'file_type' in item}.values())
+        link_items = [item for item in items if 'target_url' in item]
+
+        urls = []
+        for item in pages:
+            urls.append(item['url'])
+            urls.extend(link['url'] for link in item.get('links') or ())
+            urls.extend(image['url'] for image in item.get('images') or ())
+        urls.extend(item['url'] for item in documents)
+        for item in link_items:
+            urls.append(item['source_url'])
+            urls.append(item['target_url'])
+        try:
+            with self.db:
+                self.intern_urls(urls)
+                self.write_rows(pages, documents, link_items)
+        except Exception:
+            # Ids of rolled back URL rows must not stay cached
+            self.url_ids.clear()
+            raise
+
+    def write_rows(self, pages, documents, link_items):
+        ids = self.url_ids
+        if pages:
+            page_ids = [(ids[item['url']],) for item in pages]
+            # Recrawled pages replace their child rows
+            self.db.executemany('DELETE FROM headings WHERE page_id = ?', page_ids)
+            self.db.executemany('DELETE FROM images WHERE page_id = ?', page_ids)
+            self.db.executemany('DELETE FROM links WHERE source_id = ?', page_ids)
+            self.db.executemany(UPSERT_PAGE, (
+                (ids[item['url']], item.get('title'), item.get('content_hash'), item.get('text_content'),
+                 item.get('meta_description'), item.get('meta_keywords'),
+                 item.get('response_status'), item.get('content_type'), item.get('file_size'),
+                 crawled_at(item))
+                for item in pages
+            ))
+            self.db.executemany('INSERT INTO headings (page_id, level, text) VALUES (?, ?, ?)', (
+                (ids[item['url']], int(tag[1:]), text)
+                for item in pages
+                for tag, texts in (item.get('headers') or {}).items()
+                for text in texts
+            ))
+            self.db.executemany('INSERT OR REPLACE INTO images (page_id, image_id, alt) VALUES (?, ?, ?)', (
+                (ids[item['url']], ids[image['url']], image.get('alt'))
+                for item in pages
+                for image in item.get('images') or ()
+            ))
+            self.db.executemany(UPSERT_LINK, (
+                (ids[item['url']], ids[link['url']], link.get('text'), link.get('type'))
+                for item in pages
+                for link in item.get('links') or ()
+            ))
+        if documents:
+            self.db.executemany(UPSERT_DOCUMENT, (
+                (ids[item['url']], item.get('filename'), item.get('file_type'), item.get('content_hash'),
+                 item.get('text_content'),
+                 json.dumps(item.get('metadata') or {}), item.get('file_size'), item.get('page_count'),
+                 crawled_at(item))
+                for item in documents
+            ))
+        if link_items:
+            self.db.executemany(UPSERT_LINK, (
+                (ids[item['source_url']], ids[item['target_url']], item.get('link_text'), item.get('link_type'))
+                for item in link_items
+            ))
+
+    def count(self, table: str) -> int:
+        return self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+def crawled_at(item: Dict[str, Any]) -> str:
+    return item.get('timestamp') or datetime.now().isoformat()
@@ -0,0 +1,142 @@
+"""
+Persistent table of processed documents keyed by content hash
+
+The same document is often linked from many URLs. ``DocumentCache`` keeps
+the extracted text and metadata of every processed document in a SQLite
+file, keyed by the sha256 of its bytes (the blob store's key), so a copy
+found under another URL is recorded as an alias instead of being parsed
+again. The hash of the first bytes and the size of each document are kept
+too, so a download whose prefix and ``Content-Length`` match a known
+document can be stopped early.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    file_type TEXT,
+    size INTEGER NOT NULL,
+    prefix_hash TEXT NOT NULL,
+    text_content TEXT,
+    metadata TEXT,
+    page_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS documents_prefix ON documents (size, prefix_hash);
+CREATE TABLE IF NOT EXISTS aliases (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL REFERENCES documents (content_hash)
+);
+"""
+
+
+def prefix_hash(data: bytes, prefix_bytes: int) -> str:
+    return hashlib.sha256(data[:prefix_bytes]).hexdigest()
+
+
+class DocumentCache:
+    """Extraction results per content hash plus the URLs sharing each document"""
+
+    def __init__(self, path: str, prefix_bytes: int = 64 * 1024, commit_every: int = 100):
+        self.path = str(path)
+        self.prefix_bytes = prefix_bytes
+        self.commit_every = commit_every
+        self.pending = 0
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        # Sizes of known documents, so most downloads are ruled out without a query
+        self.sizes = {size for (size,) in self.db.execute('SELECT DISTINCT size FROM documents')}
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            'SELECT url, file_type, size, text_content, metadata, page_count FROM documents WHERE content_hash = ?',
+            (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, file_type, size, text_content, metadata, page_count = row
+        return {
+            'content_hash': digest,
+            'url': url,
+            'file_type': file_type,
+            'size': size,
+            'text_content': text_content,
+            'metadata': json.loads(metadata) if metadata else {},
+            'page_count': page_count,
+        }
+
+    def has_size(self, size: int) -> bool:
+        return size in self.sizes
+
+    def find_prefix(self, size: int, prefix: bytes) -> Optional[str]:
+        """Content hash of a known document of ``size`` bytes starting with ``prefix``"""
+        if size not in self.sizes:
+            return None
+        row = self.db.execute(
+            'SELECT content_hash FROM documents WHERE size = ? AND prefix_hash = ?',
+            (size, prefix_hash(prefix, self.prefix_bytes))
+        ).fetchone()
+        return row[0] if row else None
+
+    def add(self, digest: str, url: str, content: bytes, file_type: Optional[str] = None,
+            text_content: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None,
+            page_count: Optional[int] = None):
+        """Record the extraction of a newly processed document"""
+        self.db.execute(
+            'INSERT OR REPLACE INTO documents '
+            '(content_hash, url, file_type, size, prefix_hash, text_content, metadata, page_count) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (digest, url, file_type, len(content), prefix_hash(content, self.prefix_bytes), text_content,
+             json.dumps(metadata or {}), page_count)
+        )
+        self.sizes.add(len(content))
+        self.written()
+
+    def add_alias(self, url: str, digest: str):
+        self.db.execute('INSERT OR REPLACE INTO aliases (url, content_hash) VALUES (?, ?)', (url, digest))
+        self.written()
+
+    def aliases(self) -> Iterator[Dict[str, str]]:
+        """Yield every alias with the URL the document was first processed from"""
+        rows = self.db.execute(
+            'SELECT a.url, d.url, a.content_hash FROM aliases a '
+            'JOIN documents d ON d.content_hash = a.content_hash ORDER BY d.url, a.url'
+        )
+        for url, alias_of, digest in rows:
+            yield {'url': url, 'alias_of': alias_of, 'content_hash': digest}
+
+    def export_aliases(self, path: str) -> int:
+        """Write the aliases as JSON lines, returns the number written"""
+        self.commit()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        count = 0
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for alias in self.aliases():
+                f.write(json.dumps(alias, ensure_ascii=False) + '\n')
+                count += 1
+        os.replace(path + '.tmp', path)
+        return count
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def written(self):
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
@@ -5,7 +5,8 @@ import PyPDF2
 import pdfplumber
 from docx import Document
 import openpyxl
-from bs4 import BeautifulSoup
+
+from utils import charset, html_text
 
 
 class DocumentProcessor:
@@ -14,13 +15,14 @@ class DocumentProcessor:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def process_document(self, content: bytes, file_type: str) -> str:
+    def process_document(self, content: bytes, file_type: str, content_type: Optional[str] = None) -> str:
         """
         Process document content based on file type
         
         Args:
             content: Raw document content as bytes
             file_type: File extension (pdf, doc, docx, etc.)
+            content_type: HTTP Content-Type header, its charset decodes text and HTML
             
         Returns:
             Extracted text content as string
@@ -35,11 +37,11 @@ class DocumentProcessor:
             elif file_type.lower() in ['ppt', 'pptx']:
                 return self.process_powerpoint_document(content)
             elif file_type.lower() == 'txt':
-                return self.process_text_document(content)
+                return self.process_text_document(content, content_type)
             elif file_type.lower() == 'rtf':
                 return self.process_rtf_document(content)
             elif file_type.lower() in ['html', 'htm']:
-                return self.process_html_document(content)
+                return self.process_html_document(content, content_type)
             else:
                 self.logger.warning(f"Unsupported file type: {file_type}")
                 return ""
@@ -150,20 +152,11 @@ class DocumentProcessor:
             self.logger.error(f"Error processing PowerPoint document: {str(e)}")
             return ""
     
-    def process_text_document(self, content: bytes) -> str:
+    def process_text_document(self, content: bytes, content_type: Optional[str] = None) -> str:
         """Process plain text documents"""
         try:
-            # Try different encodings
-            encodings = ['utf-8', 'utf-16', 'latin-1', 'cp1252']
-            
-            for encoding in encodings:
-                try:
-                    return content.decode(encoding)
-                except UnicodeDecodeError:
-                    continue
-            
-            # If all encodings fail, use errors='ignore'
-            return content.decode('utf-8', errors='ignore')
+            text, _ = charset.decode(content, content_type, html=False)
+            return text
             
         except Exception as e:
             self.logger.error(f"Error processing text document: {str(e)}")
@@ -190,25 +183,12 @@ class DocumentProcessor:
             self.logger.error(f"Error processing RTF document: {str(e)}")
             return ""
     
-    def process_html_document(self, content: bytes) -> str:
+    def process_html_document(self, content: bytes, content_type: Optional[str] = None) -> str:
         """Process HTML documents"""
         try:
-            html_content = content.decode('utf-8', errors='ignore')
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text
-            text = soup.get_text()
-            
-            # Clean up text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            return text
+            html_content, _ = charset.decode(content, content_type)
+            # Script and style elements are dropped while parsing
+            return html_text.html_to_text(html_content)
             
         except Exception as e:
             self.logger.error(f"Error processing HTML document: {str(e)}")
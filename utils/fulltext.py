@@ -0,0 +1,589 @@
+"""
+Incremental inverted full-text index
+
+Documents are buffered in memory and flushed as immutable segment files.
+A segment holds delta- and varint-encoded posting lists, a sorted term
+table searched by binary search, document lengths and URLs; readers
+memory-map segments, so opening an index costs almost nothing. Terms in
+more than ``CHAMPION_THRESHOLD`` documents of a segment also get a champion
+list of their best ``CHAMPION_SIZE`` documents, which queries use instead
+of the full list unless an exact ranking is requested. A merge
+thread combines runs of ``merge_factor`` segments of the same level into
+one segment of the next level and drops documents superseded by a
+recrawl. ``segments.json`` lists the live segments and is replaced
+atomically. Queries are ranked with BM25.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+MANIFEST = 'segments.json'
+MAGIC = b'WCIX'
+VERSION = 1
+# magic, version, doc count, term count, total length, lengths offset, urls offset,
+# fingerprints offset, terms offset
+HEADER = struct.Struct('<4sIIIQQQQQ')
+# term offset, postings offset, postings length, document frequency, last doc id,
+# champions offset, champions length
+TERM_ENTRY = struct.Struct('<QQIIIQI')
+TermInfo = namedtuple('TermInfo', 'term postings_offset postings_length doc_freq last_doc '
+                                  'champions_offset champions_length')
+
+K1 = 1.2
+B = 0.75
+CHAMPION_SIZE = 1024
+CHAMPION_THRESHOLD = 4096
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its not of on or that the this to was '
+    'were will with'.split()
+)
+MAX_TOKEN_LENGTH = 40
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords and very short or long tokens"""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if 1 < len(token) <= MAX_TOKEN_LENGTH and token not in STOPWORDS
+    ]
+
+
+def url_fingerprint(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(postings: Iterable[Tuple[int, int]]) -> bytes:
+    """Encode ascending (doc id, term frequency) pairs as varint doc id deltas and frequencies"""
+    out = bytearray()
+    previous = 0
+    for doc_id, tf in postings:
+        encode_varint(doc_id - previous, out)
+        encode_varint(tf, out)
+        previous = doc_id
+    return bytes(out)
+
+
+def read_varint(data, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def decode_postings(data) -> Iterator[Tuple[int, int]]:
+    """Yield the (doc id, term frequency) pairs written by encode_postings"""
+    doc_id = 0
+    value = 0
+    shift = 0
+    delta = None
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if delta is None:
+            delta = value
+        else:
+            doc_id += delta
+            yield doc_id, value
+            delta = None
+        value = 0
+        shift = 0
+
+
+def select_champions(postings: Iterable[Tuple[int, int]], lengths, average_length: float,
+                     size: Optional[int] = None) -> List[Tuple[int, int]]:
+    """The ``size`` postings with the highest BM25 term weight, in doc id order"""
+    size = size or CHAMPION_SIZE
+    average_length = average_length or 1.0
+
+    def weight(posting):
+        doc_id, tf = posting
+        return tf / (tf + K1 * (1 - B + B * lengths[doc_id] / average_length))
+
+    return sorted(heapq.nlargest(size, postings, key=weight))
+
+
+class SegmentWriter:
+    """Streams one segment file: postings first, then lengths, URLs and terms"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.file = open(self.tmp_path, 'wb', buffering=1024 * 1024)
+        self.file.write(b'\0' * HEADER.size)
+        self.offset = HEADER.size
+        self.terms = []
+
+    def add_term(self, term: str, postings: bytes, doc_freq: int, last_doc: int, champions: bytes = b''):
+        """Terms must be added in sorted order"""
+        self.terms.append((term, self.offset, len(postings), doc_freq, last_doc,
+                           self.offset + len(postings), len(champions)))
+        self.file.write(postings)
+        self.file.write(champions)
+        self.offset += len(postings) + len(champions)
+
+    def finish(self, urls: List[str], lengths: List[int]):
+        lengths_offset = self.offset
+        self.file.write(array('I', lengths).tobytes())
+        urls_offset = lengths_offset + 4 * len(lengths)
+        encoded_urls = [url.encode('utf-8') for url in urls]
+        url_offsets = array('Q', [0])
+        for url in encoded_urls:
+            url_offsets.append(url_offsets[-1] + len(url))
+        self.file.write(url_offsets.tobytes())
+        self.file.write(b''.join(encoded_urls))
+        fingerprints_offset = urls_offset + 8 * len(url_offsets) + url_offsets[-1]
+        # Sorted fingerprints let newer segments hide older copies of a URL
+        pairs = sorted((url_fingerprint(url), doc_id) for doc_id, url in enumerate(urls))
+        self.file.write(array('Q', [fingerprint for fingerprint, _ in pairs]).tobytes())
+        self.file.write(array('I', [doc_id for _, doc_id in pairs]).tobytes())
+        terms_offset = fingerprints_offset + 12 * len(pairs)
+
+        term_blob_offset = 0
+        entries = bytearray()
+        encoded_terms = []
+        for term, *fields in self.terms:
+            encoded = term.encode('utf-8')
+            entries += TERM_ENTRY.pack(term_blob_offset, *fields)
+            encoded_terms.append(encoded)
+            term_blob_offset += len(encoded)
+        # Sentinel entry marks the end of the last term
+        entries += TERM_ENTRY.pack(term_blob_offset, 0, 0, 0, 0, 0, 0)
+        self.file.write(entries)
+        self.file.write(b''.join(encoded_terms))
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(urls), len(self.terms), sum(lengths),
+                                    lengths_offset, urls_offset, fingerprints_offset, terms_offset))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class Segment:
+    """Memory-mapped reader for one segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        (magic, version, self.doc_count, self.term_count, self.total_length,
+         lengths_offset, urls_offset, fingerprints_offset, terms_offset) = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a search index segment: {path}")
+        self.lengths = self.view[lengths_offset:lengths_offset + 4 * self.doc_count].cast('I')
+        self.url_offsets = self.view[urls_offset:urls_offset + 8 * (self.doc_count + 1)].cast('Q')
+        self.urls_start = urls_offset + 8 * (self.doc_count + 1)
+        ids_offset = fingerprints_offset + 8 * self.doc_count
+        self.fingerprints = self.view[fingerprints_offset:ids_offset].cast('Q')
+        self.fingerprint_ids = self.view[ids_offset:ids_offset + 4 * self.doc_count].cast('I')
+        self.terms_offset = terms_offset
+        self.term_blob = terms_offset + TERM_ENTRY.size * (self.term_count + 1)
+
+    def term_at(self, index: int) -> TermInfo:
+        term_offset, *fields = TERM_ENTRY.unpack_from(self.mmap, self.terms_offset + index * TERM_ENTRY.size)
+        term_end = TERM_ENTRY.unpack_from(self.mmap, self.terms_offset + (index + 1) * TERM_ENTRY.size)[0]
+        term = bytes(self.view[self.term_blob + term_offset:self.term_blob + term_end]).decode('utf-8')
+        return TermInfo(term, *fields)
+
+    def find(self, term: str) -> Optional[TermInfo]:
+        """Binary search the term table"""
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            info = self.term_at(middle)
+            if info.term < term:
+                low = middle + 1
+            elif info.term > term:
+                high = middle
+            else:
+                return info
+        return None
+
+    def postings(self, info: TermInfo, champions: bool = False) -> Iterator[Tuple[int, int]]:
+        if champions and info.champions_length:
+            return decode_postings(self.view[info.champions_offset:info.champions_offset + info.champions_length])
+        return decode_postings(self.view[info.postings_offset:info.postings_offset + info.postings_length])
+
+    def iter_terms(self) -> Iterator[TermInfo]:
+        for index in range(self.term_count):
+            yield self.term_at(index)
+
+    def contains_url(self, url: str, fingerprint: Optional[int] = None) -> bool:
+        fingerprint = url_fingerprint(url) if fingerprint is None else fingerprint
+        position = bisect_left(self.fingerprints, fingerprint)
+        while position < self.doc_count and self.fingerprints[position] == fingerprint:
+            if self.url(self.fingerprint_ids[position]) == url:
+                return True
+            position += 1
+        return False
+
+    def url(self, doc_id: int) -> str:
+        start = self.urls_start + self.url_offsets[doc_id]
+        end = self.urls_start + self.url_offsets[doc_id + 1]
+        return bytes(self.view[start:end]).decode('utf-8')
+
+    def close(self):
+        try:
+            self.lengths.release()
+            self.url_offsets.release()
+            self.fingerprints.release()
+            self.fingerprint_ids.release()
+            self.view.release()
+            self.mmap.close()
+        except BufferError:
+            # A posting iterator still holds a slice, the map is closed when it is collected
+            pass
+
+
+def read_manifest(directory: str) -> Dict:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {'segments': [], 'next_generation': 1}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, manifest: Dict):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def tagged_terms(segment: Segment, segment_index: int) -> Iterator[Tuple[str, int, TermInfo]]:
+    for info in segment.iter_terms():
+        yield info.term, segment_index, info
+
+
+class PostingsBuilder:
+    """Concatenates posting lists of consecutive segments for one term"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.doc_freq = 0
+        self.last_doc = 0
+        self.sources = []
+
+    def append_shifted(self, view, base: int, doc_freq: int, last_doc: int):
+        """Copy a list whose doc ids all move by ``base``, only the first delta is re-encoded"""
+        first, position = read_varint(view, 0)
+        tf, position = read_varint(view, position)
+        encode_varint(base + first - self.last_doc, self.data)
+        encode_varint(tf, self.data)
+        self.data += view[position:]
+        self.doc_freq += doc_freq
+        self.last_doc = base + last_doc
+
+    def append_mapped(self, view, mapping: Dict[int, int]):
+        """Re-encode a list whose segment lost superseded documents"""
+        for doc_id, tf in decode_postings(view):
+            new_id = mapping.get(doc_id)
+            if new_id is None:
+                continue
+            encode_varint(new_id - self.last_doc, self.data)
+            encode_varint(tf, self.data)
+            self.doc_freq += 1
+            self.last_doc = new_id
+
+
+def merge_segments(paths: List[str], output: str) -> int:
+    """Merge segments (oldest first) into one, keeping the newest copy of each URL"""
+    segments = [Segment(path) for path in paths]
+    try:
+        newest = {}
+        for segment_index, segment in enumerate(segments):
+            for doc_id in range(segment.doc_count):
+                newest[segment.url(doc_id)] = (segment_index, doc_id)
+        live = sorted(newest.values())
+        mappings = [dict() for _ in segments]
+        urls = []
+        lengths = []
+        for new_id, (segment_index, doc_id) in enumerate(live):
+            mappings[segment_index][doc_id] = new_id
+            urls.append(segments[segment_index].url(doc_id))
+            lengths.append(segments[segment_index].lengths[doc_id])
+        average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        # Segments that kept every document are shifted by a base instead of remapped
+        bases = []
+        for segment, mapping in zip(segments, mappings):
+            intact = len(mapping) == segment.doc_count and segment.doc_count > 0
+            bases.append(mapping[0] if intact else None)
+
+        def finish_term(term, builder):
+            if not builder.doc_freq:
+                return
+            champions = b''
+            if builder.doc_freq > CHAMPION_THRESHOLD:
+                # The best documents of the merged list are among the inputs' champions
+                candidates = []
+                for segment_index, info in builder.sources:
+                    mapping = mappings[segment_index]
+                    candidates.extend((mapping[doc_id], tf)
+                                      for doc_id, tf in segments[segment_index].postings(info, champions=True)
+                                      if doc_id in mapping)
+                champions = encode_postings(select_champions(candidates, lengths, average_length))
+            writer.add_term(term, bytes(builder.data), builder.doc_freq, builder.last_doc, champions)
+
+        writer = SegmentWriter(output)
+        merged_terms = heapq.merge(*[tagged_terms(segment, index) for index, segment in enumerate(segments)])
+        current = None
+        builder = None
+        for term, segment_index, info in merged_terms:
+            if term != current:
+                if builder is not None:
+                    finish_term(current, builder)
+                current = term
+                builder = PostingsBuilder()
+            builder.sources.append((segment_index, info))
+            view = segments[segment_index].view[info.postings_offset:info.postings_offset + info.postings_length]
+            if bases[segment_index] is not None:
+                builder.append_shifted(view, bases[segment_index], info.doc_freq, info.last_doc)
+            else:
+                builder.append_mapped(view, mappings[segment_index])
+            view.release()
+        if builder is not None:
+            finish_term(current, builder)
+        writer.finish(urls, lengths)
+        return len(urls)
+    finally:
+        for segment in segments:
+            segment.close()
+
+
+class IndexWriter:
+    """Buffers documents, flushes segments and merges them in the background"""
+
+    def __init__(self, directory: str, flush_docs: int = 5000, merge_factor: int = 8, background_merge: bool = True):
+        self.directory = directory
+        self.flush_docs = flush_docs
+        self.merge_factor = merge_factor
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.manifest = read_manifest(directory)
+        self.urls = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+        self.buffered = {}
+        self.superseded = set()
+        self.documents = 0
+        self.merges = 0
+        self.merge_wanted = threading.Event()
+        self.closing = False
+        self.merge_thread = None
+        if background_merge:
+            self.merge_thread = threading.Thread(target=self.merge_loop, name='search-index-merge', daemon=True)
+            self.merge_thread.start()
+
+    def add(self, url: str, text: str):
+        tokens = tokenize(text or '')
+        if url in self.buffered:
+            # A recrawl within one buffer replaces the earlier copy
+            self.superseded.add(self.buffered[url])
+        doc_id = len(self.urls)
+        self.buffered[url] = doc_id
+        self.urls.append(url)
+        self.lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            self.postings[term].append((doc_id, tf))
+        self.documents += 1
+        if len(self.urls) >= self.flush_docs:
+            self.flush()
+
+    def flush(self):
+        """Write buffered documents as a new level 0 segment"""
+        if not self.urls:
+            return
+        with self.lock:
+            generation = self.manifest['next_generation']
+            self.manifest['next_generation'] = generation + 1
+        name = f'seg-{generation:08d}.seg'
+        urls, lengths = self.urls, self.lengths
+        mapping = None
+        if self.superseded:
+            mapping = {}
+            for doc_id in range(len(self.urls)):
+                if doc_id not in self.superseded:
+                    mapping[doc_id] = len(mapping)
+            urls = [url for doc_id, url in enumerate(self.urls) if doc_id in mapping]
+            lengths = [length for doc_id, length in enumerate(self.lengths) if doc_id in mapping]
+        average_length = sum(lengths) / len(lengths)
+        writer = SegmentWriter(os.path.join(self.directory, name))
+        for term in sorted(self.postings):
+            postings = self.postings[term]
+            if mapping is not None:
+                postings = [(mapping[doc_id], tf) for doc_id, tf in postings if doc_id in mapping]
+                if not postings:
+                    continue
+            champions = b''
+            if len(postings) > CHAMPION_THRESHOLD:
+                champions = encode_postings(select_champions(postings, lengths, average_length))
+            writer.add_term(term, encode_postings(postings), len(postings), postings[-1][0], champions)
+        writer.finish(urls, lengths)
+        with self.lock:
+            self.manifest['segments'].append({'name': name, 'level': 0, 'docs': len(urls)})
+            write_manifest(self.directory, self.manifest)
+        self.urls = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+        self.buffered = {}
+        self.superseded = set()
+        if self.merge_thread is not None:
+            self.merge_wanted.set()
+        else:
+            while self.merge_once():
+                pass
+
+    def pick_merge(self) -> Optional[List[Dict]]:
+        """Return the newest run of merge_factor segments sharing a level"""
+        segments = self.manifest['segments']
+        run = []
+        for segment in reversed(segments):
+            if run and segment['level'] != run[-1]['level']:
+                if len(run) >= self.merge_factor:
+                    break
+                run = []
+            run.append(segment)
+        if len(run) >= self.merge_factor:
+            return list(reversed(run))[:self.merge_factor]
+        return None
+
+    def merge_once(self) -> bool:
+        with self.lock:
+            run = self.pick_merge()
+            if run is None:
+                return False
+            generation = self.manifest['next_generation']
+            self.manifest['next_generation'] = generation + 1
+        name = f'seg-{generation:08d}.seg'
+        docs = merge_segments([os.path.join(self.directory, segment['name']) for segment in run],
+                              os.path.join(self.directory, name))
+        with self.lock:
+            segments = self.manifest['segments']
+            position = segments.index(run[0])
+            merged_names = {segment['name'] for segment in run}
+            segments[:] = [segment for segment in segments if segment['name'] not in merged_names]
+            segments.insert(position, {'name': name, 'level': run[0]['level'] + 1, 'docs': docs})
+            write_manifest(self.directory, self.manifest)
+        # Readers that still map the old files keep them alive until they close
+        for segment in run:
+            os.remove(os.path.join(self.directory, segment['name']))
+        self.merges += 1
+        return True
+
+    def merge_loop(self):
+        while True:
+            self.merge_wanted.wait()
+            self.merge_wanted.clear()
+            while self.merge_once():
+                pass
+            if self.closing:
+                return
+
+    def close(self):
+        self.flush()
+        if self.merge_thread is not None:
+            self.closing = True
+            self.merge_wanted.set()
+            self.merge_thread.join()
+
+
+class IndexReader:
+    """BM25 search over the segments listed in the manifest"""
+
+    def __init__(self, directory: str, k1: float = K1, b: float = B):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.segments = self.open_segments()
+        self.doc_count = sum(segment.doc_count for segment in self.segments)
+        total_length = sum(segment.total_length for segment in self.segments)
+        self.average_length = total_length / self.doc_count if self.doc_count else 0.0
+
+    def open_segments(self, attempts: int = 3) -> List[Segment]:
+        for attempt in range(attempts):
+            manifest = read_manifest(self.directory)
+            segments = []
+            try:
+                for entry in manifest['segments']:
+                    segments.append(Segment(os.path.join(self.directory, entry['name'])))
+                return segments
+            except FileNotFoundError:
+                # A merge replaced the manifest while we were opening its segments
+                for segment in segments:
+                    segment.close()
+                if attempt == attempts - 1:
+                    raise
+        return []
+
+    def search(self, query: str, top: int = 10, exact: bool = False) -> List[Tuple[float, str]]:
+        """Return up to ``top`` (score, url) pairs, best first
+
+        Frequent terms are scored from their champion lists unless ``exact``
+        is set, which bounds query time at the cost of an approximate tail.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.doc_count:
+            return []
+        scores = defaultdict(float)
+        k1, b, average = self.k1, self.b, self.average_length or 1.0
+        for term in terms:
+            infos = [(segment_index, segment.find(term)) for segment_index, segment in enumerate(self.segments)]
+            infos = [(segment_index, info) for segment_index, info in infos if info is not None]
+            doc_freq = sum(info.doc_freq for _, info in infos)
+            if not doc_freq:
+                continue
+            idf = math.log(1 + (self.doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            for segment_index, info in infos:
+                lengths = self.segments[segment_index].lengths
+                for doc_id, tf in self.segments[segment_index].postings(info, champions=not exact):
+                    norm = k1 * (1 - b + b * lengths[doc_id] / average)
+                    scores[(segment_index, doc_id)] += idf * tf * (k1 + 1) / (tf + norm)
+
+        # Pop candidates best first and skip copies that a newer segment replaced
+        heap = [(-score, key) for key, score in scores.items()]
+        heapq.heapify(heap)
+        results = []
+        seen = set()
+        while heap and len(results) < top:
+            score, (segment_index, doc_id) = heapq.heappop(heap)
+            url = self.segments[segment_index].url(doc_id)
+            if url in seen:
+                continue
+            fingerprint = url_fingerprint(url)
+            if any(segment.contains_url(url, fingerprint) for segment in self.segments[segment_index + 1:]):
+                continue
+            seen.add(url)
+            results.append((round(-score, 4), url))
+        return results
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
@@ -0,0 +1,117 @@
+"""
+HTML to text conversion on lxml's C parser
+
+The markup is fed to libxml2's HTML parser with a parser target instead of
+building a tree: text inside ``<script>`` and ``<style>`` is dropped as it
+is parsed, and the remaining text nodes are handed out while the document
+is still being fed, a chunk at a time.
+
+``html_to_text`` gives the text DocumentProcessor has always produced with
+BeautifulSoup (all text outside scripts and styles, one space between the
+non-blank phrases of each line); ``iter_text`` gives the text nodes
+themselves, which MainSpider joins for ``text_content``. Only malformed
+markup reads differently, where libxml2 parses the way browsers do:
+markup inside ``<textarea>`` stays text and ``<![CDATA[`` sections are
+dropped.
+"""
+
+from typing import Iterator, Optional
+
+from lxml import etree
+
+SKIPPED_TAGS = frozenset(['script', 'style'])
+# Elements whose whitespace-only text nodes are kept as they are
+PRESERVED_TAGS = frozenset(['pre', 'textarea'])
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+# Characters fed to the parser between two hand-outs of text nodes
+CHUNK_SIZE = 64 * 1024
+
+
+class TextTarget:
+    """lxml parser target collecting text nodes outside skipped elements
+
+    libxml2 can report one text node in several ``data`` calls, so pieces
+    are joined until the next tag or comment. Like BeautifulSoup, a node of
+    ASCII whitespace becomes one newline (or one space if it has none)
+    outside ``<pre>`` and ``<textarea>``.
+    """
+
+    def __init__(self, within: Optional[str] = None, skipped_tags=SKIPPED_TAGS):
+        self.within = within
+        self.skipped_tags = skipped_tags
+        self.inside = 0 if within else 1
+        self.skipped = 0
+        self.preserved = 0
+        self.pieces = []
+        self.nodes = []
+
+    def flush(self):
+        if self.pieces:
+            if self.inside and not self.skipped:
+                node = ''.join(self.pieces)
+                if not self.preserved and not node.strip(ASCII_SPACES):
+                    node = '\n' if '\n' in node else ' '
+                self.nodes.append(node)
+            self.pieces = []
+
+    def start(self, tag, attrib):
+        self.flush()
+        if tag in self.skipped_tags:
+            self.skipped += 1
+        if tag in PRESERVED_TAGS:
+            self.preserved += 1
+        if tag == self.within:
+            self.inside += 1
+
+    def end(self, tag):
+        self.flush()
+        if tag in self.skipped_tags:
+            self.skipped -= 1
+        if tag in PRESERVED_TAGS:
+            self.preserved -= 1
+        if tag == self.within:
+            self.inside -= 1
+
+    def data(self, data):
+        self.pieces.append(data)
+
+    def comment(self, text):
+        self.flush()
+
+    def pi(self, target, data=None):
+        self.flush()
+
+    def drain(self):
+        nodes, self.nodes = self.nodes, []
+        return nodes
+
+    def close(self):
+        self.flush()
+
+
+def iter_text(html: str, within: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield the text nodes of ``html`` in document order
+
+    Nodes inside ``<script>`` and ``<style>`` are left out, and with
+    ``within`` (e.g. 'body') so is everything outside that element.
+    """
+    target = TextTarget(within)
+    parser = etree.HTMLParser(target=target)
+    parser.feed('')
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        yield from target.drain()
+    parser.close()
+    yield from target.drain()
+
+
+def clean_text(text: str) -> str:
+    """Join the non-blank phrases of every line with single spaces"""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML document"""
+    return clean_text(''.join(iter_text(html)))
@@ -0,0 +1,246 @@
+"""
+Main-content extraction for HTML pages
+
+Pages are cut into text blocks at block-level elements while lxml parses
+them (the same parser target approach as ``utils.html_text``, no tree is
+built). Each block is scored on its own:
+
+- link density: the share of its text inside ``<a>`` elements
+- text density: its number of words, short blocks are undecided
+- its place in the DOM: blocks under ``<nav>``, ``<aside>``, ``<form>``,
+  page-level ``<header>``/``<footer>`` or elements whose class or id reads
+  like navigation, a sidebar, a cookie banner etc. are boilerplate
+
+Undecided short blocks are settled by their neighbours (kept between two
+content blocks, and headings within a few lines of content), in one pass
+each way. On top of that ``MainContentExtractor`` learns each host's template:
+the text of every block is fingerprinted, and blocks seen on
+``template_min_pages`` pages of the same host are dropped from then on,
+whatever their score. Everything is linear in the size of the page.
+"""
+
+import re
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+from lxml import etree
+
+BLOCK_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'body', 'center', 'dd', 'details', 'dialog', 'div', 'dl',
+    'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hr', 'li', 'main', 'menu', 'nav', 'ol', 'option', 'p', 'pre', 'section', 'select', 'summary', 'table',
+    'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+])
+HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+SKIPPED_TAGS = frozenset(['script', 'style', 'noscript', 'template', 'svg', 'iframe', 'button'])
+BOILERPLATE_TAGS = frozenset(['nav', 'aside', 'form', 'menu', 'select'])
+# header and footer only mark boilerplate outside these
+CONTENT_TAGS = frozenset(['article', 'main'])
+BOILERPLATE_HINTS = re.compile(
+    r'(?:^|[^a-z])(?:nav|menu|header|footer|sidebar|breadcrumb|cookie|consent|banner|share|social|related|'
+    r'widget|promo|advert|sponsor|newsletter|subscribe|popup|modal|masthead|pagination)')
+
+# A block of at least this many words is content unless its links or place say otherwise
+MIN_WORDS = 10
+MAX_LINK_DENSITY = 0.33
+# Characters allowed between a short heading and the content it introduces
+MAX_HEADING_DISTANCE = 200
+
+GOOD = 'good'
+BAD = 'bad'
+SHORT = 'short'
+
+
+class Block:
+    """Text between two block-level tags, with what its score needs"""
+
+    __slots__ = ('text', 'chars', 'words', 'link_chars', 'heading', 'boilerplate', 'template', 'label')
+
+    def __init__(self, text, link_chars, heading, boilerplate):
+        self.text = text
+        self.chars = len(text)
+        # Only counted as far as MIN_WORDS + 1, that is all the score needs
+        self.words = len(text.split(None, MIN_WORDS))
+        self.link_chars = link_chars
+        self.heading = heading
+        self.boilerplate = boilerplate
+        self.template = False
+        self.label = None
+
+    @property
+    def link_density(self):
+        return self.link_chars / self.chars if self.chars else 0.0
+
+    def fingerprint(self):
+        return hash(self.text)
+
+
+class BlockTarget:
+    """lxml parser target cutting the body of a page into blocks"""
+
+    def __init__(self):
+        # (tag, boilerplate, inside article/main) per open element
+        self.stack = [('', False, False)]
+        self.skipped = 0
+        self.links = 0
+        self.inside = 0
+        self.nodes = []
+        self.pieces = []
+        self.link_chars = 0
+        self.blocks = []
+
+    def flush_node(self):
+        if self.pieces:
+            if self.inside and not self.skipped:
+                node = ''.join(self.pieces).strip()
+                if node:
+                    self.nodes.append(node)
+                    if self.links:
+                        self.link_chars += len(node)
+            self.pieces = []
+
+    def flush_block(self):
+        self.flush_node()
+        if self.nodes:
+            tag, boilerplate, _ = self.stack[-1]
+            self.blocks.append(Block(' '.join(self.nodes), self.link_chars, tag in HEADING_TAGS, boilerplate))
+            self.nodes = []
+            self.link_chars = 0
+
+    def start(self, tag, attrib):
+        if tag in BLOCK_TAGS:
+            self.flush_block()
+        else:
+            self.flush_node()
+        _, boilerplate, content = self.stack[-1]
+        if not boilerplate:
+            hints = f"{attrib.get('class', '')} {attrib.get('id', '')}".lower()
+            boilerplate = (tag in BOILERPLATE_TAGS or (tag in ('header', 'footer') and not content)
+                           or (hints != ' ' and BOILERPLATE_HINTS.search(hints) is not None))
+        self.stack.append((tag, boilerplate, content or tag in CONTENT_TAGS))
+        if tag in SKIPPED_TAGS:
+            self.skipped += 1
+        elif tag == 'a':
+            self.links += 1
+        elif tag == 'body':
+            self.inside += 1
+
+    def end(self, tag):
+        if tag in BLOCK_TAGS:
+            self.flush_block()
+        else:
+            self.flush_node()
+        if len(self.stack) > 1:
+            self.stack.pop()
+        if tag in SKIPPED_TAGS:
+            self.skipped -= 1
+        elif tag == 'a':
+            self.links -= 1
+        elif tag == 'body':
+            self.inside -= 1
+
+    def data(self, data):
+        self.pieces.append(data)
+
+    def comment(self, text):
+        self.flush_node()
+
+    def pi(self, target, data=None):
+        self.flush_node()
+
+    def close(self):
+        self.flush_block()
+        return self.blocks
+
+
+def parse_blocks(html: str) -> List[Block]:
+    """Blocks of the body of ``html`` in document order"""
+    parser = etree.HTMLParser(target=BlockTarget())
+    parser.feed(html)
+    return parser.close()
+
+
+def classify(blocks: List[Block]):
+    """Label every block GOOD or BAD"""
+    for block in blocks:
+        if block.boilerplate or block.template or block.link_density > MAX_LINK_DENSITY:
+            block.label = BAD
+        elif block.words >= MIN_WORDS:
+            block.label = GOOD
+        else:
+            block.label = SHORT
+    labels = [block.label for block in blocks]
+    if GOOD not in labels:
+        # Nothing reads like an article, keep every block that is not boilerplate
+        for block in blocks:
+            if block.label == SHORT:
+                block.label = GOOD
+        return
+    # Short blocks stay between content, headings stay shortly before it
+    before = []
+    previous = BAD
+    for label in labels:
+        before.append(previous)
+        if label != SHORT:
+            previous = label
+    # Characters from each block to the next content block
+    after, to_content = BAD, None
+    for index in range(len(blocks) - 1, -1, -1):
+        block = blocks[index]
+        if labels[index] == SHORT:
+            near_content = block.heading and to_content is not None and to_content <= MAX_HEADING_DISTANCE
+            block.label = GOOD if after == GOOD and before[index] == GOOD or near_content else BAD
+        else:
+            after = labels[index]
+            if after == GOOD:
+                to_content = 0
+                continue
+        if to_content is not None:
+            to_content += block.chars
+
+
+class MainContentExtractor:
+    """Main content of pages, with the template of every host learned as it goes
+
+    Block fingerprints are counted once per page for at most ``max_hosts``
+    hosts (least recently seen are forgotten first). A host past
+    ``max_blocks`` fingerprints keeps only the most common half.
+    """
+
+    def __init__(self, template_min_pages=3, max_hosts=1000, max_blocks=5000):
+        self.template_min_pages = template_min_pages
+        self.max_hosts = max_hosts
+        self.max_blocks = max_blocks
+        self.hosts = OrderedDict()
+        self.counts = Counter()
+
+    def learn(self, host, blocks):
+        """Count the blocks of a page of ``host`` and mark those of its template"""
+        seen = self.hosts.get(host)
+        if seen is None:
+            seen = self.hosts[host] = Counter()
+            if len(self.hosts) > self.max_hosts:
+                self.hosts.popitem(last=False)
+        else:
+            self.hosts.move_to_end(host)
+        fingerprints = [block.fingerprint() for block in blocks]
+        seen.update(set(fingerprints))
+        if len(seen) > self.max_blocks:
+            self.hosts[host] = seen = Counter(dict(seen.most_common(self.max_blocks // 2)))
+        for block, fingerprint in zip(blocks, fingerprints):
+            block.template = seen[fingerprint] >= self.template_min_pages
+
+    def extract(self, html: str, host: Optional[str] = None) -> str:
+        """Main-content text of ``html``, learning the template of ``host``"""
+        blocks = parse_blocks(html)
+        if host and self.template_min_pages:
+            self.learn(host, blocks)
+        classify(blocks)
+        kept = [block for block in blocks if block.label == GOOD]
+        self.counts['pages'] += 1
+        self.counts['blocks'] += len(blocks)
+        self.counts['template_blocks'] += sum(block.template for block in blocks)
+        self.counts['kept_blocks'] += len(kept)
+        self.counts['chars'] += sum(block.chars for block in blocks)
+        self.counts['kept_chars'] += sum(block.chars for block in kept)
+        return ' '.join(block.text for block in kept)
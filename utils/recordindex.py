@@ -0,0 +1,243 @@
+"""
+URL to record lookup index
+
+Maps a 64-bit URL fingerprint to the file, offset and length of a stored
+record. Writers buffer entries and write them as sorted runs; ``merge_runs``
+folds the runs into the single sorted ``records.idx`` when a crawl closes.
+Readers memory-map the index and any runs not merged yet and find a
+fingerprint by interpolation search, which needs a few probes however many
+records there are because fingerprints are uniformly distributed.
+
+Each writer appends the file paths it indexes to its own
+``paths-<session>.bin``, so several processes can index into one directory.
+"""
+
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+INDEX_FILE = 'records.idx'
+LOCK_FILE = 'merge.lock'
+# fingerprint, writer session, path offset, record offset, record length
+ENTRY = struct.Struct('<QIQQI')
+FINGERPRINT = struct.Struct('<Q')
+PATH_LENGTH = struct.Struct('<H')
+
+
+def url_fingerprint(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def paths_name(session: int) -> str:
+    return f'paths-{session:08x}.bin'
+
+
+def run_names(directory: str) -> List[str]:
+    # Run names start with their creation time, so sorting them keeps crawl order
+    return sorted(name for name in os.listdir(directory) if name.startswith('run-') and name.endswith('.idx'))
+
+
+class RecordIndexWriter:
+    """Buffers (url, path, offset, length) entries and writes them as sorted runs"""
+
+    def __init__(self, directory: str, run_size: int = 100000):
+        self.directory = directory
+        self.run_size = run_size
+        os.makedirs(directory, exist_ok=True)
+        self.session = uuid.uuid4().int & 0xFFFFFFFF
+        self.paths = open(os.path.join(directory, paths_name(self.session)), 'ab')
+        self.paths_offset = self.paths.tell()
+        self.last_path = None
+        self.last_path_offset = 0
+        self.entries = []
+        self.records = 0
+
+    def add(self, url: str, path: str, offset: int, length: int):
+        path = os.path.relpath(path, self.directory)
+        if path != self.last_path:
+            # Consecutive records of one file (e.g. a WARC) share their path entry
+            encoded = path.encode('utf-8')
+            self.paths.write(PATH_LENGTH.pack(len(encoded)) + encoded)
+            self.last_path = path
+            self.last_path_offset = self.paths_offset
+            self.paths_offset += PATH_LENGTH.size + len(encoded)
+        self.entries.append((url_fingerprint(url), self.session, self.last_path_offset, offset, length))
+        self.records += 1
+        if len(self.entries) >= self.run_size:
+            self.write_run()
+
+    def write_run(self):
+        if not self.entries:
+            return
+        # Paths must be on disk before a reader can find entries pointing at them
+        self.paths.flush()
+        # The sort is stable, so copies of one URL stay in crawl order
+        self.entries.sort(key=lambda entry: entry[0])
+        name = f'run-{time.time_ns():020d}-{self.session:08x}.idx'
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(b''.join(ENTRY.pack(*entry) for entry in self.entries))
+        os.replace(path + '.tmp', path)
+        self.entries = []
+
+    def close(self, merge: bool = True):
+        self.write_run()
+        self.paths.close()
+        if merge:
+            merge_runs(self.directory)
+
+
+def iter_entries(path: str, chunk_entries: int = 65536) -> Iterator[Tuple[int, int, int, int, int]]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(ENTRY.size * chunk_entries)
+            if not chunk:
+                return
+            yield from ENTRY.iter_unpack(chunk)
+
+
+def merge_runs(directory: str) -> int:
+    """Fold every run into ``records.idx``, returns the number of runs merged"""
+    lock = open(os.path.join(directory, LOCK_FILE), 'a')
+    try:
+        if fcntl is not None:
+            # Processes that close at the same time merge one after the other
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        runs = run_names(directory)
+        if not runs:
+            return 0
+        index_path = os.path.join(directory, INDEX_FILE)
+        sources = [index_path] if os.path.exists(index_path) else []
+        sources.extend(os.path.join(directory, name) for name in runs)
+        with open(index_path + '.tmp', 'wb', buffering=1024 * 1024) as f:
+            # heapq.merge is stable, the older copy of a URL comes first
+            for entry in heapq.merge(*[iter_entries(path) for path in sources], key=lambda entry: entry[0]):
+                f.write(ENTRY.pack(*entry))
+        os.replace(index_path + '.tmp', index_path)
+        for name in runs:
+            os.remove(os.path.join(directory, name))
+        return len(runs)
+    finally:
+        lock.close()
+
+
+class SortedTable:
+    """A memory-mapped file of fingerprint-sorted entries"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.count = size // ENTRY.size
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def key(self, position: int) -> int:
+        return FINGERPRINT.unpack_from(self.mmap, position * ENTRY.size)[0]
+
+    def find(self, fingerprint: int) -> List[Tuple[int, int, int, int, int]]:
+        """Entries with ``fingerprint``, in the order they were added"""
+        low, high = 0, self.count
+        while high - low > 8:
+            low_key, high_key = self.key(low), self.key(high - 1)
+            if fingerprint < low_key or fingerprint > high_key:
+                return []
+            if low_key == high_key:
+                break
+            guess = low + (fingerprint - low_key) * (high - 1 - low) // (high_key - low_key)
+            found = self.key(guess)
+            if found < fingerprint:
+                low = guess + 1
+            elif found > fingerprint:
+                high = guess
+            else:
+                low = high = guess
+                while low > 0 and self.key(low - 1) == fingerprint:
+                    low -= 1
+                while high < self.count and self.key(high) == fingerprint:
+                    high += 1
+                break
+        return [entry for entry in (ENTRY.unpack_from(self.mmap, position * ENTRY.size)
+                                    for position in range(low, high))
+                if entry[0] == fingerprint]
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+
+
+class RecordIndex:
+    """Looks up the stored records of a URL"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tables = self.open_tables()
+        self.path_files: Dict[int, object] = {}
+
+    def open_tables(self, attempts: int = 3) -> List[SortedTable]:
+        for attempt in range(attempts):
+            names = [INDEX_FILE] if os.path.exists(os.path.join(self.directory, INDEX_FILE)) else []
+            names.extend(run_names(self.directory))
+            tables = []
+            try:
+                for name in names:
+                    tables.append(SortedTable(os.path.join(self.directory, name)))
+                return tables
+            except FileNotFoundError:
+                # A merge removed the runs after we listed them
+                for table in tables:
+                    table.close()
+                if attempt == attempts - 1:
+                    raise
+        return []
+
+    def __len__(self) -> int:
+        return sum(table.count for table in self.tables)
+
+    def path(self, session: int, offset: int) -> str:
+        f = self.path_files.get(session)
+        if f is None:
+            f = self.path_files[session] = open(os.path.join(self.directory, paths_name(session)), 'rb')
+        f.seek(offset)
+        length = PATH_LENGTH.unpack(f.read(PATH_LENGTH.size))[0]
+        return os.path.join(self.directory, f.read(length).decode('utf-8'))
+
+    def locate(self, url: str) -> List[Tuple[str, int, int]]:
+        """(path, offset, length) of every record stored for ``url``, oldest first
+
+        Fingerprints are 64 bits, so callers that need certainty should check
+        the URL inside the record.
+        """
+        fingerprint = url_fingerprint(url)
+        return [(self.path(session, path_offset), offset, length)
+                for table in self.tables
+                for _, session, path_offset, offset, length in table.find(fingerprint)]
+
+    def lookup(self, url: str) -> Optional[bytes]:
+        """The newest record stored for ``url``, read with one seek"""
+        locations = self.locate(url)
+        if not locations:
+            return None
+        return read_record(*locations[-1])
+
+    def close(self):
+        for table in self.tables:
+            table.close()
+        for f in self.path_files.values():
+            f.close()
+        self.path_files = {}
+
+
+def read_record(path: str, offset: int, length: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
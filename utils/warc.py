@@ -0,0 +1,302 @@
+"""
+WARC reading and writing utilities
+
+Reads ``.warc`` and ``.warc.gz`` files (one or many gzip members) and turns
+``response`` records back into HTTP status, headers and body. ``WarcWriter``
+writes WARC/1.1 records as one gzip member each into size-rotated files,
+with a CDX index next to every file so a record can be read back with a
+single seek.
+"""
+
+import base64
+import gzip
+import hashlib
+import os
+import uuid
+import zlib
+from datetime import datetime, timezone
+from http import HTTPStatus
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class WarcRecord:
+    """One WARC record: header fields and the raw content block"""
+
+    def __init__(self, headers: Dict[str, str], block: bytes, offset: int = 0):
+        self.headers = headers
+        self.block = block
+        self.offset = offset
+
+    @property
+    def type(self) -> str:
+        return self.headers.get('WARC-Type', '')
+
+    @property
+    def target_uri(self) -> str:
+        return self.headers.get('WARC-Target-URI', '')
+
+    def http_response(self) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """Split a response record block into (status, headers, body)"""
+        head, _, body = self.block.partition(b'\r\n\r\n')
+        lines = head.split(b'\r\n')
+        status = int(lines[0].split(b' ', 2)[1])
+        headers = []
+        for line in lines[1:]:
+            name, _, value = line.partition(b':')
+            headers.append((name.strip(), value.strip()))
+        names = {name.lower(): value for name, value in headers}
+        if names.get(b'transfer-encoding', b'').lower() == b'chunked':
+            body = dechunk(body)
+        encoding = names.get(b'content-encoding', b'').lower()
+        if encoding in (b'gzip', b'x-gzip', b'deflate'):
+            try:
+                body = zlib.decompress(body, 47 if encoding != b'deflate' else 15)
+            except zlib.error:
+                pass
+        return status, headers, body
+
+
+def dechunk(body: bytes) -> bytes:
+    """Decode a chunked transfer-encoded body"""
+    output = []
+    pos = 0
+    while pos < len(body):
+        eol = body.find(b'\r\n', pos)
+        if eol < 0:
+            break
+        size = int(body[pos:eol].split(b';')[0] or b'0', 16)
+        if size == 0:
+            break
+        output.append(body[eol + 2:eol + 2 + size])
+        pos = eol + 2 + size + 2
+    return b''.join(output)
+
+
+def open_warc(path: str):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_records(path: str, record_types: Optional[Tuple[str, ...]] = None,
+                 shard: int = 0, shards: int = 1) -> Iterator[WarcRecord]:
+    """Yield the records of a WARC file in order
+
+    With ``shards``, only every ``shards``-th record of ``record_types`` from
+    ``shard`` on is read, the blocks of the others are skipped.
+    """
+    index = 0
+    with open_warc(path) as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            if not line.startswith(b'WARC/'):
+                raise ValueError(f"Invalid WARC record at offset {offset} in {path}")
+            headers = {}
+            for line in iter(f.readline, b'\r\n'):
+                if not line:
+                    break
+                name, _, value = line.decode('utf-8').partition(':')
+                headers[name.strip()] = value.strip()
+            length = int(headers.get('Content-Length', 0))
+            if record_types is None or headers.get('WARC-Type') in record_types:
+                index += 1
+                if (index - 1) % shards == shard:
+                    yield WarcRecord(headers, f.read(length), offset)
+                    continue
+            f.seek(length, 1)
+
+
+def read_record_at(path: str, offset: int) -> WarcRecord:
+    """Read the single gzip member starting at ``offset`` (from a CDX line)"""
+    decompressor = zlib.decompressobj(31)
+    data = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while not decompressor.eof:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            data.append(decompressor.decompress(chunk))
+    raw = b''.join(data)
+    head, _, rest = raw.partition(b'\r\n\r\n')
+    headers = {}
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.decode('utf-8').partition(':')
+        headers[name.strip()] = value.strip()
+    return WarcRecord(headers, rest[:int(headers.get('Content-Length', 0))], offset)
+
+
+def surt_key(url: str) -> str:
+    """Sort-friendly URL key used in CDX files (``com,example)/path?query``)"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    key = ','.join(reversed(host.split('.'))) + ')' + (parts.path or '/').lower()
+    if parts.query:
+        key += '?' + parts.query.lower()
+    return key
+
+
+def payload_digest(payload: bytes) -> str:
+    return 'sha1:' + base64.b32encode(hashlib.sha1(payload).digest()).decode('ascii')
+
+
+def warc_date(timestamp: Optional[float] = None) -> str:
+    moment = datetime.fromtimestamp(timestamp, timezone.utc) if timestamp else datetime.now(timezone.utc)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def http_request_block(method: str, url: str, headers: List[Tuple[bytes, bytes]], body: bytes = b'') -> bytes:
+    parts = urlsplit(url)
+    target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+    lines = [f'{method} {target} HTTP/1.1'.encode('utf-8')]
+    names = {name.lower() for name, _ in headers}
+    if b'host' not in names:
+        lines.append(b'Host: ' + parts.netloc.encode('utf-8'))
+    lines.extend(name + b': ' + value for name, value in headers)
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + body
+
+
+def http_response_block(status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    """Serialize a response with its decoded body
+
+    Transfer and content encodings were already removed by the downloader,
+    so those headers are dropped and Content-Length matches the stored body.
+    """
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f'HTTP/1.1 {status} {reason}'.encode('utf-8')]
+    for name, value in headers:
+        if name.lower() in (b'transfer-encoding', b'content-encoding', b'content-length'):
+            continue
+        lines.append(name + b': ' + value)
+    lines.append(b'Content-Length: %d' % len(body))
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + body
+
+
+class WarcWriter:
+    """Writes gzip-per-record WARC files rotated by size, with CDX indexes"""
+
+    def __init__(self, directory: str, prefix: str = 'crawl', max_size: int = 1024 ** 3,
+                 buffer_size: int = 1024 * 1024, compress_level: int = 6):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_size = max_size
+        self.buffer_size = buffer_size
+        self.compress_level = compress_level
+        self.serial = 0
+        self.file = None
+        self.cdx = None
+        self.path = None
+        self.offset = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def open_next(self):
+        self.close()
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self.serial += 1
+        filename = f'{self.prefix}-{stamp}-{self.serial:05d}.warc.gz'
+        self.path = os.path.join(self.directory, filename)
+        self.file = open(self.path, 'wb', buffering=self.buffer_size)
+        self.cdx = open(self.path + '.cdx', 'w', encoding='utf-8', buffering=self.buffer_size)
+        self.cdx.write(' CDX N b a m s k S V g\n')
+        self.offset = 0
+        info = b'software: AdvancedWebCrawler\r\nformat: WARC File Format 1.1\r\n'
+        self.write_record('warcinfo', None, info, 'application/warc-fields', {'WARC-Filename': filename})
+
+    def write_record(self, warc_type: str, target_uri: Optional[str], block: bytes, content_type: str,
+                     extra_headers: Optional[Dict[str, str]] = None) -> Tuple[str, int, int]:
+        """Append one record, returns (record id, offset, compressed length)"""
+        if self.file is None:
+            self.open_next()
+        record_id = f'<urn:uuid:{uuid.uuid4()}>'
+        extra_headers = dict(extra_headers or {})
+        headers = [
+            ('WARC-Type', warc_type),
+            ('WARC-Record-ID', record_id),
+            ('WARC-Date', extra_headers.pop('WARC-Date', None) or warc_date()),
+        ]
+        if target_uri:
+            headers.append(('WARC-Target-URI', target_uri))
+        headers.extend(extra_headers.items())
+        headers.append(('WARC-Block-Digest', payload_digest(block)))
+        headers.append(('Content-Type', content_type))
+        headers.append(('Content-Length', str(len(block))))
+        head = 'WARC/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers) + '\r\n'
+        member = gzip.compress(head.encode('utf-8') + block + b'\r\n\r\n', self.compress_level)
+        offset = self.offset
+        self.file.write(member)
+        self.offset += len(member)
+        return record_id, offset, len(member)
+
+    def write_exchange(self, url: str, method: str, request_headers: List[Tuple[bytes, bytes]],
+                       status: int, response_headers: List[Tuple[bytes, bytes]], body: bytes,
+                       mimetype: str = '-', timestamp: Optional[float] = None) -> Tuple[str, int]:
+        """Write a response record and its request record, index the response"""
+        if self.file is None or self.offset >= self.max_size:
+            # Rotate between exchanges so a request stays next to its response
+            self.open_next()
+        date = warc_date(timestamp)
+        response_block = http_response_block(status, response_headers, body)
+        digest = payload_digest(body)
+        response_id, offset, length = self.write_record(
+            'response', url, response_block, 'application/http;msgtype=response',
+            {'WARC-Date': date, 'WARC-Payload-Digest': digest}
+        )
+        path = self.path
+        self.write_record(
+            'request', url, http_request_block(method, url, request_headers),
+            'application/http;msgtype=request',
+            {'WARC-Date': date, 'WARC-Concurrent-To': response_id}
+        )
+        cdx_time = date.replace('-', '').replace(':', '').replace('T', '').rstrip('Z')
+        mimetype = (mimetype or '-').split(';')[0].strip() or '-'
+        self.cdx.write(
+            f'{surt_key(url)} {cdx_time} {url} {mimetype} {status} {digest[5:]} '
+            f'{length} {offset} {os.path.basename(path)}\n'
+        )
+        return path, offset
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+            self.cdx.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.cdx.close()
+            self.file = None
+            self.cdx = None
+
+
+def iter_cdx(path: str) -> Iterator[Dict[str, str]]:
+    """Yield the entries of a CDX file written by ``WarcWriter``"""
+    fields = ('urlkey', 'timestamp', 'url', 'mimetype', 'status', 'digest', 'length', 'offset', 'filename')
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(' CDX') or not line.strip():
+                continue
+            yield dict(zip(fields, line.rstrip('\n').split(' ')))
+
+
+def lookup(directory: str, url: str) -> List[WarcRecord]:
+    """Return every archived response record for ``url`` in ``directory``"""
+    key = surt_key(url)
+    records = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.cdx'):
+            continue
+        for entry in iter_cdx(os.path.join(directory, name)):
+            if entry['urlkey'] == key:
+                records.append(read_record_at(os.path.join(directory, entry['filename']), int(entry['offset'])))
+    return records
@@ -0,0 +1,36 @@
+"""
+Engine pause shared by the components applying backpressure
+
+The engine has a single paused flag, so a component resuming it would
+cancel the backpressure of another. Components hold the pause through
+``EnginePause`` instead, and the engine resumes only once every holder
+has released it.
+"""
+
+
+class EnginePause:
+    """Holders of the engine pause of one crawler"""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.holders = set()
+
+    @classmethod
+    def of(cls, crawler):
+        """The pause shared by every component of the crawler"""
+        pause = getattr(crawler, 'engine_pause', None)
+        if pause is None:
+            pause = crawler.engine_pause = cls(crawler)
+        return pause
+
+    def hold(self, holder):
+        if not self.holders:
+            self.crawler.engine.pause()
+        self.holders.add(holder)
+
+    def release(self, holder):
+        if holder not in self.holders:
+            return
+        self.holders.remove(holder)
+        if not self.holders:
+            self.crawler.engine.unpause()
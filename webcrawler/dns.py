@@ -0,0 +1,371 @@
+"""
+Persistent asynchronous DNS cache with prefetch
+
+``CachingResolver`` replaces Scrapy's CachingThreadedResolver (set as
+``DNS_RESOLVER``). Names are resolved with ``twisted.names`` instead of
+blocking ``getaddrinfo`` calls in the reactor thread pool, so the answer's
+TTL is known. Addresses are kept in memory and in a SQLite file
+(``DNS_CACHE_PATH``) until that TTL (clamped to ``DNS_CACHE_MIN_TTL`` /
+``DNS_CACHE_MAX_TTL``) expires, and names that do not exist are cached for
+``DNS_NEGATIVE_TTL`` seconds. At most ``DNS_CONCURRENCY`` lookups run at
+once, lookups for requests going before prefetches.
+
+``DnsPrefetch`` starts the lookup for a host as soon as one of its requests
+is scheduled or pushed to the shared frontier, so the address is usually
+known by the time the request reaches the downloader.
+
+Like Scrapy's default resolver only IPv4 addresses are returned.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter, deque
+from ipaddress import ip_address
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.resolver import dnscache
+from scrapy.utils.datatypes import LocalCache
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.internet.error import DNSLookupError
+from twisted.internet.interfaces import IResolverSimple
+from twisted.names import client, dns, hosts, resolve
+from twisted.names.error import DomainError
+from zope.interface import implementer
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    address TEXT,
+    expires_at REAL NOT NULL
+);
+"""
+
+# CNAME chains longer than this are treated as failures
+MAX_CNAME_DEPTH = 8
+
+
+def is_ip(name):
+    try:
+        ip_address(name)
+    except ValueError:
+        return False
+    return True
+
+
+def retry_timeouts(total):
+    """Per-attempt timeouts like Twisted's (1, 3, 11, 45) adding up to ``total`` seconds"""
+    timeouts, left = [], total
+    for step in (1, 3, 11, 45):
+        if left <= 0:
+            break
+        timeouts.append(min(step, left))
+        left -= step
+    if left > 0:
+        timeouts[-1] += left
+    return tuple(timeouts) or (1,)
+
+
+def build_resolver(servers=None, resolvconf='/etc/resolv.conf', hostsfile='/etc/hosts'):
+    """A twisted.names resolver for ``servers`` ('host:port'), or the system configuration"""
+    if servers:
+        addresses = []
+        for server in servers:
+            host, _, port = server.rpartition(':') if ':' in server else (server, '', '53')
+            addresses.append((host, int(port)))
+        return client.Resolver(servers=addresses)
+    return resolve.ResolverChain([hosts.Resolver(file=hostsfile), client.Resolver(resolv=resolvconf)])
+
+
+class DnsStore:
+    """Resolved addresses per host name in a SQLite file, None for names that do not exist"""
+
+    def __init__(self, path, commit_every=100):
+        self.path = str(path)
+        self.commit_every = commit_every
+        self.pending = 0
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def load(self, now=None):
+        """Yield (host, address, expires_at) for unexpired entries, the longest lived last"""
+        yield from self.db.execute(
+            'SELECT host, address, expires_at FROM hosts WHERE expires_at > ? ORDER BY expires_at',
+            (now if now is not None else time.time(),)
+        )
+
+    def put(self, host, address, expires_at):
+        self.db.execute('INSERT OR REPLACE INTO hosts (host, address, expires_at) VALUES (?, ?, ?)',
+                        (host, address, expires_at))
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def expire(self, now=None):
+        deleted = self.db.execute('DELETE FROM hosts WHERE expires_at <= ?',
+                                  (now if now is not None else time.time(),)).rowcount
+        self.db.commit()
+        return deleted
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM hosts').fetchone()[0]
+
+    def commit(self):
+        if self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+@implementer(IResolverSimple)
+class CachingResolver:
+    """TTL-respecting DNS cache with negative entries, bounded concurrency and prefetch"""
+
+    def __init__(self, reactor, resolver, store=None, cache_size=100000, timeout=60.0, concurrency=16,
+                 min_ttl=60, max_ttl=86400, negative_ttl=300, prefetch_queue_size=10000):
+        self.reactor = reactor
+        self.resolver = resolver
+        self.store = store
+        self.timeouts = retry_timeouts(timeout)
+        self.concurrency = max(1, concurrency)
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.prefetch_queue_size = prefetch_queue_size
+        self.clock = time.time
+        self.counts = Counter()
+        # host -> (address or None, expires_at)
+        self.entries = LocalCache(cache_size)
+        # host -> Deferreds waiting for its lookup, queued or running
+        self.pending = {}
+        self.running = set()
+        self.urgent = deque()
+        self.background = deque()
+        # Prefetched hosts not requested yet
+        self.prefetched = set()
+        dnscache.limit = cache_size
+        if store is not None:
+            for host, address, expires_at in store.load(self.clock()):
+                self.remember(host, address, expires_at)
+
+    @classmethod
+    def from_crawler(cls, crawler, reactor):
+        # Built once per process from the CrawlerProcess and its settings
+        settings = crawler.settings
+        store = None
+        path = settings.get('DNS_CACHE_PATH')
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            store = DnsStore(path)
+            store.expire()
+        return cls(
+            reactor,
+            build_resolver(settings.getlist('DNS_SERVERS')),
+            store=store,
+            cache_size=settings.getint('DNSCACHE_SIZE', 100000),
+            timeout=settings.getfloat('DNS_TIMEOUT', 60),
+            concurrency=settings.getint('DNS_CONCURRENCY', 16),
+            min_ttl=settings.getfloat('DNS_CACHE_MIN_TTL', 60),
+            max_ttl=settings.getfloat('DNS_CACHE_MAX_TTL', 86400),
+            negative_ttl=settings.getfloat('DNS_NEGATIVE_TTL', 300),
+            prefetch_queue_size=settings.getint('DNS_PREFETCH_QUEUE_SIZE', 10000),
+        )
+
+    def install_on_reactor(self):
+        self.reactor.installResolver(self)
+        self.reactor.addSystemEventTrigger('before', 'shutdown', self.close)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def getHostByName(self, name, timeout=None):
+        if is_ip(name):
+            return succeed(name)
+        host = name.lower()
+        entry = self.entries.get(host)
+        if entry is not None and entry[1] > self.clock():
+            if host in self.prefetched:
+                self.prefetched.discard(host)
+                self.counts['prefetch_hits'] += 1
+            if entry[0] is None:
+                self.counts['negative_hits'] += 1
+                return fail(DNSLookupError(name))
+            self.counts['cache_hits'] += 1
+            return succeed(entry[0])
+        waiters = self.pending.get(host)
+        if waiters is None:
+            self.counts['misses'] += 1
+            waiters = self.pending[host] = []
+            self.urgent.append(host)
+        else:
+            self.counts['waits'] += 1
+            if host not in self.running:
+                # A queued prefetch is needed now
+                self.urgent.append(host)
+        self.prefetched.discard(host)
+        d = Deferred()
+        waiters.append(d)
+        self.start_lookups()
+        return d
+
+    def prefetch(self, name):
+        """Queue a background lookup for ``name``, returns False if not needed or the queue is full"""
+        if not name or is_ip(name):
+            return False
+        host = name.lower()
+        if host in self.pending:
+            return False
+        entry = self.entries.get(host)
+        if entry is not None and entry[1] > self.clock():
+            return False
+        if len(self.background) >= self.prefetch_queue_size:
+            self.counts['prefetch_dropped'] += 1
+            return False
+        self.counts['prefetched'] += 1
+        self.pending[host] = []
+        self.prefetched.add(host)
+        self.background.append(host)
+        self.start_lookups()
+        return True
+
+    def start_lookups(self):
+        while len(self.running) < self.concurrency:
+            host = self.next_queued()
+            if host is None:
+                return
+            self.running.add(host)
+            self.counts['lookups'] += 1
+            d = self.query(host)
+            d.addCallbacks(self.resolved, self.failed, callbackArgs=(host,), errbackArgs=(host,))
+
+    def next_queued(self):
+        for queue in (self.urgent, self.background):
+            while queue:
+                host = queue.popleft()
+                if host in self.pending and host not in self.running:
+                    return host
+        return None
+
+    def query(self, host, depth=0):
+        d = self.resolver.lookupAddress(host, self.timeouts)
+        d.addCallback(self.parse_answers, host, depth)
+        return d
+
+    def parse_answers(self, result, host, depth):
+        """Return (address, ttl) from a lookupAddress result, following CNAMEs"""
+        answers = result[0]
+        addresses = [record for record in answers if record.type == dns.A]
+        cnames = [record for record in answers if record.type == dns.CNAME]
+        ttl = min((record.ttl for record in addresses + cnames), default=self.min_ttl)
+        if addresses:
+            return addresses[0].payload.dottedQuad(), ttl
+        if cnames and depth < MAX_CNAME_DEPTH:
+            d = self.query(cnames[0].payload.name.name.decode('ascii'), depth + 1)
+            d.addCallback(lambda resolved: (resolved[0], min(resolved[1], ttl)))
+            return d
+        raise DomainError(host)
+
+    def resolved(self, result, host):
+        address, ttl = result
+        expires_at = self.clock() + min(max(ttl, self.min_ttl), self.max_ttl)
+        self.remember(host, address, expires_at)
+        if self.store is not None:
+            self.store.put(host, address, expires_at)
+        self.finish(host, address, None)
+
+    def failed(self, failure, host):
+        if failure.check(DomainError):
+            # The name does not exist or has no address
+            expires_at = self.clock() + self.negative_ttl
+            self.remember(host, None, expires_at)
+            if self.store is not None:
+                self.store.put(host, None, expires_at)
+            self.counts['negative'] += 1
+            self.finish(host, None, DNSLookupError(host))
+        else:
+            # Timeouts and server errors are not cached
+            self.counts['lookup_errors'] += 1
+            logger.debug(f"DNS lookup for {host} failed: {failure.getErrorMessage()}")
+            self.finish(host, None, DNSLookupError(f'{host}: {failure.getErrorMessage()}'))
+
+    def finish(self, host, address, error):
+        self.running.discard(host)
+        for d in self.pending.pop(host, ()):
+            if error is None:
+                d.callback(address)
+            else:
+                d.errback(error)
+        self.start_lookups()
+
+    def remember(self, host, address, expires_at):
+        self.entries[host] = (address, expires_at)
+        if address is not None:
+            # Scrapy's downloader keys per-IP download slots on this cache
+            dnscache[host] = address
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DnsPrefetch:
+    """Extension resolving the hosts of newly scheduled or queued requests ahead of their download"""
+
+    def __init__(self, crawler):
+        if not crawler.settings.getbool('DNS_PREFETCH_ENABLED', True):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.resolver = None
+        self.opened_counts = Counter()
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        # CrawlerProcess installs the resolver just before starting the reactor, after the spider is opened
+        from twisted.internet import reactor
+        reactor.callWhenRunning(self.attach, reactor, spider)
+
+    def attach(self, reactor, spider):
+        resolver = getattr(reactor, 'resolver', None)
+        if not isinstance(resolver, CachingResolver):
+            logger.info("DNS prefetch disabled: DNS_RESOLVER is not webcrawler.dns.CachingResolver")
+            return
+        self.resolver = resolver
+        self.opened_counts = Counter(resolver.counts)
+        spider.dns_prefetch = self
+        self.crawler.signals.connect(self.request_scheduled, signal=signals.request_scheduled)
+
+    def request_scheduled(self, request, spider):
+        self.resolver.prefetch(urlparse_cached(request).hostname)
+
+    def prefetch_urls(self, urls):
+        """Prefetch the hosts of URLs pushed to the shared frontier"""
+        for url in urls:
+            self.resolver.prefetch(urlparse(url).hostname)
+
+    def spider_closed(self, spider):
+        if self.resolver is None:
+            return
+        for key, value in self.resolver.counts.items():
+            self.stats.set_value(f'dns/{key}', value - self.opened_counts[key], spider=spider)
+        self.stats.set_value('dns/cached_hosts', len(self.resolver), spider=spider)
+        if self.resolver.store is not None:
+            self.resolver.store.commit()
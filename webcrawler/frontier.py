@@ -0,0 +1,526 @@
+"""
+Shared crawl frontier backends
+
+A frontier backend holds the URLs waiting to be fetched and the sets of
+fingerprints already seen, so that several crawler nodes can work on one
+crawl. Work is grouped by host and a node must hold a host's lease before it
+may fetch from that host, so a host is only ever crawled by one node at a time.
+"""
+
+import hashlib
+import logging
+import socket
+import time
+import uuid
+from collections import defaultdict, deque
+from urllib.parse import urlparse, unquote
+
+from scrapy.utils.misc import load_object
+
+
+logger = logging.getLogger(__name__)
+
+
+def url_fingerprint(url):
+    """Return the fingerprint used for URL deduplication"""
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def url_host(url):
+    """Return the host part of a URL (lowercased, without port)"""
+    return (urlparse(url).hostname or '').lower()
+
+
+def load_frontier(settings):
+    """Instantiate the backend named by FRONTIER_BACKEND, or return None"""
+    backend_path = settings.get('FRONTIER_BACKEND')
+    if not backend_path:
+        return None
+    backend_cls = load_object(backend_path)
+    return backend_cls.from_settings(settings)
+
+
+class FrontierBackend:
+    """Interface for shared frontier and seen-set storage
+
+    Entries are (url, depth) tuples. ``push`` drops URLs that were pushed
+    before, ``pop`` hands out work only from hosts leased to this node and
+    ``mark_done`` records finished URLs so they are never handed out again.
+    """
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    def push(self, entries):
+        """Enqueue new entries, returns the number actually enqueued"""
+        raise NotImplementedError
+
+    def pop(self, count):
+        """Return up to ``count`` entries from hosts leased to this node"""
+        raise NotImplementedError
+
+    def mark_done(self, urls):
+        """Record URLs as fetched (successfully or not)"""
+        raise NotImplementedError
+
+    def renew_leases(self):
+        """Keep this node's host leases alive, called on a heartbeat"""
+        pass
+
+    def add_seen(self, keys, namespace='items'):
+        """Add keys to a shared seen-set, returns a list of "was new" flags"""
+        raise NotImplementedError
+
+    def remove_seen(self, keys, namespace='items'):
+        """Take keys out of a shared seen-set again"""
+        raise NotImplementedError
+
+    def pop_recovered(self):
+        """URLs handed out by ``pop`` since the last call that another node had in flight"""
+        return set()
+
+    def has_pending(self):
+        """Check whether any node still has queued or in-flight work"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by this node"""
+        pass
+
+
+class MemoryFrontierBackend(FrontierBackend):
+    """In-process frontier for single node crawls and testing"""
+
+    def __init__(self):
+        self.queues = defaultdict(deque)
+        self.inflight = set()
+        self.seen = defaultdict(set)
+
+    def push(self, entries):
+        pushed = 0
+        for url, depth in entries:
+            fp = url_fingerprint(url)
+            if fp in self.seen['requests']:
+                continue
+            self.seen['requests'].add(fp)
+            self.queues[url_host(url)].append((url, depth))
+            pushed += 1
+        return pushed
+
+    def pop(self, count):
+        entries = []
+        for host in list(self.queues):
+            queue = self.queues[host]
+            while queue and len(entries) < count:
+                entry = queue.popleft()
+                self.inflight.add(entry[0])
+                entries.append(entry)
+            if not queue:
+                del self.queues[host]
+            if len(entries) >= count:
+                break
+        return entries
+
+    def mark_done(self, urls):
+        for url in urls:
+            self.inflight.discard(url)
+
+    def add_seen(self, keys, namespace='items'):
+        seen = self.seen[namespace]
+        flags = []
+        for key in keys:
+            flags.append(key not in seen)
+            seen.add(key)
+        return flags
+
+    def remove_seen(self, keys, namespace='items'):
+        self.seen[namespace].difference_update(keys)
+
+    def has_pending(self):
+        return bool(self.queues or self.inflight)
+
+
+class RedisError(Exception):
+    """Error reply or protocol failure from a Redis server"""
+    pass
+
+
+class RedisConnection:
+    """Minimal RESP2 client supporting pipelined commands"""
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        parsed = urlparse(url)
+        db = parsed.path.lstrip('/')
+        return cls(
+            host=parsed.hostname or 'localhost',
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+            **kwargs
+        )
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self.pipeline(setup)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.reader.close()
+                self.sock.close()
+            finally:
+                self.sock = None
+                self.reader = None
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        """Send all commands in one write and read back their replies"""
+        if not commands:
+            return []
+        if self.sock is None:
+            self.connect()
+        payload = b''.join(self.encode_command(command) for command in commands)
+        try:
+            self.sock.sendall(payload)
+            replies = [self.read_reply() for _ in commands]
+        except (OSError, RedisError):
+            self.close()
+            raise
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    @staticmethod
+    def encode_command(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            elif isinstance(arg, str):
+                data = arg.encode('utf-8')
+            else:
+                data = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise RedisError('Connection closed by server')
+        prefix, data = line[:1], line[1:-2]
+        if prefix == b'+':
+            return data.decode('utf-8')
+        if prefix == b'-':
+            return RedisError(data.decode('utf-8'))
+        if prefix == b':':
+            return int(data)
+        if prefix == b'$':
+            length = int(data)
+            if length < 0:
+                return None
+            value = self.reader.read(length + 2)
+            return value[:-2]
+        if prefix == b'*':
+            length = int(data)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise RedisError(f'Unknown reply type: {line!r}')
+
+
+class RedisFrontierBackend(FrontierBackend):
+    """Frontier shared between nodes through a Redis-protocol server
+
+    Key layout (all keys start with ``prefix``):
+
+    - ``seen:<namespace>``: set of fingerprints already pushed/stored
+    - ``done``: set of fingerprints already fetched
+    - ``hosts``: set of hosts with queued or in-flight work
+    - ``q:<host>``: list of queued entries for the host
+    - ``inflight:<host>``: hash of fingerprint -> entry handed out to a node
+    - ``lease:<host>``: id of the node allowed to fetch from the host
+
+    Leases expire after ``lease_timeout`` seconds unless renewed (on every
+    ``pop`` and on the spider's heartbeat in between). When a node
+    takes over an expired lease it also takes over the in-flight entries of
+    the previous holder, skipping those that were marked done.
+    """
+
+    # Tries to move popped entries in flight before giving up until the next pop
+    POP_ATTEMPTS = 3
+
+    def __init__(self, connection, prefix='webcrawler', lease_timeout=60,
+                 node_id=None, max_hosts=16):
+        self.conn = connection
+        self.prefix = prefix
+        self.lease_ms = int(lease_timeout * 1000)
+        self.node_id = node_id or f'{socket.gethostname()}-{uuid.uuid4().hex[:8]}'
+        self.max_hosts = max_hosts
+        self.leases = {}
+        self.recovered = set()
+
+    @classmethod
+    def from_settings(cls, settings):
+        connection = RedisConnection.from_url(settings.get('FRONTIER_REDIS_URL', 'redis://localhost:6379/0'))
+        return cls(
+            connection,
+            prefix=settings.get('FRONTIER_KEY_PREFIX', 'webcrawler'),
+            lease_timeout=settings.getfloat('FRONTIER_LEASE_TIMEOUT', 60),
+            node_id=settings.get('FRONTIER_NODE_ID'),
+            max_hosts=settings.getint('FRONTIER_MAX_HOSTS', 16),
+        )
+
+    def key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    @staticmethod
+    def encode_entry(url, depth):
+        return f'{depth}\t{url}'
+
+    @staticmethod
+    def decode_entry(raw):
+        depth, url = raw.decode('utf-8').split('\t', 1)
+        return url, int(depth)
+
+    def push(self, entries):
+        entries = list(entries)
+        if not entries:
+            return 0
+        seen_key = self.key('seen', 'requests')
+        flags = self.conn.pipeline([('SADD', seen_key, url_fingerprint(url)) for url, _ in entries])
+
+        by_host = defaultdict(list)
+        for (url, depth), added in zip(entries, flags):
+            if added:
+                by_host[url_host(url)].append(self.encode_entry(url, depth))
+        commands = []
+        for host, encoded in by_host.items():
+            commands.append(('RPUSH', self.key('q', host)) + tuple(encoded))
+            commands.append(('SADD', self.key('hosts'), host))
+        self.conn.pipeline(commands)
+        return sum(len(encoded) for encoded in by_host.values())
+
+    def pop(self, count):
+        self.renew_leases()
+        entries = self.pop_from_leased(count)
+        if len(entries) < count and len(self.leases) < self.max_hosts:
+            entries.extend(self.acquire_hosts(count - len(entries)))
+            if len(entries) < count:
+                entries.extend(self.pop_from_leased(count - len(entries)))
+        return entries
+
+    def renew_leases(self):
+        """Extend leases still held by this node and forget lost ones"""
+        hosts = list(self.leases)
+        if not hosts:
+            return
+        owners = self.conn.pipeline([('GET', self.key('lease', host)) for host in hosts])
+        renew = []
+        for host, owner in zip(hosts, owners):
+            if owner is not None and owner.decode('utf-8') == self.node_id:
+                renew.append(('PEXPIRE', self.key('lease', host), self.lease_ms))
+            else:
+                logger.warning(f'Lost frontier lease for {host}')
+                del self.leases[host]
+        self.conn.pipeline(renew)
+
+    def pop_from_leased(self, count):
+        """Move entries from the queues of leased hosts to their in-flight hashes
+
+        The queues are read under WATCH and trimmed in the same MULTI as the
+        in-flight hashes are written, so an entry is always in one or the
+        other even if this node dies halfway. Work pushed in between aborts
+        the move, which is retried up to ``POP_ATTEMPTS`` times.
+        """
+        hosts = list(self.leases)
+        if not hosts or count <= 0:
+            return []
+        share = max(1, count // len(hosts))
+        queues = [self.key('q', host) for host in hosts]
+        for _ in range(self.POP_ATTEMPTS):
+            replies = self.conn.pipeline([('WATCH',) + tuple(queues)]
+                                         + [('LRANGE', queue, 0, share - 1) for queue in queues])[1:]
+            entries = []
+            drained = []
+            transaction = [('MULTI',)]
+            for host, queue, popped in zip(hosts, queues, replies):
+                if not popped:
+                    drained.append(host)
+                    continue
+                transaction.append(('LTRIM', queue, len(popped), -1))
+                for raw in popped:
+                    url, depth = self.decode_entry(raw)
+                    transaction.append(('HSET', self.key('inflight', host), url_fingerprint(url), raw))
+                    entries.append((url, depth))
+            if not entries:
+                self.conn.execute('UNWATCH')
+                break
+            transaction.append(('EXEC',))
+            if self.conn.pipeline(transaction)[-1] is not None:
+                break
+            logger.debug('Frontier queues changed while popping, trying again')
+        else:
+            return []
+        self.retire_hosts(drained)
+        return entries[:count] + self.requeue(entries[count:])
+
+    def requeue(self, entries):
+        """Put back entries popped beyond the requested count"""
+        if not entries:
+            return []
+        transaction = [('MULTI',)]
+        for url, depth in entries:
+            host = url_host(url)
+            transaction.append(('HDEL', self.key('inflight', host), url_fingerprint(url)))
+            transaction.append(('LPUSH', self.key('q', host), self.encode_entry(url, depth)))
+        transaction.append(('EXEC',))
+        self.conn.pipeline(transaction)
+        return []
+
+    def acquire_hosts(self, count):
+        """Lease unowned hosts and take over their orphaned in-flight work"""
+        hosts = self.conn.execute('SRANDMEMBER', self.key('hosts'), self.max_hosts * 2) or []
+        candidates = [host.decode('utf-8') for host in hosts]
+        candidates = [host for host in candidates if host not in self.leases]
+        if not candidates:
+            return []
+        slots = self.max_hosts - len(self.leases)
+        replies = self.conn.pipeline([
+            ('SET', self.key('lease', host), self.node_id, 'NX', 'PX', self.lease_ms)
+            for host in candidates[:slots]
+        ])
+        acquired = [host for host, reply in zip(candidates, replies) if reply == 'OK']
+        now = time.time()
+        for host in acquired:
+            self.leases[host] = now
+        return self.recover_inflight(acquired)[:count]
+
+    def recover_inflight(self, hosts):
+        if not hosts:
+            return []
+        tables = self.conn.pipeline([('HGETALL', self.key('inflight', host)) for host in hosts])
+        orphans = []
+        for host, flat in zip(hosts, tables):
+            flat = flat or []
+            for i in range(0, len(flat), 2):
+                orphans.append((host, flat[i].decode('utf-8'), flat[i + 1]))
+        if not orphans:
+            return []
+        done = self.conn.pipeline([('SISMEMBER', self.key('done'), fp) for _, fp, _ in orphans])
+        entries = []
+        cleanup = []
+        for (host, fp, raw), is_done in zip(orphans, done):
+            if is_done:
+                cleanup.append(('HDEL', self.key('inflight', host), fp))
+            else:
+                entries.append(self.decode_entry(raw))
+        self.conn.pipeline(cleanup)
+        if entries:
+            logger.info(f'Recovered {len(entries)} in-flight frontier entries from expired leases')
+            self.recovered.update(url for url, _ in entries)
+        return entries
+
+    def mark_done(self, urls):
+        urls = list(urls)
+        if not urls:
+            return
+        commands = []
+        hosts = set()
+        for url in urls:
+            fp = url_fingerprint(url)
+            host = url_host(url)
+            hosts.add(host)
+            commands.append(('SADD', self.key('done'), fp))
+            commands.append(('HDEL', self.key('inflight', host), fp))
+        self.conn.pipeline(commands)
+        self.retire_hosts(hosts)
+
+    def retire_hosts(self, hosts):
+        """Drop hosts without queued or in-flight work and release their leases
+
+        The check and the removal are one WATCH/MULTI transaction: work pushed
+        for a host in between aborts it, and the hosts stay leased until the
+        next try rather than leaving that work with no host to pop it from.
+        """
+        hosts = [host for host in hosts if host in self.leases]
+        if not hosts:
+            return
+        watched = []
+        commands = []
+        for host in hosts:
+            keys = (self.key('q', host), self.key('inflight', host), self.key('lease', host))
+            watched.extend(keys)
+            commands.extend([('LLEN', keys[0]), ('HLEN', keys[1]), ('GET', keys[2])])
+        replies = self.conn.pipeline([('WATCH',) + tuple(watched)] + commands)[1:]
+        retired = []
+        for i, host in enumerate(hosts):
+            queued, inflight, owner = replies[3 * i:3 * i + 3]
+            if queued == 0 and inflight == 0 and owner is not None and owner.decode('utf-8') == self.node_id:
+                retired.append(host)
+        if not retired:
+            self.conn.execute('UNWATCH')
+            return
+        transaction = [('MULTI',)]
+        for host in retired:
+            transaction.append(('SREM', self.key('hosts'), host))
+            transaction.append(('DEL', self.key('lease', host)))
+        transaction.append(('EXEC',))
+        if self.conn.pipeline(transaction)[-1] is None:
+            logger.debug(f'Frontier hosts got new work while retiring, keeping {len(retired)} leases')
+            return
+        for host in retired:
+            del self.leases[host]
+
+    def add_seen(self, keys, namespace='items'):
+        seen_key = self.key('seen', namespace)
+        return [bool(added) for added in self.conn.pipeline([('SADD', seen_key, key) for key in keys])]
+
+    def remove_seen(self, keys, namespace='items'):
+        keys = list(keys)
+        if keys:
+            self.conn.execute('SREM', self.key('seen', namespace), *keys)
+
+    def pop_recovered(self):
+        recovered, self.recovered = self.recovered, set()
+        return recovered
+
+    def has_pending(self):
+        return self.conn.execute('SCARD', self.key('hosts')) > 0
+
+    def close(self):
+        """Release leases so other nodes can pick up remaining work immediately"""
+        try:
+            hosts = list(self.leases)
+            owners = self.conn.pipeline([('GET', self.key('lease', host)) for host in hosts])
+            self.conn.pipeline([
+                ('DEL', self.key('lease', host))
+                for host, owner in zip(hosts, owners)
+                if owner is not None and owner.decode('utf-8') == self.node_id
+            ])
+        except (OSError, RedisError) as e:
+            logger.warning(f'Could not release frontier leases: {str(e)}')
+        finally:
+            self.leases.clear()
+            self.conn.close()
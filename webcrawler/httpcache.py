@@ -0,0 +1,183 @@
+"""
+Single-file HTTP cache storage
+
+``SqliteCacheStorage`` is a drop-in replacement for Scrapy's filesystem
+cache storage (``HTTPCACHE_STORAGE``). All responses live in one SQLite
+database in WAL mode instead of six files per response; bodies are
+compressed (zstd when available) and stored once per content hash, and
+expired entries are removed with a single bulk delete.
+"""
+
+import hashlib
+import logging
+import sqlite3
+from pathlib import Path
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from utils.compression import DEFAULT_CODEC, compress, decompress
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    response_url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body_hash TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at);
+CREATE INDEX IF NOT EXISTS responses_body_hash ON responses (body_hash);
+CREATE TABLE IF NOT EXISTS bodies (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+class ResponseCache:
+    """Response records in a SQLite file, usable with or without a crawler"""
+
+    def __init__(self, path, codec=DEFAULT_CODEC, level=3, commit_every=100):
+        self.path = str(path)
+        self.codec = codec
+        self.level = level
+        self.commit_every = commit_every
+        self.pending = 0
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def put(self, fingerprint, method, url, response_url, status, headers, body, stored_at=None):
+        """Store one response, the body is only written if its hash is new"""
+        body_hash = hashlib.sha256(body).hexdigest()
+        known = self.db.execute('SELECT 1 FROM bodies WHERE hash = ?', (body_hash,)).fetchone()
+        if known is None:
+            self.db.execute(
+                'INSERT INTO bodies (hash, codec, size, data) VALUES (?, ?, ?, ?)',
+                (body_hash, self.codec, len(body), compress(body, self.codec, self.level))
+            )
+        self.db.execute(
+            'INSERT OR REPLACE INTO responses '
+            '(fingerprint, method, url, response_url, status, headers, body_hash, stored_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (fingerprint, method, url, response_url, status, headers, body_hash,
+             stored_at if stored_at is not None else time())
+        )
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def get(self, fingerprint, max_age=0):
+        """Return (response_url, status, raw headers, body) or None"""
+        row = self.db.execute(
+            'SELECT r.response_url, r.status, r.headers, r.stored_at, b.codec, b.data '
+            'FROM responses r JOIN bodies b ON b.hash = r.body_hash WHERE r.fingerprint = ?',
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        response_url, status, headers, stored_at, codec, data = row
+        if 0 < max_age < time() - stored_at:
+            return None
+        return response_url, status, headers, decompress(data, codec)
+
+    def iter_responses(self, shard=0, shards=1):
+        """Yield (method, url, response_url, status, raw headers, body) for every entry
+
+        With ``shards``, only the entries of ``shard`` are read and decompressed.
+        """
+        rows = self.db.execute(
+            'SELECT r.method, r.url, r.response_url, r.status, r.headers, b.codec, b.data '
+            'FROM responses r JOIN bodies b ON b.hash = r.body_hash WHERE r.rowid % ? = ? ORDER BY r.stored_at',
+            (shards, shard)
+        )
+        for method, url, response_url, status, headers, codec, data in rows:
+            yield method, url, response_url, status, headers, decompress(data, codec)
+
+    def expire(self, older_than):
+        """Delete entries stored before ``older_than`` and orphaned bodies"""
+        self.commit()
+        deleted = self.db.execute('DELETE FROM responses WHERE stored_at < ?', (older_than,)).rowcount
+        if deleted:
+            self.db.execute('DELETE FROM bodies WHERE hash NOT IN (SELECT body_hash FROM responses)')
+        self.db.commit()
+        return deleted
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def commit(self):
+        if self.pending:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+class SqliteCacheStorage:
+    """Scrapy HTTPCACHE_STORAGE backend built on ResponseCache"""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.codec = settings.get('HTTPCACHE_SQLITE_CODEC') or DEFAULT_CODEC
+        self.level = settings.getint('HTTPCACHE_SQLITE_COMPRESSION_LEVEL', 3)
+        self.commit_every = settings.getint('HTTPCACHE_SQLITE_COMMIT_EVERY', 100)
+        self.cache = None
+
+    @staticmethod
+    def cache_path(cachedir, spider_name):
+        return Path(cachedir, f'{spider_name}.sqlite3')
+
+    def open_spider(self, spider):
+        path = self.cache_path(self.cachedir, spider.name)
+        self.cache = ResponseCache(path, self.codec, self.level, self.commit_every)
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        if self.expiration_secs > 0:
+            expired = self.cache.expire(time() - self.expiration_secs)
+            if expired:
+                logger.info(f"Expired {expired} cached responses from {path}")
+        logger.debug(f"Using SQLite cache storage in {path}")
+
+    def close_spider(self, spider):
+        self.cache.close()
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        entry = self.cache.get(self._fingerprinter.fingerprint(request).hex(), self.expiration_secs)
+        if entry is None:
+            return None
+        url, status, raw_headers, body = entry
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        # Bodies of downloads stopped early (StopDownload) are incomplete
+        if 'download_stopped' in response.flags:
+            return
+        self.cache.put(
+            self._fingerprinter.fingerprint(request).hex(),
+            request.method,
+            request.url,
+            response.url,
+            response.status,
+            headers_dict_to_raw(response.headers),
+            response.body,
+        )
@@ -1,11 +1,84 @@
 import scrapy
 
 
+class Record:
+    """Fixed-field record with read-only mapping access
+
+    Used instead of one dict per link or image to keep large pages small;
+    ``dict(record)`` turns it back into a plain dict for serialization.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.as_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.as_dict()!r})'
+
+
+class LinkRecord(Record):
+    """A link found on a page"""
+
+    __slots__ = ('url', 'text', 'type')
+
+    def __init__(self, url, text='', type='internal'):
+        self.url = url
+        self.text = text
+        self.type = type
+
+    def as_dict(self):
+        return {'url': self.url, 'text': self.text, 'type': self.type}
+
+
+class ImageRecord(Record):
+    """An image found on a page"""
+
+    __slots__ = ('url', 'alt')
+
+    def __init__(self, url, alt=''):
+        self.url = url
+        self.alt = alt
+
+    def as_dict(self):
+        return {'url': self.url, 'alt': self.alt}
+
+
+def json_default(value):
+    """``json.dump`` hook for link and image records"""
+    if isinstance(value, Record):
+        return value.as_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 class WebPageItem(scrapy.Item):
     """Item for storing web page data"""
     url = scrapy.Field()
     title = scrapy.Field()
     content = scrapy.Field()
+    content_hash = scrapy.Field()
     text_content = scrapy.Field()
     links = scrapy.Field()
     images = scrapy.Field()
@@ -24,11 +97,13 @@ class DocumentItem(scrapy.Item):
     filename = scrapy.Field()
     file_type = scrapy.Field()
     content = scrapy.Field()
+    content_hash = scrapy.Field()
     text_content = scrapy.Field()
     metadata = scrapy.Field()
     file_size = scrapy.Field()
     timestamp = scrapy.Field()
     page_count = scrapy.Field()
+    alias_of = scrapy.Field()
     
     
 class LinkItem(scrapy.Item):
@@ -0,0 +1,300 @@
+"""
+Memory accounting for long-running crawls
+
+``MemoryMonitor`` samples the process RSS every few seconds and, when
+``MEMORY_RSS_LIMIT_MB`` is set, pauses the engine before the limit is
+reached so in-flight requests and items can drain. Every report interval it
+writes ``data/logs/memory.json`` with:
+
+- the RSS history
+- the length of every set, dict, list and deque held by the spider, the
+  item pipelines and the scheduler's duplicate filter
+- live Request, Response and item instances per class (Scrapy's trackref)
+- with ``MEMORY_TRACEMALLOC``, allocated memory per module and package and
+  its growth since the previous report and since the crawl started
+"""
+
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.trackref import live_refs
+from twisted.internet import task
+
+from webcrawler.backpressure import EnginePause
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_TYPES = (set, frozenset, dict, list, deque)
+# Modules whose objects are searched one level deep for containers
+PROJECT_PACKAGES = ('webcrawler', 'utils')
+HISTORY_SIZE = 1000
+# RSS growth, as a fraction of the limit, before pausing again after a pause did not free memory
+PAUSE_STEP = 0.05
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where unavailable)"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def container_sizes(obj, prefix, depth=1):
+    """Length of every container attribute of ``obj``, keyed 'prefix.attribute'"""
+    sizes = {}
+    for name, value in list(getattr(obj, '__dict__', {}).items()):
+        key = f'{prefix}.{name}'
+        if isinstance(value, CONTAINER_TYPES):
+            sizes[key] = len(value)
+        elif depth > 0 and type(value).__module__.split('.')[0] in PROJECT_PACKAGES:
+            sizes.update(container_sizes(value, key, depth - 1))
+    return sizes
+
+
+def module_name(filename, paths=None):
+    """Dotted module name of a source file, relative to the longest sys.path entry"""
+    for path in paths if paths is not None else sorted(filter(None, sys.path), key=len, reverse=True):
+        if filename.startswith(path.rstrip(os.sep) + os.sep):
+            relative = filename[len(path.rstrip(os.sep)) + 1:]
+            break
+    else:
+        return os.path.basename(filename)
+    if relative.endswith('.py'):
+        relative = relative[:-3]
+    parts = relative.split(os.sep)
+    if len(parts) > 1 and parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def live_instances():
+    """Live instances per class of everything tracked by scrapy.utils.trackref"""
+    return {cls.__name__: len(refs) for cls, refs in list(live_refs.items()) if len(refs)}
+
+
+def growth(current, previous):
+    return {key: current.get(key, 0) - previous.get(key, 0) for key in set(current) | set(previous)
+            if current.get(key, 0) != previous.get(key, 0)}
+
+
+def top(values, count):
+    return dict(sorted(values.items(), key=lambda kv: abs(kv[1]), reverse=True)[:count])
+
+
+class AllocationTracker:
+    """Aggregates tracemalloc snapshots by module and package"""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.started = False
+        self.baseline = None
+        self.previous = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started = True
+        self.baseline = self.previous = self.by_module()
+
+    def stop(self):
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
+
+    def by_module(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        paths = sorted(filter(None, sys.path), key=len, reverse=True)
+        sizes = Counter()
+        for stat in snapshot.statistics('filename'):
+            sizes[module_name(stat.traceback[0].filename, paths)] += stat.size
+        return sizes
+
+    def report(self, count=20):
+        modules = self.by_module()
+        packages = Counter()
+        for module, size in modules.items():
+            packages[module.split('.')[0]] += size
+        report = {
+            'traced_bytes': sum(modules.values()),
+            'modules': dict(modules.most_common(count)),
+            'packages': dict(packages.most_common(count)),
+            'growth_since_last': top(growth(modules, self.previous), count),
+            'growth_since_start': top(growth(modules, self.baseline), count),
+        }
+        self.previous = modules
+        return report
+
+
+class MemoryMonitor:
+    """Extension reporting memory use and pausing the crawl near the RSS limit"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEMORY_MONITOR_ENABLED', True):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.check_interval = settings.getfloat('MEMORY_CHECK_INTERVAL', 5.0)
+        self.report_interval = settings.getfloat('MEMORY_REPORT_INTERVAL', 300.0)
+        self.report_file = settings.get('MEMORY_REPORT_FILE')
+        self.limit = settings.getint('MEMORY_RSS_LIMIT_MB', 0) * 1024 * 1024
+        self.base_pause_at = self.pause_at = self.limit * settings.getfloat('MEMORY_PAUSE_RATIO', 0.9)
+        self.resume_at = self.limit * settings.getfloat('MEMORY_RESUME_RATIO', 0.8)
+        self.top = settings.getint('MEMORY_TRACEMALLOC_TOP', 20)
+        self.tracker = None
+        if settings.getbool('MEMORY_TRACEMALLOC'):
+            self.tracker = AllocationTracker(settings.getint('MEMORY_TRACEMALLOC_FRAMES', 1))
+        self.rss = current_rss
+        self.paused = False
+        self.over_limit = False
+        self.peak = 0
+        self.started = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.previous_instances = {}
+        self.tasks = []
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self.previous_instances = live_instances()
+        if self.tracker is not None:
+            self.tracker.start()
+        loops = [(self.check_interval, self.check)]
+        if self.report_file:
+            loops.append((self.report_interval, self.write_report))
+        for interval, method in loops:
+            if interval > 0:
+                loop = task.LoopingCall(method)
+                loop.start(interval, now=False)
+                self.tasks.append(loop)
+
+    def spider_closed(self, spider, reason):
+        for loop in self.tasks:
+            if loop.running:
+                loop.stop()
+        self.tasks = []
+        if self.report_file:
+            self.write_report()
+        if self.tracker is not None:
+            self.tracker.stop()
+
+    def check(self):
+        """Track RSS and pause or resume the engine around the configured limit"""
+        rss = self.rss()
+        self.peak = max(self.peak, rss)
+        self.stats.max_value('memory/rss_max_mb', rss // (1024 * 1024))
+        if not self.limit:
+            return rss
+        pause = EnginePause.of(self.crawler)
+
+        if rss >= self.limit and not self.over_limit:
+            logger.error(f"RSS {rss / 2**20:.0f}MB exceeds MEMORY_RSS_LIMIT_MB ({self.limit / 2**20:.0f}MB)")
+            self.stats.inc_value('memory/limit_reached')
+        self.over_limit = rss >= self.limit
+
+        if not self.paused and rss >= self.pause_at:
+            pause.hold(self)
+            self.paused = True
+            self.stats.inc_value('memory/pauses')
+            logger.warning(f"RSS {rss / 2**20:.0f}MB is near the limit, pausing new requests")
+            gc.collect()
+            if self.report_file:
+                self.write_report()
+        elif self.paused and rss < self.resume_at:
+            pause.release(self)
+            self.paused = False
+            self.pause_at = self.base_pause_at
+            logger.info(f"Resuming requests at RSS {rss / 2**20:.0f}MB")
+        elif self.paused and self.drained():
+            # What is left is held by the spider, the pipelines or the allocator rather than
+            # in-flight work: resume, and pause again only after RSS grows by another step
+            pause.release(self)
+            self.paused = False
+            self.pause_at = rss + self.limit * PAUSE_STEP
+            logger.warning(f"RSS still {rss / 2**20:.0f}MB with nothing in flight, resuming requests "
+                           f"until {self.pause_at / 2**20:.0f}MB; see {self.report_file} for what holds it")
+        return rss
+
+    def drained(self):
+        engine = self.crawler.engine
+        if engine.slot is None:
+            return True
+        scraper_slot = engine.scraper.slot
+        return not engine.slot.inprogress and (scraper_slot is None or scraper_slot.is_idle())
+
+    def containers(self):
+        """Sizes of the internal sets and maps that grow with the crawl"""
+        engine = self.crawler.engine
+        sizes = {}
+        spider = getattr(engine, 'spider', None)
+        if spider is not None:
+            sizes.update(container_sizes(spider, 'spider'))
+        for pipeline in engine.scraper.itemproc.middlewares:
+            sizes.update(container_sizes(pipeline, type(pipeline).__name__))
+        dupefilter = getattr(getattr(engine.slot, 'scheduler', None), 'df', None)
+        if dupefilter is not None:
+            sizes.update(container_sizes(dupefilter, 'dupefilter', depth=0))
+        return dict(sorted(sizes.items(), key=lambda kv: kv[1], reverse=True))
+
+    def report(self):
+        rss = self.rss()
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        self.history.append((round(elapsed, 1), round(rss / 2**20, 1)))
+        instances = live_instances()
+        report = {
+            'timestamp': time.time(),
+            'elapsed_seconds': round(elapsed, 3),
+            'rss_mb': round(rss / 2**20, 1),
+            'peak_rss_mb': round(max(self.peak, rss) / 2**20, 1),
+            'limit_mb': round(self.limit / 2**20, 1),
+            'paused': self.paused,
+            'containers': self.containers(),
+            'live_instances': instances,
+            'live_instances_growth': growth(instances, self.previous_instances),
+            'rss_history_mb': list(self.history),
+        }
+        self.previous_instances = instances
+        if self.tracker is not None:
+            report['allocations'] = self.tracker.report(self.top)
+        return report
+
+    def write_report(self):
+        try:
+            report = self.report()
+            os.makedirs(os.path.dirname(self.report_file) or '.', exist_ok=True)
+            with open(self.report_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            os.replace(self.report_file + '.tmp', self.report_file)
+        except OSError as e:
+            logger.error(f"Error writing memory report to {self.report_file}: {str(e)}")
@@ -0,0 +1,277 @@
+"""
+Crawl metrics: latency histograms, queue depths and byte counters
+
+``CrawlMetrics`` records download latency, time per spider callback (via
+``WebcrawlerSpiderMiddleware``) and time per item pipeline stage in
+fixed-bucket histograms. Each observation is one ``bisect`` plus two
+additions, so recording stays cheap. Metrics are served in the Prometheus
+text format on a local port and written to a JSON stats file periodically
+and when the spider closes.
+"""
+
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from functools import wraps
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.reactor import listen_tcp
+from twisted.internet import task
+from twisted.internet.defer import Deferred
+from twisted.web import resource, server
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond pipeline stages to slow downloads
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Counts per fixed bucket (the last one is +Inf) plus the sum of values"""
+
+    __slots__ = ('bounds', 'counts', 'total')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = array('Q', [0] * (len(bounds) + 1))
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile"""
+        count = self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, bucket in zip(self.bounds, self.counts):
+            seen += bucket
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        count = self.count
+        return {
+            'count': count,
+            'sum': round(self.total, 6),
+            'mean': round(self.total / count, 6) if count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Histograms keyed by metric name and a label tuple"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.histograms = {}
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.bounds)
+        return histogram
+
+    def render_prometheus(self, gauges=None, counters=None):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        typed = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f'webcrawler_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} histogram')
+                typed.add(metric)
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket in zip(self.bounds + (float('inf'),), histogram.counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{metric}_sum{suffix} {histogram.total}')
+            lines.append(f'{metric}_count{suffix} {cumulative}')
+        for kind, values in (('gauge', gauges or {}), ('counter', counters or {})):
+            for name, value in sorted(values.items()):
+                lines.append(f'# TYPE webcrawler_{name} {kind}')
+                lines.append(f'webcrawler_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        metrics = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            label = ','.join(f'{key}={value}' for key, value in labels)
+            metrics[f'{name}{{{label}}}' if label else name] = histogram.snapshot()
+        return metrics
+
+
+def stage_name(pipeline):
+    name = type(pipeline).__name__
+    return name[:-len('Pipeline')] if name.endswith('Pipeline') and name != 'Pipeline' else name
+
+
+def timed_stage(method, histogram):
+    """Wrap a pipeline's ``process_item`` to record its duration"""
+
+    @wraps(method)
+    def process_item(item, spider):
+        start = time.perf_counter()
+        try:
+            result = method(item, spider)
+        except Exception:
+            histogram.observe(time.perf_counter() - start)
+            raise
+        if isinstance(result, Deferred) and not result.called:
+            # Asynchronous stages are timed until their result fires
+            def observe(value):
+                histogram.observe(time.perf_counter() - start)
+                return value
+            return result.addBoth(observe)
+        histogram.observe(time.perf_counter() - start)
+        return result
+
+    return process_item
+
+
+class MetricsResource(resource.Resource):
+    isLeaf = True
+
+    def __init__(self, metrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+        return self.metrics.render().encode('utf-8')
+
+
+class CrawlMetrics:
+    """Extension collecting crawl metrics and exporting them"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.registry = MetricsRegistry()
+        self.portrange = [int(port) for port in settings.getlist('METRICS_PORT')]
+        self.host = settings.get('METRICS_HOST', '127.0.0.1')
+        self.stats_file = settings.get('METRICS_STATS_FILE')
+        self.interval = settings.getfloat('METRICS_INTERVAL', 30.0)
+        self.download_latency = self.registry.histogram('download_latency_seconds')
+        self.started = None
+        self.port = None
+        self.task = None
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        # WebcrawlerSpiderMiddleware times callbacks through spider.metrics
+        spider.metrics = self.registry
+        self.instrument_pipelines()
+        if self.portrange:
+            self.port = listen_tcp(self.portrange, self.host, server.Site(MetricsResource(self)))
+            address = self.port.getHost()
+            logger.info(f"Metrics available at http://{address.host}:{address.port}/metrics")
+        if self.stats_file and self.interval > 0:
+            self.task = task.LoopingCall(self.write_stats_file)
+            self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        if self.stats_file:
+            self.write_stats_file()
+        if self.port is not None:
+            self.port.stopListening()
+
+    def instrument_pipelines(self):
+        itemproc = self.crawler.engine.scraper.itemproc
+        methods = itemproc.methods['process_item']
+        for index, method in enumerate(methods):
+            pipeline = getattr(getattr(method, '__wrapped__', method), '__self__', None)
+            if pipeline is None:
+                continue
+            histogram = self.registry.histogram('pipeline_seconds', stage=stage_name(pipeline))
+            methods[index] = timed_stage(method, histogram)
+
+    def response_downloaded(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.download_latency.observe(latency)
+
+    def gauges(self):
+        """Queue depths, sampled when metrics are exported"""
+        engine = self.crawler.engine
+        gauges = {}
+        if engine is None or engine.slot is None:
+            return gauges
+        gauges['scheduler_pending'] = len(engine.slot.scheduler)
+        gauges['requests_in_progress'] = len(engine.slot.inprogress)
+        gauges['downloader_active'] = len(engine.downloader.active)
+        gauges['scraper_active'] = len(engine.scraper.slot.active) if engine.scraper.slot else 0
+        gauges['items_in_pipelines'] = engine.scraper.slot.itemproc_size if engine.scraper.slot else 0
+        for pipeline in engine.scraper.itemproc.middlewares:
+            # Pipelines with a background writer expose their bounded queue
+            queue = getattr(pipeline, 'queue', None)
+            if queue is not None and hasattr(queue, 'qsize'):
+                gauges[f'queue_{stage_name(pipeline).lower()}'] = queue.qsize()
+        return gauges
+
+    def counters(self):
+        stats = self.crawler.stats
+        return {
+            'bytes_in_total': stats.get_value('downloader/response_bytes', 0),
+            'bytes_out_total': stats.get_value('downloader/request_bytes', 0),
+            'responses_total': stats.get_value('response_received_count', 0),
+            'items_total': stats.get_value('item_scraped_count', 0),
+            'items_dropped_total': stats.get_value('item_dropped_count', 0),
+        }
+
+    def render(self):
+        return self.registry.render_prometheus(self.gauges(), self.counters())
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        return {
+            'timestamp': time.time(),
+            'elapsed_seconds': round(elapsed, 3),
+            'gauges': self.gauges(),
+            'counters': self.counters(),
+            'histograms': self.registry.snapshot(),
+        }
+
+    def write_stats_file(self):
+        try:
+            os.makedirs(os.path.dirname(self.stats_file) or '.', exist_ok=True)
+            with open(self.stats_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(self.stats_file + '.tmp', self.stats_file)
+        except OSError as e:
+            logger.error(f"Error writing metrics to {self.stats_file}: {str(e)}")
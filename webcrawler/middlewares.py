@@ -1,13 +1,33 @@
 import random
 import logging
+import time
+from collections import defaultdict, deque
 from scrapy import signals
-from scrapy.http import HtmlResponse
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest, NotConfigured
+from scrapy.http import HtmlResponse, TextResponse, XmlResponse
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.misc import load_object
+from twisted.internet import reactor
+from w3lib.url import canonicalize_url
 from fake_useragent import UserAgent
 from itemadapter import is_item, ItemAdapter
 
+from utils import charset
+from utils.compression import CONTENT_ENCODINGS, DecompressionLimitExceeded, decode_content
+from webcrawler.frontier import url_fingerprint
+
+
+logger = logging.getLogger(__name__)
+
 
 class WebcrawlerSpiderMiddleware:
-    """Spider middleware for custom processing"""
+    """Spider middleware for custom processing
+
+    When the CrawlMetrics extension is enabled it times every callback;
+    ordered closest to the spider so the time excludes other middlewares.
+    """
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -19,7 +39,29 @@ class WebcrawlerSpiderMiddleware:
         return None
 
     def process_spider_output(self, response, result, spider):
-        return result
+        metrics = getattr(spider, 'metrics', None)
+        if metrics is None:
+            return result
+        callback = getattr(response.request, 'callback', None) if response.request else None
+        name = getattr(callback, '__name__', None) or 'parse'
+        return self.timed_output(result, metrics.histogram('parse_seconds', callback=name))
+
+    def timed_output(self, result, histogram):
+        """Yield the callback's output, counting only time spent inside it"""
+        elapsed = 0.0
+        iterator = iter(result)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield output
+        finally:
+            histogram.observe(elapsed)
 
     def process_spider_exception(self, response, exception, spider):
         pass
@@ -31,28 +73,598 @@ class WebcrawlerSpiderMiddleware:
         spider.logger.info('Spider opened: %s' % spider.name)
 
 
+class CircuitBreaker:
+    """Failure tracking for one host: closed -> open -> half-open -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        # Numbers probes, so an expiry timer only ends the probe it was set for
+        self.probes = 0
+        self.dead = False
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of first attempts"""
+
+    def __init__(self, ratio=0.1, min_tokens=10, max_tokens=100):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(min_tokens)
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
 class WebcrawlerDownloaderMiddleware:
-    """Downloader middleware for custom request/response processing"""
+    """Downloader middleware with per-host circuit breakers and a retry budget
+
+    Connection errors and 5xx answers to a URL's first attempt count as
+    host failures; a URL failing again on retry says nothing new about the
+    host. Requests to a host whose breaker is open are parked (not
+    downloaded) until the breaker lets a probe through, preferably one that
+    has not failed yet. A probe whose outcome is never seen (dropped by
+    another middleware) is given up after ``CIRCUIT_BREAKER_RECOVERY_TIMEOUT``
+    and the next parked request probes instead. Retries replace Scrapy's RetryMiddleware: they are drawn from a
+    global budget and rescheduled after a jittered exponential backoff
+    instead of holding a slot.
+    """
+
+    DEFERRED_META_KEY = 'circuit_breaker_deferred'
+    PROBE_META_KEY = 'circuit_breaker_probe'
+
+    def __init__(self, crawler=None):
+        self.crawler = crawler
+        self.enabled = False
+        self.breakers = defaultdict(CircuitBreaker)
+        self.parked = defaultdict(deque)
+        self.pending_retries = 0
+        self.clock = time.monotonic
+        self.call_later = reactor.callLater
+        self.budget = RetryBudget()
+        if crawler is not None:
+            self.configure(crawler.settings)
+
+    def configure(self, settings):
+        self.enabled = settings.getbool('CIRCUIT_BREAKER_ENABLED', True)
+        self.failure_threshold = settings.getint('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+        self.recovery_timeout = settings.getfloat('CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 30)
+        self.max_open_time = settings.getfloat('CIRCUIT_BREAKER_MAX_OPEN_TIME', 600)
+        self.max_trips = settings.getint('CIRCUIT_BREAKER_MAX_TRIPS', 5)
+        self.max_parked = settings.getint('CIRCUIT_BREAKER_MAX_PARKED', 1000)
+        self.max_retry_times = settings.getint('RETRY_TIMES', 2)
+        self.retry_http_codes = set(settings.getlist('RETRY_HTTP_CODES'))
+        self.priority_adjust = settings.getint('RETRY_PRIORITY_ADJUST', -1)
+        self.exceptions_to_retry = tuple(
+            load_object(x) if isinstance(x, str) else x
+            for x in settings.getlist('RETRY_EXCEPTIONS')
+        )
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 1.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 60.0)
+        self.budget = RetryBudget(
+            ratio=settings.getfloat('RETRY_BUDGET_RATIO', 0.1),
+            min_tokens=settings.getint('RETRY_BUDGET_MIN_TOKENS', 10),
+            max_tokens=settings.getint('RETRY_BUDGET_MAX_TOKENS', 100),
+        )
 
     @classmethod
     def from_crawler(cls, crawler):
-        s = cls()
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(s.response_downloaded, signal=signals.response_downloaded)
         return s
 
     def process_request(self, request, spider):
-        return None
+        if not self.enabled:
+            return None
+        request.meta.pop(self.DEFERRED_META_KEY, None)
+        request.meta.pop(self.PROBE_META_KEY, None)
+        if not request.meta.get('retry_times'):
+            self.budget.deposit()
+
+        host = urlparse_cached(request).hostname
+        breaker = self.breakers.get(host)
+        if breaker is None or self.allow(breaker, request):
+            return None
+
+        if breaker.dead:
+            self.inc_stat('circuit_breaker/dead_host_dropped')
+            raise IgnoreRequest(f"Host marked dead by circuit breaker: {host}")
+        if self.park(host, request):
+            request.meta[self.DEFERRED_META_KEY] = True
+            raise IgnoreRequest(f"Circuit open for {host}, request parked")
+        raise IgnoreRequest(f"Circuit open for {host}, too many parked requests")
 
     def process_response(self, request, response, spider):
+        if not self.enabled:
+            return response
+        host = urlparse_cached(request).hostname
+        if response.status >= 500 and response.status in self.retry_http_codes:
+            breaker = self.breakers.get(host)
+            if not request.meta.get('retry_times') or (
+                    breaker is not None and breaker.state == CircuitBreaker.HALF_OPEN):
+                self.record_failure(host)
+        else:
+            self.record_success(host)
+
+        if response.status in self.retry_http_codes and not request.meta.get('dont_retry', False):
+            if self.retry(request, f'{response.status}', spider, host):
+                raise IgnoreRequest(f"Retry scheduled for {request.url}")
         return response
 
+    def response_downloaded(self, response, request, spider):
+        """Settle a probe as soon as its host answers
+
+        Middlewares after this one see the response first: RedirectMiddleware
+        turns a 3xx into a new request and DecompressionMiddleware can drop
+        it, so process_response may never run for the probe.
+        """
+        if not request.meta.pop(self.PROBE_META_KEY, False):
+            return
+        if not (response.status >= 500 and response.status in self.retry_http_codes):
+            self.record_success(urlparse_cached(request).hostname)
+
     def process_exception(self, request, exception, spider):
-        pass
+        if not self.enabled:
+            return None
+        probe = request.meta.pop(self.PROBE_META_KEY, False)
+        host = urlparse_cached(request).hostname
+        if isinstance(exception, IgnoreRequest):
+            if probe:
+                self.end_probe(host, 'circuit_breaker/probes_ignored')
+            return None
+        self.record_failure(host)
+        if not isinstance(exception, self.exceptions_to_retry):
+            return None
+        if not request.meta.get('dont_retry', False):
+            if self.retry(request, exception, spider, host):
+                raise IgnoreRequest(f"Retry scheduled for {request.url}")
+        return None
+
+    def allow(self, breaker, request):
+        if breaker.dead:
+            return False
+        if breaker.state == CircuitBreaker.CLOSED:
+            return True
+        if breaker.state == CircuitBreaker.OPEN and self.clock() >= breaker.open_until:
+            breaker.state = CircuitBreaker.HALF_OPEN
+            breaker.probe_in_flight = False
+        if breaker.state == CircuitBreaker.HALF_OPEN and not breaker.probe_in_flight:
+            if request.meta.get('retry_times') and self.fresh_parked(urlparse_cached(request).hostname) is not None:
+                # A request that has not failed yet tests the host better
+                return False
+            # Let exactly one probe through to test the host
+            breaker.probe_in_flight = True
+            breaker.probes += 1
+            request.meta[self.PROBE_META_KEY] = True
+            self.inc_stat('circuit_breaker/probes')
+            self.call_later(self.recovery_timeout, self.expire_probe,
+                            urlparse_cached(request).hostname, breaker.probes)
+            return True
+        return False
+
+    def expire_probe(self, host, probe):
+        breaker = self.breakers.get(host)
+        if breaker is None or breaker.probes != probe:
+            return
+        if breaker.state == CircuitBreaker.HALF_OPEN and breaker.probe_in_flight:
+            logger.warning(f"Circuit breaker probe for {host} got no answer in {self.recovery_timeout:.0f}s")
+            self.end_probe(host, 'circuit_breaker/probes_expired')
+
+    def end_probe(self, host, stat):
+        """Give up on a probe without an outcome and let the next parked request probe"""
+        breaker = self.breakers.get(host)
+        if breaker is None or breaker.state != CircuitBreaker.HALF_OPEN or not breaker.probe_in_flight:
+            return
+        breaker.probe_in_flight = False
+        self.inc_stat(stat)
+        self.release_probe(host)
+
+    def record_success(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            return
+        breaker.failures = 0
+        if breaker.state != CircuitBreaker.CLOSED:
+            breaker.state = CircuitBreaker.CLOSED
+            breaker.trips = 0
+            breaker.probe_in_flight = False
+            self.inc_stat('circuit_breaker/closed')
+            logger.info(f"Circuit closed for {host}, releasing {len(self.parked[host])} parked requests")
+            self.release(host, len(self.parked[host]))
+
+    def record_failure(self, host):
+        breaker = self.breakers[host]
+        if breaker.dead:
+            return
+        breaker.failures += 1
+        if breaker.state == CircuitBreaker.HALF_OPEN or (
+                breaker.state == CircuitBreaker.CLOSED and breaker.failures >= self.failure_threshold):
+            self.trip(host, breaker)
+
+    def trip(self, host, breaker):
+        breaker.trips += 1
+        breaker.probe_in_flight = False
+        if breaker.trips > self.max_trips:
+            breaker.dead = True
+            dropped = len(self.parked.pop(host, ()))
+            self.inc_stat('circuit_breaker/dead_hosts')
+            self.inc_stat('circuit_breaker/dead_host_dropped', dropped)
+            logger.warning(f"Giving up on {host} after {self.max_trips} circuit breaker trips")
+            self.evict_queued(host, breaker)
+            return
+        open_time = min(self.max_open_time, self.recovery_timeout * 2 ** (breaker.trips - 1))
+        breaker.state = CircuitBreaker.OPEN
+        breaker.open_until = self.clock() + open_time
+        self.inc_stat('circuit_breaker/opened')
+        logger.warning(f"Circuit opened for {host} for {open_time:.0f}s after {breaker.failures} failures")
+        self.call_later(open_time, self.release_probe, host)
+        self.evict_queued(host, breaker)
+
+    def evict_queued(self, host, breaker):
+        """Pull requests for a tripped host out of the downloader slot queues
+
+        Downloader middlewares run before a request waits in its slot, so
+        requests admitted before the trip would otherwise still be sent.
+        """
+        downloader = getattr(self.crawler.engine, 'downloader', None) if self.crawler else None
+        if downloader is None:
+            return
+        evicted = []
+        for slot in list(downloader.slots.values()):
+            queue = getattr(slot, 'queue', None)
+            if not queue:
+                continue
+            kept = [entry for entry in queue if urlparse_cached(entry[0]).hostname != host]
+            if len(kept) != len(queue):
+                evicted.extend(entry for entry in queue if urlparse_cached(entry[0]).hostname == host)
+                queue.clear()
+                queue.extend(kept)
+        for request, deferred in evicted:
+            if not breaker.dead and self.park(host, request):
+                request.meta[self.DEFERRED_META_KEY] = True
+                deferred.errback(IgnoreRequest(f"Circuit open for {host}, request parked"))
+            else:
+                self.inc_stat('circuit_breaker/dead_host_dropped')
+                deferred.errback(IgnoreRequest(f"Host marked dead by circuit breaker: {host}"))
+
+    def park(self, host, request):
+        """Hold a request until the host's breaker lets traffic through"""
+        queue = self.parked[host]
+        if len(queue) >= self.max_parked:
+            self.inc_stat('circuit_breaker/park_overflow')
+            return False
+        queue.append(request.replace(dont_filter=True))
+        self.inc_stat('circuit_breaker/parked')
+        return True
+
+    def release(self, host, count):
+        """Hand parked requests back to the scheduler"""
+        queue = self.parked.get(host)
+        while queue and count > 0:
+            self.crawler.engine.crawl(queue.popleft())
+            count -= 1
+        if not queue:
+            self.parked.pop(host, None)
+
+    def fresh_parked(self, host):
+        """Index of the first parked request that has not been retried, or None"""
+        for index, request in enumerate(self.parked.get(host, ())):
+            if not request.meta.get('retry_times'):
+                return index
+        return None
+
+    def release_probe(self, host):
+        """Hand back the parked request to probe the host with
+
+        The oldest parked requests are mostly retries of URLs that fail
+        whatever state the host is in, so a first attempt goes first.
+        """
+        queue = self.parked.get(host)
+        if not queue:
+            return
+        index = self.fresh_parked(host) or 0
+        request = queue[index]
+        del queue[index]
+        if not queue:
+            self.parked.pop(host, None)
+        self.crawler.engine.crawl(request)
+
+    def retry(self, request, reason, spider, host):
+        """Schedule a backed-off retry, returns False when none is allowed"""
+        retry_times = request.meta.get('retry_times', 0) + 1
+        if retry_times > request.meta.get('max_retry_times', self.max_retry_times):
+            return False
+        if not self.budget.withdraw():
+            self.inc_stat('retry_budget/exhausted')
+            return False
+        retry_request = get_retry_request(
+            request,
+            spider=spider,
+            reason=reason,
+            max_retry_times=request.meta.get('max_retry_times', self.max_retry_times),
+            priority_adjust=request.meta.get('priority_adjust', self.priority_adjust),
+        )
+        if retry_request is None:
+            return False
+
+        breaker = self.breakers.get(host)
+        if breaker is not None and breaker.dead:
+            return False
+        if breaker is not None and breaker.state != CircuitBreaker.CLOSED:
+            if not self.park(host, retry_request):
+                return False
+        else:
+            # Full jitter: uniform over [0, exponential cap]
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retry_times - 1)))
+            self.pending_retries += 1
+            self.call_later(delay, self.send_retry, retry_request)
+        request.meta[self.DEFERRED_META_KEY] = True
+        return True
+
+    def send_retry(self, request):
+        self.pending_retries -= 1
+        self.crawler.engine.crawl(request)
+
+    def inc_stat(self, key, count=1):
+        if self.crawler is not None and count:
+            self.crawler.stats.inc_value(key, count)
+
+    def spider_idle(self, spider):
+        for host in [host for host, queue in self.parked.items() if queue]:
+            breaker = self.breakers.get(host)
+            # A released probe dropped before reaching this middleware leaves nothing to settle
+            if (breaker is not None and breaker.state != CircuitBreaker.CLOSED and not breaker.dead
+                    and not breaker.probe_in_flight and self.clock() >= breaker.open_until):
+                self.release_probe(host)
+        if self.pending_retries or any(self.parked.values()):
+            raise DontCloseSpider
 
     def spider_opened(self, spider):
         spider.logger.info('Spider opened: %s' % spider.name)
 
 
+class PrefetchDedupMiddleware:
+    """Downloader middleware dropping requests for URLs already fetched
+
+    Every request URL is canonicalized and claimed in the seen-store
+    (``spider.frontier`` when configured, so all nodes share it) before it is
+    downloaded. The claim holds once a response arrives; a request dropped
+    on the way (robots.txt, a dead host) or failing to download gives it up
+    again. Redirects pass through again with their target URL, so a
+    redirect to a page fetched before costs only the 3xx response. Retries
+    and parked requests keep the key their first attempt claimed and are
+    let through, and so are frontier entries recovered from a node that
+    died mid-fetch. Requests with ``dont_dedup`` in their meta and
+    robots.txt requests are not checked.
+
+    While it is enabled DeduplicationPipeline skips its own check.
+    """
+
+    KEY_META_KEY = 'prefetch_dedup_key'
+    NAMESPACE = 'fetched'
+
+    def __init__(self, crawler=None):
+        self.crawler = crawler
+        self.seen = set()
+        self.seen_backend = None
+        self.dropped = 0
+        self.responses = 0
+        self.response_bytes = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PREFETCH_DEDUP_ENABLED', True):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        self.seen_backend = getattr(spider, 'frontier', None)
+        # Tells DeduplicationPipeline that item URLs are already unique
+        spider.prefetch_dedup = self
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_dedup') or urlparse_cached(request).path == '/robots.txt':
+            return None
+        key = url_fingerprint(canonicalize_url(request.url))
+        if request.meta.get(self.KEY_META_KEY) == key:
+            return None
+        if self.claim(key) or request.meta.get('frontier_recovered'):
+            request.meta[self.KEY_META_KEY] = key
+            return None
+
+        self.dropped += 1
+        self.inc_stat('dedup/prefetch_dropped')
+        if request.meta.get('redirect_urls'):
+            self.inc_stat('dedup/prefetch_redirect_dropped')
+        raise IgnoreRequest(f"Already fetched: {request.url}")
+
+    def process_response(self, request, response, spider):
+        if self.KEY_META_KEY in request.meta:
+            self.responses += 1
+            self.response_bytes += len(response.body)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # Parked or backed-off requests come back with their claim
+        if request.meta.get('circuit_breaker_deferred'):
+            return None
+        key = request.meta.get(self.KEY_META_KEY)
+        # A redirect dropped here still carries the key of the URL it came from
+        if key is not None and key == url_fingerprint(canonicalize_url(request.url)):
+            self.release(key)
+            del request.meta[self.KEY_META_KEY]
+        return None
+
+    def claim(self, key):
+        """Record ``key`` as fetched, returns False if it was recorded before"""
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        if self.seen_backend is not None:
+            return self.seen_backend.add_seen([key], namespace=self.NAMESPACE)[0]
+        return True
+
+    def release(self, key):
+        """Give up the claim on ``key`` of a request that was not fetched"""
+        self.seen.discard(key)
+        if self.seen_backend is not None:
+            self.seen_backend.remove_seen([key], namespace=self.NAMESPACE)
+        self.inc_stat('dedup/prefetch_released')
+
+    def spider_closed(self, spider, reason):
+        if not self.dropped or not self.responses:
+            return
+        # Estimated from the average response size and callback time of the fetched pages
+        self.inc_stat('dedup/prefetch_bytes_saved', self.dropped * self.response_bytes // self.responses)
+        metrics = getattr(spider, 'metrics', None)
+        if metrics is not None:
+            histograms = [histogram for (name, _), histogram in metrics.histograms.items()
+                          if name == 'parse_seconds']
+            count = sum(histogram.count for histogram in histograms)
+            if count:
+                seconds = sum(histogram.total for histogram in histograms) / count
+                self.inc_stat('dedup/prefetch_parse_ms_saved', round(self.dropped * seconds * 1000))
+
+    def inc_stat(self, key, count=1):
+        if self.crawler is not None and count:
+            self.crawler.stats.inc_value(key, count)
+
+
+class DecompressionMiddleware:
+    """Downloader middleware negotiating and decoding compressed responses
+
+    Replaces Scrapy's HttpCompressionMiddleware. Requests advertise br and
+    zstd (when a binding is installed) besides gzip and deflate. Bodies are
+    decoded a chunk at a time and the response is dropped once the decoded
+    size passes ``MAX_FILE_SIZE`` (or the request's ``download_maxsize``) or
+    the expansion ratio passes ``DECOMPRESSION_MAX_RATIO``, so a small
+    compressed body cannot blow up into gigabytes of memory.
+
+    Bytes on the wire and decoded bytes are counted per host, and the ratio
+    of the hosts with the most decoded bytes is written to the stats.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.max_size = settings.getint('MAX_FILE_SIZE', 50 * 1024 * 1024)
+        self.max_ratio = settings.getfloat('DECOMPRESSION_MAX_RATIO', 100)
+        self.ratio_min_size = settings.getint('DECOMPRESSION_RATIO_MIN_SIZE', 1024 * 1024)
+        self.stats_hosts = settings.getint('DECOMPRESSION_STATS_HOSTS', 50)
+        self.accept_encoding = ', '.join(CONTENT_ENCODINGS).encode()
+        # host -> [bytes on the wire, decoded bytes]
+        self.hosts = defaultdict(lambda: [0, 0])
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('COMPRESSION_ENABLED', True):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        request.headers.setdefault('Accept-Encoding', self.accept_encoding)
+
+    def process_response(self, request, response, spider):
+        if request.method == 'HEAD':
+            return response
+        wire_size = len(response.body)
+        encodings = response.headers.getlist('Content-Encoding')
+        encoding = encodings[-1].decode('latin-1').strip().lower() if encodings else None
+        if encoding == 'x-gzip':
+            encoding = 'gzip'
+        if encoding in CONTENT_ENCODINGS:
+            max_size = request.meta.get('download_maxsize', self.max_size)
+            try:
+                body = decode_content(response.body, encoding, max_size, self.max_ratio, self.ratio_min_size)
+            except DecompressionLimitExceeded as e:
+                self.inc_stat(f'httpcompression/{e.limit}_exceeded')
+                raise IgnoreRequest(f"Ignored {response}: {encoding} body {e}")
+            self.inc_stat(f'httpcompression/encoding/{encoding}')
+            self.inc_stat('httpcompression/response_count')
+            self.inc_stat('httpcompression/response_bytes', len(body))
+            respcls = responsetypes.from_args(headers=response.headers, url=response.url, body=body)
+            kwargs = {'cls': respcls, 'body': body}
+            if issubclass(respcls, TextResponse):
+                # Let the body decide the encoding again
+                kwargs['encoding'] = None
+            response = response.replace(**kwargs)
+            if len(encodings) > 1:
+                response.headers.setlist('Content-Encoding', encodings[:-1])
+            else:
+                del response.headers['Content-Encoding']
+        host = self.hosts[urlparse_cached(request).hostname]
+        host[0] += wire_size
+        host[1] += len(response.body)
+        return response
+
+    def spider_closed(self, spider, reason):
+        wire_size = sum(wire for wire, _ in self.hosts.values())
+        decoded_size = sum(decoded for _, decoded in self.hosts.values())
+        if not wire_size:
+            return
+        stats = self.crawler.stats
+        stats.set_value('httpcompression/wire_bytes', wire_size, spider=spider)
+        stats.set_value('httpcompression/decoded_bytes', decoded_size, spider=spider)
+        stats.set_value('httpcompression/ratio', round(decoded_size / wire_size, 2), spider=spider)
+        busiest = sorted(self.hosts.items(), key=lambda item: item[1][1], reverse=True)[:self.stats_hosts]
+        for host, (wire, decoded) in busiest:
+            if wire:
+                stats.set_value(f'httpcompression/ratio/{host}', round(decoded / wire, 2), spider=spider)
+
+    def inc_stat(self, key, count=1):
+        if count:
+            self.crawler.stats.inc_value(key, count)
+
+
+class CharsetMiddleware:
+    """Downloader middleware settling the encoding of text responses
+
+    Without a declared encoding Scrapy's TextResponse decodes the whole body
+    as ascii, utf-8 and cp1252 in turn. Responses are given the encoding
+    ``utils.charset`` finds instead (BOM, Content-Type header, meta
+    declaration, then a detector on the first bytes), so ``response.text``
+    decodes the body once, the same way DocumentProcessor does.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        # Responses built with an explicit encoding keep it
+        if not isinstance(response, TextResponse) or response._encoding is not None:
+            return response
+        encoding, source = charset.detect_encoding(
+            response.body, response.headers.get('Content-Type'), isinstance(response, (HtmlResponse, XmlResponse))
+        )
+        self.crawler.stats.inc_value(f'charset/{source}')
+        self.crawler.stats.inc_value(f'charset/encoding/{encoding}')
+        return response.replace(encoding=encoding)
+
+
 class UserAgentMiddleware:
     """Middleware to rotate user agents"""
 
@@ -1,10 +1,87 @@
 import json
+import logging
 import os
 import hashlib
+import queue
+import threading
+import time
+import weakref
+from collections import deque
 from datetime import datetime
 from itemadapter import ItemAdapter
-from scrapy.exceptions import DropItem
+from scrapy import Request, signals
+from scrapy.exceptions import DropItem, NotConfigured, StopDownload
+from twisted.internet import defer, reactor
+from utils.blobstore import BlobStore, blob_hash
+from utils.columnar import ParquetExporter, pa
+from utils.database import CrawlDatabase
+from utils.document_cache import DocumentCache
 from utils.document_processor import DocumentProcessor
+from utils.fulltext import IndexWriter
+from utils.recordindex import RecordIndexWriter
+from utils.warc import WarcWriter
+from webcrawler.backpressure import EnginePause
+from webcrawler.items import json_default
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriterQueue:
+    """Bounded queue feeding a writer thread without blocking the reactor
+
+    ``put`` hands an entry over right away while there is room. Once
+    ``maxsize`` entries are queued, further entries wait in order on the
+    reactor side and ``put`` returns a Deferred that fires when its entry
+    has been queued, so callers can hold Scrapy back until then. Without a
+    running reactor (offline replay) set ``blocking`` and ``put`` waits for
+    room instead.
+    """
+
+    def __init__(self, maxsize=0, blocking=False):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.waiting = deque()
+        self.blocking = blocking
+
+    def put(self, entry):
+        if self.blocking:
+            self.queue.put(entry)
+            return None
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(entry)
+                return None
+            except queue.Full:
+                pass
+        waiter = defer.Deferred()
+        self.waiting.append((entry, waiter))
+        # The writer may have made room since the attempt above
+        self.refill()
+        return waiter
+
+    def refill(self):
+        """Move waiting entries into the queue while there is room"""
+        while self.waiting:
+            try:
+                self.queue.put_nowait(self.waiting[0][0])
+            except queue.Full:
+                return
+            _, waiter = self.waiting.popleft()
+            waiter.callback(None)
+
+    def get(self, timeout=None):
+        """Take the next entry, called from the writer thread"""
+        entry = self.queue.get(timeout=timeout)
+        if self.waiting:
+            reactor.callFromThread(self.refill)
+        return entry
+
+    def close(self):
+        """Queue the end marker once every waiting entry is in"""
+        while self.waiting:
+            self.queue.put(self.waiting[0][0])
+            self.waiting.popleft()[1].callback(None)
+        self.queue.put(None)
 
 
 class ValidationPipeline:
@@ -25,8 +102,16 @@ class DeduplicationPipeline:
 
     def __init__(self):
         self.urls_seen = set()
+        self.seen_backend = None
+
+    def open_spider(self, spider):
+        # Share the seen-set with other nodes when a frontier backend is configured
+        self.seen_backend = getattr(spider, 'frontier', None)
 
     def process_item(self, item, spider):
+        # PrefetchDedupMiddleware already dropped requests for URLs fetched before
+        if getattr(spider, 'prefetch_dedup', None) is not None:
+            return item
         adapter = ItemAdapter(item)
         url = adapter['url']
         
@@ -35,42 +120,276 @@ class DeduplicationPipeline:
         
         if url_hash in self.urls_seen:
             raise DropItem(f"Duplicate item found: {url}")
-        else:
-            self.urls_seen.add(url_hash)
-            return item
+        self.urls_seen.add(url_hash)
+        
+        if self.seen_backend is not None and not self.seen_backend.add_seen([url_hash])[0]:
+            raise DropItem(f"Duplicate item found on another node: {url}")
+        return item
 
 
 class DocumentProcessingPipeline:
-    """Pipeline to process documents (PDF, DOC, etc.)"""
+    """Pipeline to process documents (PDF, DOC, etc.)
 
-    def __init__(self):
+    With ``DOCUMENT_DEDUP_PATH`` set, every document is looked up by the
+    sha256 of its bytes in a persistent table before it is parsed. A known
+    document reuses the stored text and metadata, and its URL is recorded
+    as an alias (``alias_of`` on the item, exported to
+    ``DOCUMENT_ALIASES_FILE`` at close). Downloads whose first
+    ``DOCUMENT_DEDUP_PREFIX_KB`` and ``Content-Length`` match a known
+    document are stopped once the prefix has arrived. Should that document
+    be gone from the table by the time the item gets here, it is downloaded
+    again in full before it is processed.
+    """
+
+    KNOWN_HASH_META_KEY = 'document_content_hash'
+    # Set on downloads that must not be stopped on a prefix match
+    FULL_DOWNLOAD_META_KEY = 'document_full_download'
+
+    def __init__(self, dedup_path=None, prefix_kb=64, aliases_file=None, stats=None):
         self.processor = DocumentProcessor()
+        self.dedup_path = dedup_path
+        self.prefix_bytes = prefix_kb * 1024
+        self.aliases_file = aliases_file
+        self.stats = stats
+        self.cache = None
+        self.crawler = None
+        # Prefix received so far of downloads that may be a known document
+        self.prefixes = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            dedup_path=settings.get('DOCUMENT_DEDUP_PATH'),
+            prefix_kb=settings.getint('DOCUMENT_DEDUP_PREFIX_KB', 64),
+            aliases_file=settings.get('DOCUMENT_ALIASES_FILE'),
+            stats=crawler.stats,
+        )
+        pipeline.crawler = crawler
+        if pipeline.dedup_path and pipeline.prefix_bytes:
+            crawler.signals.connect(pipeline.headers_received, signal=signals.headers_received)
+            crawler.signals.connect(pipeline.bytes_received, signal=signals.bytes_received)
+        return pipeline
+
+    def open_spider(self, spider):
+        if self.dedup_path:
+            os.makedirs(os.path.dirname(self.dedup_path) or '.', exist_ok=True)
+            self.cache = DocumentCache(self.dedup_path, prefix_bytes=self.prefix_bytes)
+
+    def close_spider(self, spider):
+        if self.cache is None:
+            return
+        if self.aliases_file:
+            try:
+                count = self.cache.export_aliases(self.aliases_file)
+                spider.logger.info(f"Exported {count} document aliases to {self.aliases_file}")
+            except OSError as e:
+                spider.logger.error(f"Error exporting document aliases to {self.aliases_file}: {str(e)}")
+        self.cache.close()
+        self.cache = None
+
+    def headers_received(self, headers, body_length, request, spider):
+        """Watch the download if its size is that of a known document"""
+        if self.cache is None or body_length <= self.prefix_bytes or not self.cache.has_size(body_length):
+            return
+        if request.meta.get(self.FULL_DOWNLOAD_META_KEY):
+            return
+        # The prefix table holds decoded bytes
+        if headers.get('Content-Encoding', b'identity').lower() != b'identity':
+            return
+        content_type = headers.get('Content-Type', b'').decode('latin-1').lower()
+        is_document = getattr(spider, 'is_document_url', lambda url: False)(request.url)
+        if is_document or getattr(spider, 'is_document_content_type', lambda value: False)(content_type):
+            self.prefixes[request] = (body_length, bytearray())
+
+    def bytes_received(self, data, request, spider):
+        entry = self.prefixes.get(request)
+        if entry is None:
+            return
+        body_length, prefix = entry
+        prefix += data
+        if len(prefix) < self.prefix_bytes:
+            return
+        del self.prefixes[request]
+        digest = self.cache.find_prefix(body_length, bytes(prefix))
+        if digest is not None:
+            request.meta[self.KNOWN_HASH_META_KEY] = digest
+            self.inc_stat('documents/prefix_matched')
+            self.inc_stat('documents/bytes_not_downloaded', body_length - len(prefix))
+            raise StopDownload(fail=False)
 
     def process_item(self, item, spider):
         adapter = ItemAdapter(item)
         
         # Only process document items
         if adapter.get('file_type'):
-            try:
-                # Process the document based on its type
-                processed_content = self.processor.process_document(
-                    item['content'], 
-                    item['file_type']
-                )
-                adapter['text_content'] = processed_content
-                spider.logger.info(f"Processed document: {adapter['url']}")
-            except Exception as e:
-                spider.logger.error(f"Error processing document {adapter['url']}: {str(e)}")
+            if self.cache is not None:
+                # Set by the spider when the download was stopped on a prefix match
+                prefix_only = adapter.get('content_hash') is not None
+                if self.reuse(adapter, spider):
+                    return item
+                if prefix_only:
+                    # The content is only a prefix, never process it as the document
+                    return self.download_full(item, spider)
+            self.process(adapter, spider)
         
         return item
 
+    def process(self, adapter, spider):
+        try:
+            # Process the document based on its type
+            processed_content = self.processor.process_document(
+                adapter['content'], 
+                adapter['file_type'],
+                content_type=(adapter.get('metadata') or {}).get('content-type'),
+            )
+            adapter['text_content'] = processed_content
+            spider.logger.info(f"Processed document: {adapter['url']}")
+        except Exception as e:
+            spider.logger.error(f"Error processing document {adapter['url']}: {str(e)}")
+        else:
+            if self.cache is not None:
+                content = self.content_bytes(adapter)
+                self.cache.add(adapter['content_hash'], adapter['url'], content, adapter['file_type'],
+                               processed_content, adapter.get('metadata'), adapter.get('page_count'))
+
+    def download_full(self, item, spider):
+        """Download a stopped document again in full, then process it"""
+        adapter = ItemAdapter(item)
+        url = adapter['url']
+        spider.logger.info(f"Matched document is no longer cached, downloading in full: {url}")
+        self.inc_stat('documents/full_downloads')
+        if self.crawler is None or self.crawler.engine is None:
+            # Offline replay, there is nothing to download with
+            raise DropItem(f"Only a prefix of document {url} is available")
+        request = Request(url, dont_filter=True, meta={self.FULL_DOWNLOAD_META_KEY: True, 'dont_dedup': True})
+
+        def downloaded(response):
+            adapter['content'] = response.body
+            adapter['file_size'] = len(response.body)
+            adapter['content_hash'] = blob_hash(response.body)
+            self.process(adapter, spider)
+            return item
+
+        def failed(failure):
+            raise DropItem(f"Error downloading document {url} in full: {failure.getErrorMessage()}")
+
+        return self.crawler.engine.download(request).addCallbacks(downloaded, failed)
+
+    def reuse(self, adapter, spider):
+        """Fill the item from a processed copy of the same document, if there is one"""
+        digest = adapter.get('content_hash')
+        if digest is None:
+            digest = adapter['content_hash'] = blob_hash(self.content_bytes(adapter))
+        document = self.cache.get(digest)
+        if document is None:
+            return False
+
+        adapter['text_content'] = document['text_content']
+        adapter['metadata'] = {**document['metadata'], **(adapter.get('metadata') or {})}
+        adapter['file_size'] = document['size']
+        if document['page_count'] is not None:
+            adapter['page_count'] = document['page_count']
+        # The stored copy is already in the blob store; a stopped download only has a prefix
+        adapter.pop('content', None)
+        if document['url'] != adapter['url']:
+            adapter['alias_of'] = document['url']
+            self.cache.add_alias(adapter['url'], digest)
+            self.inc_stat('documents/aliases')
+        self.inc_stat('documents/processing_skipped')
+        spider.logger.info(f"Reused processed document for {adapter['url']} (same as {document['url']})")
+        return True
+
+    def content_bytes(self, adapter):
+        content = adapter.get('content') or b''
+        return content.encode('utf-8') if isinstance(content, str) else content
+
+    def inc_stat(self, key, count=1):
+        if self.stats is not None and count:
+            self.stats.inc_value(key, count)
+
+
+class BlobStorePipeline:
+    """Pipeline to move raw content into the content-addressed blob store
+
+    Page HTML and document bytes are stored once per sha256 and the item
+    keeps only ``content_hash``. Runs after DocumentProcessingPipeline, which
+    still needs the document bytes.
+    """
+
+    def __init__(self, directory='data/blobs', level=3, pack_size=256 * 1024 * 1024,
+                 dictionary_samples=1000, dictionary_size=112640):
+        self.directory = directory
+        self.level = level
+        self.pack_size = pack_size
+        self.dictionary_samples = dictionary_samples
+        self.dictionary_size = dictionary_size
+        self.store = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            directory=settings.get('BLOB_STORE_DIR', 'data/blobs'),
+            level=settings.getint('BLOB_STORE_COMPRESSION_LEVEL', 3),
+            pack_size=settings.getint('BLOB_STORE_PACK_SIZE', 256 * 1024 * 1024),
+            dictionary_samples=settings.getint('BLOB_STORE_DICTIONARY_SAMPLES', 1000),
+            dictionary_size=settings.getint('BLOB_STORE_DICTIONARY_SIZE', 112640),
+        )
+
+    def open_spider(self, spider):
+        self.store = BlobStore(
+            self.directory,
+            level=self.level,
+            pack_size=self.pack_size,
+            dictionary_samples=self.dictionary_samples,
+            dictionary_size=self.dictionary_size,
+        )
+
+    def close_spider(self, spider):
+        self.store.close()
+        spider.logger.info(f"Blob store {self.directory}: {len(self.store)} blobs, "
+                           f"{self.store.written_bytes} bytes written this crawl")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        content = adapter.get('content')
+        if content is None:
+            return item
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        # The dictionary is trained on and used for HTML pages only
+        adapter['content_hash'] = self.store.put(content, use_dictionary=not adapter.get('file_type'))
+        del adapter['content']
+        return item
+
 
 class JsonWriterPipeline:
-    """Pipeline to write items to JSON files"""
+    """Pipeline to write items to JSON files
 
-    def __init__(self):
+    Page and document files are also added to a URL lookup index in
+    ``RECORD_INDEX_DIR`` (disabled when the setting is empty), so the stored
+    record of a URL can be found without scanning the output directories.
+    """
+
+    def __init__(self, index_dir='data/lookup'):
+        self.index_dir = index_dir
+        self.index = None
         self.ensure_directories()
 
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(index_dir=crawler.settings.get('RECORD_INDEX_DIR', 'data/lookup'))
+
+    def open_spider(self, spider):
+        if self.index_dir:
+            self.index = RecordIndexWriter(self.index_dir)
+
+    def close_spider(self, spider):
+        if self.index is not None:
+            self.index.close()
+            spider.logger.info(f"Indexed {self.index.records} records in {self.index_dir}")
+
     def ensure_directories(self):
         """Create necessary directories"""
         directories = ['data', 'data/pages', 'data/documents', 'data/links', 'data/logs']
@@ -96,7 +415,10 @@ class JsonWriterPipeline:
         # Write item to JSON file
         try:
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(dict(adapter), f, ensure_ascii=False, indent=2)
+                json.dump(dict(adapter), f, ensure_ascii=False, indent=2, default=json_default)
+                length = f.tell()
+            if self.index is not None and adapter.get('url'):
+                self.index.add(adapter['url'], filename, 0, length)
             spider.logger.info(f"Saved item to {filename}")
         except Exception as e:
             spider.logger.error(f"Error saving item to {filename}: {str(e)}")
@@ -104,13 +426,243 @@ class JsonWriterPipeline:
         return item
 
 
+class ParquetWriterPipeline:
+    """Pipeline to write items to Parquet files for analytics"""
+
+    def __init__(self, directory='data/parquet', batch_size=1000, compression='zstd', compression_level=None):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.exporter = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if pa is None:
+            raise NotConfigured("pyarrow is not installed")
+        settings = crawler.settings
+        return cls(
+            directory=settings.get('PARQUET_DIR', 'data/parquet'),
+            batch_size=settings.getint('PARQUET_BATCH_SIZE', 1000),
+            compression=settings.get('PARQUET_COMPRESSION', 'zstd'),
+            compression_level=settings.getint('PARQUET_COMPRESSION_LEVEL') or None,
+        )
+
+    def open_spider(self, spider):
+        self.exporter = ParquetExporter(self.directory, self.batch_size, self.compression, self.compression_level)
+
+    def close_spider(self, spider):
+        self.exporter.close()
+        spider.logger.info(f"Wrote {self.exporter.rows} rows to Parquet files in {self.directory}")
+
+    def process_item(self, item, spider):
+        self.exporter.add(dict(ItemAdapter(item)))
+        return item
+
+
 class DatabasePipeline:
-    """Pipeline to save items to database (optional)"""
+    """Pipeline to save items to a SQLite database
 
-    def __init__(self):
-        # Initialize database connection here if needed
-        pass
+    Items are written in batches of ``DATABASE_BATCH_SIZE`` or every
+    ``DATABASE_COMMIT_INTERVAL`` seconds, whichever comes first.
+    """
+
+    def __init__(self, path='data/crawl.sqlite3', batch_size=500, commit_interval=1.0, queue_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.queue = WriterQueue(maxsize=queue_size)
+        self.database = None
+        self.thread = None
+        self.written = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            path=settings.get('DATABASE_PATH', 'data/crawl.sqlite3'),
+            batch_size=settings.getint('DATABASE_BATCH_SIZE', 500),
+            commit_interval=settings.getfloat('DATABASE_COMMIT_INTERVAL', 1.0),
+            queue_size=settings.getint('DATABASE_QUEUE_SIZE', 10000),
+        )
+
+    def open_spider(self, spider):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.database = CrawlDatabase(self.path)
+        self.thread = threading.Thread(target=self.write_loop, name='database-writer', daemon=True)
+        self.thread.start()
+
+    def close_spider(self, spider):
+        self.queue.close()
+        self.thread.join()
+        self.database.close()
+        spider.logger.info(f"Saved {self.written} items to {self.path}")
 
     def process_item(self, item, spider):
-        # Implement database saving logic here
-        return item
\ No newline at end of file
+        waiter = self.queue.put(dict(ItemAdapter(item)))
+        if waiter is not None:
+            # The writer is behind, the item moves on once it is queued
+            return waiter.addCallback(lambda _: item)
+        return item
+
+    def write_loop(self):
+        batch = []
+        deadline = time.monotonic() + self.commit_interval
+        running = True
+        while running:
+            try:
+                entry = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if entry is None:
+                    running = False
+                else:
+                    batch.append(entry)
+            except queue.Empty:
+                pass
+            if batch and (not running or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self.write(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.commit_interval
+
+    def write(self, batch):
+        try:
+            self.database.write_batch(batch)
+            self.written += len(batch)
+        except Exception as e:
+            logger.error(f"Error saving {len(batch)} items to {self.path}: {str(e)}")
+
+
+class SearchIndexPipeline:
+    """Pipeline to add page and document text to the full-text index
+
+    A segment is flushed every ``SEARCH_INDEX_FLUSH_DOCS`` items, so the
+    index can be searched with ``search_index.py`` during the crawl.
+    """
+
+    def __init__(self, directory='data/index', flush_docs=5000, merge_factor=8, queue_size=10000):
+        self.directory = directory
+        self.flush_docs = flush_docs
+        self.merge_factor = merge_factor
+        self.queue = WriterQueue(maxsize=queue_size)
+        self.writer = None
+        self.thread = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            directory=settings.get('SEARCH_INDEX_DIR', 'data/index'),
+            flush_docs=settings.getint('SEARCH_INDEX_FLUSH_DOCS', 5000),
+            merge_factor=settings.getint('SEARCH_INDEX_MERGE_FACTOR', 8),
+            queue_size=settings.getint('SEARCH_INDEX_QUEUE_SIZE', 10000),
+        )
+
+    def open_spider(self, spider):
+        self.writer = IndexWriter(self.directory, self.flush_docs, self.merge_factor)
+        self.thread = threading.Thread(target=self.index_loop, name='search-indexer', daemon=True)
+        self.thread.start()
+
+    def close_spider(self, spider):
+        self.queue.close()
+        self.thread.join()
+        self.writer.close()
+        spider.logger.info(f"Indexed {self.writer.documents} items in {self.directory}")
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if adapter.get('text_content') and adapter.get('url'):
+            waiter = self.queue.put((adapter['url'], adapter['text_content']))
+            if waiter is not None:
+                # The indexer is behind, the item moves on once its text is queued
+                return waiter.addCallback(lambda _: item)
+        return item
+
+    def index_loop(self):
+        for url, text in iter(self.queue.get, None):
+            try:
+                self.writer.add(url, text)
+            except Exception as e:
+                logger.error(f"Error indexing {url}: {str(e)}")
+
+
+class WarcWriterPipeline:
+    """Pipeline to archive raw request/response exchanges as WARC files
+
+    Every downloaded page and document is archived from the
+    ``response_received`` signal, whether or not it produced an item.
+    """
+
+    def __init__(self, directory='data/warc', prefix='webcrawler', max_size=1024 ** 3,
+                 queue_size=1000, buffer_size=1024 * 1024):
+        self.writer = WarcWriter(directory, prefix, max_size, buffer_size)
+        self.queue = WriterQueue(maxsize=queue_size)
+        self.thread = None
+        self.records = 0
+        self.crawler = None
+        self.paused = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            directory=settings.get('WARC_DIR', 'data/warc'),
+            prefix=settings.get('WARC_PREFIX', 'webcrawler'),
+            max_size=settings.getint('WARC_MAX_FILE_SIZE', 1024 ** 3),
+            queue_size=settings.getint('WARC_QUEUE_SIZE', 1000),
+            buffer_size=settings.getint('WARC_BUFFER_SIZE', 1024 * 1024),
+        )
+        pipeline.crawler = crawler
+        crawler.signals.connect(pipeline.response_received, signal=signals.response_received)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.thread = threading.Thread(target=self.write_loop, name='warc-writer', daemon=True)
+        self.thread.start()
+
+    def close_spider(self, spider):
+        self.queue.close()
+        self.thread.join()
+        spider.logger.info(f"Archived {self.records} responses to WARC files in {self.writer.directory}")
+
+    def response_received(self, response, request, spider):
+        # Bodies of downloads stopped early (StopDownload) are incomplete
+        if 'cached' in response.flags or 'download_stopped' in response.flags:
+            return
+        content_type = response.headers.get('Content-Type', b'-').decode('latin-1')
+        waiter = self.queue.put((
+            response.url,
+            request.method,
+            [(name, value) for name, values in request.headers.items() for value in values],
+            response.status,
+            [(name, value) for name, values in response.headers.items() for value in values],
+            response.body,
+            content_type,
+            time.time(),
+        ))
+        if waiter is not None:
+            # Signal handlers cannot return a Deferred, hold back new downloads instead.
+            # The waiter may have fired already, so pause before resuming on it
+            if not self.paused and self.crawler is not None and self.crawler.engine is not None:
+                self.paused = True
+                EnginePause.of(self.crawler).hold(self)
+            waiter.addCallback(self.resume)
+
+    def resume(self, _):
+        if self.paused and not self.queue.waiting:
+            self.paused = False
+            EnginePause.of(self.crawler).release(self)
+
+    def write_loop(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            try:
+                self.writer.write_exchange(*entry)
+                self.records += 1
+            except Exception as e:
+                logger.error(f"Error writing WARC record for {entry[0]}: {str(e)}")
+        self.writer.close()
+
+    def process_item(self, item, spider):
+        return item
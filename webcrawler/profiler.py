@@ -0,0 +1,235 @@
+"""
+Crawl profiling: a sampling profiler and a single-URL cProfile mode
+
+``CrawlProfiler`` runs a background thread that samples the stack of every
+thread (the reactor thread and the pipelines' writer threads) at a fixed
+interval. Samples taken inside a spider callback or a pipeline's
+``process_item`` are attributed to it, and when the spider closes the
+samples are written as collapsed stacks (the input format of
+``flamegraph.pl`` and speedscope) next to a hot-function report.
+
+``profile_url`` downloads one URL and runs it through the spider callback
+and the item pipelines under ``cProfile``, without the reactor in the way.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from webcrawler.metrics import stage_name
+from webcrawler.replay import ReplayWorker, build_response
+
+
+logger = logging.getLogger(__name__)
+
+# Leaf functions where a thread is waiting for work, counted as idle
+IDLE_FUNCTIONS = frozenset((
+    'Condition.wait', 'Event.wait', 'Thread._wait_for_tstate_lock',
+    'EPollReactor.doPoll', 'PollReactor.doPoll', 'SelectReactor.doSelect',
+))
+
+
+# Without co_qualname (Python < 3.11) idle leaves are matched on the function name alone
+IDLE_NAMES = frozenset(name.rpartition('.')[2] for name in IDLE_FUNCTIONS)
+
+
+def qualname(code):
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+def is_idle(code):
+    if hasattr(code, 'co_qualname'):
+        return code.co_qualname in IDLE_FUNCTIONS
+    return code.co_name in IDLE_NAMES
+
+
+def frame_name(code):
+    return f'{qualname(code)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Counts the stacks of all other threads, sampled every ``interval`` seconds"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        # Code object -> stage label, e.g. 'pipeline:Validation'
+        self.labels = {}
+        self.stacks = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def label(self, function, label):
+        code = getattr(getattr(function, '__func__', function), '__code__', None)
+        if code is not None:
+            self.labels[code] = label
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.sample_loop, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def sample_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        start = time.perf_counter()
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            codes = []
+            label = None
+            while frame is not None:
+                code = frame.f_code
+                if label is None:
+                    # The innermost labelled frame is the stage that is running
+                    label = self.labels.get(code)
+                codes.append(code)
+                frame = frame.f_back
+            if codes and is_idle(codes[0]):
+                label = 'idle'
+            codes.reverse()
+            self.stacks[(names.get(ident, f'thread-{ident}'), label, tuple(codes))] += 1
+        self.samples += 1
+        self.sampling_seconds += time.perf_counter() - start
+
+    def collapsed(self):
+        """Lines of 'thread;stage;frame;...;frame count', outermost frame first"""
+        lines = Counter()
+        for (thread, label, codes), count in self.stacks.items():
+            frames = [thread] + ([label] if label else []) + [frame_name(code) for code in codes]
+            lines[';'.join(frame.replace(';', ':') for frame in frames)] += count
+        return [f'{stack} {count}' for stack, count in sorted(lines.items())]
+
+    def report(self, top=30):
+        """Samples per stage and thread, then the hottest functions while busy"""
+        stages = Counter()
+        threads = Counter()
+        own = Counter()
+        inclusive = Counter()
+        busy = 0
+        for (thread, label, codes), count in self.stacks.items():
+            threads[thread] += count
+            stages[label or 'other'] += count
+            if label == 'idle':
+                continue
+            busy += count
+            if codes:
+                own[codes[-1]] += count
+            for code in set(codes):
+                inclusive[code] += count
+        total = sum(self.stacks.values()) or 1
+
+        lines = [f'{self.samples} samples every {self.interval * 1000:g}ms, '
+                 f'{self.sampling_seconds:.3f}s spent sampling', '']
+        for title, counter in (('Samples by stage', stages), ('Samples by thread', threads)):
+            lines.append(title)
+            for name, count in counter.most_common():
+                lines.append(f'{count:>10} {count * 100 / total:6.2f}%  {name}')
+            lines.append('')
+        for title, counter in (('Hot functions (self)', own), ('Hot functions (inclusive)', inclusive)):
+            lines.append(f'{title}, % of {busy} busy samples')
+            for code, count in counter.most_common(top):
+                lines.append(f'{count:>10} {count * 100 / (busy or 1):6.2f}%  {frame_name(code)}')
+            lines.append('')
+        return '\n'.join(lines)
+
+    def write(self, directory, name, top=30):
+        os.makedirs(directory, exist_ok=True)
+        collapsed_path = os.path.join(directory, f'{name}.collapsed')
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            f.writelines(line + '\n' for line in self.collapsed())
+        report_path = os.path.join(directory, f'{name}-top.txt')
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(self.report(top))
+        return collapsed_path, report_path
+
+
+class CrawlProfiler:
+    """Extension sampling the crawl while the spider is open"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PROFILE_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.directory = settings.get('PROFILE_DIR', 'data/logs/profile')
+        self.top = settings.getint('PROFILE_TOP', 30)
+        self.profiler = SamplingProfiler(settings.getfloat('PROFILE_INTERVAL', 0.01))
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        for name in dir(type(spider)):
+            if name.startswith('parse'):
+                self.profiler.label(getattr(type(spider), name), f'callback:{name}')
+        for pipeline in self.crawler.engine.scraper.itemproc.middlewares:
+            if hasattr(pipeline, 'process_item'):
+                self.profiler.label(pipeline.process_item, f'pipeline:{stage_name(pipeline)}')
+        self.profiler.start()
+        logger.info(f"Sampling profiler started, interval {self.profiler.interval * 1000:g}ms")
+
+    def spider_closed(self, spider, reason):
+        self.profiler.stop()
+        try:
+            collapsed_path, report_path = self.profiler.write(self.directory, spider.name, self.top)
+        except OSError as e:
+            logger.error(f"Error writing profile to {self.directory}: {str(e)}")
+            return
+        logger.info(f"Profile written to {collapsed_path} and {report_path}")
+
+
+def profile_url(settings, url, directory='data/logs/profile', top=30, spider_kwargs=None):
+    """Fetch ``url`` once, then profile parse and the pipelines on it with cProfile
+
+    Returns the path of the pstats file and the text report.
+    """
+    headers = {'User-Agent': settings.get('USER_AGENT')} if settings.get('USER_AGENT') else {}
+    fetched = requests.get(url, headers=headers, timeout=settings.getfloat('DOWNLOAD_TIMEOUT', 180))
+    response = build_response(fetched.url, fetched.status_code, dict(fetched.headers), fetched.content)
+
+    worker = ReplayWorker(settings, spider_kwargs or {'max_depth': 1000})
+    worker.open()
+    profile = cProfile.Profile()
+    try:
+        profile.runcall(worker.process, response)
+    finally:
+        worker.close()
+
+    os.makedirs(directory, exist_ok=True)
+    stats_path = os.path.join(directory, 'url.pstats')
+    profile.dump_stats(stats_path)
+    stream = io.StringIO()
+    stream.write(f'{url}: {len(fetched.content)} bytes, {dict(worker.counts)}\n\n')
+    stats = pstats.Stats(profile, stream=stream).strip_dirs()
+    stats.sort_stats('cumulative').print_stats(top)
+    stats.sort_stats('tottime').print_stats(top)
+    report = stream.getvalue()
+    with open(os.path.join(directory, 'url-top.txt'), 'w', encoding='utf-8') as f:
+        f.write(report)
+    return stats_path, report
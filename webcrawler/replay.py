@@ -0,0 +1,245 @@
+"""
+Offline replay of stored responses
+
+Feeds responses from the SQLite HTTP cache or from WARC files through
+``MainSpider.parse`` and the configured item pipelines without touching
+the network. Work is sharded across processes and every stage is timed,
+so a replay doubles as a CPU throughput benchmark for parsing and the
+pipelines.
+"""
+
+import logging
+import multiprocessing
+import time
+from collections import Counter, defaultdict
+
+from scrapy import Request
+from scrapy.crawler import Crawler
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.misc import load_object
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from w3lib.http import headers_raw_to_dict
+
+from utils.compression import decode_content
+from utils.warc import iter_records
+from webcrawler.httpcache import ResponseCache
+from webcrawler.pipelines import WriterQueue
+from webcrawler.spiders.main_spider import MainSpider
+
+try:
+    from scrapy.utils.misc import build_from_crawler
+except ImportError:
+    from scrapy.utils.misc import create_instance
+
+    def build_from_crawler(objcls, crawler):
+        return create_instance(objcls, crawler.settings, crawler)
+
+
+logger = logging.getLogger(__name__)
+
+
+def decode_body(headers, body):
+    """Undo the content codings of a body stored as it came off the wire
+
+    Codings are removed last applied first, and so is Content-Encoding.
+    """
+    encodings = [encoding.strip().lower() for value in headers.getlist('Content-Encoding')
+                 for encoding in value.decode('latin-1').split(',')]
+    for encoding in reversed(encodings):
+        if encoding == 'x-gzip':
+            encoding = 'gzip'
+        if encoding and encoding != 'identity':
+            body = decode_content(body, encoding)
+    headers.pop(b'Content-Encoding', None)
+    return body
+
+
+def iter_cache_entries(path, shard=0, shards=1):
+    """Yield (url, status, headers, body) from a SQLite cache file
+
+    HttpCacheMiddleware stores responses before DecompressionMiddleware
+    sees them, so bodies are decoded here.
+    """
+    cache = ResponseCache(path)
+    try:
+        for method, url, response_url, status, raw_headers, body in cache.iter_responses(shard, shards):
+            headers = Headers(headers_raw_to_dict(raw_headers))
+            try:
+                body = decode_body(headers, body)
+            except Exception as e:
+                logger.warning(f"Skipping cached response for {response_url}, body not decoded: {str(e)}")
+                continue
+            yield response_url, status, headers, body
+    finally:
+        cache.close()
+
+
+def iter_warc_entries(path, shard=0, shards=1):
+    """Yield (url, status, headers, body) from WARC response records"""
+    for record in iter_records(path, record_types=('response',), shard=shard, shards=shards):
+        status, headers, body = record.http_response()
+        header_dict = defaultdict(list)
+        for name, value in headers:
+            header_dict[name].append(value)
+        yield record.target_uri, status, dict(header_dict), body
+
+
+def iter_entries(sources, shard=0, shards=1):
+    for kind, path in sources:
+        if kind == 'warc':
+            yield from iter_warc_entries(path, shard, shards)
+        else:
+            yield from iter_cache_entries(path, shard, shards)
+
+
+def build_response(url, status, headers, body):
+    headers = Headers(headers)
+    # Bodies are decoded by now (cache entries above, WARC records by http_response and
+    # requests' content in the profiler), drop headers that would make Scrapy decode again
+    for name in (b'Content-Encoding', b'Transfer-Encoding'):
+        headers.pop(name, None)
+    respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+    return respcls(url=url, status=status, headers=headers, body=body,
+                   request=Request(url, meta={'depth': 0}))
+
+
+class ReplayWorker:
+    """Runs parse and the item pipelines for one shard of the stored responses"""
+
+    def __init__(self, settings, spider_kwargs=None, use_pipelines=True):
+        self.crawler = Crawler(MainSpider, settings)
+        if hasattr(self.crawler, '_apply_settings'):
+            # Creates stats, fingerprinter and extensions like a real crawl would
+            self.crawler._apply_settings()
+        self.spider = self.crawler._create_spider(**(spider_kwargs or {}))
+        self.crawler.spider = self.spider
+        self.pipelines = []
+        if use_pipelines:
+            pipeline_paths = sorted(settings.getdict('ITEM_PIPELINES').items(), key=lambda kv: kv[1])
+            for path, order in pipeline_paths:
+                if order is None:
+                    continue
+                try:
+                    pipeline = build_from_crawler(load_object(path), self.crawler)
+                except NotConfigured:
+                    continue
+                # No reactor moves waiting entries into a full queue, wait for room instead
+                if isinstance(getattr(pipeline, 'queue', None), WriterQueue):
+                    pipeline.queue.blocking = True
+                self.pipelines.append((path.rsplit('.', 1)[-1], pipeline))
+        self.stage_seconds = Counter()
+        self.stage_calls = Counter()
+        self.counts = Counter()
+
+    def open(self):
+        self.crawler.stats.open_spider(self.spider)
+        for _, pipeline in self.pipelines:
+            if hasattr(pipeline, 'open_spider'):
+                pipeline.open_spider(self.spider)
+
+    def close(self):
+        for _, pipeline in self.pipelines:
+            if hasattr(pipeline, 'close_spider'):
+                pipeline.close_spider(self.spider)
+
+    def process(self, response):
+        start = time.perf_counter()
+        items = []
+        for output in self.spider.parse(response) or ():
+            if isinstance(output, Request):
+                self.counts['requests'] += 1
+            else:
+                items.append(output)
+        self.stage_seconds['parse'] += time.perf_counter() - start
+        self.stage_calls['parse'] += 1
+        self.counts['responses'] += 1
+
+        for item in items:
+            self.counts['items'] += 1
+            for name, pipeline in self.pipelines:
+                start = time.perf_counter()
+                try:
+                    item = pipeline.process_item(item, self.spider)
+                    if isinstance(item, defer.Deferred):
+                        item = self.result(item, name)
+                except DropItem:
+                    self.counts['dropped'] += 1
+                    break
+                finally:
+                    self.stage_seconds[name] += time.perf_counter() - start
+                    self.stage_calls[name] += 1
+
+    @staticmethod
+    def result(deferred, name):
+        """Outcome of a Deferred returned by a pipeline, which must have fired already"""
+        outcome = []
+        deferred.addBoth(outcome.append)
+        if not outcome:
+            raise RuntimeError(f'{name} returned a Deferred that needs a running reactor')
+        if isinstance(outcome[0], Failure):
+            outcome[0].raiseException()
+        return outcome[0]
+
+    def run(self, entries):
+        self.open()
+        try:
+            for url, status, headers, body in entries:
+                self.process(build_response(url, status, headers, body))
+        finally:
+            self.close()
+        return {
+            'counts': dict(self.counts),
+            'stage_seconds': dict(self.stage_seconds),
+            'stage_calls': dict(self.stage_calls),
+        }
+
+
+def run_shard(args):
+    settings, sources, shard, shards, spider_kwargs, use_pipelines = args
+    worker = ReplayWorker(settings, spider_kwargs, use_pipelines)
+    return worker.run(iter_entries(sources, shard, shards))
+
+
+def replay(settings, sources, processes=1, spider_kwargs=None, use_pipelines=True):
+    """Replay all sources and return counts, per-stage timings and throughput
+
+    ``sources`` is a list of ('cache' | 'warc', path) tuples.
+    """
+    settings = settings.copy()
+    spider_kwargs = spider_kwargs or {'max_depth': 1000}
+    start = time.perf_counter()
+    jobs = [(settings, sources, shard, processes, spider_kwargs, use_pipelines) for shard in range(processes)]
+    if processes == 1:
+        results = [run_shard(jobs[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(run_shard, jobs)
+    wall_seconds = time.perf_counter() - start
+
+    counts = Counter()
+    stage_seconds = Counter()
+    stage_calls = Counter()
+    for result in results:
+        counts.update(result['counts'])
+        stage_seconds.update(result['stage_seconds'])
+        stage_calls.update(result['stage_calls'])
+
+    responses = counts['responses']
+    stages = {}
+    for stage, seconds in stage_seconds.items():
+        # Throughput of a single process spending all its time in this stage
+        stages[stage] = {
+            'calls': stage_calls[stage],
+            'seconds': round(seconds, 3),
+            'per_sec': round(stage_calls[stage] / seconds, 1) if seconds else None,
+        }
+    return {
+        'processes': processes,
+        'counts': dict(counts),
+        'wall_seconds': round(wall_seconds, 3),
+        'pages_per_sec': round(responses / wall_seconds, 1) if wall_seconds else None,
+        'stages': stages,
+    }
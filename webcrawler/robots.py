@@ -0,0 +1,397 @@
+"""
+Persistent robots.txt cache with compiled rule matchers
+
+``RobotsMiddleware`` replaces Scrapy's RobotsTxtMiddleware. Fetched
+robots.txt bodies and the rules selected for our user agent are kept in a
+SQLite file (``ROBOTSTXT_CACHE_PATH``) until their TTL expires, so a new
+process or a new run starts checking requests without refetching
+robots.txt from every host.
+
+Each host's Allow/Disallow rules are compiled into one trie over the rule
+characters, so finding the longest matching rule walks the URL path once
+instead of trying the rules one by one. Wildcard rules hang off the trie
+node of their literal prefix and their regex is only tried when the walk
+reaches it. As in RFC 9309 the longest rule wins and Allow wins ties.
+
+``Crawl-delay`` becomes a lower bound on the host's download delay: through
+AdaptiveThrottle when it is enabled, on the download slot otherwise.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import quote
+
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Request
+from scrapy.http.request import NO_CALLBACK
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet.defer import Deferred
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS robots (
+    netloc TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    user_agent TEXT NOT NULL,
+    rules TEXT NOT NULL,
+    crawl_delay REAL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Characters left as they are when paths and rules are normalized
+SAFE_CHARACTERS = "/?=&;:@!$'()*+,-._~%"
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+ESCAPE = re.compile(r'%([0-9a-fA-F]{2})')
+NEEDS_NORMALIZING = re.compile(r"[^A-Za-z0-9/?=&;:@!$'()*+,\-._~]")
+# Trie keys are single characters, these two cannot collide with them
+RULE = None
+WILDCARDS = ''
+
+
+def normalize_path(path):
+    """Percent-encode non-ASCII characters and unify existing escapes"""
+    if not NEEDS_NORMALIZING.search(path):
+        return path
+    path = quote(path, safe=SAFE_CHARACTERS)
+
+    def unescape(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in UNRESERVED else '%' + match.group(1).upper()
+
+    return ESCAPE.sub(unescape, path)
+
+
+def product_token(user_agent):
+    """The name robots.txt groups are matched against, e.g. 'webcrawler' for 'WebCrawler/1.0 (...)'"""
+    return re.split(r'[/\s(;]', user_agent.strip(), maxsplit=1)[0].lower()
+
+
+def parse_robots(body, token):
+    """Rules and crawl delay that apply to ``token``
+
+    Returns ([(allow, pattern), ...], crawl_delay). Groups naming the token
+    are merged; the '*' groups apply only when no group names it.
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    groups = []
+    group = None
+    in_rules = True
+    for line in body.splitlines():
+        line = line.split('#', 1)[0].strip()
+        key, colon, value = line.partition(':')
+        if not colon:
+            continue
+        key = key.strip().lower()
+        value = value.strip()
+        if key in ('user-agent', 'useragent'):
+            if in_rules:
+                group = {'agents': [], 'rules': [], 'crawl_delay': None}
+                groups.append(group)
+                in_rules = False
+            group['agents'].append(value.lower())
+        elif group is None:
+            continue
+        elif key in ('allow', 'disallow'):
+            in_rules = True
+            # An empty Disallow allows everything, it adds no rule
+            if value:
+                group['rules'].append((key == 'allow', value))
+        elif key in ('crawl-delay', 'crawldelay'):
+            in_rules = True
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            if math.isfinite(delay) and delay >= 0:
+                group['crawl_delay'] = delay
+
+    def names_token(agent):
+        return agent != '*' and re.search(rf'(?:^|[^a-z0-9_-]){re.escape(agent)}', token) is not None
+
+    selected = [group for group in groups if any(names_token(agent) for agent in group['agents'])]
+    if not selected:
+        selected = [group for group in groups if '*' in group['agents']]
+    rules = [rule for group in selected for rule in group['rules']]
+    delays = [group['crawl_delay'] for group in selected if group['crawl_delay'] is not None]
+    return rules, max(delays) if delays else None
+
+
+def compile_wildcard(pattern):
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    return re.compile('.*'.join(map(re.escape, pattern.split('*'))) + ('$' if anchored else ''), re.DOTALL)
+
+
+class RobotsRules:
+    """The Allow/Disallow rules of one host compiled into a longest-match trie"""
+
+    __slots__ = ('rules', 'trie', 'crawl_delay', 'expires_at')
+
+    def __init__(self, rules=(), crawl_delay=None, expires_at=math.inf):
+        self.rules = list(rules)
+        self.crawl_delay = crawl_delay
+        self.expires_at = expires_at
+        self.trie = {}
+        for allow, pattern in self.rules:
+            pattern = normalize_path(pattern)
+            literal = pattern.split('*', 1)[0]
+            if literal.endswith('$') and literal == pattern:
+                literal = literal[:-1]
+            node = self.trie
+            for char in literal:
+                node = node.setdefault(char, {})
+            if literal == pattern:
+                # Allow wins over a Disallow of the same length
+                node[RULE] = node.get(RULE, False) or allow
+            else:
+                node.setdefault(WILDCARDS, []).append((len(pattern), allow, compile_wildcard(pattern).match))
+
+    def allowed(self, path):
+        """Whether ``path`` (path and query of a URL) may be fetched"""
+        if path == '/robots.txt':
+            return True
+        path = normalize_path(path)
+        best_length = -1
+        allowed = True
+        candidates = None
+        node = self.trie
+        length = 0
+        while True:
+            rule = node.get(RULE)
+            if rule is not None:
+                best_length, allowed = length, rule
+            wildcards = node.get(WILDCARDS)
+            if wildcards is not None:
+                candidates = wildcards if candidates is None else candidates + wildcards
+            if length == len(path):
+                break
+            node = node.get(path[length])
+            if node is None:
+                break
+            length += 1
+        if candidates is not None:
+            for pattern_length, allow, match in candidates:
+                if pattern_length < best_length or (pattern_length == best_length and (allowed or not allow)):
+                    continue
+                if match(path):
+                    best_length, allowed = pattern_length, allow
+        return allowed
+
+    def __len__(self):
+        return len(self.rules)
+
+
+class RobotsStore:
+    """robots.txt bodies and selected rules per netloc in a SQLite file"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def get(self, netloc, user_agent, now=None):
+        """Return a RobotsRules for ``netloc`` or None if missing or expired"""
+        row = self.db.execute(
+            'SELECT body, user_agent, rules, crawl_delay, expires_at FROM robots WHERE netloc = ?', (netloc,)
+        ).fetchone()
+        if row is None:
+            return None
+        body, stored_agent, rules, crawl_delay, expires_at = row
+        if expires_at <= (now if now is not None else time.time()):
+            return None
+        if stored_agent == user_agent:
+            rules = [(bool(allow), pattern) for allow, pattern in json.loads(rules)]
+        else:
+            rules, crawl_delay = parse_robots(body, user_agent)
+        return RobotsRules(rules, crawl_delay, expires_at)
+
+    def put(self, netloc, status, body, user_agent, rules, crawl_delay, expires_at, now=None):
+        self.db.execute(
+            'INSERT OR REPLACE INTO robots '
+            '(netloc, status, body, user_agent, rules, crawl_delay, fetched_at, expires_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (netloc, status, body, user_agent, json.dumps(rules), crawl_delay,
+             now if now is not None else time.time(), expires_at)
+        )
+        self.db.commit()
+
+    def expire(self, now=None):
+        deleted = self.db.execute('DELETE FROM robots WHERE expires_at <= ?',
+                                  (now if now is not None else time.time(),)).rowcount
+        self.db.commit()
+        return deleted
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM robots').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+class RobotsMiddleware:
+    """Downloader middleware obeying robots.txt from a persistent cache"""
+
+    DOWNLOAD_PRIORITY = 1000
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ROBOTSTXT_OBEY'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.user_agent = product_token(settings.get('ROBOTSTXT_USER_AGENT') or settings.get('USER_AGENT') or 'Scrapy')
+        self.path = settings.get('ROBOTSTXT_CACHE_PATH')
+        self.ttl = settings.getfloat('ROBOTSTXT_CACHE_TTL', 86400)
+        self.error_ttl = settings.getfloat('ROBOTSTXT_CACHE_ERROR_TTL', 600)
+        self.max_crawl_delay = settings.getfloat('ROBOTSTXT_MAX_CRAWL_DELAY', 30)
+        self.clock = time.time
+        self.store = None
+        # netloc -> RobotsRules, or a Deferred while robots.txt is being fetched
+        self.hosts = {}
+        # netloc -> Crawl-delay not yet applied to the host's download slot
+        self.crawl_delays = {}
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.request_reached_downloader, signal=signals.request_reached_downloader)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.store = RobotsStore(self.path)
+            self.store.expire()
+
+    def spider_closed(self, spider):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_obey_robotstxt'):
+            return None
+        parsed = urlparse_cached(request)
+        if parsed.scheme in ('data', 'file'):
+            return None
+        rules = self.hosts.get(parsed.netloc)
+        if rules is None or (not isinstance(rules, Deferred) and rules.expires_at <= self.clock()):
+            rules = self.load(request, parsed, spider)
+        if isinstance(rules, Deferred):
+            d = Deferred()
+            rules.addCallback(self.forward, d)
+            d.addCallback(self.check, request, spider)
+            return d
+        return self.check(rules, request, spider)
+
+    @staticmethod
+    def forward(result, d):
+        d.callback(result)
+        return result
+
+    def check(self, rules, request, spider):
+        parsed = urlparse_cached(request)
+        path = parsed.path or '/'
+        if parsed.params:
+            path += ';' + parsed.params
+        if parsed.query:
+            path += '?' + parsed.query
+        if not rules.allowed(path):
+            logger.debug(f"Forbidden by robots.txt: {request}")
+            self.stats.inc_value('robotstxt/forbidden')
+            raise IgnoreRequest("Forbidden by robots.txt")
+        return None
+
+    def load(self, request, parsed, spider):
+        """Rules from the store, or a Deferred firing once robots.txt is fetched"""
+        netloc = parsed.netloc
+        if self.store is not None:
+            rules = self.store.get(netloc, self.user_agent, self.clock())
+            if rules is not None:
+                self.stats.inc_value('robotstxt/cache_hit')
+                return self.set_rules(netloc, rules)
+
+        self.hosts[netloc] = pending = Deferred()
+        robots_request = Request(
+            f'{parsed.scheme}://{netloc}/robots.txt',
+            priority=self.DOWNLOAD_PRIORITY,
+            meta={'dont_obey_robotstxt': True},
+            callback=NO_CALLBACK,
+        )
+        dfd = self.crawler.engine.download(robots_request)
+        dfd.addCallbacks(self.parse_response, self.parse_error,
+                         callbackArgs=(netloc,), errbackArgs=(netloc, robots_request))
+        self.stats.inc_value('robotstxt/request_count')
+        return pending
+
+    def parse_response(self, response, netloc):
+        self.stats.inc_value('robotstxt/response_count')
+        self.stats.inc_value(f'robotstxt/response_status_count/{response.status}')
+        now = self.clock()
+        if 200 <= response.status < 300:
+            rules, crawl_delay = parse_robots(response.body, self.user_agent)
+        else:
+            # 4xx means there are no rules; server errors are treated the same
+            # way as by RobotsTxtMiddleware, but asked again sooner
+            rules, crawl_delay = [], None
+        expires_at = now + (self.error_ttl if response.status >= 500 else self.ttl)
+        if self.store is not None:
+            self.store.put(netloc, response.status, response.body, self.user_agent, rules, crawl_delay,
+                           expires_at, now)
+        self.resolve(netloc, RobotsRules(rules, crawl_delay, expires_at))
+
+    def parse_error(self, failure, netloc, request):
+        if not failure.check(IgnoreRequest):
+            logger.error(f"Error downloading {request}: {failure.value}")
+            self.stats.inc_value(f'robotstxt/exception_count/{failure.type}')
+        # Not stored, so the next run asks again
+        self.resolve(netloc, RobotsRules(expires_at=self.clock() + self.error_ttl))
+
+    def resolve(self, netloc, rules):
+        pending = self.hosts.get(netloc)
+        self.set_rules(netloc, rules)
+        if isinstance(pending, Deferred):
+            pending.callback(rules)
+
+    def set_rules(self, netloc, rules):
+        self.hosts[netloc] = rules
+        if rules.crawl_delay:
+            self.crawl_delays[netloc] = min(rules.crawl_delay, self.max_crawl_delay)
+        return rules
+
+    def request_reached_downloader(self, request, spider):
+        # The slot key (host or IP) is only known once the request has reached the downloader
+        if not self.crawl_delays:
+            return
+        delay = self.crawl_delays.pop(urlparse_cached(request).netloc, None)
+        if delay is not None:
+            self.apply_crawl_delay(request.meta.get('download_slot', ''), delay, spider)
+
+    def apply_crawl_delay(self, key, delay, spider):
+        """Make ``delay`` the minimum delay of the host's download slot"""
+        self.stats.inc_value('robotstxt/crawl_delay_hosts')
+        throttle = getattr(spider, 'throttle', None)
+        if throttle is not None:
+            throttle.set_crawl_delay(key, delay)
+            return
+        engine = self.crawler.engine
+        slot = engine.downloader.slots.get(key) if engine is not None else None
+        if slot is not None:
+            slot.delay = max(slot.delay, delay)
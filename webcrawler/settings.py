@@ -7,6 +7,13 @@ NEWSPIDER_MODULE = 'webcrawler.spiders'
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
+# robots.txt bodies and rules are kept between runs by webcrawler.robots.RobotsMiddleware ('' keeps them in memory)
+ROBOTSTXT_CACHE_PATH = 'data/robots.sqlite3'
+ROBOTSTXT_CACHE_TTL = 86400
+# Server errors and failed downloads allow everything until robots.txt is asked again
+ROBOTSTXT_CACHE_ERROR_TTL = 600
+# Upper bound on the Crawl-delay honoured per host, in seconds
+ROBOTSTXT_MAX_CRAWL_DELAY = 30
 
 # Configure delays for requests
 DOWNLOAD_DELAY = 1
@@ -16,6 +23,24 @@ RANDOMIZE_DOWNLOAD_DELAY = 0.5
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 CONCURRENT_REQUESTS_PER_IP = 8
 
+# DNS: TTL-respecting cache kept between runs ('' keeps it in memory), with negative entries
+DNS_RESOLVER = 'webcrawler.dns.CachingResolver'
+DNS_CACHE_PATH = 'data/dns.sqlite3'
+DNSCACHE_SIZE = 100000
+DNS_CACHE_MIN_TTL = 60
+DNS_CACHE_MAX_TTL = 86400
+DNS_NEGATIVE_TTL = 300
+DNS_TIMEOUT = 30
+# Nameservers as 'host:port', /etc/resolv.conf and /etc/hosts when empty
+DNS_SERVERS = []
+DNS_CONCURRENCY = 16
+# Resolve the hosts of scheduled and frontier requests before they are downloaded
+DNS_PREFETCH_ENABLED = True
+DNS_PREFETCH_QUEUE_SIZE = 10000
+
+# Request fingerprints key the HTTP cache and replay
+REQUEST_FINGERPRINTER_IMPLEMENTATION = '2.7'
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = False
 
@@ -31,40 +56,166 @@ DEFAULT_REQUEST_HEADERS = {
 
 # Enable or disable spider middlewares
 SPIDER_MIDDLEWARES = {
-    'webcrawler.middlewares.WebcrawlerSpiderMiddleware': 543,
+    # Closest to the spider so callback timings exclude the built-in middlewares
+    'webcrawler.middlewares.WebcrawlerSpiderMiddleware': 950,
 }
 
 # Enable or disable downloader middlewares
 DOWNLOADER_MIDDLEWARES = {
+    # First, so duplicates are dropped before robots.txt, circuit breakers or the cache see them
+    'webcrawler.middlewares.PrefetchDedupMiddleware': 50,
+    'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': None,
+    'webcrawler.robots.RobotsMiddleware': 100,
     'webcrawler.middlewares.WebcrawlerDownloaderMiddleware': 543,
     'webcrawler.middlewares.UserAgentMiddleware': 400,
+    'scrapy.downloadermiddlewares.httpcompression.HttpCompressionMiddleware': None,
+    'webcrawler.middlewares.DecompressionMiddleware': 590,
+    # Between decompression (590) and MetaRefreshMiddleware (580): sees decoded bodies, and
+    # meta refresh and the spider read text with the detected encoding
+    'webcrawler.middlewares.CharsetMiddleware': 585,
+    # Retries are handled by WebcrawlerDownloaderMiddleware (budget + backoff)
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
 }
 
+# Drop requests for URLs already fetched (shared through FRONTIER_BACKEND) before downloading
+PREFETCH_DEDUP_ENABLED = True
+
 # Enable or disable extensions
 EXTENSIONS = {
     'scrapy.extensions.telnet.TelnetConsole': None,
+    'webcrawler.dns.DnsPrefetch': 450,
+    'webcrawler.throttle.AdaptiveThrottle': 500,
+    'webcrawler.metrics.CrawlMetrics': 600,
+    'webcrawler.profiler.CrawlProfiler': 700,
+    'webcrawler.memory.MemoryMonitor': 800,
 }
 
+# Latency histograms, queue depths and byte counters (Prometheus text at /metrics)
+METRICS_ENABLED = True
+METRICS_HOST = '127.0.0.1'
+# A port range like TELNETCONSOLE_PORT, [] disables the HTTP endpoint
+METRICS_PORT = [9410, 9420]
+METRICS_STATS_FILE = 'data/logs/metrics.json'
+METRICS_INTERVAL = 30.0
+
+# Sampling profiler (run_crawler.py --profile), writes collapsed stacks and a hot-function report
+PROFILE_ENABLED = False
+PROFILE_INTERVAL = 0.01
+PROFILE_DIR = 'data/logs/profile'
+PROFILE_TOP = 30
+
+# Memory report (RSS, container sizes, live objects) and RSS backpressure
+MEMORY_MONITOR_ENABLED = True
+MEMORY_CHECK_INTERVAL = 5.0
+MEMORY_REPORT_INTERVAL = 300.0
+MEMORY_REPORT_FILE = 'data/logs/memory.json'
+# New requests are paused at MEMORY_PAUSE_RATIO of the limit until RSS falls below
+# MEMORY_RESUME_RATIO or in-flight work has drained, 0 disables backpressure
+MEMORY_RSS_LIMIT_MB = 0
+MEMORY_PAUSE_RATIO = 0.9
+MEMORY_RESUME_RATIO = 0.8
+# Per-module allocation tracking, slows the crawl down noticeably
+MEMORY_TRACEMALLOC = False
+MEMORY_TRACEMALLOC_FRAMES = 1
+MEMORY_TRACEMALLOC_TOP = 20
+
+# WebPageItem fields to extract (empty means all; url is always kept), e.g. ['title', 'text_content']
+ITEM_FIELDS = []
+# Maximum length per field: characters for text, entries for links and images
+ITEM_FIELD_LIMITS = {}
+
+# text_content keeps the main content of a page: blocks dense in links, in navigation, headers,
+# footers or sidebars, or repeated on MAIN_CONTENT_TEMPLATE_MIN_PAGES pages of a host are dropped.
+# Off by default: it changes text_content, and with template learning the text depends on crawl order
+MAIN_CONTENT_ENABLED = False
+MAIN_CONTENT_TEMPLATE_MIN_PAGES = 3  # 0 turns per-host template learning off
+MAIN_CONTENT_TEMPLATE_HOSTS = 1000  # hosts whose templates are remembered
+MAIN_CONTENT_TEMPLATE_BLOCKS = 5000  # block fingerprints remembered per host
+
 # Configure item pipelines
 ITEM_PIPELINES = {
     'webcrawler.pipelines.ValidationPipeline': 100,
     'webcrawler.pipelines.DeduplicationPipeline': 200,
     'webcrawler.pipelines.DocumentProcessingPipeline': 300,
+    'webcrawler.pipelines.BlobStorePipeline': 400,
+    'webcrawler.pipelines.SearchIndexPipeline': 500,
     'webcrawler.pipelines.JsonWriterPipeline': 800,
+    'webcrawler.pipelines.ParquetWriterPipeline': 850,
+    'webcrawler.pipelines.WarcWriterPipeline': 900,
 }
 
-# Enable autothrottling
-AUTOTHROTTLE_ENABLED = True
+# Processed documents per content hash: copies under other URLs reuse the extraction
+# and are exported as aliases ('' disables). Downloads whose first DOCUMENT_DEDUP_PREFIX_KB
+# and Content-Length match a known document are stopped early (0 disables)
+DOCUMENT_DEDUP_PATH = 'data/documents.sqlite3'
+DOCUMENT_DEDUP_PREFIX_KB = 64
+DOCUMENT_ALIASES_FILE = 'data/documents/aliases.jsonl'
+
+# Content-addressed storage of page HTML and document bytes
+BLOB_STORE_DIR = 'data/blobs'
+BLOB_STORE_COMPRESSION_LEVEL = 3
+BLOB_STORE_PACK_SIZE = 256 * 1024 * 1024
+# Train a zstd dictionary from this many HTML pages (0 disables)
+BLOB_STORE_DICTIONARY_SAMPLES = 1000
+BLOB_STORE_DICTIONARY_SIZE = 112640
+
+# URL lookup index over the JSON output, queried with lookup_record.py ('' disables)
+RECORD_INDEX_DIR = 'data/lookup'
+
+# Full-text index of page and document text, searched with search_index.py
+SEARCH_INDEX_DIR = 'data/index'
+SEARCH_INDEX_FLUSH_DOCS = 5000
+SEARCH_INDEX_MERGE_FACTOR = 8
+SEARCH_INDEX_QUEUE_SIZE = 10000
+
+# SQLite item storage, enable with 'webcrawler.pipelines.DatabasePipeline': 700
+DATABASE_PATH = 'data/crawl.sqlite3'
+DATABASE_BATCH_SIZE = 500
+DATABASE_COMMIT_INTERVAL = 1.0
+DATABASE_QUEUE_SIZE = 10000
+
+# Columnar export (skipped when pyarrow is not installed)
+PARQUET_DIR = 'data/parquet'
+PARQUET_BATCH_SIZE = 1000
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_COMPRESSION_LEVEL = None
+
+# WARC archive of raw exchanges (one gzip member per record, CDX index per file)
+WARC_DIR = 'data/warc'
+WARC_PREFIX = 'webcrawler'
+WARC_MAX_FILE_SIZE = 1024 * 1024 * 1024
+WARC_QUEUE_SIZE = 1000
+WARC_BUFFER_SIZE = 1024 * 1024
+
+# Global autothrottling (superseded by the per-host adaptive throttle below)
+AUTOTHROTTLE_ENABLED = False
 AUTOTHROTTLE_START_DELAY = 1
 AUTOTHROTTLE_MAX_DELAY = 10
 AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
 AUTOTHROTTLE_DEBUG = False
 
+# Per-host adaptive throttling (AIMD on concurrency and delay per download slot)
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_START_CONCURRENCY = 2.0
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1.0
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 8.0
+ADAPTIVE_THROTTLE_START_DELAY = 1
+ADAPTIVE_THROTTLE_MIN_DELAY = 0  # replaces DOWNLOAD_DELAY for healthy hosts, raise it to cap their rate
+ADAPTIVE_THROTTLE_MAX_DELAY = 10
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0  # p95 seconds above which a host is slowed down
+ADAPTIVE_THROTTLE_MAX_RETRY_AFTER = 300
+ADAPTIVE_THROTTLE_WINDOW = 32  # latency samples kept per host
+ADAPTIVE_THROTTLE_DEBUG = False
+
 # HTTP cache settings
 HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 3600
 HTTPCACHE_DIR = 'httpcache'
 HTTPCACHE_IGNORE_HTTP_CODES = [503, 504, 505, 500, 403, 404, 408, 429]
+HTTPCACHE_STORAGE = 'webcrawler.httpcache.SqliteCacheStorage'
+HTTPCACHE_SQLITE_CODEC = None  # zstd when installed, zlib otherwise
+HTTPCACHE_SQLITE_COMPRESSION_LEVEL = 3
+HTTPCACHE_SQLITE_COMMIT_EVERY = 100
 
 # File storage settings
 FILES_STORE = 'data/files'
@@ -76,6 +227,21 @@ DOWNLOAD_TIMEOUT = 30
 RETRY_TIMES = 3
 RETRY_HTTP_CODES = [500, 502, 503, 504, 408, 429]
 
+# Retry budget: each first attempt earns RETRY_BUDGET_RATIO retry tokens
+RETRY_BUDGET_RATIO = 0.1
+RETRY_BUDGET_MIN_TOKENS = 10
+RETRY_BUDGET_MAX_TOKENS = 100
+RETRY_BACKOFF_BASE = 1.0  # seconds, doubled per attempt with full jitter
+RETRY_BACKOFF_MAX = 60.0
+
+# Per-host circuit breakers
+CIRCUIT_BREAKER_ENABLED = True
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures (connection errors, 5xx on first attempts) before opening
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = 30  # seconds before the first probe, doubled per trip
+CIRCUIT_BREAKER_MAX_OPEN_TIME = 600
+CIRCUIT_BREAKER_MAX_TRIPS = 5  # host is given up after this many trips
+CIRCUIT_BREAKER_MAX_PARKED = 1000  # parked requests kept per host
+
 # Logging
 LOG_LEVEL = 'INFO'
 LOG_FILE = 'data/logs/webcrawler.log'
@@ -87,4 +253,21 @@ CRAWL_FILE_EXTENSIONS = [
 ]
 
 # Maximum file size to download (in bytes)
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
\ No newline at end of file
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
+
+# Compressed responses are dropped when their decoded body passes MAX_FILE_SIZE, or passes
+# DECOMPRESSION_MAX_RATIO times the compressed size once larger than DECOMPRESSION_RATIO_MIN_SIZE
+DECOMPRESSION_MAX_RATIO = 100
+DECOMPRESSION_RATIO_MIN_SIZE = 1024 * 1024
+# Hosts whose compression ratio is written to the stats, by decoded bytes
+DECOMPRESSION_STATS_HOSTS = 50
+
+# Shared frontier for multi-node crawls (disabled when FRONTIER_BACKEND is None)
+# e.g. 'webcrawler.frontier.RedisFrontierBackend'
+FRONTIER_BACKEND = None
+FRONTIER_REDIS_URL = 'redis://localhost:6379/0'
+FRONTIER_KEY_PREFIX = 'webcrawler'
+FRONTIER_NODE_ID = None
+FRONTIER_LEASE_TIMEOUT = 60  # seconds before a dead node's hosts are released
+FRONTIER_BATCH_SIZE = 32
+FRONTIER_MAX_HOSTS = 16  # hosts leased by one node at a time
\ No newline at end of file
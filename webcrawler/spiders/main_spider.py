@@ -2,8 +2,14 @@ import scrapy
 import re
 import mimetypes
 from urllib.parse import urljoin, urlparse
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
 from scrapy.http import Request
-from webcrawler.items import WebPageItem, DocumentItem, LinkItem
+from twisted.internet.task import LoopingCall
+from webcrawler.items import WebPageItem, DocumentItem, LinkItem, LinkRecord, ImageRecord
+from webcrawler.frontier import RedisError, load_frontier
+from utils import html_text
+from utils.main_content import MainContentExtractor
 
 
 class MainSpider(scrapy.Spider):
@@ -17,6 +23,11 @@ class MainSpider(scrapy.Spider):
         'txt', 'rtf', 'odt', 'ods', 'odp'
     ]
     
+    # Page fields that ITEM_FIELD_LIMITS can truncate
+    limitable_fields = [
+        'title', 'content', 'text_content', 'meta_description', 'meta_keywords', 'links', 'images'
+    ]
+    
     def __init__(self, start_urls=None, allowed_domains=None, max_depth=5, *args, **kwargs):
         super(MainSpider, self).__init__(*args, **kwargs)
         
@@ -32,9 +43,67 @@ class MainSpider(scrapy.Spider):
             
         self.max_depth = int(max_depth)
         self.crawled_urls = set()
+        self.frontier = None
+        self.frontier_batch_size = 32
+        self.frontier_done = []
+        self.frontier_lease_timeout = 60
+        self.frontier_heartbeat = None
+        # Set by webcrawler.dns.DnsPrefetch to resolve hosts pushed to the frontier
+        self.dns_prefetch = None
+        # Page fields to extract (None means all) and size limits per field
+        self.item_fields = None
+        self.field_limits = {}
+        # Main-content extractor for text_content (None keeps all body text)
+        self.main_content = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(MainSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.frontier = load_frontier(crawler.settings)
+        spider.configure_item_fields(
+            crawler.settings.getlist('ITEM_FIELDS'),
+            crawler.settings.getdict('ITEM_FIELD_LIMITS'),
+        )
+        if crawler.settings.getbool('MAIN_CONTENT_ENABLED'):
+            spider.main_content = MainContentExtractor(
+                template_min_pages=crawler.settings.getint('MAIN_CONTENT_TEMPLATE_MIN_PAGES', 3),
+                max_hosts=crawler.settings.getint('MAIN_CONTENT_TEMPLATE_HOSTS', 1000),
+                max_blocks=crawler.settings.getint('MAIN_CONTENT_TEMPLATE_BLOCKS', 5000),
+            )
+            crawler.signals.connect(spider.main_content_stats, signal=signals.spider_closed)
+        if spider.frontier is not None:
+            spider.frontier_batch_size = crawler.settings.getint('FRONTIER_BATCH_SIZE', 32)
+            spider.frontier_lease_timeout = crawler.settings.getfloat('FRONTIER_LEASE_TIMEOUT', 60)
+            crawler.signals.connect(spider.open_frontier, signal=signals.spider_opened)
+            crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+            crawler.signals.connect(spider.close_frontier, signal=signals.spider_closed)
+        return spider
+
+    def configure_item_fields(self, fields, limits):
+        """Restrict page extraction to ``fields`` and cap large fields
+
+        ``limits`` maps a field to a maximum length: characters for text
+        fields, entries for ``links`` and ``images``.
+        """
+        unknown = (set(fields) | set(limits)) - set(WebPageItem.fields)
+        if unknown:
+            raise ValueError(f"Unknown WebPageItem fields: {', '.join(sorted(unknown))}")
+        unlimited = set(limits) - set(self.limitable_fields)
+        if unlimited:
+            raise ValueError(f"Fields without a length limit: {', '.join(sorted(unlimited))}")
+        self.item_fields = set(fields) | {'url'} if fields else None
+        self.field_limits = {field: int(limit) for field, limit in limits.items()}
+
+    def wants(self, field):
+        return self.item_fields is None or field in self.item_fields
 
     def start_requests(self):
         """Generate initial requests"""
+        if self.frontier is not None:
+            self.frontier.push([(url, 0) for url in self.start_urls])
+            yield from self.next_frontier_requests()
+            return
+
         for url in self.start_urls:
             yield Request(
                 url=url,
@@ -42,10 +111,82 @@ class MainSpider(scrapy.Spider):
                 meta={'depth': 0}
             )
 
+    def next_frontier_requests(self):
+        """Pop the next batch of work from the shared frontier"""
+        self.flush_frontier_done()
+        entries = self.frontier.pop(self.frontier_batch_size)
+        # Taken over from a node that died mid-fetch, the URL may be claimed as fetched already
+        recovered = self.frontier.pop_recovered()
+        for url, depth in entries:
+            meta = {'depth': depth, 'frontier_url': url}
+            if url in recovered:
+                meta['frontier_recovered'] = True
+            yield Request(
+                url=url,
+                callback=self.parse,
+                errback=self.frontier_errback,
+                meta=meta,
+                dont_filter=True
+            )
+
+    def frontier_task_done(self, url):
+        """Buffer finished frontier URLs and report them in batches"""
+        self.frontier_done.append(url)
+        if len(self.frontier_done) >= self.frontier_batch_size:
+            self.flush_frontier_done()
+
+    def flush_frontier_done(self):
+        if self.frontier_done:
+            self.frontier.mark_done(self.frontier_done)
+            self.frontier_done = []
+
+    def frontier_errback(self, failure):
+        # Parked or backed-off requests come back later, they are not done yet
+        if failure.request.meta.get('circuit_breaker_deferred'):
+            return
+        if failure.check(IgnoreRequest):
+            self.logger.debug(f"Request dropped: {failure.request.url} ({failure.value})")
+        else:
+            self.logger.warning(f"Request failed: {failure.request.url} ({failure.value!r})")
+        self.frontier_task_done(failure.request.meta['frontier_url'])
+
+    def spider_idle(self, spider):
+        """Keep the spider alive while the shared frontier has work"""
+        scheduled = False
+        for request in self.next_frontier_requests():
+            self.crawler.engine.crawl(request)
+            scheduled = True
+        if scheduled or self.frontier.has_pending():
+            raise DontCloseSpider
+
+    def main_content_stats(self, spider):
+        for name, value in self.main_content.counts.items():
+            self.crawler.stats.set_value(f'main_content/{name}', value)
+
+    def open_frontier(self, spider):
+        # Leases are renewed on a timer as well as on every pop, so a slow batch keeps them
+        self.frontier_heartbeat = LoopingCall(self.renew_frontier_leases)
+        self.frontier_heartbeat.start(self.frontier_lease_timeout / 3, now=False)
+
+    def renew_frontier_leases(self):
+        try:
+            self.frontier.renew_leases()
+        except (OSError, RedisError) as e:
+            self.logger.warning(f"Could not renew frontier leases: {str(e)}")
+
+    def close_frontier(self, spider):
+        if self.frontier_heartbeat is not None and self.frontier_heartbeat.running:
+            self.frontier_heartbeat.stop()
+        self.flush_frontier_done()
+        self.frontier.close()
+
     def parse(self, response):
         """Parse web pages and extract data"""
         current_depth = response.meta.get('depth', 0)
         
+        if 'frontier_url' in response.meta:
+            self.frontier_task_done(response.meta['frontier_url'])
+        
         # Check if we've exceeded max depth
         if current_depth >= self.max_depth:
             self.logger.info(f"Max depth reached for {response.url}")
@@ -69,22 +210,31 @@ class MainSpider(scrapy.Spider):
             # Extract page data
             item = WebPageItem()
             item['url'] = response.url
-            item['title'] = self.extract_title(response)
-            item['content'] = response.text
-            item['text_content'] = self.extract_text_content(response)
-            item['meta_description'] = self.extract_meta_description(response)
-            item['meta_keywords'] = self.extract_meta_keywords(response)
-            item['headers'] = self.extract_headers(response)
-            item['response_status'] = response.status
-            item['content_type'] = response.headers.get('Content-Type', b'').decode('utf-8')
-            item['file_size'] = len(response.body)
+            # Unselected fields are not extracted at all
+            extractors = {
+                'title': self.extract_title,
+                'content': lambda response: response.text,
+                'text_content': self.extract_text_content,
+                'meta_description': self.extract_meta_description,
+                'meta_keywords': self.extract_meta_keywords,
+                'headers': self.extract_headers,
+                'response_status': lambda response: response.status,
+                'content_type': lambda response: response.headers.get('Content-Type', b'').decode('utf-8'),
+                'file_size': lambda response: len(response.body),
+                'images': self.extract_images,
+            }
+            for field, extract in extractors.items():
+                if self.wants(field):
+                    item[field] = extract(response)
             
-            # Extract links and images
+            # Links are always extracted, they drive the crawl
             links = self.extract_links(response)
-            images = self.extract_images(response)
+            if self.wants('links'):
+                item['links'] = links
             
-            item['links'] = links
-            item['images'] = images
+            for field, limit in self.field_limits.items():
+                if item.get(field) is not None:
+                    item[field] = item[field][:limit]
             
             yield item
             
@@ -100,10 +250,13 @@ class MainSpider(scrapy.Spider):
             item = DocumentItem()
             item['url'] = response.url
             item['filename'] = self.extract_filename(response.url)
-            item['file_type'] = self.get_file_extension(response.url)
+            item['file_type'] = self.get_file_extension(response.url) or self.get_content_type_extension(response)
             item['content'] = response.body
             item['file_size'] = len(response.body)
             item['metadata'] = self.extract_document_metadata(response)
+            # Download stopped by DocumentProcessingPipeline, the body is only a prefix of this document
+            if 'document_content_hash' in response.meta:
+                item['content_hash'] = response.meta['document_content_hash']
             
             yield item
             
@@ -112,6 +265,7 @@ class MainSpider(scrapy.Spider):
 
     def follow_links(self, response, links, current_depth):
         """Follow discovered links"""
+        frontier_entries = []
         for link_data in links:
             url = link_data['url']
             
@@ -130,12 +284,20 @@ class MainSpider(scrapy.Spider):
             
             # Follow the link if it's internal and within depth limit
             if link_data.get('type') == 'internal' and current_depth < self.max_depth:
+                if self.frontier is not None:
+                    frontier_entries.append((url, current_depth + 1))
+                    continue
                 yield Request(
                     url=url,
                     callback=self.parse,
                     meta={'depth': current_depth + 1},
                     dont_filter=False
                 )
+        
+        if frontier_entries:
+            self.frontier.push(frontier_entries)
+            if self.dns_prefetch is not None:
+                self.dns_prefetch.prefetch_urls(url for url, _ in frontier_entries)
 
     def extract_title(self, response):
         """Extract page title"""
@@ -144,8 +306,10 @@ class MainSpider(scrapy.Spider):
 
     def extract_text_content(self, response):
         """Extract clean text content from page"""
-        # Remove script and style elements
-        text = response.css('body *:not(script):not(style)::text').getall()
+        if self.main_content is not None:
+            return self.main_content.extract(response.text, urlparse(response.url).netloc)
+        # Text nodes of the body, without script and style elements
+        text = html_text.iter_text(response.text, within='body')
         # Clean and join text
         cleaned_text = ' '.join([t.strip() for t in text if t.strip()])
         return cleaned_text
@@ -171,29 +335,21 @@ class MainSpider(scrapy.Spider):
         
         # Extract anchor tags
         for link in response.css('a[href]'):
-            href = link.css('::attr(href)').get()
-            text = link.css('::text').get() or ''
+            href = link.attrib.get('href')
+            text = link.xpath('text()').get() or ''
             
             if href:
                 absolute_url = urljoin(response.url, href)
                 link_type = self.classify_link(absolute_url, response.url)
                 
-                links.append({
-                    'url': absolute_url,
-                    'text': text.strip(),
-                    'type': link_type
-                })
+                links.append(LinkRecord(absolute_url, text.strip(), link_type))
         
         # Extract links from other elements (iframe, embed, etc.)
         for src_link in response.css('[src]'):
-            src = src_link.css('::attr(src)').get()
+            src = src_link.attrib.get('src')
             if src:
                 absolute_url = urljoin(response.url, src)
-                links.append({
-                    'url': absolute_url,
-                    'text': '',
-                    'type': 'resource'
-                })
+                links.append(LinkRecord(absolute_url, '', 'resource'))
         
         return links
 
@@ -202,15 +358,12 @@ class MainSpider(scrapy.Spider):
         images = []
         
         for img in response.css('img'):
-            src = img.css('::attr(src)').get()
-            alt = img.css('::attr(alt)').get() or ''
+            src = img.attrib.get('src')
+            alt = img.attrib.get('alt') or ''
             
             if src:
                 absolute_url = urljoin(response.url, src)
-                images.append({
-                    'url': absolute_url,
-                    'alt': alt
-                })
+                images.append(ImageRecord(absolute_url, alt))
         
         return images
 
@@ -260,6 +413,12 @@ class MainSpider(scrapy.Spider):
             return path.split('.')[-1]
         return ''
 
+    def get_content_type_extension(self, response):
+        """Get file extension from the Content-Type header (for URLs without one)"""
+        content_type = response.headers.get('Content-Type', b'').decode('utf-8').split(';')[0].strip().lower()
+        extension = mimetypes.guess_extension(content_type) if content_type else None
+        return extension.lstrip('.') if extension else ''
+
     def extract_filename(self, url):
         """Extract filename from URL"""
         parsed_url = urlparse(url)
@@ -274,8 +433,10 @@ class MainSpider(scrapy.Spider):
         metadata = {}
         
         # Extract headers that might contain metadata
-        for header_name, header_value in response.headers.items():
-            if header_name.decode().lower() in ['last-modified', 'content-length', 'content-type']:
-                metadata[header_name.decode().lower()] = header_value.decode()
+        for header_name in ['last-modified', 'content-length', 'content-type']:
+            # Scrapy keeps a list of values per header, get() returns the last one
+            header_value = response.headers.get(header_name)
+            if header_value is not None:
+                metadata[header_name] = header_value.decode()
         
         return metadata
\ No newline at end of file
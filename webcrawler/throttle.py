@@ -0,0 +1,298 @@
+"""
+Per-host adaptive concurrency controller
+
+Replaces the single global AutoThrottle target with AIMD feedback per
+download slot: every healthy response additively raises the slot's
+concurrency and relaxes its delay, while errors, 429/503 responses, slow
+latency percentiles and ``Retry-After`` headers cut them multiplicatively.
+
+Host state lives in parallel ``array`` columns indexed by a host id so the
+controller stays small with tens of thousands of hosts.
+"""
+
+import logging
+import time
+import weakref
+from array import array
+from email.utils import parsedate_to_datetime
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """Parse a Retry-After header value into seconds (None if invalid)"""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+class HostTable:
+    """Columnar per-host state with a fixed-size latency window per host"""
+
+    def __init__(self, window=32, start_concurrency=2.0, start_delay=1.0):
+        self.window = window
+        self.start_concurrency = start_concurrency
+        self.start_delay = start_delay
+        self.index = {}
+        self.concurrency = array('f')
+        self.delay = array('f')
+        self.error_rate = array('f')
+        self.throttle_rate = array('f')
+        self.blocked_until = array('d')
+        # Lower bound from robots.txt Crawl-delay
+        self.crawl_delay = array('f')
+        self.responses = array('L')
+        self.errors = array('L')
+        self.throttled = array('L')
+        self.sample_count = array('L')
+        self.last_decrease = array('L')
+        self.latency = array('f')
+
+    def __len__(self):
+        return len(self.index)
+
+    def host_id(self, host):
+        hid = self.index.get(host)
+        if hid is None:
+            hid = len(self.index)
+            self.index[host] = hid
+            self.concurrency.append(self.start_concurrency)
+            self.delay.append(self.start_delay)
+            self.error_rate.append(0.0)
+            self.throttle_rate.append(0.0)
+            self.blocked_until.append(0.0)
+            self.crawl_delay.append(0.0)
+            self.responses.append(0)
+            self.errors.append(0)
+            self.throttled.append(0)
+            self.sample_count.append(0)
+            self.last_decrease.append(0)
+            self.latency.extend([0.0] * self.window)
+        return hid
+
+    def add_latency(self, hid, latency):
+        n = self.sample_count[hid]
+        self.latency[hid * self.window + n % self.window] = latency
+        self.sample_count[hid] = n + 1
+
+    def percentiles(self, hid, *quantiles):
+        n = min(self.sample_count[hid], self.window)
+        if not n:
+            return tuple(0.0 for _ in quantiles)
+        start = hid * self.window
+        samples = sorted(self.latency[start:start + n])
+        return tuple(samples[min(n - 1, int(q * n))] for q in quantiles)
+
+    def snapshot(self, host):
+        hid = self.index[host]
+        p50, p95 = self.percentiles(hid, 0.5, 0.95)
+        return {
+            'concurrency': round(self.concurrency[hid], 2),
+            'delay': round(self.delay[hid], 3),
+            'crawl_delay': round(self.crawl_delay[hid], 3),
+            'latency_p50': round(p50, 3),
+            'latency_p95': round(p95, 3),
+            'error_rate': round(self.error_rate[hid], 3),
+            'throttle_rate': round(self.throttle_rate[hid], 3),
+            'responses': self.responses[hid],
+            'errors': self.errors[hid],
+            'throttled': self.throttled[hid],
+        }
+
+
+class AdaptiveThrottle:
+    """Extension adjusting each download slot's concurrency and delay"""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.debug = settings.getbool('ADAPTIVE_THROTTLE_DEBUG')
+        self.min_concurrency = settings.getfloat('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1.0)
+        self.max_concurrency = settings.getfloat(
+            'ADAPTIVE_THROTTLE_MAX_CONCURRENCY',
+            settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN', 8)
+        )
+        # With any delay a slot starts one request per delay whatever its concurrency,
+        # so healthy hosts are let down to no delay at all unless a floor is set
+        self.min_delay = settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.0)
+        self.max_delay = settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 10.0)
+        self.target_latency = settings.getfloat('ADAPTIVE_THROTTLE_TARGET_LATENCY', 2.0)
+        self.max_retry_after = settings.getfloat('ADAPTIVE_THROTTLE_MAX_RETRY_AFTER', 300.0)
+        self.increase_step = settings.getfloat('ADAPTIVE_THROTTLE_INCREASE', 1.0)
+        self.decrease_factor = settings.getfloat('ADAPTIVE_THROTTLE_DECREASE', 0.5)
+        self.ewma_alpha = 0.1
+        self.hosts = HostTable(
+            window=settings.getint('ADAPTIVE_THROTTLE_WINDOW', 32),
+            start_concurrency=settings.getfloat('ADAPTIVE_THROTTLE_START_CONCURRENCY', 2.0),
+            start_delay=settings.getfloat('ADAPTIVE_THROTTLE_START_DELAY', 1.0),
+        )
+        # Slot each host's state was last applied to
+        self.slots = weakref.WeakValueDictionary()
+
+        crawler.signals.connect(self.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(self.request_left_downloader, signal=signals.request_left_downloader)
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def spider_opened(self, spider):
+        # RobotsMiddleware passes Crawl-delay values through spider.throttle
+        spider.throttle = self
+
+    def get_slot(self, request):
+        key = request.meta.get('download_slot')
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def request_reached_downloader(self, request, spider):
+        key, slot = self.get_slot(request)
+        if slot is None or self.slots.get(key) is slot:
+            return
+        # A new host, or a slot the downloader dropped while idle and created
+        # again with the default concurrency and delay
+        hid = self.hosts.host_id(key)
+        self.apply(hid, slot)
+        self.slots[key] = slot
+        self.stats.set_value('adaptive_throttle/hosts', len(self.hosts), spider=spider)
+
+    def response_downloaded(self, response, request, spider):
+        request.meta['adaptive_throttle_seen'] = True
+        key, slot = self.get_slot(request)
+        if slot is None:
+            return
+        hid = self.hosts.host_id(key)
+        hosts = self.hosts
+        hosts.responses[hid] += 1
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            hosts.add_latency(hid, latency)
+
+        throttled = response.status in THROTTLE_STATUSES
+        hosts.throttle_rate[hid] += self.ewma_alpha * (throttled - hosts.throttle_rate[hid])
+        hosts.error_rate[hid] += self.ewma_alpha * ((response.status >= 500) - hosts.error_rate[hid])
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if throttled or retry_after:
+            hosts.throttled[hid] += throttled
+            self.decrease(hid, 'throttled', spider)
+            if retry_after:
+                self.block(hid, retry_after, spider)
+        elif response.status >= 500:
+            hosts.errors[hid] += 1
+            # A URL failing again on retry says nothing new about the host
+            if not request.meta.get('retry_times'):
+                self.decrease(hid, 'server_error', spider)
+        elif latency is not None and self.is_slow(hid):
+            hosts.last_decrease[hid] = hosts.sample_count[hid]
+            self.decrease(hid, 'slow', spider)
+        else:
+            self.increase(hid, spider)
+        self.apply(hid, slot, key)
+
+    def request_left_downloader(self, request, spider):
+        # No response_downloaded before leaving the downloader means the
+        # download failed (timeout, DNS error, connection refused ...)
+        if request.meta.pop('adaptive_throttle_seen', False):
+            return
+        key, slot = self.get_slot(request)
+        if slot is None:
+            return
+        hid = self.hosts.host_id(key)
+        self.hosts.errors[hid] += 1
+        self.hosts.error_rate[hid] += self.ewma_alpha * (1.0 - self.hosts.error_rate[hid])
+        self.decrease(hid, 'download_error', spider)
+        self.apply(hid, slot, key)
+
+    def is_slow(self, hid):
+        """p95 latency above target, checked at most once per half window"""
+        hosts = self.hosts
+        count = hosts.sample_count[hid]
+        if count < 4 or count - hosts.last_decrease[hid] < hosts.window // 2:
+            return False
+        return hosts.percentiles(hid, 0.95)[0] > self.target_latency
+
+    def increase(self, hid, spider):
+        """Additive increase: about +1 concurrency per window of responses"""
+        hosts = self.hosts
+        if hosts.blocked_until[hid] > time.time():
+            return
+        concurrency = hosts.concurrency[hid]
+        if concurrency < self.max_concurrency:
+            hosts.concurrency[hid] = min(self.max_concurrency, concurrency + self.increase_step / concurrency)
+            self.stats.inc_value('adaptive_throttle/increase', spider=spider)
+        delay = hosts.delay[hid] * 0.75
+        hosts.delay[hid] = delay if delay - self.min_delay > 0.01 else self.min_delay
+
+    def decrease(self, hid, reason, spider):
+        """Multiplicative decrease of concurrency, back off the delay"""
+        hosts = self.hosts
+        hosts.concurrency[hid] = max(self.min_concurrency, hosts.concurrency[hid] * self.decrease_factor)
+        hosts.delay[hid] = min(self.max_delay, max(hosts.delay[hid] * 2, 0.25))
+        self.stats.inc_value(f'adaptive_throttle/decrease/{reason}', spider=spider)
+
+    def block(self, hid, retry_after, spider):
+        """Honour Retry-After by holding the host's delay until it has passed"""
+        retry_after = min(retry_after, self.max_retry_after)
+        hosts = self.hosts
+        hosts.blocked_until[hid] = max(hosts.blocked_until[hid], time.time() + retry_after)
+        hosts.delay[hid] = max(hosts.delay[hid], retry_after)
+        hosts.concurrency[hid] = self.min_concurrency
+        self.stats.inc_value('adaptive_throttle/retry_after', spider=spider)
+
+    def apply(self, hid, slot, key=None):
+        hosts = self.hosts
+        old_concurrency, old_delay = slot.concurrency, slot.delay
+        slot.concurrency = max(1, int(hosts.concurrency[hid]))
+        slot.delay = max(hosts.delay[hid], hosts.crawl_delay[hid])
+        if self.debug and key is not None and (old_concurrency, old_delay) != (slot.concurrency, slot.delay):
+            p50, p95 = hosts.percentiles(hid, 0.5, 0.95)
+            logger.info(
+                f"slot: {key} | conc: {old_concurrency} -> {slot.concurrency} | "
+                f"delay: {old_delay * 1000:.0f} -> {slot.delay * 1000:.0f} ms | "
+                f"latency p50/p95: {p50 * 1000:.0f}/{p95 * 1000:.0f} ms"
+            )
+
+    def set_crawl_delay(self, key, delay):
+        """Never download from the slot ``key`` faster than once per ``delay`` seconds"""
+        hid = self.hosts.host_id(key)
+        self.hosts.crawl_delay[hid] = delay
+        engine = self.crawler.engine
+        slot = engine.downloader.slots.get(key) if engine is not None else None
+        if slot is not None:
+            self.apply(hid, slot, key)
+
+    def host_stats(self, host):
+        """Return the controller state for one host/slot"""
+        return self.hosts.snapshot(host)
+
+    def spider_closed(self, spider):
+        hosts = self.hosts
+        if not len(hosts):
+            return
+        self.stats.set_value('adaptive_throttle/hosts', len(hosts), spider=spider)
+        self.stats.set_value('adaptive_throttle/concurrency_max', round(max(hosts.concurrency), 2), spider=spider)
+        self.stats.set_value('adaptive_throttle/concurrency_mean',
+                             round(sum(hosts.concurrency) / len(hosts), 2), spider=spider)
+        self.stats.set_value('adaptive_throttle/delay_max', round(max(hosts.delay), 3), spider=spider)